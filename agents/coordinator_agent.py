@@ -4,16 +4,103 @@
 This module acts as the central orchestrator for the agentic RAG system.
 It coordinates the flow of information between the ingestion, retrieval, and
 language model agents to process a user's query and generate a response.
-It also handles special commands for system management, such as clearing data.
+It also handles special commands for system management, such as clearing data,
+and the removal or re-indexing of a single document.
+
+Indexing runs in a background job queue with persistent, pollable progress, so
+the question path only embeds the question and searches what is already indexed.
 """
 
+import asyncio
+import atexit
 import os
 import shutil
+import threading
+import time
 import uuid
-from agents.ingestion_agent import handle_message as ingestion_handle_message
-from agents.retrieval_agent import handle_message as retrieval_handle_message
-from agents.llm_response_agent import handle_message as llm_handle_message
+from utils.answer_cache import answer_cache
+from utils.concurrency import LazyResource
+from utils.job_queue import JobCancelled, JobQueue
+from utils.manifest import source_key
 from utils.mcp import create_mcp_message
+from utils.message_bus import MessageBus
+from utils.tracing import span, start_metrics_server
+
+# --- Configuration and Constants ---
+
+# Status message returned when nothing is indexed for the document path.
+NO_DOCUMENTS_MESSAGE = "No documents found to process. Please upload documents first."
+# Status message returned when nothing is searchable yet but indexing is still running.
+INDEXING_IN_PROGRESS_MESSAGE = "Your documents are still being indexed. Please ask again in a moment."
+# File holding the state of the background indexing jobs.
+INDEXING_JOBS_PATH = "indexing_jobs.json"
+# Number of most recently indexed files listed in a job's progress.
+INDEXING_RECENT_FILES = 10
+# Number of questions retrieved together in one RETRIEVE_BATCH message in batch mode.
+BATCH_RETRIEVE_SIZE = 128
+# Maximum number of LLM generations running concurrently in batch mode.
+BATCH_GENERATION_CONCURRENCY = 8
+# Where the CPU-heavy Ingestion and Retrieval agents run: "thread" (in this process)
+# or "process" (in separate worker processes, so they do not share the GIL with the UI).
+AGENT_EXECUTION_MODE = os.getenv("AGENT_EXECUTION_MODE", "thread")
+# Whether `start_background_warm_up` loads the embedding model, the databases and the
+# LLM client while the UI is already usable, instead of during the first question.
+BACKGROUND_WARM_UP = os.getenv("BACKGROUND_WARM_UP", "1") != "0"
+
+# --- Message Bus ---
+
+# All messages are routed by their 'receiver' through the bus. The Ingestion Agent owns
+# the manifest and the Retrieval Agent owns the vector store, so each of them gets a
+# single process when running out of process; in-process, the Retrieval Agent can serve
+# several requests at once. The LLM agent waits on the network and always uses threads.
+_agent_processes = AGENT_EXECUTION_MODE == "process"
+bus = MessageBus()
+bus.register("IngestionAgent", "agents.ingestion_agent", workers=1, processes=_agent_processes)
+bus.register("RetrievalAgent", "agents.retrieval_agent", workers=1 if _agent_processes else 4, processes=_agent_processes)
+bus.register("LLMResponseAgent", "agents.llm_response_agent", workers=BATCH_GENERATION_CONCURRENCY)
+atexit.register(bus.shutdown)
+
+# Serve the pipeline metrics to Prometheus when a port is configured.
+if os.getenv("METRICS_PORT"):
+    start_metrics_server(int(os.getenv("METRICS_PORT")))
+
+# --- Warm-Up ---
+
+def warm_up_agents(trace_id: str = None):
+    """
+    Starts the agents' workers and has them load their models, parsers and
+    databases, so that the first question does not pay for it.
+
+    Args:
+        trace_id (str, optional): The trace ID of the warm-up; a new one by default.
+    """
+    trace_id = trace_id or str(uuid.uuid4())
+    with span("Coordinator.warm_up", trace_id=trace_id):
+        for agent in ("IngestionAgent", "RetrievalAgent", "LLMResponseAgent"):
+            bus.request(create_mcp_message("Coordinator", agent, "WARM_UP", {}, trace_id))
+
+def start_background_warm_up():
+    """
+    Runs `warm_up_agents` in a background thread, unless BACKGROUND_WARM_UP is off.
+
+    Requests sent while the warm-up is still running simply wait for the resources
+    it is loading. A failed warm-up is only logged; the first request retries it.
+
+    Returns:
+        threading.Thread | None: The warm-up thread, or None if warm-up is disabled.
+    """
+    if not BACKGROUND_WARM_UP:
+        return None
+
+    def run():
+        try:
+            warm_up_agents()
+        except Exception as e:
+            print(f"Warm-up failed. Reason: {e}")
+
+    thread = threading.Thread(target=run, name="warm-up", daemon=True)
+    thread.start()
+    return thread
 
 def empty_directory(directory_path: str):
     """
@@ -41,75 +128,644 @@ def empty_directory(directory_path: str):
             # Print an error message if any item fails to be deleted.
             print(f'Failed to delete {file_path}. Reason: {e}')
 
-def coordinate_chat(question: str, document_path: str) -> str:
+def clear_all_data(document_path: str, trace_id: str) -> str:
+    """
+    Resets the vector database and the ingestion manifest, and empties the document folder.
+
+    Args:
+        document_path (str): The path to the directory containing uploaded documents.
+        trace_id (str): The trace ID of the current operation.
+
+    Returns:
+        str: A status message for the user interface.
+    """
+    try:
+        # A running indexing job would otherwise keep adding chunks after the reset.
+        _stop_indexing()
+
+        # Create and send a message to the RetrievalAgent to reset its database.
+        reset_msg = create_mcp_message("Coordinator", "RetrievalAgent", "RESET_DATABASE", {}, trace_id)
+        bus.request(reset_msg)
+        # Every cached answer refers to chunks that no longer exist.
+        answer_cache.clear()
+
+        # Tell the IngestionAgent to forget which files it has already ingested.
+        manifest_msg = create_mcp_message("Coordinator", "IngestionAgent", "RESET_MANIFEST", {}, trace_id)
+        bus.request(manifest_msg)
+        
+        # Empty the local directory where uploaded documents are stored.
+        empty_directory(document_path)
+        
+        # Return a success message to the user interface.
+        return "✅ Successfully cleared all data from the database and document folder."
+    except Exception as e:
+        # Return an error message if any part of the cleanup fails.
+        return f"❌ Error during cleanup: {str(e)}"
+
+def _update_progress(progress: dict, batch_progress: dict, chunks: int, deleted: int, elapsed: float):
+    # Folds one CHUNK_BATCH's progress report into the running totals of an indexing run.
+    progress["files_total"] = batch_progress.get("files_total", progress["files_total"])
+    progress["files_done"] = batch_progress.get("files_done", progress["files_done"])
+    progress["current_file"] = batch_progress.get("current_file")
+    progress["chunks_skipped"] = batch_progress.get("skipped_chunks", progress["chunks_skipped"])
+    completed = progress["recent_files"] + batch_progress.get("completed_files", [])
+    progress["recent_files"] = completed[-INDEXING_RECENT_FILES:]
+    progress["chunks_indexed"] += chunks
+    progress["chunks_deleted"] += deleted
+    progress["elapsed_s"] = round(elapsed, 2)
+    if elapsed > 0:
+        progress["chunks_per_s"] = round(progress["chunks_indexed"] / elapsed, 1)
+        progress["files_per_s"] = round(progress["files_done"] / elapsed, 2)
+
+def index_documents(document_path: str, trace_id: str, report=None, cancelled: threading.Event = None) -> int:
+    """
+    Runs the ingestion and indexing steps of the RAG pipeline.
+
+    Chunks are searchable as soon as their batch has been indexed, so questions
+    asked while this runs are answered from the documents indexed so far.
+
+    Args:
+        document_path (str): The path to the directory containing uploaded documents.
+        trace_id (str): The trace ID of the current operation.
+        report (callable, optional): Called after every batch with the progress so far:
+                                     'files_total', 'files_done', 'current_file',
+                                     'recent_files', 'chunks_indexed', 'chunks_deleted',
+                                     'chunks_skipped' (near duplicates that were not
+                                     stored), 'elapsed_s', 'chunks_per_s' and 'files_per_s'.
+        cancelled (threading.Event, optional): Stops indexing before the next batch once set.
+
+    Returns:
+        int: The number of chunks indexed for the document path.
+
+    Raises:
+        JobCancelled: If `cancelled` was set before indexing finished. The chunks
+                      indexed so far stay searchable, and the manifest is not
+                      updated, so the next run picks up where this one stopped.
+    """
+    # Steps 1 and 2: Ingestion and Indexing
+    # Ask the IngestionAgent to stream the changes for new or changed documents. Each
+    # CHUNK_BATCH message carries a bounded number of chunks, which are forwarded to the
+    # RetrievalAgent straight away so the full corpus is never held in memory.
+    ingest_msg = create_mcp_message("Coordinator", "IngestionAgent", "INGEST", {"document_path": document_path}, trace_id)
+    total_chunks = 0
+    progress = {"files_total": 0, "files_done": 0, "current_file": None, "recent_files": [], "chunks_indexed": 0,
+                "chunks_deleted": 0, "chunks_skipped": 0, "elapsed_s": 0.0, "chunks_per_s": 0.0, "files_per_s": 0.0}
+    started = time.perf_counter()
+    responses = bus.stream(ingest_msg)
+    try:
+        for ingest_response in responses:
+            if ingest_response["type"] == "INGESTION_COMPLETE":
+                total_chunks = ingest_response["payload"]["total_chunks"]
+                continue
+            # Closing the stream (below) also stops the IngestionAgent.
+            if cancelled is not None and cancelled.is_set():
+                raise JobCancelled()
+
+            chunks = ingest_response["payload"]["chunks"]
+            deleted_ids = ingest_response["payload"]["deleted_ids"]
+
+            # Remove chunks that no longer exist in the source documents.
+            if deleted_ids:
+                delete_msg = create_mcp_message("Coordinator", "RetrievalAgent", "DELETE_CHUNKS", {"ids": deleted_ids}, trace_id)
+                _ = bus.request(delete_msg)
+                # Cached answers built on these chunks are now stale.
+                answer_cache.invalidate(deleted_ids)
+
+            # Send only the new or changed chunks to the RetrievalAgent to be added to the vector database.
+            if chunks:
+                add_msg = create_mcp_message("Coordinator", "RetrievalAgent", "ADD_CHUNKS", {"chunks": chunks}, trace_id)
+                # The response from adding chunks is not critical for the flow, so it's ignored.
+                _ = bus.request(add_msg)
+                answer_cache.invalidate([chunk["id"] for chunk in chunks])
+
+            if report is not None:
+                _update_progress(progress, ingest_response["payload"].get("progress", {}), len(chunks), len(deleted_ids),
+                                 time.perf_counter() - started)
+                report(dict(progress))
+    finally:
+        responses.close()
+
+    return total_chunks
+
+def _run_indexing_job(params: dict, report, cancelled: threading.Event) -> dict:
+    # Runner of the background indexing jobs (see utils/job_queue.py).
+    trace_id = str(uuid.uuid4())
+    with span("Coordinator.index_job", trace_id=trace_id):
+        return {"total_chunks": index_documents(params["document_path"], trace_id, report, cancelled)}
+
+# The job queue is opened on first use: opening it resumes the jobs that an earlier
+# process left unfinished, which only the app should trigger, not every importer.
+_indexing_jobs = LazyResource(lambda: JobQueue(INDEXING_JOBS_PATH, _run_indexing_job))
+
+def submit_indexing(document_path: str) -> str:
+    """
+    Queues a background job that brings the index up to date with the document path.
+
+    Args:
+        document_path (str): The path to the directory containing uploaded documents.
+
+    Returns:
+        str: The job ID, for `get_indexing_job` and `cancel_indexing`.
+    """
+    return _indexing_jobs.get().submit(document_path=document_path)
+
+def cancel_indexing(job_id: str) -> bool:
+    """
+    Cancels a queued or running indexing job; documents indexed so far stay searchable.
+
+    Args:
+        job_id (str): The ID returned by `submit_indexing`.
+
+    Returns:
+        bool: True if the job was still queued or running.
+    """
+    return _indexing_jobs.get().cancel(job_id)
+
+def get_indexing_job(job_id: str) -> dict:
+    """
+    Returns the state of an indexing job: its 'status', 'progress' and, once
+    finished, its 'result' or 'error' (see `utils.job_queue.JobQueue.get`).
+
+    Args:
+        job_id (str): The ID returned by `submit_indexing`.
+    """
+    return _indexing_jobs.get().get(job_id)
+
+def list_indexing_jobs() -> list[dict]:
+    """
+    Returns the states of the known indexing jobs, most recently submitted first.
+    """
+    return _indexing_jobs.get().jobs()
+
+def indexing_active() -> bool:
+    """
+    Checks whether an indexing job is queued or running in this process.
+    """
+    return _indexing_jobs.loaded and _indexing_jobs.get().active()
+
+def _stop_indexing():
+    # Cancels the indexing jobs and waits for them, e.g. before the database is reset.
+    if _indexing_jobs.loaded:
+        _indexing_jobs.get().cancel_all(wait=True)
+
+def coordinate_indexing(document_path: str) -> int:
+    """
+    Brings the index up to date with the document path, e.g. right after new uploads.
+
+    Only new or changed files are parsed and embedded; the ingestion manifest
+    skips everything else.
+
+    Args:
+        document_path (str): The path to the directory containing uploaded documents.
+
+    Returns:
+        int: The number of chunks indexed for the document path.
+    """
+    trace_id = str(uuid.uuid4())
+    with span("Coordinator.index", trace_id=trace_id):
+        return index_documents(document_path, trace_id)
+
+def delete_document(source: str) -> int:
+    """
+    Removes one document's chunks from the index, without touching any other document.
+
+    The caller removes the file itself (e.g. from the upload store) first;
+    otherwise the next ingestion would simply index it again.
+
+    Args:
+        source (str): The path of the document.
+
+    Returns:
+        int: The number of chunks deleted from the vector database.
+    """
+    trace_id = str(uuid.uuid4())
+    with span("Coordinator.delete_document", trace_id=trace_id):
+        forgotten = _forget_document(source)
+        # The RetrievalAgent finds the chunks by their source metadata, including any the manifest missed.
+        delete_msg = create_mcp_message("Coordinator", "RetrievalAgent", "DELETE_DOCUMENT", {"source": source}, trace_id)
+        deleted_ids = bus.request(delete_msg)["payload"]["deleted_ids"]
+        answer_cache.invalidate(list({*forgotten["chunk_ids"], *deleted_ids}))
+        _reindex_stale(forgotten["stale_sources"])
+        return len(deleted_ids)
+
+def _forget_document(source: str) -> dict:
+    # Edits the manifest here rather than through the IngestionAgent, whose only worker
+    # may be busy with a background indexing job for a long time. Imported on first
+    # use, so the agent (and its parsers) is not loaded before it is needed.
+    from agents.ingestion_agent import forget_document
+    return forget_document(source)
+
+def _reindex_stale(sources: list[str]):
+    # Documents whose near duplicates referred to deleted chunks store their own copies
+    # again; they are few, and indexed in the background like any other change.
+    for stale_source in sources:
+        submit_indexing(stale_source)
+
+def replace_document(source: str) -> int:
+    """
+    Re-chunks one document from scratch and makes its new chunks the only ones stored for it.
+
+    Unlike incremental indexing, this does not trust the ingestion manifest, so it
+    also repairs a document whose stored chunks have drifted from its file.
+
+    Args:
+        source (str): The path of the document.
+
+    Returns:
+        int: The number of chunks now stored for the document.
+    """
+    trace_id = str(uuid.uuid4())
+    with span("Coordinator.replace_document", trace_id=trace_id):
+        stale_sources = _forget_document(source)["stale_sources"]
+        # With the manifest entry gone, ingesting the file alone yields all of its chunks,
+        # except near duplicates of other documents' chunks.
+        ingest_msg = create_mcp_message("Coordinator", "IngestionAgent", "INGEST", {"document_path": source}, trace_id)
+        chunks, other_deleted_ids = [], []
+        # The chunks are only stored after INGESTION_COMPLETE, so the stream must not run
+        # ahead of it: with a window of 1, the manifest is committed only when the stream
+        # is resumed below, and closing it early (on failure) leaves the manifest unchanged.
+        responses = bus.stream(ingest_msg, window=1)
+        try:
+            for ingest_response in responses:
+                if ingest_response["type"] == "INGESTION_COMPLETE":
+                    break
+                if ingest_response["type"] == "CHUNK_BATCH":
+                    chunks.extend(ingest_response["payload"]["chunks"])
+                    # Deletions can only concern other documents that were chunked again along with it.
+                    other_deleted_ids.extend(ingest_response["payload"]["deleted_ids"])
+
+            replace_msg = create_mcp_message("Coordinator", "RetrievalAgent", "REPLACE_DOCUMENT",
+                                             {"source": source, "chunks": chunks}, trace_id)
+            deleted_ids = bus.request(replace_msg)["payload"]["deleted_ids"]
+            if other_deleted_ids:
+                delete_msg = create_mcp_message("Coordinator", "RetrievalAgent", "DELETE_CHUNKS", {"ids": other_deleted_ids}, trace_id)
+                bus.request(delete_msg)
+            # Resuming the stream commits the manifest.
+            for _ in responses:
+                pass
+        finally:
+            responses.close()
+        answer_cache.invalidate([chunk["id"] for chunk in chunks] + deleted_ids + other_deleted_ids)
+        _reindex_stale(stale_sources)
+        return sum(chunk["metadata"]["source"] == source_key(source) for chunk in chunks)
+
+def _context_or_status(context: dict):
+    # Nothing is found only when nothing (matching) is indexed, or not yet.
+    if context["chunk_ids"]:
+        return context
+    return INDEXING_IN_PROGRESS_MESSAGE if indexing_active() else NO_DOCUMENTS_MESSAGE
+
+def _retrieve_payload(question: str, sources: list[str] = None) -> dict:
+    # A RETRIEVE request, restricted to the given documents if any are given.
+    payload = {"question": question}
+    if sources is not None:
+        payload["sources"] = list(sources)
+    return payload
+
+def prepare_context(question: str, document_path: str, trace_id: str, sources: list[str] = None):
+    """
+    Runs the retrieval step of the RAG pipeline over the documents indexed so far.
+
+    Documents are indexed by `submit_indexing` (or `coordinate_indexing`), not
+    here, so a question never waits for ingestion.
+
+    Args:
+        question (str): The user's query.
+        document_path (str): The path to the directory containing uploaded documents.
+        trace_id (str): The trace ID of the current operation.
+        sources (list[str], optional): Paths of the documents the answer may draw on;
+                                       all indexed documents by default.
+
+    Returns:
+        dict | str: The RetrievalAgent's CONTEXT_RESPONSE payload, or a status
+                    message if there is nothing to search.
+    """
+    # Step 1: Retrieval
+    # Send the user's question to the RetrievalAgent to find relevant context.
+    retrieve_msg = create_mcp_message("Coordinator", "RetrievalAgent", "RETRIEVE", _retrieve_payload(question, sources), trace_id)
+    retrieve_response = bus.request(retrieve_msg)
+    # The payload holds the most relevant chunks (top_chunks), their IDs and the query embedding.
+    return _context_or_status(retrieve_response["payload"])
+
+def coordinate_chat(question: str, document_path: str, sources: list[str] = None) -> str:
     """
     Orchestrates the entire RAG pipeline or handles special system commands.
 
     This function manages the sequence of agent interactions:
-    1. Ingestion: Loads and chunks documents.
-    2. Indexing: Adds document chunks to the vector database.
-    3. Retrieval: Fetches relevant context for a given question.
-    4. Generation: Synthesizes a final answer using an LLM.
+    1. Retrieval: Fetches relevant context for a given question from the documents
+       indexed so far (ingestion and indexing run separately, see `submit_indexing`).
+    2. Generation: Synthesizes a final answer using an LLM, unless a cached answer
+       for a semantically equivalent question over the same chunks exists.
 
     It also intercepts special commands like "CLEAR_ALL_DATA" to manage the system's state.
 
     Args:
         question (str): The user's query or a special command string.
         document_path (str): The path to the directory containing uploaded documents.
+        sources (list[str], optional): Paths of the documents the answer may draw on;
+                                       all indexed documents by default.
 
     Returns:
         str: The final answer from the language model or a status message.
     """
     # Generate a unique trace ID to track this entire operation across all agents.
     trace_id = str(uuid.uuid4())
+    with span("Coordinator.chat", trace_id=trace_id, question_chars=len(question)):
+        # Check if the input is a special command for clearing data.
+        if question == "CLEAR_ALL_DATA":
+            return clear_all_data(document_path, trace_id)
 
-    # Check if the input is a special command for clearing data.
-    if question == "CLEAR_ALL_DATA":
-        try:
-            # Create and send a message to the RetrievalAgent to reset its database.
-            reset_msg = create_mcp_message("Coordinator", "RetrievalAgent", "RESET_DATABASE", {}, trace_id)
-            retrieval_handle_message(reset_msg)
-            
-            # Empty the local directory where uploaded documents are stored.
-            empty_directory(document_path)
-            
-            # Return a success message to the user interface.
-            return "✅ Successfully cleared all data from the database and document folder."
-        except Exception as e:
-            # Return an error message if any part of the cleanup fails.
-            return f"❌ Error during cleanup: {str(e)}"
+        # --- Standard RAG Pipeline ---
+
+        context = prepare_context(question, document_path, trace_id, sources)
+        if isinstance(context, str):
+            return context
+
+        # A semantically equivalent question answered from exactly the same chunks
+        # can reuse the cached answer instead of calling the LLM again.
+        cached_answer = answer_cache.lookup(context["query_embedding"], context["chunk_ids"])
+        if cached_answer is not None:
+            return cached_answer
+
+        # Step 2: Generation
+        # Send the question and the retrieved context to the LLMResponseAgent.
+        llm_msg = create_mcp_message("Coordinator", "LLMResponseAgent", "GENERATE_RESPONSE", {"question": question, "top_chunks": context["top_chunks"]}, trace_id)
+        llm_response = bus.request(llm_msg)
 
-    # --- Standard RAG Pipeline ---
+        # Remember successful answers for similar questions asked later.
+        if not llm_response["payload"].get("error"):
+            answer_cache.store(context["query_embedding"], context["chunk_ids"], llm_response["payload"]["final_response"])
 
-    # Step 1: Ingestion
-    # Send a message to the IngestionAgent to process the documents.
+        # Return the final, synthesized response from the language model.
+        return llm_response["payload"]["final_response"]
+
+def coordinate_chat_stream(question: str, document_path: str, trace_id: str = None, sources: list[str] = None):
+    """
+    Streaming variant of `coordinate_chat`.
+
+    It runs the same pipeline but yields the answer piece by piece while the
+    language model generates it, so the user interface can render tokens as they
+    arrive. Cached answers and status messages are yielded in one piece.
+
+    Args:
+        question (str): The user's query or a special command string.
+        document_path (str): The path to the directory containing uploaded documents.
+        trace_id (str, optional): The trace ID to use, e.g. to look up the generation
+                                  timings afterwards. A new one is generated if omitted.
+        sources (list[str], optional): Paths of the documents the answer may draw on;
+                                       all indexed documents by default.
+
+    Yields:
+        str: Consecutive pieces of the final answer or a status message.
+    """
+    trace_id = trace_id or str(uuid.uuid4())
+    with span("Coordinator.chat", trace_id=trace_id, question_chars=len(question), stream=True):
+        if question == "CLEAR_ALL_DATA":
+            yield clear_all_data(document_path, trace_id)
+            return
+
+        context = prepare_context(question, document_path, trace_id, sources)
+        if isinstance(context, str):
+            yield context
+            return
+
+        cached_answer = answer_cache.lookup(context["query_embedding"], context["chunk_ids"])
+        if cached_answer is not None:
+            yield cached_answer
+            return
+
+        # Stream the answer from the LLMResponseAgent, forwarding each chunk immediately.
+        llm_msg = create_mcp_message("Coordinator", "LLMResponseAgent", "GENERATE_RESPONSE", {"question": question, "top_chunks": context["top_chunks"]}, trace_id)
+        for llm_response in bus.stream(llm_msg):
+            if llm_response["type"] == "RESPONSE_CHUNK":
+                yield llm_response["payload"]["text"]
+            elif not llm_response["payload"]["error"]:
+                answer_cache.store(context["query_embedding"], context["chunk_ids"], llm_response["payload"]["final_response"])
+
+# --- Asynchronous Pipeline ---
+
+async def clear_all_data_async(document_path: str, trace_id: str) -> str:
+    """
+    Asynchronous counterpart of `clear_all_data`.
+
+    Args:
+        document_path (str): The path to the directory containing uploaded documents.
+        trace_id (str): The trace ID of the current operation.
+
+    Returns:
+        str: A status message for the user interface.
+    """
+    try:
+        await asyncio.to_thread(_stop_indexing)
+
+        reset_msg = create_mcp_message("Coordinator", "RetrievalAgent", "RESET_DATABASE", {}, trace_id)
+        await bus.request_async(reset_msg)
+        answer_cache.clear()
+
+        manifest_msg = create_mcp_message("Coordinator", "IngestionAgent", "RESET_MANIFEST", {}, trace_id)
+        await bus.request_async(manifest_msg)
+
+        empty_directory(document_path)
+        return "✅ Successfully cleared all data from the database and document folder."
+    except Exception as e:
+        return f"❌ Error during cleanup: {str(e)}"
+
+async def index_documents_async(document_path: str, trace_id: str) -> int:
+    """
+    Asynchronous counterpart of `index_documents`.
+
+    Parsing, embedding and database calls run in the agents' bounded executors,
+    so the event loop can keep serving other sessions in the meantime.
+
+    Args:
+        document_path (str): The path to the directory containing uploaded documents.
+        trace_id (str): The trace ID of the current operation.
+
+    Returns:
+        int: The number of chunks indexed for the document path.
+    """
     ingest_msg = create_mcp_message("Coordinator", "IngestionAgent", "INGEST", {"document_path": document_path}, trace_id)
-    ingest_response = ingestion_handle_message(ingest_msg)
-    
-    # Validate the response from the IngestionAgent.
-    if ingest_response.get("status") == "error" or not ingest_response["payload"].get("chunks"):
-        return "No documents found to process. Please upload documents first."
-        
-    # Extract the document chunks from the response payload.
-    chunks = ingest_response["payload"]["chunks"]
+    total_chunks = 0
+    async for ingest_response in bus.stream_async(ingest_msg):
+        if ingest_response["type"] == "INGESTION_COMPLETE":
+            total_chunks = ingest_response["payload"]["total_chunks"]
+            continue
 
-    # Step 2: Indexing
-    # Send the chunks to the RetrievalAgent to be added to the vector database.
-    add_msg = create_mcp_message("Coordinator", "RetrievalAgent", "ADD_CHUNKS", {"chunks": chunks}, trace_id)
-    # The response from adding chunks is not critical for the flow, so it's ignored.
-    _ = retrieval_handle_message(add_msg)
+        chunks = ingest_response["payload"]["chunks"]
+        deleted_ids = ingest_response["payload"]["deleted_ids"]
+        if deleted_ids:
+            delete_msg = create_mcp_message("Coordinator", "RetrievalAgent", "DELETE_CHUNKS", {"ids": deleted_ids}, trace_id)
+            await bus.request_async(delete_msg)
+            answer_cache.invalidate(deleted_ids)
+        if chunks:
+            add_msg = create_mcp_message("Coordinator", "RetrievalAgent", "ADD_CHUNKS", {"chunks": chunks}, trace_id)
+            await bus.request_async(add_msg)
+            answer_cache.invalidate([chunk["id"] for chunk in chunks])
 
-    # Step 3: Retrieval
-    # Send the user's question to the RetrievalAgent to find relevant context.
-    retrieve_msg = create_mcp_message("Coordinator", "RetrievalAgent", "RETRIEVE", {"question": question}, trace_id)
-    retrieve_response = retrieval_handle_message(retrieve_msg)
-    # Extract the most relevant chunks (top_chunks) from the response.
-    top_chunks = retrieve_response["payload"]["top_chunks"]
-
-    # Step 4: Generation
-    # Send the question and the retrieved context to the LLMResponseAgent.
-    llm_msg = create_mcp_message("Coordinator", "LLMResponseAgent", "GENERATE_RESPONSE", {"question": question, "top_chunks": top_chunks}, trace_id)
-    llm_response = llm_handle_message(llm_msg)
-
-    # Return the final, synthesized response from the language model.
-    return llm_response["payload"]["final_response"]
\ No newline at end of file
+    return total_chunks
+
+async def prepare_context_async(question: str, document_path: str, trace_id: str, sources: list[str] = None):
+    """
+    Asynchronous counterpart of `prepare_context`.
+
+    Args:
+        question (str): The user's query.
+        document_path (str): The path to the directory containing uploaded documents.
+        trace_id (str): The trace ID of the current operation.
+        sources (list[str], optional): Paths of the documents the answer may draw on.
+
+    Returns:
+        dict | str: The RetrievalAgent's CONTEXT_RESPONSE payload, or a status
+                    message if there is nothing to search.
+    """
+    retrieve_msg = create_mcp_message("Coordinator", "RetrievalAgent", "RETRIEVE", _retrieve_payload(question, sources), trace_id)
+    retrieve_response = await bus.request_async(retrieve_msg)
+    return _context_or_status(retrieve_response["payload"])
+
+async def coordinate_chat_async(question: str, document_path: str, sources: list[str] = None) -> str:
+    """
+    Asynchronous counterpart of `coordinate_chat`.
+
+    Many sessions can run this concurrently on one event loop: blocking work is
+    offloaded to bounded executors and the LLM call is awaited through the async
+    client, so sessions waiting on the network do not hold up each other.
+
+    Args:
+        question (str): The user's query or a special command string.
+        document_path (str): The path to the directory containing uploaded documents.
+        sources (list[str], optional): Paths of the documents the answer may draw on.
+
+    Returns:
+        str: The final answer from the language model or a status message.
+    """
+    trace_id = str(uuid.uuid4())
+    with span("Coordinator.chat", trace_id=trace_id, question_chars=len(question)):
+        if question == "CLEAR_ALL_DATA":
+            return await clear_all_data_async(document_path, trace_id)
+
+        context = await prepare_context_async(question, document_path, trace_id, sources)
+        if isinstance(context, str):
+            return context
+
+        cached_answer = answer_cache.lookup(context["query_embedding"], context["chunk_ids"])
+        if cached_answer is not None:
+            return cached_answer
+
+        llm_msg = create_mcp_message("Coordinator", "LLMResponseAgent", "GENERATE_RESPONSE", {"question": question, "top_chunks": context["top_chunks"]}, trace_id)
+        llm_response = await bus.request_async(llm_msg)
+
+        if not llm_response["payload"].get("error"):
+            answer_cache.store(context["query_embedding"], context["chunk_ids"], llm_response["payload"]["final_response"])
+
+        return llm_response["payload"]["final_response"]
+
+# --- Batch Question Answering ---
+
+async def coordinate_batch_async(questions: list[str], document_path: str,
+                                 concurrency: int = BATCH_GENERATION_CONCURRENCY,
+                                 retrieve_batch_size: int = BATCH_RETRIEVE_SIZE, sources: list[str] = None):
+    """
+    Answers many questions over the same documents, yielding each result as soon as it is ready.
+
+    The documents are indexed once. Questions are then retrieved in slices of
+    `retrieve_batch_size` through RETRIEVE_BATCH messages (one embedding batch and
+    one multi-query vector search per slice), and their answers are generated
+    with at most `concurrency` LLM calls in flight. Retrieval of the next slice
+    overlaps with generation for the previous ones.
+
+    Args:
+        questions (list[str]): The questions to answer.
+        document_path (str): The path to the directory containing uploaded documents.
+        concurrency (int): The maximum number of concurrent LLM generations.
+        retrieve_batch_size (int): The number of questions per RETRIEVE_BATCH message.
+        sources (list[str], optional): Paths of the documents the answers may draw on.
+
+    Yields:
+        dict: One result per question, in completion order, with its 'index' in the input,
+              'question', 'answer', 'error', 'cached', 'chunk_ids' and the timings
+              'retrieval_s' (of its batch), 'generation_s' and 'latency_s' (from the
+              start of its retrieval to its answer).
+    """
+    trace_id = str(uuid.uuid4())
+
+    if not await index_documents_async(document_path, trace_id):
+        for index, question in enumerate(questions):
+            yield {"index": index, "question": question, "answer": NO_DOCUMENTS_MESSAGE, "error": True,
+                   "cached": False, "chunk_ids": [], "retrieval_s": 0.0, "generation_s": 0.0, "latency_s": 0.0}
+        return
+
+    semaphore = asyncio.Semaphore(concurrency)
+    results = asyncio.Queue()
+    tasks = []
+
+    async def answer(index: int, context: dict, started: float, retrieval_s: float):
+        result = {"index": index, "question": questions[index], "cached": False, "chunk_ids": context["chunk_ids"],
+                  "retrieval_s": round(retrieval_s, 4)}
+        if not context["chunk_ids"]:
+            # Nothing (matching) is indexed: report it instead of asking the LLM without context.
+            result.update(answer=_context_or_status(context), error=True, generation_s=0.0,
+                          latency_s=round(time.perf_counter() - started, 4))
+            await results.put(result)
+            return
+        async with semaphore:
+            generation_started = time.perf_counter()
+            try:
+                cached_answer = answer_cache.lookup(context["query_embedding"], context["chunk_ids"])
+                if cached_answer is not None:
+                    result.update(answer=cached_answer, error=False, cached=True)
+                else:
+                    llm_msg = create_mcp_message("Coordinator", "LLMResponseAgent", "GENERATE_RESPONSE",
+                                                 {"question": questions[index], "top_chunks": context["top_chunks"]},
+                                                 f"{trace_id}-{index}")
+                    llm_response = await bus.request_async(llm_msg)
+                    result.update(answer=llm_response["payload"]["final_response"], error=llm_response["payload"]["error"])
+                    if not result["error"]:
+                        answer_cache.store(context["query_embedding"], context["chunk_ids"], result["answer"])
+            except Exception as e:
+                result.update(answer=f"Error: {e}", error=True)
+            finished = time.perf_counter()
+        result["generation_s"] = round(finished - generation_started, 4)
+        result["latency_s"] = round(finished - started, 4)
+        await results.put(result)
+
+    async def retrieve_all():
+        for start in range(0, len(questions), retrieve_batch_size):
+            batch = questions[start:start + retrieve_batch_size]
+            started = time.perf_counter()
+            try:
+                payload = {"questions": batch}
+                if sources is not None:
+                    payload["sources"] = list(sources)
+                retrieve_msg = create_mcp_message("Coordinator", "RetrievalAgent", "RETRIEVE_BATCH", payload, trace_id)
+                contexts = (await bus.request_async(retrieve_msg))["payload"]["results"]
+            except Exception as e:
+                # A failed slice is reported per question; the remaining slices still run.
+                for index in range(start, start + len(batch)):
+                    await results.put({"index": index, "question": questions[index], "answer": f"Error: {e}",
+                                       "error": True, "cached": False, "chunk_ids": [], "retrieval_s": 0.0,
+                                       "generation_s": 0.0, "latency_s": round(time.perf_counter() - started, 4)})
+                continue
+            retrieval_s = time.perf_counter() - started
+            for offset, context in enumerate(contexts):
+                tasks.append(asyncio.create_task(answer(start + offset, context, started, retrieval_s)))
+        await asyncio.gather(*tasks)
+
+    producer = asyncio.create_task(retrieve_all())
+    getter = None
+    try:
+        for _ in range(len(questions)):
+            # Wait for the next result or for the producer to stop, whichever comes first,
+            # so an exception raised by the producer is not left unobserved.
+            getter = asyncio.create_task(results.get())
+            await asyncio.wait({getter, producer}, return_when=asyncio.FIRST_COMPLETED)
+            if not getter.done() and producer.done() and results.empty():
+                producer.result()
+                raise RuntimeError("Batch retrieval stopped before every question was answered.")
+            yield await getter
+    finally:
+        # If the consumer stops early, do not leave retrieval and generation running.
+        if getter is not None:
+            getter.cancel()
+        producer.cancel()
+        for task in tasks:
+            task.cancel()
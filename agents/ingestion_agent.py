@@ -4,79 +4,558 @@
 This module is responsible for the first stage of the RAG pipeline: ingestion.
 It takes a path to a directory of documents, loads their content, and splits
 them into smaller, more manageable text chunks suitable for embedding and retrieval.
+
+Ingestion is incremental: an on-disk manifest remembers every file's size,
+modification time and content hash, so unchanged files are skipped entirely and
+changed files only produce the chunks that actually differ.
+
+Documents are split into overlapping windows of whole sentences with a bounded
+size in tokens, and every chunk carries metadata (source file, page or slide
+number, character offsets) that is stored next to it in the vector database.
+
+Near-duplicate chunks (e.g. from a revised version of a document, or a copy of a
+whole directory) are detected with MinHash fingerprints and skipped: they are
+neither embedded nor stored, and the manifest records which stored chunk each one
+refers to, so it is stored after all if that chunk is ever deleted.
+
+Ingestion is also streaming: documents are read page by page (or section by
+section), chunked lazily, and handed out in fixed-size batches, so peak memory
+does not grow with the size of the corpus.
 """
 
-import uuid
-from utils.file_loader import load_documents, basic_chunk_by_paragraph
+import os
+import threading
+import time
+from collections import deque
+from utils.concurrency import run_in_stage, get_loop_lock
+from utils.file_loader import (
+    iter_document_paths, iter_file_records, chunk_records,
+    CHUNK_TARGET_TOKENS, CHUNK_OVERLAP_TOKENS, MIN_CHUNK_LENGTH
+)
+from utils.parsers import CSV_GROUP_TARGET_CHARS
+from utils.manifest import (
+    load_manifest, save_manifest, clear_manifest, file_sha256, text_sha1,
+    source_key, make_chunk_id, is_under
+)
 from utils.mcp import create_mcp_message
+from utils.near_duplicates import (
+    NearDuplicateIndex, minhash, clear_near_duplicate_index, NEAR_DUPLICATE_INDEX_PATH
+)
+from utils.tracing import span, traced_handler, traced_iter
+
+# --- Configuration and Constants ---
+
+# Number of worker processes used to parse changed documents. Set to 1 to parse in-process.
+PARSE_WORKERS = os.cpu_count() or 1
+# Maximum number of chunks carried by a single CHUNK_BATCH message.
+INGEST_BATCH_SIZE = 256
+# Identifies the chunking settings a file was chunked with. Files chunked with other
+# settings are re-chunked, and their old chunks deleted, on the next ingestion.
+CHUNKING_SIGNATURE = f"sentences:{CHUNK_TARGET_TOKENS}:{CHUNK_OVERLAP_TOKENS}:{MIN_CHUNK_LENGTH}:csv:{CSV_GROUP_TARGET_CHARS}"
+
+# Chunks whose estimated Jaccard similarity (over word shingles) to an already stored
+# chunk reaches this value are skipped as near duplicates. Set to None to store every chunk.
+NEAR_DUPLICATE_THRESHOLD = 0.9
+
+# Serializes ingestion runs, which read, modify and write the shared manifest.
+_ingestion_lock = threading.Lock()
+# Serializes the writes of the manifest. Unlike `_ingestion_lock`, it is only held
+# for a moment, so a document can be forgotten while an ingestion run is going on.
+_manifest_lock = threading.Lock()
 
-def run_ingestion_agent(document_path: str) -> list[dict]:
+# --- Core Logic Functions ---
+
+def iter_ingestion_batches(document_path: str, batch_size: int = INGEST_BATCH_SIZE, summary: dict = None):
     """
-    Loads all documents from a given path and chunks them into a structured list.
+    Lazily loads new or changed documents from a given path and yields chunk changes in batches.
+
+    Every chunk receives a deterministic ID derived from its source file and its
+    offset within the document, so the same chunk always maps to the same row in
+    the vector database. The manifest is only saved once the generator is exhausted,
+    i.e. after the consumer has handled every batch: a consumer that stops early
+    leaves the manifest untouched, so the next run redoes the unfinished work.
 
     Args:
-        document_path (str): The path to the directory containing documents.
+        document_path (str): The path to the directory (or single file) containing documents.
+        batch_size (int): The maximum number of chunks per yielded batch.
+        summary (dict, optional): Filled in with 'total_chunks', the number of chunks
+                                  indexed for this path, and 'skipped_chunks', the number
+                                  of near duplicates skipped, once ingestion has finished.
 
-    Returns:
-        list[dict]: A list of chunk dictionaries, where each dictionary contains a
-                    unique 'id' and the chunk 'text'.
-    """
-    # Load the raw text content from all supported files in the specified directory.
-    documents = load_documents(document_path)
-    
-    # Initialize an empty list to store all chunks from all documents.
-    all_chunks = []
-
-    # Process each loaded document one by one.
-    for doc_text in documents:
-        # Split the document's text into chunks based on paragraphs.
-        chunks = basic_chunk_by_paragraph(doc_text)
-        
-        # Process each chunk individually.
-        for chunk in chunks:
-            # Create a dictionary for the chunk, giving it a unique ID and its text content.
-            chunk_dict = {
-                "id": str(uuid.uuid4()),
-                "text": chunk
+    Yields:
+        dict: A batch with 'chunks' (chunk dictionaries with 'id', 'text' and 'metadata'
+              that must be upserted), 'deleted_ids' (IDs of chunks that must be deleted)
+              and 'progress': 'files_total' (new or changed files), 'files_done',
+              'current_file', 'skipped_chunks' (near duplicates so far), and the
+              'completed_files' finished since the previous batch, each with its
+              'source', 'chunks', 'duplicates', 'seconds' and 'error' flag.
+              A first batch without chunks announces the number of files to process.
+    """
+    for batch in _iter_batches_until_commit(document_path, batch_size, summary):
+        if batch is not None:
+            yield batch
+
+def _iter_batches_until_commit(document_path: str, batch_size: int, summary: dict):
+    # Yields the batches, then None once all of them have been handed out (with the
+    # summary filled in). The manifest is saved only when the generator is resumed
+    # after that None, so a consumer can acknowledge every batch before the commit.
+    # Concurrent sessions may ingest at the same time; only one may touch the manifest.
+    # The lock is released when the generator finishes or is closed.
+    with _ingestion_lock:
+        yield from _iter_ingestion_batches(document_path, batch_size, summary)
+
+def _load_duplicate_index(files: dict) -> NearDuplicateIndex:
+    # Only fingerprints of chunks the manifest says are stored can be referenced.
+    if NEAR_DUPLICATE_THRESHOLD is None:
+        return None
+    stored_ids = {chunk_id for entry in files.values() for chunk_id in entry["chunks"]}
+    return NearDuplicateIndex.load(NEAR_DUPLICATE_INDEX_PATH, stored_ids)
+
+def _referencing_files(files: dict, deleted: set) -> list[str]:
+    # Files whose skipped duplicates refer to one of the deleted chunks.
+    return [key for key, entry in files.items()
+            if any(canonical_id in deleted for canonical_id in entry.get("duplicates", {}).values())]
+
+def _iter_ingestion_batches(document_path: str, batch_size: int, summary: dict):
+    files = load_manifest()["files"]
+    root = source_key(document_path)
+    duplicate_index = _load_duplicate_index(files)
+    # The documents known when the run started, and those whose entries it changed.
+    start_keys, touched = set(files), set()
+
+    seen_sources = set()
+    changed_files = deque()
+
+    # First pass: find the supported documents that are new or changed.
+    with span("ingestion.scan") as scan:
+        for file_path in iter_document_paths(document_path):
+            key = source_key(file_path)
+            seen_sources.add(key)
+            stat = os.stat(file_path)
+            entry = files.get(key)
+
+            # A file chunked with different settings must be chunked again, whether it changed or not.
+            if entry and entry.get("chunking") != CHUNKING_SIGNATURE:
+                changed_files.append((key, stat, file_sha256(file_path)))
+                continue
+
+            # Fast path: an untouched file (same size and mtime) is skipped without reading it.
+            if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+                continue
+
+            # The file was touched; only re-parse it if its content actually changed.
+            content_hash = file_sha256(file_path)
+            if entry and entry["sha256"] == content_hash:
+                entry["size"], entry["mtime_ns"] = stat.st_size, stat.st_mtime_ns
+                touched.add(key)
+                continue
+
+            changed_files.append((key, stat, content_hash))
+        scan["files"], scan["changed_files"] = len(seen_sources), len(changed_files)
+
+    chunk_batch = []
+    deleted_ids = []
+    progress = {"files_total": len(changed_files), "files_done": 0, "current_file": None,
+                "skipped_chunks": 0, "completed_files": []}
+
+    def batch(chunks: list[dict], deleted: list[str]) -> dict:
+        # Every batch reports the files finished since the previous one.
+        snapshot = dict(progress)
+        progress["completed_files"] = []
+        return {"chunks": chunks, "deleted_ids": deleted, "progress": snapshot}
+
+    def complete_file(key: str, chunk_count: int, duplicate_count: int, started: float, error: bool = False):
+        progress["files_done"] += 1
+        progress["completed_files"].append({"source": key, "chunks": chunk_count, "duplicates": duplicate_count,
+                                            "seconds": round(time.perf_counter() - started, 3), "error": error})
+
+    # Files that were removed from the document path take all of their chunks with them.
+    # They go first, so that their chunks are no longer matched as near duplicates.
+    for key in [key for key in files if is_under(key, root) and key not in seen_sources]:
+        for chunk_id in files[key]["chunks"]:
+            deleted_ids.append(chunk_id)
+            if duplicate_index is not None:
+                duplicate_index.remove(chunk_id)
+        del files[key]
+        touched.add(key)
+
+    # Deleted chunks already checked for files whose skipped duplicates refer to them.
+    checked_deleted = set()
+
+    def queue_referencing_files():
+        # Duplicates that referred to a deleted chunk have lost their stored copy, so
+        # their files are chunked again, wherever they are, to store or re-link them.
+        newly_deleted = set(deleted_ids) - checked_deleted
+        checked_deleted.update(newly_deleted)
+        for key in _referencing_files(files, newly_deleted) if newly_deleted else []:
+            if os.path.exists(key) and key not in {queued for queued, _, _ in changed_files}:
+                changed_files.append((key, os.stat(key), file_sha256(key)))
+                progress["files_total"] += 1
+
+    queue_referencing_files()
+
+    # Announce the work ahead, so progress can be shown before the first file is done.
+    if changed_files:
+        yield batch([], [])
+
+    while changed_files:
+        # Second pass: stream the changed documents, possibly parsed across several processes.
+        work = list(changed_files)
+        changed_files.clear()
+        records_by_file = iter_file_records([key for key, _, _ in work], max_workers=PARSE_WORKERS)
+
+        for (key, stat, content_hash), (file_path, records) in zip(work, records_by_file):
+            old_chunks = files[key]["chunks"] if key in files else {}
+            old_duplicates = files[key].get("duplicates", {}) if key in files else {}
+            new_chunks, new_duplicates = {}, {}
+            # The file's stored chunks are compared again below; until then they must not
+            # match its own new chunks (a shifted offset gives a chunk a new ID).
+            old_signatures = {}
+            if duplicate_index is not None:
+                old_signatures = {chunk_id: duplicate_index.remove(chunk_id) for chunk_id in old_chunks}
+            progress["current_file"] = key
+            started = time.perf_counter()
+            try:
+                # Split each page or section into chunks as soon as it has been read.
+                for offset, chunk, record in traced_iter("ingestion.parse_and_chunk", chunk_records(records), "chunks", file=key):
+                    chunk_id = make_chunk_id(key, offset)
+                    metadata = {"source": key, "start": offset, "end": offset + len(chunk)}
+                    # Vector databases do not store null metadata, so a missing page number is left out.
+                    if record["page"] is not None:
+                        metadata["page"] = record["page"]
+                    # Format-specific metadata, e.g. the columns and row range of a CSV row group.
+                    metadata.update(record.get("metadata", {}))
+                    # The page is part of the fingerprint, so a chunk that moved to another page is re-stored.
+                    chunk_hash = text_sha1(f"{metadata.get('page')}:{chunk}")
+                    signature = minhash(chunk) if duplicate_index is not None else None
+
+                    # A chunk that is stored unchanged stays stored, even if it resembles another one.
+                    if old_chunks.get(chunk_id) == chunk_hash:
+                        new_chunks[chunk_id] = chunk_hash
+                        if duplicate_index is not None:
+                            duplicate_index.add(chunk_id, signature)
+                        continue
+
+                    # A near duplicate of a stored chunk is not embedded again; the manifest
+                    # only remembers which chunk it refers to.
+                    if duplicate_index is not None:
+                        canonical_id = duplicate_index.find(signature, NEAR_DUPLICATE_THRESHOLD, exclude=chunk_id)
+                        if canonical_id is not None:
+                            new_duplicates[chunk_id] = canonical_id
+                            progress["skipped_chunks"] += 1
+                            continue
+                        duplicate_index.add(chunk_id, signature)
+
+                    # Only chunks that are new or whose text changed need to be re-embedded.
+                    new_chunks[chunk_id] = chunk_hash
+                    chunk_batch.append({"id": chunk_id, "text": chunk, "metadata": metadata})
+                    if len(chunk_batch) >= batch_size:
+                        yield batch(chunk_batch, [])
+                        chunk_batch = []
+            except Exception as e:
+                print(f"Failed to parse {file_path}. Reason: {e}")
+                # Track everything that may already have been sent, and leave the content
+                # hash empty so the file is re-parsed (and cleaned up) on the next run.
+                chunks = {**old_chunks, **new_chunks}
+                if duplicate_index is not None:
+                    for chunk_id, signature in old_signatures.items():
+                        if chunk_id not in new_chunks:
+                            duplicate_index.add(chunk_id, signature)
+                files[key] = {
+                    "size": stat.st_size,
+                    "mtime_ns": stat.st_mtime_ns,
+                    "sha256": None,
+                    "chunking": CHUNKING_SIGNATURE,
+                    "chunks": chunks,
+                    "duplicates": {chunk_id: canonical_id for chunk_id, canonical_id in {**old_duplicates, **new_duplicates}.items()
+                                   if chunk_id not in chunks},
+                }
+                touched.add(key)
+                complete_file(key, len(new_chunks), len(new_duplicates), started, error=True)
+                continue
+
+            # Chunks that disappeared from the new version of the file (or are now
+            # near duplicates of another chunk) must be deleted.
+            deleted_ids.extend(chunk_id for chunk_id in old_chunks if chunk_id not in new_chunks)
+
+            files[key] = {
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "sha256": content_hash,
+                "chunking": CHUNKING_SIGNATURE,
+                "chunks": new_chunks,
+                "duplicates": new_duplicates,
             }
-            # Add the structured chunk dictionary to the master list.
-            all_chunks.append(chunk_dict)
+            touched.add(key)
+            complete_file(key, len(new_chunks), len(new_duplicates), started)
+
+        queue_referencing_files()
+
+    # Flush the remaining chunks and deletions, still respecting the batch size.
+    progress["current_file"] = None
+    while chunk_batch or deleted_ids or progress["completed_files"]:
+        yield batch(chunk_batch[:batch_size], deleted_ids[:batch_size])
+        chunk_batch, deleted_ids = chunk_batch[batch_size:], deleted_ids[batch_size:]
+
+    if summary is not None:
+        summary["total_chunks"] = sum(len(entry["chunks"]) for key, entry in files.items() if is_under(key, root))
+        summary["skipped_chunks"] = progress["skipped_chunks"]
+
+    # Every batch has been handed out; commit once the consumer asks for more.
+    yield None
+    _commit_manifest(files, start_keys, touched)
+    if duplicate_index is not None:
+        duplicate_index.save(NEAR_DUPLICATE_INDEX_PATH)
+
+def _commit_manifest(files: dict, start_keys: set, touched: set):
+    # Writes the entries an ingestion run changed into the manifest as it is on disk
+    # now, so a document forgotten while the run was going on stays forgotten.
+    with _manifest_lock:
+        manifest = load_manifest()
+        current = manifest["files"]
+        for key in touched:
+            if key in start_keys and key not in current:
+                continue
+            if key in files:
+                current[key] = files[key]
+            else:
+                current.pop(key, None)
+        save_manifest(manifest)
+
+def forget_document(source: str) -> dict:
+    """
+    Removes one document from the manifest, so it is ingested from scratch if it is seen again.
+
+    Other documents whose near duplicates were skipped in favour of this document's
+    chunks lose their stored copy; they are marked as changed, so the next ingestion
+    that covers them chunks them again.
+
+    It does not wait for a running ingestion: the run's commit re-reads the manifest
+    and leaves the forgotten document out of it.
+
+    Args:
+        source (str): The path of the document.
+
+    Returns:
+        dict: 'chunk_ids', the IDs of the chunks the manifest recorded for it (empty if
+              it was unknown), and 'stale_sources', the documents that must be ingested again.
+    """
+    with _manifest_lock:
+        manifest = load_manifest()
+        files = manifest["files"]
+        entry = files.pop(source_key(source), None)
+        if entry is None:
+            return {"chunk_ids": [], "stale_sources": []}
+
+        stale_sources = _referencing_files(files, set(entry["chunks"]))
+        for key in stale_sources:
+            # Neither the size and modification time nor the content hash match any more.
+            files[key]["mtime_ns"], files[key]["sha256"] = None, None
+        save_manifest(manifest)
+
+        if NEAR_DUPLICATE_THRESHOLD is not None:
+            duplicate_index = _load_duplicate_index(files)
+            duplicate_index.save(NEAR_DUPLICATE_INDEX_PATH)
+        return {"chunk_ids": list(entry["chunks"]), "stale_sources": stale_sources}
+
+def record_duplicates(duplicates: dict) -> int:
+    """
+    Records stored chunks that were deleted as exact duplicates of other stored chunks
+    (e.g. by compacting the store) as skipped duplicates of the copy that was kept.
+
+    Their documents are then treated exactly like documents whose near duplicates were
+    skipped at ingestion: unchanged, they are not re-indexed, and should the kept copy
+    ever be deleted, they are chunked again and the chunks stored after all.
+
+    Args:
+        duplicates (dict): The ID of each deleted chunk -> the ID of the kept copy.
+
+    Returns:
+        int: The number of chunks moved from the manifest's stored chunks to its duplicates.
+    """
+    with _ingestion_lock, _manifest_lock:
+        manifest = load_manifest()
+        recorded = 0
+        for entry in manifest["files"].values():
+            entry_duplicates = entry.setdefault("duplicates", {})
+            for chunk_id in [chunk_id for chunk_id in entry["chunks"] if chunk_id in duplicates]:
+                del entry["chunks"][chunk_id]
+                entry_duplicates[chunk_id] = duplicates[chunk_id]
+                recorded += 1
+            # Skipped duplicates that referred to a deleted chunk now refer to its kept copy.
+            for chunk_id, canonical_id in entry_duplicates.items():
+                entry_duplicates[chunk_id] = duplicates.get(canonical_id, canonical_id)
+        save_manifest(manifest)
+
+        # The fingerprints of the deleted chunks must no longer be matched.
+        if NEAR_DUPLICATE_THRESHOLD is not None:
+            _load_duplicate_index(manifest["files"]).save(NEAR_DUPLICATE_INDEX_PATH)
+        return recorded
+
+def run_ingestion_agent(document_path: str) -> dict:
+    """
+    Loads new or changed documents from a given path and collects all chunk changes at once.
+
+    The manifest is not saved, as the caller has not stored the chunks yet: calling
+    it again returns the same changes. To index documents, use the streaming message
+    interface (or `iter_ingestion_batches`), which commits the manifest only after
+    every batch has been handled. This helper also materializes every changed chunk
+    in memory, so it is only meant for inspecting or benchmarking ingestion.
 
-    # Return the complete list of chunks.
-    return all_chunks
+    Args:
+        document_path (str): The path to the directory (or single file) containing documents.
+
+    Returns:
+        dict: A dictionary with:
+              - 'chunks': chunk dictionaries ('id', 'text' and 'metadata') that must be upserted.
+              - 'deleted_ids': IDs of chunks that no longer exist and must be deleted.
+              - 'total_chunks': the number of chunks currently indexed for this path.
+              - 'skipped_chunks': the number of near-duplicate chunks that were skipped.
+    """
+    summary = {}
+    chunks, deleted_ids = [], []
+    batches = _iter_batches_until_commit(document_path, INGEST_BATCH_SIZE, summary)
+    try:
+        for batch in batches:
+            # Stop before the commit: closing the generator leaves the manifest untouched.
+            if batch is None:
+                break
+            chunks.extend(batch["chunks"])
+            deleted_ids.extend(batch["deleted_ids"])
+    finally:
+        batches.close()
+    return {"chunks": chunks, "deleted_ids": deleted_ids, **summary}
+
+# --- Message Handling ---
+
+@traced_handler("IngestionAgent")
+def stream_message(mcp_message: dict):
+    """
+    Streaming interface of the Ingestion Agent for "INGEST" requests.
+
+    Instead of one response carrying every chunk, it yields a "CHUNK_BATCH" message
+    per batch of chunk changes, followed by a single "INGESTION_COMPLETE" message
+    whose payload holds the 'total_chunks' and 'skipped_chunks' counts. The manifest is saved only when
+    the stream is resumed after "INGESTION_COMPLETE", i.e. once the consumer has
+    handled every batch; a stream closed earlier does not change it.
+
+    Args:
+        mcp_message (dict): A message dictionary following the Message Communication Protocol.
+
+    Yields:
+        dict: "CHUNK_BATCH" response messages, then one "INGESTION_COMPLETE" message.
+
+    Raises:
+        ValueError: If the message type is not "INGEST".
+    """
+    if mcp_message["type"] != "INGEST":
+        raise ValueError(f"Unknown message type: {mcp_message['type']}")
+
+    document_path = mcp_message["payload"]["document_path"]
+    batch_size = mcp_message["payload"].get("batch_size", INGEST_BATCH_SIZE)
+    summary = {}
+
+    for batch in _iter_batches_until_commit(document_path, batch_size, summary):
+        if batch is not None:
+            yield create_mcp_message("IngestionAgent", mcp_message["sender"], "CHUNK_BATCH", batch, mcp_message["trace_id"])
+            continue
+        # Resuming after this message commits the manifest.
+        yield create_mcp_message(
+            sender="IngestionAgent",
+            receiver=mcp_message["sender"],
+            type_="INGESTION_COMPLETE",
+            payload=dict(summary),
+            trace_id=mcp_message["trace_id"]
+        )
 
+async def stream_message_async(mcp_message: dict):
+    """
+    Asynchronous counterpart of `stream_message`.
+
+    Each step of the ingestion stream (parsing and chunking the next batch) runs
+    in the bounded "ingestion" executor, so the event loop stays free.
+
+    Args:
+        mcp_message (dict): A message dictionary following the Message Communication Protocol.
+
+    Yields:
+        dict: "CHUNK_BATCH" response messages, then one "INGESTION_COMPLETE" message.
+    """
+    # Only one stream at a time may hold the ingestion lock. Waiting here, rather than
+    # inside an executor thread, keeps blocked sessions from starving the executor.
+    async with get_loop_lock("ingestion"):
+        responses = stream_message(mcp_message)
+        while True:
+            response = await run_in_stage("ingestion", next, responses, None)
+            if response is None:
+                break
+            yield response
+
+@traced_handler("IngestionAgent")
 def handle_message(mcp_message: dict) -> dict:
     """
     Acts as the public interface for the Ingestion Agent, handling incoming messages.
 
-    It processes messages of type "INGEST" by running the ingestion pipeline and
-    returning the resulting chunks in a new message.
+    It processes messages of type "RESET_MANIFEST" by forgetting everything that
+    was ingested so far, messages of type "DELETE_DOCUMENT" by forgetting a single
+    document, and messages of type "WARM_UP", which only confirm that the agent
+    (and with it the document parsers) has been loaded. "INGEST" requests are only
+    served by `stream_message`, whose manifest commit waits until the consumer has
+    stored every batch.
 
     Args:
         mcp_message (dict): A message dictionary following the Message Communication Protocol.
 
     Returns:
-        dict: A response message containing the processed chunks.
-    
+        dict: The response message.
+
     Raises:
         ValueError: If the message type is unknown or unsupported.
     """
-    # Check if the message is an "INGEST" request.
-    if mcp_message["type"] == "INGEST":
-        # Extract the document path from the message payload.
-        document_path = mcp_message["payload"]["document_path"]
-        
-        # Execute the core ingestion logic to get the document chunks.
-        chunks = run_ingestion_agent(document_path)
-        
-        # Create and return a response message containing the chunks.
+    # Check if the message asks to forget all previously ingested files.
+    if mcp_message["type"] == "RESET_MANIFEST":
+        clear_manifest()
+        clear_near_duplicate_index()
+        return create_mcp_message(
+            sender="IngestionAgent",
+            receiver=mcp_message["sender"],
+            type_="MANIFEST_RESET_SUCCESS",
+            payload={"status": "SUCCESS"},
+            trace_id=mcp_message["trace_id"]
+        )
+    # Check if the message asks to forget a single document, e.g. before it is deleted or re-indexed.
+    elif mcp_message["type"] == "DELETE_DOCUMENT":
+        result = forget_document(mcp_message["payload"]["source"])
         return create_mcp_message(
             sender="IngestionAgent",
             receiver=mcp_message["sender"],
-            type_="INGESTION_COMPLETE", # Type indicates the operation was successful.
-            payload={"chunks": chunks},
+            type_="DOCUMENT_FORGOTTEN",
+            payload=result,
+            trace_id=mcp_message["trace_id"]
+        )
+    # Check if the message asks the agent to get ready; importing it was the expensive part.
+    elif mcp_message["type"] == "WARM_UP":
+        return create_mcp_message(
+            sender="IngestionAgent",
+            receiver=mcp_message["sender"],
+            type_="WARM_UP_COMPLETE",
+            payload={"status": "SUCCESS"},
             trace_id=mcp_message["trace_id"]
         )
     else:
-        # If the message type is not "INGEST", raise an error.
-        raise ValueError(f"Unknown message type: {mcp_message['type']}")
\ No newline at end of file
+        # If the message type is not supported, raise an error.
+        raise ValueError(f"Unknown message type: {mcp_message['type']}")
+
+async def handle_message_async(mcp_message: dict) -> dict:
+    """
+    Asynchronous counterpart of `handle_message`.
+
+    The blocking ingestion work runs in the bounded "ingestion" executor.
+
+    Args:
+        mcp_message (dict): A message dictionary following the Message Communication Protocol.
+
+    Returns:
+        dict: The same response message as `handle_message`.
+    """
+    return await run_in_stage("ingestion", handle_message, mcp_message)
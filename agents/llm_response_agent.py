@@ -5,33 +5,82 @@ This module represents the final stage of the RAG pipeline. It is responsible
 for synthesizing a coherent, human-readable answer based on the user's question
 and the context provided by the Retrieval Agent. It uses a powerful generative
 language model (Google's Gemini Pro) to generate the final response.
+
+Model calls go through an LLM backend (utils/llm_backend.py), which coalesces
+identical concurrent prompts, rate-limits and retries requests, and pools clients.
+The backend (and with it the model SDK) is only set up on first use.
 """
 
-import google.generativeai as genai
 from dotenv import load_dotenv
+import asyncio
 import os
+import threading
+import time
+from collections import OrderedDict
+from utils.concurrency import LazyResource
+from utils.llm_backend import LLMBackend, create_llm_backend
 from utils.mcp import create_mcp_message
+from utils.tracing import span, traced_handler
 
 # --- Model Initialization ---
 
-# Load environment variables from a .env file (e.g., for the API key).
-load_dotenv()
+def _create_llm() -> LLMBackend:
+    # Load environment variables from a .env file (e.g., for the API key).
+    load_dotenv()
+    # Select the model backend: "gemini" (default) or "stub", a local offline model for tests.
+    # For Gemini, the API key is read from GEMINI_API_KEY; the stub streams a fixed answer,
+    # waiting STUB_LLM_TOKEN_DELAY seconds per token.
+    return create_llm_backend(os.getenv("LLM_BACKEND", "gemini"))
 
-# Configure the Google Generative AI library with the API key.
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+# The backend is created once per process, by whichever request (or warm-up) needs it first.
+_llm = LazyResource(_create_llm)
 
-# Instantiate the specific generative model to be used for answering questions.
-model = genai.GenerativeModel("gemini-2.5-flash") 
+def get_llm() -> LLMBackend:
+    """
+    Retrieves the process-wide LLM backend, creating it on first use.
 
-# --- Core Logic Function ---
+    Returns:
+        LLMBackend: The configured backend.
+    """
+    return _llm.get()
 
-def run_llm_response_agent(question: str, context_chunks: list[str]) -> str:
+# Message returned to the user when the language model call fails.
+GENERATION_ERROR_MESSAGE = "An error occurred while trying to generate an answer. Please check the logs."
+
+# --- Generation Metrics ---
+
+# Number of recent requests whose generation timings are kept in memory.
+GENERATION_METRICS_MAX_ENTRIES = 1000
+
+# Maps a trace_id to its timings: 'time_to_first_token' and 'generation_time' in seconds.
+_generation_metrics = OrderedDict()
+_metrics_lock = threading.Lock()
+
+def _record_generation_metrics(trace_id: str, metrics: dict):
+    with _metrics_lock:
+        _generation_metrics[trace_id] = metrics
+        # Forget the oldest requests once the limit is reached.
+        while len(_generation_metrics) > GENERATION_METRICS_MAX_ENTRIES:
+            _generation_metrics.popitem(last=False)
+
+def get_generation_metrics(trace_id: str):
     """
-    Generates a final answer by feeding the question and context to a language model.
+    Returns the recorded generation timings of a request.
 
-    This function constructs a detailed prompt that instructs the model to act as a
-    helpful assistant and answer the user's question strictly based on the provided
-    context chunks.
+    Args:
+        trace_id (str): The trace ID of the request.
+
+    Returns:
+        dict | None: 'time_to_first_token' and 'generation_time' (seconds), or None if unknown.
+    """
+    with _metrics_lock:
+        return _generation_metrics.get(trace_id)
+
+# --- Core Logic Functions ---
+
+def build_prompt(question: str, context_chunks: list[str]) -> str:
+    """
+    Builds the prompt that instructs the model to answer strictly from the given context.
 
     Args:
         question (str): The original question from the user.
@@ -39,14 +88,13 @@ def run_llm_response_agent(question: str, context_chunks: list[str]) -> str:
                                     from the vector database.
 
     Returns:
-        str: The generated answer from the language model, or an error message if
-             the API call fails.
+        str: The complete prompt.
     """
     # Combine the individual context chunks into a single string, separated by newlines.
     context = "\n\n".join(context_chunks)
     
     # Construct the prompt using a template. This is a form of "prompt engineering".
-    prompt = f"""
+    return f"""
 You are a helpful assistant that answers user questions using the provided context.
 Your goal is to be accurate and concise.
 
@@ -63,24 +111,183 @@ Question:
 
 Answer:
 """
+
+def generate_answer(question: str, context_chunks: list[str]) -> str:
+    """
+    Generates a final answer by feeding the question and context to a language model.
+
+    Unlike `run_llm_response_agent`, errors from the API call are not caught.
+
+    Args:
+        question (str): The original question from the user.
+        context_chunks (list[str]): A list of relevant text chunks retrieved
+                                    from the vector database.
+
+    Returns:
+        str: The generated answer from the language model.
+    """
+    prompt = build_prompt(question, context_chunks)
+    # Send the complete prompt to the generative model.
+    with span("generate_content", prompt_chars=len(prompt), context_chunks=len(context_chunks)):
+        return get_llm().generate(prompt)
+
+def stream_answer(question: str, context_chunks: list[str], trace_id: str = None):
+    """
+    Generates a final answer as a stream of text pieces, as soon as the model produces them.
+
+    Time-to-first-token and total generation time are recorded under the trace ID.
+    Errors from the API call are not caught.
+
+    Args:
+        question (str): The original question from the user.
+        context_chunks (list[str]): A list of relevant text chunks retrieved
+                                    from the vector database.
+        trace_id (str, optional): The trace ID under which the timings are recorded.
+
+    Yields:
+        str: Consecutive pieces of the answer.
+    """
+    prompt = build_prompt(question, context_chunks)
+    start = time.perf_counter()
+    time_to_first_token = None
+    # The span covers the whole stream, including the time its consumer takes per piece.
+    with span("generate_content", prompt_chars=len(prompt), context_chunks=len(context_chunks), stream=True) as generation:
+        # Ask the model to stream its response instead of waiting for the complete answer.
+        for text in get_llm().stream(prompt):
+            if time_to_first_token is None:
+                time_to_first_token = time.perf_counter() - start
+                generation["time_to_first_token"] = time_to_first_token
+            yield text
+    if trace_id is not None:
+        _record_generation_metrics(trace_id, {
+            "time_to_first_token": time_to_first_token,
+            "generation_time": time.perf_counter() - start,
+        })
+
+async def generate_answer_async(question: str, context_chunks: list[str]) -> str:
+    """
+    Asynchronous counterpart of `generate_answer`, using the model's async client.
+
+    Args:
+        question (str): The original question from the user.
+        context_chunks (list[str]): A list of relevant text chunks retrieved
+                                    from the vector database.
+
+    Returns:
+        str: The generated answer from the language model.
+    """
+    prompt = build_prompt(question, context_chunks)
+    with span("generate_content", prompt_chars=len(prompt), context_chunks=len(context_chunks)):
+        return await get_llm().generate_async(prompt)
+
+async def stream_answer_async(question: str, context_chunks: list[str], trace_id: str = None):
+    """
+    Asynchronous counterpart of `stream_answer`, using the model's async client.
+
+    Args:
+        question (str): The original question from the user.
+        context_chunks (list[str]): A list of relevant text chunks retrieved
+                                    from the vector database.
+        trace_id (str, optional): The trace ID under which the timings are recorded.
+
+    Yields:
+        str: Consecutive pieces of the answer.
+    """
+    prompt = build_prompt(question, context_chunks)
+    start = time.perf_counter()
+    time_to_first_token = None
+    with span("generate_content", prompt_chars=len(prompt), context_chunks=len(context_chunks), stream=True) as generation:
+        async for text in get_llm().stream_async(prompt):
+            if time_to_first_token is None:
+                time_to_first_token = time.perf_counter() - start
+                generation["time_to_first_token"] = time_to_first_token
+            yield text
+    if trace_id is not None:
+        _record_generation_metrics(trace_id, {
+            "time_to_first_token": time_to_first_token,
+            "generation_time": time.perf_counter() - start,
+        })
+
+def run_llm_response_agent(question: str, context_chunks: list[str]) -> str:
+    """
+    Generates a final answer by feeding the question and context to a language model.
+
+    This function constructs a detailed prompt that instructs the model to act as a
+    helpful assistant and answer the user's question strictly based on the provided
+    context chunks.
+
+    Args:
+        question (str): The original question from the user.
+        context_chunks (list[str]): A list of relevant text chunks retrieved
+                                    from the vector database.
+
+    Returns:
+        str: The generated answer from the language model, or an error message if
+             the API call fails.
+    """
     try:
-        # Send the complete prompt to the generative model.
-        response = model.generate_content(prompt)
-        # Extract and return the plain text from the model's response.
-        return response.text
+        return generate_answer(question, context_chunks)
     except Exception as e:
         # Handle potential errors during the API call (e.g., network issues, API key problems).
         print(f"An error occurred while generating the LLM response: {e}")
-        return f"An error occurred while trying to generate an answer. Please check the logs."
+        return GENERATION_ERROR_MESSAGE
 
 # --- Message Handling ---
 
+@traced_handler("LLMResponseAgent")
+def stream_message(mcp_message: dict):
+    """
+    Streaming interface of the LLM Response Agent for "GENERATE_RESPONSE" requests.
+
+    It yields a "RESPONSE_CHUNK" message for every piece of the answer as it is
+    generated, followed by a single "FINAL_RESPONSE" message carrying the full answer,
+    an error flag and the generation timings.
+
+    Args:
+        mcp_message (dict): A message dictionary following the Message Communication Protocol.
+
+    Yields:
+        dict: "RESPONSE_CHUNK" messages, then one "FINAL_RESPONSE" message.
+
+    Raises:
+        ValueError: If the message type is not "GENERATE_RESPONSE".
+    """
+    if mcp_message["type"] != "GENERATE_RESPONSE":
+        raise ValueError(f"Unknown message type: {mcp_message['type']}")
+
+    question = mcp_message["payload"]["question"]
+    top_chunks = mcp_message["payload"]["top_chunks"]
+    trace_id = mcp_message["trace_id"]
+    pieces = []
+    error = False
+
+    try:
+        for text in stream_answer(question, top_chunks, trace_id):
+            pieces.append(text)
+            yield create_mcp_message("LLMResponseAgent", mcp_message["sender"], "RESPONSE_CHUNK", {"text": text}, trace_id)
+    except Exception as e:
+        # Handle potential errors during the API call, even in the middle of the stream.
+        print(f"An error occurred while generating the LLM response: {e}")
+        pieces.append(("\n\n" if pieces else "") + GENERATION_ERROR_MESSAGE)
+        error = True
+        yield create_mcp_message("LLMResponseAgent", mcp_message["sender"], "RESPONSE_CHUNK", {"text": pieces[-1]}, trace_id)
+
+    yield create_mcp_message(
+        sender="LLMResponseAgent",
+        receiver=mcp_message["sender"],
+        type_="FINAL_RESPONSE",
+        payload={"final_response": "".join(pieces), "error": error, "metrics": get_generation_metrics(trace_id)},
+        trace_id=trace_id
+    )
+
+@traced_handler("LLMResponseAgent")
 def handle_message(mcp_message: dict) -> dict:
     """
     Acts as the public interface for the LLM Response Agent, handling incoming messages.
 
     It processes messages of type "GENERATE_RESPONSE" by calling the language model
-    and returning the final answer in a new message.
+    and returning the final answer in a new message, and messages of type "WARM_UP"
+    by setting up the model backend ahead of the first question.
 
     Args:
         mcp_message (dict): A message dictionary following the Message Communication Protocol.
@@ -98,16 +305,133 @@ def handle_message(mcp_message: dict) -> dict:
         top_chunks = mcp_message["payload"]["top_chunks"]
         
         # Call the core logic function to generate the final response from the LLM.
-        final_response = run_llm_response_agent(question, top_chunks)
+        start = time.perf_counter()
+        try:
+            final_response = generate_answer(question, top_chunks)
+            error = False
+        except Exception as e:
+            # Handle potential errors during the API call (e.g., network issues, API key problems).
+            print(f"An error occurred while generating the LLM response: {e}")
+            final_response = GENERATION_ERROR_MESSAGE
+            error = True
+        else:
+            # Without streaming, the first token arrives together with the whole answer.
+            generation_time = time.perf_counter() - start
+            _record_generation_metrics(mcp_message["trace_id"], {
+                "time_to_first_token": generation_time,
+                "generation_time": generation_time,
+            })
         
-        # Create and return the final response message.
+        # Create and return the final response message. The error flag lets callers
+        # avoid caching a failed answer.
         return create_mcp_message(
             sender="LLMResponseAgent",
             receiver=mcp_message["sender"],
             type_="FINAL_RESPONSE",
-            payload={"final_response": final_response},
+            payload={"final_response": final_response, "error": error},
+            trace_id=mcp_message["trace_id"]
+        )
+    # Check if the message asks to set up the model backend ahead of the first question.
+    elif mcp_message["type"] == "WARM_UP":
+        get_llm()
+        return create_mcp_message(
+            sender="LLMResponseAgent",
+            receiver=mcp_message["sender"],
+            type_="WARM_UP_COMPLETE",
+            payload={"status": "SUCCESS"},
             trace_id=mcp_message["trace_id"]
         )
     else:
         # If the message type is not supported, raise an error.
-        raise ValueError(f"Unknown message type: {mcp_message['type']}")
\ No newline at end of file
+        raise ValueError(f"Unknown message type: {mcp_message['type']}")
+
+@traced_handler("LLMResponseAgent")
+async def stream_message_async(mcp_message: dict):
+    """
+    Asynchronous counterpart of `stream_message`.
+
+    Args:
+        mcp_message (dict): A message dictionary following the Message Communication Protocol.
+
+    Yields:
+        dict: "RESPONSE_CHUNK" messages, then one "FINAL_RESPONSE" message.
+
+    Raises:
+        ValueError: If the message type is not "GENERATE_RESPONSE".
+    """
+    if mcp_message["type"] != "GENERATE_RESPONSE":
+        raise ValueError(f"Unknown message type: {mcp_message['type']}")
+
+    question = mcp_message["payload"]["question"]
+    top_chunks = mcp_message["payload"]["top_chunks"]
+    trace_id = mcp_message["trace_id"]
+    pieces = []
+    error = False
+
+    try:
+        async for text in stream_answer_async(question, top_chunks, trace_id):
+            pieces.append(text)
+            yield create_mcp_message("LLMResponseAgent", mcp_message["sender"], "RESPONSE_CHUNK", {"text": text}, trace_id)
+    except Exception as e:
+        # Handle potential errors during the API call, even in the middle of the stream.
+        print(f"An error occurred while generating the LLM response: {e}")
+        pieces.append(("\n\n" if pieces else "") + GENERATION_ERROR_MESSAGE)
+        error = True
+        yield create_mcp_message("LLMResponseAgent", mcp_message["sender"], "RESPONSE_CHUNK", {"text": pieces[-1]}, trace_id)
+
+    yield create_mcp_message(
+        sender="LLMResponseAgent",
+        receiver=mcp_message["sender"],
+        type_="FINAL_RESPONSE",
+        payload={"final_response": "".join(pieces), "error": error, "metrics": get_generation_metrics(trace_id)},
+        trace_id=trace_id
+    )
+
+@traced_handler("LLMResponseAgent")
+async def handle_message_async(mcp_message: dict) -> dict:
+    """
+    Asynchronous counterpart of `handle_message`.
+
+    The LLM call is awaited on the event loop through the async client, so many
+    sessions can wait on the network at the same time without tying up threads.
+    Other message types (e.g. "WARM_UP") are handled by `handle_message` in a thread.
+
+    Args:
+        mcp_message (dict): A message dictionary following the Message Communication Protocol.
+
+    Returns:
+        dict: A response message containing the final, synthesized answer, or the
+              response of `handle_message` for other message types.
+
+    Raises:
+        ValueError: If the message type is unknown or unsupported.
+    """
+    if mcp_message["type"] != "GENERATE_RESPONSE":
+        # The undecorated handler, since this call already has its span.
+        return await asyncio.to_thread(handle_message.__wrapped__, mcp_message)
+
+    question = mcp_message["payload"]["question"]
+    top_chunks = mcp_message["payload"]["top_chunks"]
+
+    start = time.perf_counter()
+    try:
+        final_response = await generate_answer_async(question, top_chunks)
+        error = False
+    except Exception as e:
+        print(f"An error occurred while generating the LLM response: {e}")
+        final_response = GENERATION_ERROR_MESSAGE
+        error = True
+    else:
+        generation_time = time.perf_counter() - start
+        _record_generation_metrics(mcp_message["trace_id"], {
+            "time_to_first_token": generation_time,
+            "generation_time": generation_time,
+        })
+
+    return create_mcp_message(
+        sender="LLMResponseAgent",
+        receiver=mcp_message["sender"],
+        type_="FINAL_RESPONSE",
+        payload={"final_response": final_response, "error": error},
+        trace_id=mcp_message["trace_id"]
+    )
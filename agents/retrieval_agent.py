@@ -2,91 +2,410 @@
 
 """
 This module serves as the memory and search component of the RAG system.
-It manages all interactions with the ChromaDB vector database, including:
-- Creating and managing a persistent client connection.
+It manages all interactions with the vector database, including:
+- Opening the configured vector store (ChromaDB or memory-mapped NumPy segments,
+  optionally searched through quantized codes).
 - Indexing (embedding and storing) document chunks.
-- Retrieving relevant document chunks based on a query's semantic similarity.
-- Handling database lifecycle commands, such as resetting the database.
+- Maintaining a BM25 inverted index of the same chunks for exact-term matches.
+- Retrieving relevant document chunks by fusing semantic and lexical rankings,
+  optionally restricted to chosen documents or other chunk metadata.
+- Deleting or replacing all chunks of a single document, found by their source metadata.
+- Assembling the context: dropping duplicates, diversifying and fitting a token budget.
+- Handling database lifecycle commands, such as resetting the database, and
+  warming up the embedding model and the database ahead of the first request.
+
+The embedding model, the embedding cache, the vector store and the BM25 index are
+created lazily on first use, so importing this module is cheap.
 """
 
-import chromadb
-from chromadb.utils import embedding_functions
-from chromadb.config import Settings
 import shutil
 import os
+import numpy as np
+from functools import lru_cache
+from utils.concurrency import LazyResource, run_in_stage
+from utils.context_packer import CONTEXT_TOKEN_BUDGET, pack_context
+from utils.embeddings import EmbeddingEngine
+from utils.embedding_cache import EmbeddingCache
+from utils.lexical_index import BM25Index, LEXICAL_INDEX_PATH, reciprocal_rank_fusion
+from utils.manifest import MANIFEST_PATH, load_manifest, source_key
 from utils.mcp import create_mcp_message
+from utils.text import estimate_tokens
+from utils.tracing import span, traced_handler
+from utils.vector_store import VectorStore, create_vector_store
 
 # --- Configuration and Constants ---
 
 # Define the file path for ChromaDB's persistent storage.
 CHROMA_PATH = "chroma_persistent_storage"
-# Specify the sentence-transformer model to be used for creating embeddings (vectors).
-embedding_fn = embedding_functions.SentenceTransformerEmbeddingFunction("all-MiniLM-L6-v2")
+# Define the directory of the NumPy vector store.
+NUMPY_STORE_PATH = "vector_store"
+# The vector store backend: "chroma", "numpy" for the memory-mapped brute-force store, or
+# "numpy-int8" / "numpy-binary" for the same store searched through compact quantized codes
+# first, with the shortlist rescored at full precision (for corpora too large for memory).
+VECTOR_STORE_BACKEND = "chroma"
+# Maximum number of chunks sent to the database in a single upsert call.
+UPSERT_BATCH_SIZE = 256
+# Number of recent query embeddings kept in memory, so repeated questions skip the model.
+QUERY_EMBEDDING_CACHE_SIZE = 1024
+# Number of candidates each retriever (vector and BM25) contributes before rank fusion.
+HYBRID_CANDIDATES = 20
+# Reciprocal rank fusion constant.
+RRF_K = 60
+# Number of fused candidates the context packer chooses the final chunks from.
+CONTEXT_CANDIDATES = 12
+# Create the embedding engine (all-MiniLM-L6-v2); the model itself is loaded on first use.
+# Embeddings are computed explicitly and passed to the vector store, which never calls
+# an embedding function itself.
+embedding_engine = EmbeddingEngine()
+# Question embedded by the warm-up, so the vector store and BM25 index are exercised once.
+WARM_UP_QUERY = "warm-up"
 
 # --- Singleton State Management ---
 
-# These global-like variables will hold the single instance of the client and collection
-# to prevent multiple connections and potential file-locking issues.
-_chroma_client = None
-_collection = None
+def _open_embedding_cache() -> EmbeddingCache:
+    # The cache is stored outside CHROMA_PATH, so it survives RESET_DATABASE and makes
+    # re-ingesting known documents nearly free.
+    return EmbeddingCache(dimension=embedding_engine.dimension)
+
+def _open_vector_store() -> VectorStore:
+    path = CHROMA_PATH if VECTOR_STORE_BACKEND == "chroma" else NUMPY_STORE_PATH
+    return create_vector_store(VECTOR_STORE_BACKEND, path)
+
+def _open_lexical_index() -> BM25Index:
+    index = BM25Index(LEXICAL_INDEX_PATH)
+    store = get_vector_store()
+    # A database that was filled before the lexical index existed (or whose index
+    # files were removed or outdated) is indexed once from the chunks in the vector store.
+    if len(index) == 0 and store.count() > 0:
+        # Backfill page by page to keep memory bounded.
+        for page in store.iter_chunks(UPSERT_BATCH_SIZE):
+            index.add(page)
+    return index
+
+# Each resource is opened exactly once per process, even when several retrieval workers
+# ask for it at the same time, which prevents multiple connections and file-locking issues.
+_embedding_cache = LazyResource(_open_embedding_cache)
+_vector_store = LazyResource(_open_vector_store)
+_lexical_index = LazyResource(_open_lexical_index)
+
+def get_embedding_cache() -> EmbeddingCache:
+    """
+    Retrieves the process-wide persistent embedding cache, opening it on first use.
+
+    Returns:
+        EmbeddingCache: The embedding cache.
+    """
+    return _embedding_cache.get()
 
-def get_collection():
+def get_vector_store() -> VectorStore:
     """
-    Retrieves the singleton instance of the ChromaDB collection.
+    Retrieves the process-wide instance of the configured vector store, opening it on first use.
 
-    This function implements the Singleton Pattern. It ensures that only one
-    instance of the ChromaDB client and collection is created during the
-    application's lifecycle, which is crucial for managing the connection
-    to the persistent database file safely and efficiently.
+    Returns:
+        VectorStore: The singleton vector store.
+    """
+    return _vector_store.get()
+
+def get_lexical_index() -> BM25Index:
+    """
+    Retrieves the process-wide BM25 index, loading it from disk on first use.
 
     Returns:
-        chromadb.Collection: The singleton collection object.
-    """
-    global _chroma_client, _collection
-    
-    # If the collection object has not been created yet...
-    if _collection is None:
-        # And if the client object has not been created yet...
-        if _chroma_client is None:
-            # Create the persistent client instance.
-            _chroma_client = chromadb.PersistentClient(
-                path=CHROMA_PATH,
-                # Pass a settings object to enable the .reset() method.
-                # This is a security feature to prevent accidental data loss.
-                settings=Settings(allow_reset=True)
-            )
-        # Using the client, get or create the collection for our documents.
-        _collection = _chroma_client.get_or_create_collection(
-            name="document_qa_collection",
-            embedding_function=embedding_fn
-        )
-    # Return the existing or newly created collection object.
-    return _collection
+        BM25Index: The singleton lexical index.
+    """
+    return _lexical_index.get()
+
+def warm_up():
+    """
+    Loads the embedding model and opens the embedding cache, the vector store and
+    the BM25 index, then runs one dummy query through them, so that the first
+    user request does not pay for any of it.
+    """
+    # The first embedding loads the model and pays for the first inference's allocations.
+    query_embedding = embedding_engine.encode([WARM_UP_QUERY])[0]
+    get_embedding_cache()
+    store = get_vector_store()
+    get_lexical_index().search(WARM_UP_QUERY, 1)
+    if store.count() > 0:
+        store.query(query_embedding, 1)
 
 # --- Core Logic Functions ---
 
+def embed_texts(texts: list[str]):
+    """
+    Embeds a list of chunk texts, reusing cached embeddings whenever possible.
+
+    Args:
+        texts (list[str]): The texts to embed.
+
+    Returns:
+        np.ndarray: A float32 array with one embedding per text, in input order.
+    """
+    embedding_cache = get_embedding_cache()
+    cached = embedding_cache.get_many(embedding_engine.cache_key, texts)
+    missing = [i for i, vector in enumerate(cached) if vector is None]
+
+    # Only the texts that were never embedded before go through the model.
+    if missing:
+        missing_texts = [texts[i] for i in missing]
+        with span("embed", texts=len(missing_texts), cache_hits=len(texts) - len(missing)):
+            vectors = embedding_engine.encode(missing_texts)
+        embedding_cache.put_many(embedding_engine.cache_key, missing_texts, vectors)
+        for i, vector in zip(missing, vectors):
+            cached[i] = vector
+
+    return np.array(cached, dtype=np.float32).reshape(len(texts), embedding_engine.dimension)
+
+@lru_cache(maxsize=QUERY_EMBEDDING_CACHE_SIZE)
+def embed_query(query: str) -> np.ndarray:
+    """
+    Embeds a user query, remembering the most recent queries in an in-process LRU cache.
+
+    Args:
+        query (str): The user's question or search term.
+
+    Returns:
+        np.ndarray: The query's embedding (read-only, as it is shared between callers).
+    """
+    with span("embed", texts=1):
+        vector = embedding_engine.encode([query])[0]
+    vector.flags.writeable = False
+    return vector
+
 def add_chunks_to_chroma(chunks: list[dict]):
     """
-    Adds or updates a list of document chunks in the ChromaDB collection.
+    Adds or updates a list of document chunks in the vector store.
+
+    The chunks are written in slices of UPSERT_BATCH_SIZE so that a large call
+    never embeds or sends more than one fixed-size batch at a time.
 
     Args:
         chunks (list[dict]): A list of dictionaries, where each dictionary
-                             represents a chunk with an 'id' and 'text'.
-    """
-    collection = get_collection()
-    # Extract the IDs and text content from the list of chunk dictionaries.
-    ids = [doc["id"] for doc in chunks]
-    texts = [doc["text"] for doc in chunks]
-    
-    # Ensure there is data to process before calling the database.
-    if ids and texts:
+                             represents a chunk with an 'id', a 'text' and
+                             optionally its 'metadata' (source, page, offsets).
+    """
+    store = get_vector_store()
+    for start in range(0, len(chunks), UPSERT_BATCH_SIZE):
+        batch = chunks[start:start + UPSERT_BATCH_SIZE]
+        # Extract the IDs and text content from the list of chunk dictionaries.
+        ids = [doc["id"] for doc in batch]
+        texts = [doc["text"] for doc in batch]
+        # Chunks without metadata (e.g. from older callers) are stored with an empty source.
+        metadatas = [doc.get("metadata") or {"source": ""} for doc in batch]
         # Use 'upsert' to add new chunks or update existing ones with the same ID.
         # This is safer than 'add' as it prevents errors on duplicate IDs.
-        collection.upsert(ids=ids, documents=texts)
+        embeddings = embed_texts(texts)
+        with span("upsert", chunks=len(batch), payload_bytes=sum(map(len, texts))):
+            store.upsert(ids, texts, embeddings, metadatas)
+            # Keep the lexical index in step with the vector database.
+            get_lexical_index().add(batch)
+
+def delete_chunks_from_chroma(ids: list[str]):
+    """
+    Removes a list of document chunks from the vector store.
+
+    Args:
+        ids (list[str]): The IDs of the chunks to delete.
+    """
+    store = get_vector_store()
+    # Delete in fixed-size slices, mirroring the upsert path.
+    with span("delete", chunks=len(ids)):
+        for start in range(0, len(ids), UPSERT_BATCH_SIZE):
+            store.delete(ids[start:start + UPSERT_BATCH_SIZE])
+        # Keep the lexical index in step with the vector database.
+        get_lexical_index().delete(ids)
+
+@lru_cache(maxsize=1)
+def _skipped_duplicates(manifest_stamp: tuple) -> dict:
+    # Source key -> IDs of the stored chunks its skipped near duplicates refer to, as of
+    # the manifest version identified by manifest_stamp (its size and modification time).
+    files = load_manifest()["files"]
+    return {key: set(entry["duplicates"].values()) for key, entry in files.items() if entry.get("duplicates")}
+
+def _duplicate_clauses(keys: list[str]) -> list[dict]:
+    # Filters matching the stored chunks that the given documents' skipped near duplicates
+    # refer to. Chunks carry no ID metadata, so each one is matched by its source and start.
+    try:
+        stat = os.stat(MANIFEST_PATH)
+    except OSError:
+        return []
+    duplicates = _skipped_duplicates((stat.st_size, stat.st_mtime_ns))
+    canonical_ids = sorted({chunk_id for key in keys for chunk_id in duplicates.get(key, ())})
+    if not canonical_ids:
+        return []
+    starts_by_source = {}
+    for metadata in get_vector_store().get_metadata(canonical_ids).values():
+        if metadata.get("source") not in keys and "start" in metadata:
+            starts_by_source.setdefault(metadata["source"], set()).add(metadata["start"])
+    return [{"$and": [{"source": source}, {"start": {"$in": sorted(starts)}}]}
+            for source, starts in sorted(starts_by_source.items())]
+
+def document_filter(sources: list[str] = None, where: dict = None) -> dict:
+    """
+    Builds the metadata filter that restricts a retrieval to chosen documents.
+
+    Chunks of a document that were skipped as near duplicates at ingestion are
+    represented by the stored chunks they duplicate (see the manifest's
+    'duplicates'), so those chunks match the document's filter too.
+
+    Args:
+        sources (list[str], optional): Paths of the documents to search; every chunk
+                                       stores its document's normalized path as 'source'.
+        where (dict, optional): An additional ChromaDB-style metadata filter,
+                                e.g. {"page": {"$lte": 10}}.
+
+    Returns:
+        dict | None: The combined filter, or None if the search is not restricted.
+    """
+    clauses = []
+    if sources is not None:
+        keys = [source_key(source) for source in sources]
+        source_clauses = [{"source": {"$in": keys}}] + _duplicate_clauses(keys)
+        clauses.append(source_clauses[0] if len(source_clauses) == 1 else {"$or": source_clauses})
+    if where:
+        clauses.append(where)
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+def retrieve_chunks(query: str, n_results: int = 3, token_budget: int = CONTEXT_TOKEN_BUDGET, where: dict = None) -> dict:
+    """
+    Performs a hybrid search and returns the matching chunks together with their IDs.
+
+    The best HYBRID_CANDIDATES chunks by semantic similarity and by BM25 are merged
+    with reciprocal rank fusion, so exact identifiers and names found by the lexical
+    index can outrank loosely related passages found by the vector search. The
+    context packer then picks the final chunks from the best CONTEXT_CANDIDATES:
+    without duplicates, diversified, and within the token budget.
+
+    Args:
+        query (str): The user's question or search term.
+        n_results (int): The maximum number of relevant chunks to retrieve.
+        token_budget (int): The maximum number of estimated tokens of all chunks together.
+        where (dict, optional): A metadata filter (see `document_filter`); only
+                                matching chunks are considered.
+
+    Returns:
+        dict: 'ids' and 'documents' of the selected chunks (a document may be
+              truncated to fit the budget), their total 'context_tokens', and the
+              'query_embedding' used for the search.
+    """
+    store = get_vector_store()
+    query_embedding = embed_query(query)
+    n_candidates = max(n_results, HYBRID_CANDIDATES)
+    # Query the store for chunks that are semantically similar to the input query.
+    # The filter is applied by each index itself, never by listing the matching chunks first.
+    with span("vector_query", queries=1):
+        vector_ids, vector_documents = store.query(query_embedding, n_candidates, where)
+    return _fuse_results(store, query, query_embedding, vector_ids, vector_documents, n_results, token_budget, where)
+
+def retrieve_chunks_batch(queries: list[str], n_results: int = 3, token_budget: int = CONTEXT_TOKEN_BUDGET,
+                          where: dict = None) -> list[dict]:
+    """
+    Performs the hybrid search of `retrieve_chunks` for many queries at once.
+
+    All queries are embedded in a single batch and sent to the vector store as one
+    multi-query call, which is much cheaper than one model pass and one database
+    round trip per query.
+
+    Args:
+        queries (list[str]): The questions or search terms.
+        n_results (int): The maximum number of relevant chunks to retrieve per query.
+        token_budget (int): The maximum number of estimated tokens of context per query.
+        where (dict, optional): A metadata filter applied to every query.
+
+    Returns:
+        list[dict]: One result per query, in input order, shaped like the result of `retrieve_chunks`.
+    """
+    if not queries:
+        return []
+    store = get_vector_store()
+    with span("embed", texts=len(queries)):
+        query_embeddings = embedding_engine.encode(queries)
+    n_candidates = max(n_results, HYBRID_CANDIDATES)
+    with span("vector_query", queries=len(queries)):
+        vector_results = store.query_batch(query_embeddings, n_candidates, where)
+    return [
+        _fuse_results(store, query, query_embedding, vector_ids, vector_documents, n_results, token_budget, where)
+        for query, query_embedding, (vector_ids, vector_documents) in zip(queries, query_embeddings, vector_results)
+    ]
+
+def _fuse_results(store: VectorStore, query: str, query_embedding, vector_ids: list[str],
+                  vector_documents: list[str], n_results: int, token_budget: int, where: dict = None) -> dict:
+    # Merges the vector results of one query with its BM25 results and packs the context.
+    documents = dict(zip(vector_ids, vector_documents))
+    with span("lexical_query"):
+        lexical_ids = [chunk_id for chunk_id, _ in
+                       get_lexical_index().search(query, max(n_results, HYBRID_CANDIDATES), where=where)]
+
+    # Fuse both rankings and keep the best candidates.
+    ids = reciprocal_rank_fusion([vector_ids, lexical_ids], k=RRF_K)[:max(n_results, CONTEXT_CANDIDATES)]
+
+    # Chunks found only by the lexical index still need their text.
+    missing = [chunk_id for chunk_id in ids if chunk_id not in documents]
+    if missing:
+        documents.update(store.get(missing))
+    # Redundancy between the candidates is measured on their stored embeddings, so the
+    # question is the only text this search embeds.
+    embeddings = store.get_embeddings(ids) if ids else {}
+    ids = [chunk_id for chunk_id in ids if chunk_id in documents and chunk_id in embeddings]
+    texts = [documents[chunk_id] for chunk_id in ids]
+
+    with span("context_packing", candidates=len(ids)) as packing:
+        packed = pack_context(texts, [embeddings[chunk_id] for chunk_id in ids], n_results, token_budget) if ids else []
+        context_tokens = sum(estimate_tokens(text) for _, text in packed)
+        packing["chunks"], packing["context_tokens"] = len(packed), context_tokens
+
+    return {
+        "ids": [ids[i] for i, _ in packed],
+        "documents": [text for _, text in packed],
+        "context_tokens": context_tokens,
+        "query_embedding": query_embedding,
+    }
+
+def delete_document(source: str) -> list[str]:
+    """
+    Removes every chunk of one document from the vector store and the BM25 index.
+
+    The chunks are found by their 'source' metadata, so this works whether or not
+    the ingestion manifest still knows the document.
+
+    Args:
+        source (str): The path of the document.
+
+    Returns:
+        list[str]: The IDs of the deleted chunks.
+    """
+    ids = get_vector_store().find({"source": source_key(source)})
+    if ids:
+        delete_chunks_from_chroma(ids)
+    return ids
+
+def replace_document(source: str, chunks: list[dict]) -> list[str]:
+    """
+    Makes the given chunks the only stored chunks of one document.
+
+    The new chunks are written first and the document's other chunks are deleted
+    afterwards, so the document never disappears from the search in between.
+
+    Args:
+        source (str): The path of the document.
+        chunks (list[dict]): The document's complete list of chunks ('id', 'text', 'metadata').
+
+    Returns:
+        list[str]: The IDs of the deleted chunks, i.e. the old chunks not among the new ones.
+    """
+    new_ids = {chunk["id"] for chunk in chunks}
+    old_ids = get_vector_store().find({"source": source_key(source)})
+    add_chunks_to_chroma(chunks)
+    stale_ids = [chunk_id for chunk_id in old_ids if chunk_id not in new_ids]
+    if stale_ids:
+        delete_chunks_from_chroma(stale_ids)
+    return stale_ids
 
 def run_retrieval_agent(query: str, n_results: int = 3) -> list[str]:
     """
-    Performs a semantic search to find the most relevant document chunks for a query.
+    Performs a hybrid (semantic and BM25) search to find the most relevant document chunks for a query.
 
     Args:
         query (str): The user's question or search term.
@@ -95,18 +414,25 @@ def run_retrieval_agent(query: str, n_results: int = 3) -> list[str]:
     Returns:
         list[str]: A list of the text content of the most relevant chunks.
     """
-    collection = get_collection()
-    # Query the collection for chunks that are semantically similar to the input query.
-    results = collection.query(
-        query_texts=[query], 
-        n_results=n_results, 
-        include=["documents"]
-    )
-    # The results are returned in a nested list; this flattens it.
-    return [doc for sublist in results["documents"] for doc in sublist]
+    return retrieve_chunks(query, n_results)["documents"]
 
 # --- Message Handling ---
 
+def _context_payload(query: str, results: dict) -> dict:
+    # The retrieved chunks, their IDs and the query embedding, as sent in CONTEXT_RESPONSE messages.
+    return {
+        "top_chunks": results["documents"],
+        "chunk_ids": results["ids"],
+        "context_tokens": results["context_tokens"],
+        "query_embedding": results["query_embedding"].tolist(),
+        "query": query,
+    }
+
+def _payload_filter(payload: dict):
+    # The metadata filter of a RETRIEVE or RETRIEVE_BATCH request: optional 'sources' and 'where'.
+    return document_filter(payload.get("sources"), payload.get("where"))
+
+@traced_handler("RetrievalAgent")
 def handle_message(mcp_message: dict) -> dict:
     """
     Acts as the public interface for the Retrieval Agent, handling incoming messages.
@@ -124,17 +450,21 @@ def handle_message(mcp_message: dict) -> dict:
 
     # Route: Handles requests to clear the entire database.
     if msg_type == "RESET_DATABASE":
-        global _chroma_client, _collection
-        
-        # If a client instance exists, call its reset method.
-        if _chroma_client:
-            _chroma_client.reset()
-        
-        # Set the singleton variables back to None to ensure a fresh start
-        # on the next operation and to release the old connection.
-        _chroma_client = None
-        _collection = None
-        
+        # Remove every stored chunk. The store is opened first if necessary, so the
+        # persisted data is cleared even if nothing was loaded in this process yet.
+        get_vector_store().reset()
+
+        # Forget the store to ensure a fresh start on the next operation
+        # and to release the old connection.
+        _vector_store.reset()
+
+        # The lexical index mirrors the database, so it is emptied as well. It is opened
+        # through the shared resource, never separately: another retrieval worker may be
+        # opening it at the same time, and two instances would write the same files. The
+        # store is empty by now, so opening it does not backfill anything.
+        _lexical_index.get().clear()
+        _lexical_index.reset()
+
         # Return a success message.
         return create_mcp_message(
             sender="RetrievalAgent",
@@ -144,6 +474,11 @@ def handle_message(mcp_message: dict) -> dict:
             trace_id=trace_id
         )
 
+    # Route: Handles requests to load the model and open the databases ahead of the first query.
+    elif msg_type == "WARM_UP":
+        warm_up()
+        return create_mcp_message("RetrievalAgent", mcp_message["sender"], "WARM_UP_COMPLETE", {"status": "SUCCESS"}, trace_id)
+
     # Route: Handles requests to add new document chunks to the database.
     elif msg_type == "ADD_CHUNKS":
         chunks = mcp_message["payload"]["chunks"]
@@ -151,14 +486,63 @@ def handle_message(mcp_message: dict) -> dict:
         # Return a confirmation message with the count of added chunks.
         return create_mcp_message("RetrievalAgent", mcp_message["sender"], "CHUNKS_ADDED", {"count": len(chunks)}, trace_id)
 
+    # Route: Handles requests to remove stale document chunks from the database.
+    elif msg_type == "DELETE_CHUNKS":
+        ids = mcp_message["payload"]["ids"]
+        delete_chunks_from_chroma(ids)
+        # Return a confirmation message with the count of deleted chunks.
+        return create_mcp_message("RetrievalAgent", mcp_message["sender"], "CHUNKS_DELETED", {"count": len(ids)}, trace_id)
+
+    # Route: Handles requests to remove every chunk of one document.
+    elif msg_type == "DELETE_DOCUMENT":
+        ids = delete_document(mcp_message["payload"]["source"])
+        # Return the deleted IDs, so cached answers built on them can be invalidated.
+        payload = {"count": len(ids), "deleted_ids": ids}
+        return create_mcp_message("RetrievalAgent", mcp_message["sender"], "DOCUMENT_DELETED", payload, trace_id)
+
+    # Route: Handles requests to swap all chunks of one document for a new set.
+    elif msg_type == "REPLACE_DOCUMENT":
+        chunks = mcp_message["payload"]["chunks"]
+        stale_ids = replace_document(mcp_message["payload"]["source"], chunks)
+        payload = {"count": len(chunks), "deleted_ids": stale_ids}
+        return create_mcp_message("RetrievalAgent", mcp_message["sender"], "DOCUMENT_REPLACED", payload, trace_id)
+
     # Route: Handles requests to retrieve relevant context for a query.
     elif msg_type == "RETRIEVE":
         query = mcp_message["payload"]["question"]
         n_results = mcp_message["payload"].get("n_results", 3)
-        top_chunks = run_retrieval_agent(query, n_results)
-        # Return the retrieved chunks in the message payload.
-        return create_mcp_message("RetrievalAgent", mcp_message["sender"], "CONTEXT_RESPONSE", {"top_chunks": top_chunks, "query": query}, trace_id)
+        token_budget = mcp_message["payload"].get("token_budget", CONTEXT_TOKEN_BUDGET)
+        # Optionally restrict the search to chosen documents ('sources') or other metadata ('where').
+        results = retrieve_chunks(query, n_results, token_budget, _payload_filter(mcp_message["payload"]))
+        # Return the retrieved chunks, their IDs and the query embedding in the message payload.
+        payload = _context_payload(query, results)
+        return create_mcp_message("RetrievalAgent", mcp_message["sender"], "CONTEXT_RESPONSE", payload, trace_id)
+
+    # Route: Handles requests to retrieve context for many queries in one pass.
+    elif msg_type == "RETRIEVE_BATCH":
+        queries = mcp_message["payload"]["questions"]
+        n_results = mcp_message["payload"].get("n_results", 3)
+        token_budget = mcp_message["payload"].get("token_budget", CONTEXT_TOKEN_BUDGET)
+        results = retrieve_chunks_batch(queries, n_results, token_budget, _payload_filter(mcp_message["payload"]))
+        # Return one CONTEXT_RESPONSE-style payload per query, in input order.
+        payload = {"results": [_context_payload(query, result) for query, result in zip(queries, results)]}
+        return create_mcp_message("RetrievalAgent", mcp_message["sender"], "CONTEXT_BATCH_RESPONSE", payload, trace_id)
 
     # Fallback for any unsupported message types.
     else:
-        raise ValueError(f"Unsupported message type: {msg_type}")
\ No newline at end of file
+        raise ValueError(f"Unsupported message type: {msg_type}")
+
+async def handle_message_async(mcp_message: dict) -> dict:
+    """
+    Asynchronous counterpart of `handle_message`.
+
+    Embedding and ChromaDB calls are blocking, so the message is handled in the
+    bounded "retrieval" executor instead of on the event loop.
+
+    Args:
+        mcp_message (dict): A message dictionary following the Message Communication Protocol.
+
+    Returns:
+        dict: The same response message as `handle_message`.
+    """
+    return await run_in_stage("retrieval", handle_message, mcp_message)
@@ -4,15 +4,26 @@
 This script launches the web-based user interface for the Agentic RAG Chatbot
 using the Streamlit library. It handles file uploads, displays the chat history,
 and captures user input. All backend processing is delegated to the
-`coordinate_chat` function in the coordinator agent.
+coordinator agent (`coordinate_chat` and its streaming variant `coordinate_chat_stream`);
+documents are indexed by background jobs whose progress is shown in the sidebar.
 """
 
 import streamlit as st
+import itertools
 import os
-from agents.coordinator_agent import coordinate_chat
+import uuid
+from agents.coordinator_agent import (
+    cancel_indexing, coordinate_chat, coordinate_chat_stream, delete_document, indexing_active,
+    list_indexing_jobs, start_background_warm_up, submit_indexing
+)
+from utils.job_queue import ACTIVE_STATUSES, CANCELLED, COMPLETED, FAILED, RUNNING
+from utils.tracing import get_trace
+from utils.upload_store import UploadStore, content_hash, DUPLICATE, REPLACED, STORED
 
 # Define a constant for the directory where uploaded files will be temporarily stored.
 UPLOAD_DIR = "./Documents"
+# How often the indexing progress in the sidebar is refreshed while a job runs, in seconds.
+INDEXING_REFRESH_SECONDS = 1.0
 
 # --- Page Configuration ---
 # Set the title, icon, and layout for the browser tab and page.
@@ -23,6 +34,32 @@ st.title("Agentic RAG Chatbot")
 st.markdown("Upload documents and ask questions based on their content.")
 
 
+# --- Process-Wide Resources ---
+
+@st.cache_resource(show_spinner=False)
+def warm_up_agents():
+    # Runs once per server process, not on every rerun or for every session: the agents
+    # load their models and open their databases while the first page is being used.
+    return start_background_warm_up()
+
+warm_up_agents()
+
+@st.cache_resource(show_spinner=False)
+def get_upload_store() -> UploadStore:
+    # One content-addressed store per server process, shared by every session.
+    return UploadStore(UPLOAD_DIR)
+
+upload_store = get_upload_store()
+
+@st.cache_resource(show_spinner=False)
+def start_indexing() -> str:
+    # Runs once per server process: indexes documents that were added to the folder
+    # outside the app. Jobs an earlier process left unfinished are resumed as well.
+    return submit_indexing(UPLOAD_DIR)
+
+start_indexing()
+
+
 # --- State Management and Callbacks ---
 
 # Initialize a key in the session state for the file uploader.
@@ -30,6 +67,11 @@ st.markdown("Upload documents and ask questions based on their content.")
 if "uploader_key" not in st.session_state:
     st.session_state.uploader_key = 0
 
+# Maps the ID of every file uploaded in this session to its content hash, so that a
+# rerun neither hashes nor writes a file it has already seen.
+if "upload_hashes" not in st.session_state:
+    st.session_state.upload_hashes = {}
+
 def clear_data_callback():
     """
     Callback function executed when the 'Clear All Data' button is clicked.
@@ -37,6 +79,10 @@ def clear_data_callback():
     """
     # Send a command to the coordinator agent to clear the database and document folder.
     response = coordinate_chat("CLEAR_ALL_DATA", UPLOAD_DIR)
+    # The document folder, including the upload index, is now empty.
+    upload_store.reload()
+    st.session_state.upload_hashes = {}
+    st.session_state.source_filter = []
     
     # Reset the chat history stored in the session state.
     st.session_state.chat_history = []
@@ -48,6 +94,24 @@ def clear_data_callback():
     # Display the success message from the backend in the sidebar.
     st.sidebar.success(response)
 
+def delete_document_callback(name: str):
+    """
+    Callback function executed when a single document is deleted. Only that
+    document's file and chunks are removed; everything else stays indexed.
+    """
+    path = upload_store.remove(name)
+    if path is not None:
+        deleted = delete_document(path)
+        st.sidebar.success(f"Removed {name} ({deleted} chunks).")
+    else:
+        st.sidebar.info(f"Removed the name {name}; its content is still stored under another name.")
+
+    # Drop the document from the search filter, and reset the uploader so it does
+    # not store the file again on the next rerun.
+    st.session_state.source_filter = [selected for selected in st.session_state.get("source_filter", []) if selected != name]
+    st.session_state.document_to_delete = None
+    st.session_state.uploader_key += 1
+
 
 # --- Sidebar UI Elements ---
 
@@ -66,20 +130,120 @@ uploaded_files = st.sidebar.file_uploader(
 # Create the button to clear all data, linking it to the callback function.
 st.sidebar.button("🗑️ Clear All Data", on_click=clear_data_callback)
 
+# Optionally show how long each stage of the last answer took.
+show_timings = st.sidebar.checkbox("⏱️ Show timings")
+
 
 # --- File Processing Logic ---
 
 # This block executes only if the user has uploaded files in the widget.
 if uploaded_files:
-    # Ensure the target directory for uploads exists.
-    os.makedirs(UPLOAD_DIR, exist_ok=True)
-    # Loop through each uploaded file object.
+    results = {STORED: [], REPLACED: [], DUPLICATE: []}
     for file in uploaded_files:
-        # Open a new file in binary write mode and save the uploaded content.
-        with open(os.path.join(UPLOAD_DIR, file.name), "wb") as f:
-            f.write(file.getbuffer())
-    # Provide feedback to the user in the sidebar.
-    st.sidebar.success(f"{len(uploaded_files)} file(s) processed!")
+        known_hash = st.session_state.upload_hashes.get(file.file_id)
+        # The widget hands the same files to every rerun; they were stored the first time.
+        if known_hash is not None and upload_store.contains(known_hash):
+            continue
+        data = file.getbuffer()
+        st.session_state.upload_hashes[file.file_id] = content_hash(data)
+        # The store only writes content it does not have yet.
+        status = upload_store.add(file.name, data, st.session_state.upload_hashes[file.file_id])
+        results.setdefault(status, []).append(file.name)
+
+    # Provide feedback to the user in the sidebar, only about what actually changed.
+    if results[STORED]:
+        st.sidebar.success(f"{len(results[STORED])} new file(s) stored.")
+    if results[REPLACED]:
+        st.sidebar.warning(f"Replaced the earlier version of: {', '.join(results[REPLACED])}")
+    if results[DUPLICATE]:
+        st.sidebar.info(f"Already stored under another name: {', '.join(results[DUPLICATE])}")
+
+# Index newly stored content in the background; questions are answered from the
+# documents indexed so far in the meantime. A job that is cancelled or interrupted
+# leaves the rest to the next job, as ingestion only processes what is not indexed yet.
+pending = upload_store.pending()
+if pending:
+    submit_indexing(UPLOAD_DIR)
+    upload_store.mark_indexed(pending)
+
+
+# --- Indexing Progress ---
+
+def cancel_indexing_callback(job_ids: list[str]):
+    # Stops the running job and drops the queued ones; what is indexed stays searchable.
+    for job_id in job_ids:
+        cancel_indexing(job_id)
+
+def render_indexing_status():
+    """
+    Shows the progress of the current (or else the latest) indexing job: files
+    done, throughput and the most recently indexed files, with a button to cancel
+    (or resume) indexing.
+    """
+    jobs = list_indexing_jobs()
+    if not jobs:
+        return
+    active_ids = [job["id"] for job in jobs if job["status"] in ACTIVE_STATUSES]
+    # The running job, else the latest one that got to start (a cancelled queue also
+    # holds jobs that never ran, with nothing to show).
+    job = (next((job for job in jobs if job["status"] == RUNNING), None)
+           or next((job for job in jobs if job["started"]), jobs[0]))
+    progress = job["progress"]
+    files_total, files_done = progress.get("files_total", 0), progress.get("files_done", 0)
+
+    if job["status"] in ACTIVE_STATUSES:
+        st.progress(files_done / files_total if files_total else 0.0,
+                    text=f"Indexing documents: {files_done} of {files_total} files")
+        if progress.get("current_file"):
+            st.caption(f"Now indexing {os.path.basename(progress['current_file'])}")
+        st.caption(f"{progress.get('chunks_indexed', 0)} chunks indexed · "
+                   f"{progress.get('chunks_skipped', 0)} near duplicates skipped · "
+                   f"{progress.get('chunks_per_s', 0)} chunks/s · {progress.get('files_per_s', 0)} files/s")
+        st.button("Cancel indexing", on_click=cancel_indexing_callback, args=(active_ids,))
+    elif job["status"] == CANCELLED:
+        st.warning(f"Indexing cancelled after {files_done} of {files_total} files.")
+        st.button("Resume indexing", on_click=submit_indexing, args=(UPLOAD_DIR,))
+    elif job["status"] == FAILED:
+        st.error(f"Indexing failed: {job['error']}")
+        st.button("Retry indexing", on_click=submit_indexing, args=(UPLOAD_DIR,))
+    elif job["status"] == COMPLETED and files_total:
+        st.caption(f"Indexed {files_total} file(s), {progress.get('chunks_indexed', 0)} chunks "
+                   f"({progress.get('chunks_skipped', 0)} near duplicates skipped), in {progress.get('elapsed_s', 0)} s.")
+
+    # Per-file results of the most recent files.
+    if job["status"] != COMPLETED and progress.get("recent_files"):
+        st.dataframe(
+            [{"file": os.path.basename(entry["source"]), "chunks": entry["chunks"],
+              "duplicates": entry.get("duplicates", 0),
+              "chunks/s": round(entry["chunks"] / entry["seconds"], 1) if entry["seconds"] else None,
+              "status": "failed" if entry["error"] else "done"}
+             for entry in reversed(progress["recent_files"])],
+            hide_index=True,
+        )
+
+# Only this part of the page refreshes while a job runs; the chat stays usable.
+with st.sidebar:
+    st.fragment(run_every=INDEXING_REFRESH_SECONDS if indexing_active() else None)(render_indexing_status)()
+
+
+# --- Document Selection ---
+
+# The stored documents, by name. Questions can be limited to some of them, and
+# single documents can be removed without clearing everything else.
+documents = upload_store.documents()
+selected_sources = None
+if documents:
+    st.sidebar.header("📄 Documents")
+    selected_names = st.sidebar.multiselect(
+        "Answer only from:", sorted(documents), key="source_filter",
+        help="Leave empty to search all documents."
+    )
+    if selected_names:
+        selected_sources = [documents[name] for name in selected_names]
+
+    document_to_delete = st.sidebar.selectbox("Remove a document:", sorted(documents), index=None, key="document_to_delete")
+    if document_to_delete:
+        st.sidebar.button("Remove", on_click=delete_document_callback, args=(document_to_delete,))
 
 
 # --- Main Chat Interface ---
@@ -94,8 +258,8 @@ for msg in st.session_state.chat_history:
     with st.chat_message(msg["role"]):
         st.markdown(msg["content"])
 
-# Only display the chat input box if documents have been uploaded and exist on disk.
-if os.path.exists(UPLOAD_DIR) and os.listdir(UPLOAD_DIR):
+# Only display the chat input box if documents have been uploaded (checked in memory, not on disk).
+if upload_store.has_documents():
     # Create the chat input widget at the bottom of the page.
     if question := st.chat_input("Ask your question about the documents..."):
         # Add the user's new message to the chat history.
@@ -104,16 +268,33 @@ if os.path.exists(UPLOAD_DIR) and os.listdir(UPLOAD_DIR):
         with st.chat_message("user"):
             st.markdown(question)
 
-        # Display the bot's response bubble with a loading spinner.
+        # Display the bot's response bubble, streaming the answer as it is generated.
         with st.chat_message("bot"):
+            # Call the backend coordinator to get a stream of answer pieces. The trace ID
+            # identifies this request's spans for the timing panel.
+            st.session_state.last_trace_id = str(uuid.uuid4())
+            stream = coordinate_chat_stream(question, UPLOAD_DIR, st.session_state.last_trace_id, selected_sources)
+            # Show a loading spinner only until the first piece of the answer arrives.
             with st.spinner("Thinking..."):
-                # Call the backend coordinator to get the answer.
-                answer = coordinate_chat(question, UPLOAD_DIR)
-                # Display the answer from the bot.
-                st.markdown(answer)
+                first_piece = next(stream, "")
+            # Render the remaining tokens as they arrive; the full answer is returned at the end.
+            answer = st.write_stream(itertools.chain([first_piece], stream))
         
         # Add the bot's new message to the chat history.
         st.session_state.chat_history.append({"role": "bot", "content": answer})
 else:
     # If no documents are uploaded, display an informational message.
-    st.info("Upload one or more documents to begin chatting.")
\ No newline at end of file
+    st.info("Upload one or more documents to begin chatting.")
+
+
+# --- Timing Panel ---
+
+# Rendered last, so it includes the request that was just answered.
+if show_timings and "last_trace_id" in st.session_state:
+    spans = sorted(get_trace(st.session_state.last_trace_id), key=lambda span: span["start"])
+    if spans:
+        st.sidebar.subheader("Timings of the last answer")
+        st.sidebar.dataframe(
+            [{"stage": span["name"], "ms": round(span["duration"] * 1000, 1), "status": span["status"]} for span in spans],
+            hide_index=True,
+        )
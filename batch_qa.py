@@ -0,0 +1,90 @@
+# batch_qa.py
+
+"""
+Command-line batch question answering over the uploaded documents.
+
+It reads a file of questions, answers all of them through the coordinator's
+batch pipeline (`coordinate_batch_async`: batched retrieval and bounded
+concurrent generation), and writes one JSON line per question as soon as its
+answer is ready, including per-question timings.
+
+The questions file holds either one question per line, or JSON lines with a
+"question" field (and optionally an "id", which is copied to the output).
+
+Usage:
+    python batch_qa.py questions.txt --output answers.jsonl --concurrency 8
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from agents.coordinator_agent import coordinate_batch_async, BATCH_GENERATION_CONCURRENCY, BATCH_RETRIEVE_SIZE
+
+# Define the default directory holding the documents, as used by the Streamlit app.
+DEFAULT_DOCUMENT_PATH = "./Documents"
+
+def read_questions(path: str) -> list[dict]:
+    """
+    Reads the questions file.
+
+    Args:
+        path (str): The path to a text or JSON-lines file of questions.
+
+    Returns:
+        list[dict]: One dictionary per question with a 'question' and, if given, an 'id'.
+    """
+    questions = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                record = json.loads(line)
+                questions.append({key: record[key] for key in ("id", "question") if key in record})
+            else:
+                questions.append({"question": line})
+    return questions
+
+async def run(args) -> int:
+    questions = read_questions(args.questions)
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    errors = 0
+    start = time.perf_counter()
+    try:
+        async for result in coordinate_batch_async(
+            [question["question"] for question in questions],
+            args.documents,
+            concurrency=args.concurrency,
+            retrieve_batch_size=args.batch_size,
+        ):
+            if "id" in questions[result["index"]]:
+                result = {"id": questions[result["index"]]["id"], **result}
+            errors += bool(result["error"])
+            # Write and flush every line immediately, so partial results survive an interruption.
+            output.write(json.dumps(result, ensure_ascii=False) + "\n")
+            output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Answered {len(questions)} questions in {elapsed:.1f}s ({errors} errors).", file=sys.stderr)
+    return 1 if errors else 0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("questions", help="Text file (one question per line) or JSON-lines file of questions.")
+    parser.add_argument("--output", help="Output JSON-lines file (default: standard output).")
+    parser.add_argument("--documents", default=DEFAULT_DOCUMENT_PATH, help="Directory of documents to search.")
+    parser.add_argument("--concurrency", type=int, default=BATCH_GENERATION_CONCURRENCY,
+                        help="Maximum number of concurrent LLM generations.")
+    parser.add_argument("--batch-size", type=int, default=BATCH_RETRIEVE_SIZE,
+                        help="Number of questions retrieved per batch.")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args)))
+
+if __name__ == "__main__":
+    main()
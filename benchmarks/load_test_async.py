@@ -0,0 +1,107 @@
+# benchmarks/load_test_async.py
+
+"""
+Load test for the asyncio-native pipeline (`coordinate_chat_async`).
+
+It builds a small text corpus in a temporary working directory, switches the LLM
+to the local stub model (which waits a fixed delay per token, like a network
+call), and then fires batches of concurrent questions at increasing concurrency
+levels. For each level it reports request throughput and latency, which should
+scale with concurrency until the agents' worker pools on the message bus become the limit.
+
+Usage (from the repository root):
+    python -m benchmarks.load_test_async --concurrency 1 2 4 8 16 --requests 64
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def write_corpus(directory: str, documents: int, paragraphs: int):
+    """
+    Writes a simple plain-text corpus of numbered documents and paragraphs.
+
+    Args:
+        directory (str): The directory to write the documents into.
+        documents (int): The number of documents.
+        paragraphs (int): The number of paragraphs per document.
+    """
+    os.makedirs(directory, exist_ok=True)
+    for d in range(documents):
+        with open(os.path.join(directory, f"doc_{d:03d}.txt"), "w", encoding="utf-8") as f:
+            for p in range(paragraphs):
+                f.write(f"Document {d} paragraph {p} describes component {d * paragraphs + p}, "
+                        f"its part number PN-{d:03d}-{p:03d} and how it is maintained.\n\n")
+
+async def run_level(coordinate_chat_async, document_path: str, concurrency: int, requests: int) -> dict:
+    """
+    Sends `requests` distinct questions with at most `concurrency` in flight.
+
+    Returns:
+        dict: Throughput and latency statistics for this concurrency level.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            await coordinate_chat_async(f"Question {concurrency}-{i}: how is component {i} maintained?", document_path)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 2),
+        "latency_p50_s": round(statistics.median(latencies), 3),
+        "latency_p95_s": round(latencies[int(0.95 * (len(latencies) - 1))], 3),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--requests", type=int, default=64, help="Questions sent per concurrency level.")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="Stub LLM delay per token, in seconds.")
+    parser.add_argument("--documents", type=int, default=20)
+    parser.add_argument("--paragraphs", type=int, default=20)
+    args = parser.parse_args()
+
+    # Use the offline stub model and isolate all on-disk state in a temporary directory.
+    os.environ["LLM_BACKEND"] = "stub"
+    os.environ["STUB_LLM_TOKEN_DELAY"] = str(args.token_delay)
+    sys.path.insert(0, REPO_ROOT)
+    workdir = tempfile.mkdtemp(prefix="rag_load_test_")
+    os.chdir(workdir)
+    write_corpus("Documents", args.documents, args.paragraphs)
+
+    from agents.coordinator_agent import coordinate_chat_async, coordinate_indexing
+    from utils.answer_cache import answer_cache
+
+    # Disable the semantic answer cache so every request reaches the LLM.
+    answer_cache.threshold = float("inf")
+
+    # Ingest and index the corpus up front; questions only search what is indexed.
+    coordinate_indexing("Documents")
+
+    async def run_all():
+        # The first request loads the models; keep it out of the measurements.
+        await coordinate_chat_async("warm-up question", "Documents")
+        return [await run_level(coordinate_chat_async, "Documents", c, args.requests) for c in args.concurrency]
+
+    for result in asyncio.run(run_all()):
+        print(json.dumps(result))
+
+if __name__ == "__main__":
+    main()
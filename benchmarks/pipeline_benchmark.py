@@ -0,0 +1,222 @@
+# benchmarks/pipeline_benchmark.py
+
+"""
+Offline benchmark of the full RAG pipeline on a synthetic corpus.
+
+It writes a deterministic corpus in every supported format (see
+`benchmarks.synthetic_corpus`) into a temporary working directory, so the app's
+own databases are never touched, switches the LLM to the local stub model, and
+measures each stage in isolation:
+- `load_documents`: files, megabytes and characters parsed per second;
+- `run_ingestion_agent`: chunks produced per second (cold manifest), their
+  mean and maximum size in estimated tokens, and the near duplicates skipped;
+- embedding rate: chunks per second through the embedding model (no cache);
+- `add_chunks_to_chroma`: chunks indexed per second (cold embedding cache);
+- `run_retrieval_agent`: latency p50 / p95 / p99 over distinct questions, and the
+  mean size of the retrieved context in estimated tokens;
+- `coordinate_chat`: end-to-end latency p50 / p95 / p99 with the stub LLM and
+  the answer cache disabled.
+
+The results, together with the parameters and environment of the run, are
+written as JSON. Pass an earlier result file with --compare to print the ratio
+of every metric to that baseline.
+
+Usage (from the repository root):
+    python -m benchmarks.pipeline_benchmark --output results.json
+    python -m benchmarks.pipeline_benchmark --output new.json --compare results.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.synthetic_corpus import FORMATS, write_corpus
+
+def latency_summary(latencies: list[float]) -> dict:
+    """
+    Summarizes latencies (in seconds) as milliseconds at the usual percentiles.
+
+    Returns:
+        dict: 'p50_ms', 'p95_ms', 'p99_ms' and 'mean_ms'.
+    """
+    ordered = sorted(latencies)
+
+    def percentile(q: float) -> float:
+        return round(ordered[int(q * (len(ordered) - 1))] * 1000, 2)
+
+    return {
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 2),
+    }
+
+def timed(function, *args):
+    # Returns the function's result and its wall-clock duration in seconds.
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+def run_benchmarks(args) -> dict:
+    """
+    Runs every stage benchmark in the current working directory.
+
+    Returns:
+        dict: The measurements, keyed by stage.
+    """
+    corpus_start = time.perf_counter()
+    paths = write_corpus("Documents", args.files_per_format, args.paragraphs, tuple(args.formats), args.seed)
+    corpus_bytes = sum(os.path.getsize(path) for path in paths)
+    results = {"corpus": {"files": len(paths), "megabytes": round(corpus_bytes / 1e6, 2),
+                          "generate_s": round(time.perf_counter() - corpus_start, 2)}}
+
+    # The agents are imported only now, so their relative paths resolve inside the working directory.
+    from utils.file_loader import load_documents
+    from agents import retrieval_agent
+    from agents.ingestion_agent import run_ingestion_agent
+    from agents.retrieval_agent import add_chunks_to_chroma, run_retrieval_agent, embedding_engine
+    from agents.coordinator_agent import coordinate_chat
+    from utils.answer_cache import answer_cache
+    from utils.text import estimate_tokens
+
+    retrieval_agent.VECTOR_STORE_BACKEND = args.vector_store
+
+    texts, seconds = timed(load_documents, "Documents")
+    characters = sum(map(len, texts))
+    results["load_documents"] = {
+        "seconds": round(seconds, 3),
+        "files_per_s": round(len(paths) / seconds, 1),
+        "mb_per_s": round(corpus_bytes / 1e6 / seconds, 2),
+        "chars_per_s": round(characters / seconds),
+    }
+
+    ingestion, seconds = timed(run_ingestion_agent, "Documents")
+    chunks = ingestion["chunks"]
+    results["ingestion"] = {
+        "seconds": round(seconds, 3),
+        "chunks": len(chunks),
+        "chunks_per_s": round(len(chunks) / seconds, 1),
+        "skipped_chunks": ingestion["skipped_chunks"],
+        "mean_chunk_tokens": round(sum(estimate_tokens(chunk["text"]) for chunk in chunks) / max(len(chunks), 1), 1),
+        "max_chunk_tokens": max((estimate_tokens(chunk["text"]) for chunk in chunks), default=0),
+    }
+
+    # Embed a fixed sample straight through the model, bypassing the embedding cache.
+    sample = [chunk["text"] for chunk in chunks[:args.embedding_sample]]
+    embedding_engine.encode(sample[:8])
+    _, seconds = timed(embedding_engine.encode, sample)
+    results["embedding"] = {
+        "chunks": len(sample),
+        "seconds": round(seconds, 3),
+        "chunks_per_s": round(len(sample) / seconds, 1),
+    }
+
+    # The embedding cache of the working directory is still empty, so this includes embedding.
+    _, seconds = timed(add_chunks_to_chroma, chunks)
+    results["add_chunks"] = {
+        "backend": args.vector_store,
+        "seconds": round(seconds, 3),
+        "chunks_per_s": round(len(chunks) / seconds, 1),
+    }
+
+    # Distinct questions, so the query embedding cache never hits.
+    questions = [f"How do I maintain the component described in question {i}? Which torque applies?"
+                 for i in range(args.queries)]
+    run_retrieval_agent("warm-up question", args.n_results)
+    latencies, context_tokens = [], []
+    for question in questions:
+        documents, seconds = timed(run_retrieval_agent, question, args.n_results)
+        latencies.append(seconds)
+        context_tokens.append(sum(estimate_tokens(document) for document in documents))
+    results["retrieval"] = {
+        "queries": len(questions),
+        "n_results": args.n_results,
+        **latency_summary(latencies),
+        "mean_context_tokens": round(sum(context_tokens) / len(context_tokens), 1),
+    }
+
+    # Every request reaches the (stub) LLM; the corpus was indexed above, so requests only retrieve and generate.
+    answer_cache.threshold = float("inf")
+    coordinate_chat("warm-up question", "Documents")
+    latencies = [timed(coordinate_chat, f"End-to-end question {i}: what is the inspection interval?", "Documents")[1]
+                 for i in range(args.chat_requests)]
+    results["coordinate_chat"] = {"requests": args.chat_requests, **latency_summary(latencies)}
+    return results
+
+def environment() -> dict:
+    # Identifies the code and machine a result was measured on.
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+def compare(results: dict, baseline: dict):
+    """
+    Prints every numeric metric next to its baseline value and their ratio.
+    """
+    for stage, metrics in results.items():
+        for name, value in metrics.items():
+            base = baseline.get(stage, {}).get(name)
+            if isinstance(value, (int, float)) and isinstance(base, (int, float)) and base:
+                print(f"{stage + '.' + name:40s} {base:>12} -> {value:>12}  x{value / base:.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default="pipeline_benchmark.json", help="JSON file the results are written to.")
+    parser.add_argument("--compare", help="Earlier result file to compare against.")
+    parser.add_argument("--files-per-format", type=int, default=4)
+    parser.add_argument("--paragraphs", type=int, default=200, help="Size of each document, in paragraphs.")
+    parser.add_argument("--formats", nargs="+", default=list(FORMATS), choices=FORMATS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--embedding-sample", type=int, default=512, help="Chunks embedded for the embedding rate.")
+    parser.add_argument("--vector-store", default="chroma", choices=["chroma", "numpy", "numpy-int8", "numpy-binary"])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--n-results", type=int, default=3)
+    parser.add_argument("--chat-requests", type=int, default=50)
+    args = parser.parse_args()
+    # Both files are given relative to where the benchmark was started.
+    output = os.path.abspath(args.output)
+    baseline_path = os.path.abspath(args.compare) if args.compare else None
+
+    # Use the offline stub model and isolate all on-disk state in a temporary directory.
+    os.environ["LLM_BACKEND"] = "stub"
+    os.environ["STUB_LLM_TOKEN_DELAY"] = "0"
+    start_directory = os.getcwd()
+    work_directory = tempfile.mkdtemp(prefix="rag_pipeline_benchmark_")
+    os.chdir(work_directory)
+    try:
+        report = {
+            "environment": environment(),
+            "parameters": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+            "results": run_benchmarks(args),
+        }
+    finally:
+        os.chdir(start_directory)
+        shutil.rmtree(work_directory, ignore_errors=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report["results"], indent=2))
+
+    if baseline_path:
+        with open(baseline_path, encoding="utf-8") as f:
+            compare(report["results"], json.load(f)["results"])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+# benchmarks/startup_benchmark.py
+
+"""
+Benchmark of the application's cold start.
+
+Every measurement runs in a fresh interpreter inside a temporary working
+directory (with the local stub LLM), so nothing is cached from a previous run:
+- import time of each agent module and of the coordinator, which `app.py` imports;
+- time to first page: one run of `app.py` through Streamlit's AppTest harness,
+  i.e. what the first visitor waits for before the page renders;
+- first answer: the latency of the first question after startup, once without
+  warm-up and once after the background warm-up has finished, together with the
+  warm-up's own duration.
+
+Each measurement is repeated and the median is reported. The documents are
+indexed once beforehand, so the first answers measure model and database
+loading rather than ingestion.
+
+Usage (from the repository root):
+    python -m benchmarks.startup_benchmark --output startup.json
+    python -m benchmarks.startup_benchmark --output new.json --compare startup.json
+"""
+
+import argparse
+import importlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.pipeline_benchmark import compare, environment
+from benchmarks.synthetic_corpus import write_corpus
+
+MODULES = ["agents.coordinator_agent", "agents.ingestion_agent", "agents.retrieval_agent", "agents.llm_response_agent"]
+QUESTION = "Which torque applies when you tighten the pump?"
+# Prefix of the line on which a probe prints its result; agents may print other lines.
+RESULT_MARKER = "STARTUP_BENCHMARK_RESULT "
+
+# --- Probes (run in the child interpreters) ---
+
+def probe_import(module_name: str) -> dict:
+    start = time.perf_counter()
+    importlib.import_module(module_name)
+    return {"seconds": time.perf_counter() - start}
+
+def probe_first_page() -> dict:
+    start = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    app = AppTest.from_file(os.path.join(REPO_ROOT, "app.py"), default_timeout=120)
+    app.run()
+    if app.exception:
+        raise RuntimeError(f"app.py failed: {app.exception}")
+    return {"seconds": time.perf_counter() - start}
+
+def probe_index() -> dict:
+    start = time.perf_counter()
+    from agents.coordinator_agent import coordinate_indexing
+    chunks = coordinate_indexing("Documents")
+    return {"seconds": time.perf_counter() - start, "chunks": chunks}
+
+def probe_first_answer(warm_up: bool) -> dict:
+    start = time.perf_counter()
+    from agents.coordinator_agent import coordinate_chat, start_background_warm_up
+    result = {}
+    if warm_up:
+        warm_up_start = time.perf_counter()
+        start_background_warm_up().join()
+        result["warm_up_s"] = time.perf_counter() - warm_up_start
+    answer_start = time.perf_counter()
+    coordinate_chat(QUESTION, "Documents")
+    result["seconds"] = time.perf_counter() - answer_start
+    result["since_start_s"] = time.perf_counter() - start
+    return result
+
+def run_probe(probe: str) -> dict:
+    kind, _, argument = probe.partition(":")
+    if kind == "import":
+        return probe_import(argument)
+    if kind == "index":
+        return probe_index()
+    if kind == "first_page":
+        return probe_first_page()
+    if kind == "first_answer":
+        return probe_first_answer(argument == "warm")
+    raise ValueError(f"Unknown probe: {probe}")
+
+# --- Driver ---
+
+def measure(probe: str, workdir: str, repeats: int, extra_env: dict = None) -> dict:
+    """
+    Runs a probe `repeats` times, each in a new interpreter, and returns the median of every value.
+    """
+    env = {**os.environ, "LLM_BACKEND": "stub", "STUB_LLM_TOKEN_DELAY": "0", **(extra_env or {})}
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [REPO_ROOT, os.environ.get("PYTHONPATH")]))
+    runs = []
+    for _ in range(repeats):
+        completed = subprocess.run([sys.executable, "-m", "benchmarks.startup_benchmark", "--probe", probe],
+                                   cwd=workdir, env=env, capture_output=True, text=True)
+        if completed.returncode != 0:
+            raise RuntimeError(f"Probe {probe} failed:\n{completed.stderr}")
+        result = next(line for line in completed.stdout.splitlines() if line.startswith(RESULT_MARKER))
+        runs.append(json.loads(result[len(RESULT_MARKER):]))
+    return {key: round(statistics.median(run[key] for run in runs), 3) for key in runs[0]}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default="startup_benchmark.json", help="JSON file the results are written to.")
+    parser.add_argument("--compare", help="Earlier result file to compare against.")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--probe", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.probe:
+        print(RESULT_MARKER + json.dumps(run_probe(args.probe)), flush=True)
+        return
+
+    output = os.path.abspath(args.output)
+    workdir = tempfile.mkdtemp(prefix="rag_startup_benchmark_")
+    write_corpus(os.path.join(workdir, "Documents"), files_per_format=1, paragraphs=50, formats=("txt", "md"))
+    # Index the corpus once, so the measured first answers find it already ingested.
+    measure("index", workdir, 1)
+
+    results = {f"import {module}": measure(f"import:{module}", workdir, args.repeats) for module in MODULES}
+    results["first_page"] = measure("first_page", workdir, args.repeats)
+    results["first_answer_cold"] = measure("first_answer:cold", workdir, args.repeats, {"BACKGROUND_WARM_UP": "0"})
+    results["first_answer_warm"] = measure("first_answer:warm", workdir, args.repeats)
+
+    report = {
+        "environment": environment(),
+        "parameters": {"repeats": args.repeats},
+        "results": results,
+    }
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(results, indent=2))
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(results, json.load(f)["results"])
+
+if __name__ == "__main__":
+    main()
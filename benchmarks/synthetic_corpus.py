@@ -0,0 +1,179 @@
+# benchmarks/synthetic_corpus.py
+
+"""
+Generates a deterministic synthetic corpus in every supported document format.
+
+The documents read like equipment maintenance manuals: sections of sentences
+about components, part numbers, intervals and measurements, built from a fixed
+vocabulary with a seeded random generator. The same arguments always produce the
+same files, so benchmark runs on different commits see identical input.
+
+Per file, `paragraphs` controls the size: TXT and MD get that many paragraphs
+(MD with headings), DOCX gets headings and paragraphs, PDF packs them onto pages,
+PPTX puts a few paragraphs on each slide, and CSV gets one inventory row per
+paragraph.
+
+Usage (from the repository root):
+    python -m benchmarks.synthetic_corpus ./bench_corpus --files-per-format 4 --paragraphs 200
+"""
+
+import argparse
+import csv
+import os
+import random
+
+FORMATS = ("txt", "md", "pdf", "docx", "pptx", "csv")
+
+# Paragraphs per section (DOCX / MD headings) and per slide (PPTX).
+PARAGRAPHS_PER_SECTION = 8
+PARAGRAPHS_PER_SLIDE = 3
+
+_COMPONENTS = ["pump", "valve", "bearing", "gasket", "filter", "compressor", "sensor", "actuator",
+               "coupling", "impeller", "seal", "motor", "gearbox", "manifold", "regulator", "heat exchanger"]
+_ACTIONS = ["inspect", "replace", "lubricate", "calibrate", "tighten", "clean", "test", "align"]
+_CONDITIONS = ["after every 500 operating hours", "during the annual shutdown", "whenever vibration exceeds 4 mm/s",
+               "before restarting after maintenance", "when the pressure drop exceeds 0.8 bar", "every six months"]
+_MATERIALS = ["stainless steel", "cast iron", "nitrile rubber", "PTFE", "bronze", "aluminium"]
+_SITES = ["North Plant", "Harbor Station", "Line 3", "Building 12", "the test bench", "Unit B"]
+
+class _Writer:
+    """Produces the sentences, paragraphs and table rows of one synthetic document."""
+
+    def __init__(self, seed: int):
+        self.rng = random.Random(seed)
+
+    def part_number(self) -> str:
+        return f"PN-{self.rng.randint(0, 999):03d}-{self.rng.randint(0, 9999):04d}"
+
+    def sentence(self) -> str:
+        rng = self.rng
+        templates = [
+            lambda: f"{rng.choice(_ACTIONS).capitalize()} the {rng.choice(_COMPONENTS)} {rng.choice(_CONDITIONS)}.",
+            lambda: f"The {rng.choice(_COMPONENTS)} with part number {self.part_number()} is made of {rng.choice(_MATERIALS)}.",
+            lambda: f"At {rng.choice(_SITES)}, the {rng.choice(_COMPONENTS)} runs at {rng.randint(900, 3600)} rpm "
+                    f"and {rng.randint(2, 40)} bar.",
+            lambda: f"Use torque of {rng.randint(10, 250)} Nm when you {rng.choice(_ACTIONS)} the {rng.choice(_COMPONENTS)}.",
+            lambda: f"Record the {rng.choice(_COMPONENTS)} temperature; it must stay below {rng.randint(40, 120)} degrees Celsius.",
+        ]
+        return rng.choice(templates)()
+
+    def paragraph(self) -> str:
+        return " ".join(self.sentence() for _ in range(self.rng.randint(3, 6)))
+
+    def heading(self, number: int) -> str:
+        return f"Section {number}: {self.rng.choice(_COMPONENTS).title()} maintenance"
+
+    def row(self) -> dict:
+        rng = self.rng
+        return {
+            "part_number": self.part_number(),
+            "component": rng.choice(_COMPONENTS),
+            "material": rng.choice(_MATERIALS),
+            "site": rng.choice(_SITES),
+            "stock": rng.randint(0, 500),
+            "unit_price_eur": round(rng.uniform(2, 2000), 2),
+            "notes": self.sentence(),
+        }
+
+# --- Format Writers ---
+
+def _write_txt(path: str, writer: _Writer, paragraphs: int):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n\n".join(writer.paragraph() for _ in range(paragraphs)) + "\n")
+
+def _write_md(path: str, writer: _Writer, paragraphs: int):
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(paragraphs):
+            if i % PARAGRAPHS_PER_SECTION == 0:
+                f.write(f"## {writer.heading(i // PARAGRAPHS_PER_SECTION + 1)}\n\n")
+            f.write(writer.paragraph() + "\n\n")
+
+def _write_docx(path: str, writer: _Writer, paragraphs: int):
+    from docx import Document
+    document = Document()
+    for i in range(paragraphs):
+        if i % PARAGRAPHS_PER_SECTION == 0:
+            document.add_heading(writer.heading(i // PARAGRAPHS_PER_SECTION + 1), level=2)
+        document.add_paragraph(writer.paragraph())
+    document.save(path)
+
+def _write_pdf(path: str, writer: _Writer, paragraphs: int):
+    import fitz  # PyMuPDF
+    document = fitz.open()
+    page, y = None, 0
+    for _ in range(paragraphs):
+        text = writer.paragraph()
+        # Estimate the paragraph's height on an A4 page with 10 pt text, and start a new page when it is full.
+        height = (len(text) // 95 + 2) * 13
+        if page is None or y + height > 800:
+            page, y = document.new_page(), 40
+        page.insert_textbox(fitz.Rect(50, y, 545, y + height), text, fontsize=10)
+        y += height
+    document.save(path)
+    document.close()
+
+def _write_pptx(path: str, writer: _Writer, paragraphs: int):
+    from pptx import Presentation
+    presentation = Presentation()
+    layout = presentation.slide_layouts[1]  # Title and content
+    for i in range(0, paragraphs, PARAGRAPHS_PER_SLIDE):
+        slide = presentation.slides.add_slide(layout)
+        slide.shapes.title.text = writer.heading(i // PARAGRAPHS_PER_SLIDE + 1)
+        slide.placeholders[1].text = "\n\n".join(writer.paragraph() for _ in range(min(PARAGRAPHS_PER_SLIDE, paragraphs - i)))
+    presentation.save(path)
+
+def _write_csv(path: str, writer: _Writer, paragraphs: int):
+    rows = [writer.row() for _ in range(paragraphs)]
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        table = csv.DictWriter(f, fieldnames=list(rows[0]))
+        table.writeheader()
+        table.writerows(rows)
+
+_WRITERS = {
+    "txt": _write_txt,
+    "md": _write_md,
+    "pdf": _write_pdf,
+    "docx": _write_docx,
+    "pptx": _write_pptx,
+    "csv": _write_csv,
+}
+
+def write_corpus(directory: str, files_per_format: int = 2, paragraphs: int = 100,
+                 formats: tuple = FORMATS, seed: int = 0) -> list[str]:
+    """
+    Writes the synthetic corpus.
+
+    Args:
+        directory (str): The directory to write the documents into (created if needed).
+        files_per_format (int): The number of documents per format.
+        paragraphs (int): The size of each document, in paragraphs (rows for CSV).
+        formats (tuple): The formats to generate, a subset of FORMATS.
+        seed (int): The random seed; the same seed always produces the same corpus.
+
+    Returns:
+        list[str]: The paths of the written documents.
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for fmt in formats:
+        for i in range(files_per_format):
+            path = os.path.join(directory, f"manual_{i:03d}.{fmt}")
+            # Every file has its own seed, so adding formats or files leaves the others unchanged.
+            _WRITERS[fmt](path, _Writer(f"{seed}-{fmt}-{i}"), paragraphs)
+            paths.append(path)
+    return paths
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory")
+    parser.add_argument("--files-per-format", type=int, default=2)
+    parser.add_argument("--paragraphs", type=int, default=100)
+    parser.add_argument("--formats", nargs="+", default=list(FORMATS), choices=FORMATS)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    paths = write_corpus(args.directory, args.files_per_format, args.paragraphs, tuple(args.formats), args.seed)
+    total_bytes = sum(os.path.getsize(path) for path in paths)
+    print(f"Wrote {len(paths)} files ({total_bytes / 1e6:.1f} MB) to {args.directory}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+# benchmarks/vector_store_benchmark.py
+
+"""
+Compares the vector store backends (ChromaDB, the NumPy memory-mapped store, and
+the NumPy store with an int8 or binary quantized first search stage).
+
+Each backend is filled and then queried in two fresh subprocesses, on the same synthetic data (unit vectors
+and short texts, so no embedding model is needed) and reports:
+- ingest throughput, upserting in batches like the Retrieval Agent does;
+- time to reopen the persisted store;
+- query latency (p50 / p95) for top-k searches;
+- recall@k: the share of the exact top-k (computed by brute force) it returns;
+- the bytes per vector a query scans, and the peak resident memory of a process
+  that reopens the store and queries it.
+
+By default the vectors are drawn around a few hundred cluster centres, which,
+like real embeddings, gives every query a set of clearly nearer neighbours; with
+--data random they are uniform on the sphere, the worst case for quantization.
+
+Usage (from the repository root):
+    python -m benchmarks.vector_store_benchmark --chunks 50000 --queries 200
+    python -m benchmarks.vector_store_benchmark --backends numpy numpy-int8 numpy-binary --chunks 1000000
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKENDS = ("chroma", "numpy", "numpy-int8", "numpy-binary")
+DATA = ("clustered", "random")
+# Number of cluster centres of the clustered data, and the spread of the vectors around them.
+CLUSTERS = 256
+CLUSTER_SPREAD = 1.0
+
+def centroids(dimension: int) -> np.ndarray:
+    return np.random.default_rng(0).standard_normal((CLUSTERS, dimension), dtype=np.float32)
+
+def synthetic_vectors(count: int, dimension: int, batch_size: int, data: str, seed: int):
+    """
+    Generates deterministic unit vectors in batches.
+
+    Yields:
+        np.ndarray: The next batch of at most `batch_size` L2-normalized vectors.
+    """
+    rng = np.random.default_rng(seed)
+    centres = centroids(dimension) if data == "clustered" else None
+    for offset in range(0, count, batch_size):
+        size = min(batch_size, count - offset)
+        vectors = rng.standard_normal((size, dimension), dtype=np.float32)
+        if centres is not None:
+            vectors = centres[rng.integers(0, CLUSTERS, size)] + CLUSTER_SPREAD * vectors
+        yield vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def bytes_per_vector(backend: str, dimension: int) -> int:
+    # What a query scans per stored vector: float32, int8 plus a float32 scale, or one bit per dimension.
+    if backend == "numpy-int8":
+        return dimension + 4
+    if backend == "numpy-binary":
+        return -(-dimension // 8)
+    return 4 * dimension
+
+def ingest_backend(backend: str, path: str, chunks: int, dimension: int, batch_size: int, data: str) -> dict:
+    """
+    Fills a new store of one backend in the current process.
+
+    Returns:
+        dict: The ingest measurements.
+    """
+    sys.path.insert(0, REPO_ROOT)
+    from utils.vector_store import create_vector_store
+
+    store = create_vector_store(backend, path)
+    start = time.perf_counter()
+    offset = 0
+    for vectors in synthetic_vectors(chunks, dimension, batch_size, data, seed=1):
+        size = len(vectors)
+        ids = [f"chunk-{offset + i}" for i in range(size)]
+        store.upsert(ids, [f"Synthetic chunk {offset + i} with part number PN-{offset + i:07d}." for i in range(size)], vectors)
+        offset += size
+    return {"ingest_chunks_per_s": round(chunks / (time.perf_counter() - start), 1)}
+
+def query_backend(backend: str, path: str, dimension: int, queries: int, n_results: int, data: str) -> dict:
+    """
+    Reopens a filled store in the current process, as the app does on startup, and queries it.
+
+    Returns:
+        dict: The query measurements, and the IDs found for every query.
+    """
+    sys.path.insert(0, REPO_ROOT)
+    from utils.vector_store import create_vector_store
+    if backend == "chroma":
+        # Only opening the store is timed, not importing ChromaDB.
+        import chromadb
+
+    start = time.perf_counter()
+    store = create_vector_store(backend, path)
+    open_seconds = time.perf_counter() - start
+
+    query_vectors = next(synthetic_vectors(queries, dimension, queries, data, seed=2))
+    store.query(query_vectors[0], n_results)
+    latencies, result_ids = [], []
+    for vector in query_vectors:
+        start = time.perf_counter()
+        ids, _ = store.query(vector, n_results)
+        latencies.append(time.perf_counter() - start)
+        result_ids.append(ids)
+    latencies.sort()
+
+    # ru_maxrss is reported in kilobytes on Linux. This process only opened and queried the
+    # store, so this is the memory needed to serve it; memory-mapped pages a scan touched count too.
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {
+        "open_ms": round(open_seconds * 1000, 1),
+        "query_p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "query_p95_ms": round(latencies[int(0.95 * (len(latencies) - 1))] * 1000, 2),
+        "scanned_bytes_per_vector": bytes_per_vector(backend, dimension),
+        "query_peak_rss_mb": round(peak_rss_mb, 1),
+        "ids": result_ids,
+    }
+
+def exact_neighbours(chunks: int, dimension: int, queries: int, n_results: int, batch_size: int, data: str) -> list[set]:
+    """
+    Computes the exact top-k chunk IDs of every benchmark query by brute force.
+
+    Returns:
+        list[set]: One set of chunk IDs per query.
+    """
+    query_vectors = next(synthetic_vectors(queries, dimension, queries, data, seed=2))
+    best_scores = np.full((queries, 0), -np.inf, dtype=np.float32)
+    best_rows = np.zeros((queries, 0), dtype=np.int64)
+    offset = 0
+    for vectors in synthetic_vectors(chunks, dimension, batch_size, data, seed=1):
+        # Merge each batch into the running top-k, so the data never has to fit in memory at once.
+        scores = np.concatenate([best_scores, query_vectors @ vectors.T], axis=1)
+        rows = np.concatenate([best_rows, np.broadcast_to(np.arange(offset, offset + len(vectors)), (queries, len(vectors)))], axis=1)
+        top = np.argsort(-scores, axis=1)[:, :n_results]
+        best_scores, best_rows = np.take_along_axis(scores, top, axis=1), np.take_along_axis(rows, top, axis=1)
+        offset += len(vectors)
+    return [{f"chunk-{row}" for row in rows} for rows in best_rows]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--chunks", type=int, default=50_000)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--n-results", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--data", default="clustered", choices=DATA)
+    parser.add_argument("--phase", choices=["ingest", "query"], help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.phase == "ingest":
+        print(json.dumps(ingest_backend(args.backends[0], args.path, args.chunks, args.dimension, args.batch_size, args.data)))
+        return
+    if args.phase == "query":
+        print(json.dumps(query_backend(args.backends[0], args.path, args.dimension, args.queries, args.n_results, args.data)))
+        return
+
+    exact = exact_neighbours(args.chunks, args.dimension, args.queries, args.n_results, args.batch_size, args.data)
+    # Each phase of each backend gets a fresh process, so peak memory is measured independently.
+    for backend in args.backends:
+        path = tempfile.mkdtemp(prefix=f"vector_store_{backend}_")
+        measurements = {"backend": backend, "chunks": args.chunks}
+        for phase in ("ingest", "query"):
+            command = [sys.executable, os.path.abspath(__file__), "--phase", phase, "--path", path, "--backends", backend,
+                       "--chunks", str(args.chunks), "--dimension", str(args.dimension), "--queries", str(args.queries),
+                       "--n-results", str(args.n_results), "--batch-size", str(args.batch_size), "--data", args.data]
+            result = subprocess.run(command, capture_output=True, text=True, check=True)
+            measurements.update(json.loads(result.stdout.strip().splitlines()[-1]))
+        ids = measurements.pop("ids")
+        measurements[f"recall_at_{args.n_results}"] = round(
+            float(np.mean([len(exact_ids & set(found)) / args.n_results for exact_ids, found in zip(exact, ids)])), 4)
+        print(json.dumps(measurements))
+
+if __name__ == "__main__":
+    main()
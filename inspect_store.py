@@ -0,0 +1,400 @@
+# inspect_store.py
+
+"""
+Command-line inspection and maintenance of the vector store.
+
+Every command pages through the store (`VectorStore.iter_chunks`), so memory is
+bounded by the page size, not by the size of the store:
+- list: prints one page of chunks, chosen with --offset and --limit;
+- export: streams the chunks (optionally with their embeddings) to a JSON-lines
+  or Parquet file, one page at a time;
+- stats: chunk counts per source document, texts stored more than once, and the
+  size on disk of the store's files (ChromaDB's SQLite file and HNSW segments, or
+  the NumPy segments), the BM25 index and the embedding cache;
+- compact: deletes every chunk whose text (up to whitespace) repeats an older
+  stored chunk, then reclaims the disk space (VACUUM of ChromaDB's SQLite file,
+  rewrite of the NumPy segments without dead rows).
+
+The store is the one the Retrieval Agent opens (`VECTOR_STORE_BACKEND`), unless
+--backend and --path choose another. Compaction also removes the deleted chunks
+from the BM25 index and records them in the ingestion manifest as skipped
+duplicates of the kept copy, so they are not indexed again. Run it while the
+app is not running.
+
+Parquet export requires pyarrow (`pip install pyarrow`).
+
+Usage:
+    python inspect_store.py list --offset 100 --limit 20
+    python inspect_store.py export chunks.parquet --embeddings
+    python inspect_store.py stats
+    python inspect_store.py compact --dry-run
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+from collections import Counter
+from agents import retrieval_agent
+from utils.embedding_cache import EMBEDDING_CACHE_DIR
+from utils.lexical_index import LEXICAL_INDEX_PATH
+from utils.manifest import source_key
+
+# Define the number of chunks read from the store per page.
+DEFAULT_PAGE_SIZE = 1000
+# Number of embedding values printed per chunk by the list command.
+EMBEDDING_PREVIEW_VALUES = 10
+# Number of most repeated texts shown by the stats command.
+TOP_DUPLICATES = 10
+# Number of characters of a text shown in previews.
+PREVIEW_CHARS = 80
+
+# On-disk file kinds of the vector stores, by file name suffix.
+_FILE_KINDS = {
+    ".sqlite3": "sqlite", ".sqlite3-wal": "sqlite", ".sqlite3-shm": "sqlite",
+    ".f32": "vectors", ".jsonl": "rows", ".i8": "codes", ".i8s": "codes", ".b1": "codes",
+}
+
+# --- Helpers ---
+
+def open_store(args):
+    """
+    Opens the vector store chosen on the command line, through the Retrieval Agent,
+    so that compaction keeps its BM25 index in step.
+
+    Returns:
+        VectorStore: The opened store.
+    """
+    if args.backend:
+        retrieval_agent.VECTOR_STORE_BACKEND = args.backend
+    if args.path:
+        if retrieval_agent.VECTOR_STORE_BACKEND == "chroma":
+            retrieval_agent.CHROMA_PATH = args.path
+        else:
+            retrieval_agent.NUMPY_STORE_PATH = args.path
+    return retrieval_agent.get_vector_store()
+
+def store_path() -> str:
+    # The directory of the store opened by `open_store`.
+    if retrieval_agent.VECTOR_STORE_BACKEND == "chroma":
+        return retrieval_agent.CHROMA_PATH
+    return retrieval_agent.NUMPY_STORE_PATH
+
+def text_digest(text: str) -> bytes:
+    """
+    Hashes a chunk's text after normalizing its whitespace, like the embedding cache.
+
+    A 16-byte digest (instead of the text itself) is all that is kept per distinct text,
+    so finding duplicates in millions of chunks takes little memory.
+    """
+    return hashlib.blake2b(" ".join(text.split()).encode("utf-8"), digest_size=16).digest()
+
+def preview(text: str) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= PREVIEW_CHARS else text[:PREVIEW_CHARS - 3] + "..."
+
+def format_bytes(size: int) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+def directory_size(path: str) -> int:
+    # Total size of the files below a directory (0 if it does not exist).
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            file_path = os.path.join(root, name)
+            if os.path.isfile(file_path):
+                total += os.path.getsize(file_path)
+    return total
+
+def storage_usage(path: str) -> dict:
+    """
+    Measures the files of a vector store directory on disk.
+
+    Files in a subdirectory (ChromaDB's HNSW segments) are counted per segment,
+    the others by kind: the SQLite database, or the NumPy store's vectors, rows
+    and quantized codes.
+
+    Args:
+        path (str): The store directory.
+
+    Returns:
+        dict: Kind or "segment <name>" -> bytes.
+    """
+    usage = Counter()
+    for root, _, files in os.walk(path):
+        relative = os.path.relpath(root, path)
+        for name in files:
+            if relative != ".":
+                kind = f"segment {relative.split(os.sep)[0]}"
+            else:
+                kind = next((kind for suffix, kind in _FILE_KINDS.items() if name.endswith(suffix)), "other")
+            usage[kind] += os.path.getsize(os.path.join(root, name))
+    return dict(sorted(usage.items()))
+
+def source_filter(args) -> dict:
+    # Restricts a command to one document, as stored in the chunks' 'source' metadata.
+    return {"source": source_key(args.source)} if args.source else None
+
+# --- Commands ---
+
+def list_chunks(args) -> int:
+    store = open_store(args)
+    shown = 0
+    for page in store.iter_chunks(min(args.limit, DEFAULT_PAGE_SIZE), args.offset, args.limit,
+                                  source_filter(args), include_embeddings=args.embeddings):
+        for chunk in page:
+            print(f"[{args.offset + shown}] {chunk['id']}")
+            print(f"Document: {chunk['text']}")
+            print(f"Metadata: {chunk['metadata']}")
+            if args.embeddings:
+                print(f"Embedding (first {EMBEDDING_PREVIEW_VALUES} values): "
+                      f"{chunk['embedding'][:EMBEDDING_PREVIEW_VALUES].tolist()}")
+            print()
+            shown += 1
+    print(f"Showed {shown} chunks from offset {args.offset}; the store holds {store.count()}.", file=sys.stderr)
+    return 0
+
+def write_jsonl(pages, path: str) -> int:
+    """
+    Writes chunks to a JSON-lines file, one page at a time.
+
+    Returns:
+        int: The number of chunks written.
+    """
+    written = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for page in pages:
+            for chunk in page:
+                if "embedding" in chunk:
+                    chunk["embedding"] = chunk["embedding"].tolist()
+                f.write(json.dumps(chunk, ensure_ascii=False) + "\n")
+            written += len(page)
+    return written
+
+def write_parquet(pages, path: str, include_embeddings: bool) -> int:
+    """
+    Writes chunks to a Parquet file, one row group per page.
+
+    The metadata keys differ between document formats, so each chunk's metadata
+    is stored as a JSON string column.
+
+    Returns:
+        int: The number of chunks written.
+
+    Raises:
+        RuntimeError: If pyarrow is not installed.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export requires pyarrow: pip install pyarrow")
+
+    fields = [("id", pa.string()), ("text", pa.string()), ("metadata", pa.string())]
+    if include_embeddings:
+        fields.append(("embedding", pa.list_(pa.float32())))
+    schema = pa.schema(fields)
+    written = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        for page in pages:
+            columns = {
+                "id": [chunk["id"] for chunk in page],
+                "text": [chunk["text"] for chunk in page],
+                "metadata": [json.dumps(chunk["metadata"], ensure_ascii=False) for chunk in page],
+            }
+            if include_embeddings:
+                columns["embedding"] = [chunk["embedding"] for chunk in page]
+            writer.write_table(pa.table(columns, schema=schema))
+            written += len(page)
+    return written
+
+def export_chunks(args) -> int:
+    store = open_store(args)
+    output_format = args.format or ("parquet" if args.output.endswith(".parquet") else "jsonl")
+    pages = store.iter_chunks(args.page_size, where=source_filter(args), include_embeddings=args.embeddings)
+    # Write under a temporary name first, so an interrupted export never looks complete.
+    tmp_path = f"{args.output}.tmp"
+    try:
+        if output_format == "parquet":
+            written = write_parquet(pages, tmp_path, args.embeddings)
+        else:
+            written = write_jsonl(pages, tmp_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, args.output)
+    print(f"Exported {written} chunks to {args.output} ({output_format}).", file=sys.stderr)
+    return 0
+
+def collect_stats(store, page_size: int, top: int = TOP_DUPLICATES) -> dict:
+    """
+    Counts chunks per source and texts stored more than once, in one pass over the store
+    (plus a second one for the previews of the most repeated texts).
+
+    Args:
+        store (VectorStore): The store.
+        page_size (int): The number of chunks read per page.
+        top (int): The number of most repeated texts to describe.
+
+    Returns:
+        dict: 'chunks', 'sources' (source -> chunk count, largest first),
+              'distinct_texts', 'repeated_texts' (texts stored more than once),
+              'duplicate_chunks' (chunks that compaction would delete) and
+              'top_duplicates' (the most repeated texts with their count and sources).
+    """
+    sources = Counter()
+    copies = Counter()   # text digest -> number of chunks with that text
+    for page in store.iter_chunks(page_size):
+        for chunk in page:
+            sources[chunk["metadata"].get("source", "")] += 1
+            copies[text_digest(chunk["text"])] += 1
+
+    most_repeated = {digest: count for digest, count in copies.most_common(top) if count > 1}
+    top_duplicates = {}
+    if most_repeated:
+        for page in store.iter_chunks(page_size):
+            for chunk in page:
+                digest = text_digest(chunk["text"])
+                if digest in most_repeated:
+                    entry = top_duplicates.setdefault(digest, {"text": preview(chunk["text"]),
+                                                               "copies": most_repeated[digest], "sources": []})
+                    source = chunk["metadata"].get("source", "")
+                    if source not in entry["sources"]:
+                        entry["sources"].append(source)
+
+    return {
+        "chunks": sum(sources.values()),
+        "sources": dict(sources.most_common()),
+        "distinct_texts": len(copies),
+        "repeated_texts": sum(1 for count in copies.values() if count > 1),
+        "duplicate_chunks": sum(count - 1 for count in copies.values()),
+        "top_duplicates": sorted(top_duplicates.values(), key=lambda entry: -entry["copies"]),
+    }
+
+def show_stats(args) -> int:
+    store = open_store(args)
+    stats = collect_stats(store, args.page_size)
+    path = store_path()
+    stats["storage"] = {
+        "backend": retrieval_agent.VECTOR_STORE_BACKEND,
+        "path": path,
+        "files": storage_usage(path),
+        "total": directory_size(path),
+        "lexical_index": directory_size(LEXICAL_INDEX_PATH),
+        "embedding_cache": directory_size(EMBEDDING_CACHE_DIR),
+    }
+    if args.json:
+        print(json.dumps(stats, indent=2, ensure_ascii=False))
+        return 0
+
+    print(f"Chunks: {stats['chunks']} from {len(stats['sources'])} sources")
+    for source, count in stats["sources"].items():
+        print(f"  {count:>8}  {source or '(no source)'}")
+    print(f"Distinct texts: {stats['distinct_texts']}; {stats['repeated_texts']} stored more than once, "
+          f"{stats['duplicate_chunks']} duplicate chunks")
+    for entry in stats["top_duplicates"]:
+        print(f"  {entry['copies']:>8}x  {entry['text']}")
+        print(f"            in {', '.join(entry['sources'])}")
+    storage = stats["storage"]
+    print(f"Storage ({storage['backend']}, {storage['path']}): {format_bytes(storage['total'])}")
+    for kind, size in storage["files"].items():
+        print(f"  {format_bytes(size):>10}  {kind}")
+    print(f"BM25 index: {format_bytes(storage['lexical_index'])}; "
+          f"embedding cache: {format_bytes(storage['embedding_cache'])}")
+    return 0
+
+def find_exact_duplicates(store, page_size: int, within_source: bool = False) -> dict:
+    """
+    Finds chunks whose text (up to whitespace) repeats another stored chunk.
+    The first copy in store order, i.e. the oldest one, is kept.
+
+    Args:
+        store (VectorStore): The store.
+        page_size (int): The number of chunks read per page.
+        within_source (bool): Only count copies in the same source document as duplicates.
+
+    Returns:
+        dict: The ID of each duplicate chunk -> the ID of the kept copy.
+    """
+    kept = {}         # text digest (and source) -> ID of the kept copy
+    duplicates = {}
+    for page in store.iter_chunks(page_size):
+        for chunk in page:
+            key = text_digest(chunk["text"])
+            if within_source:
+                key = (chunk["metadata"].get("source", ""), key)
+            kept_id = kept.setdefault(key, chunk["id"])
+            if kept_id != chunk["id"]:
+                duplicates[chunk["id"]] = kept_id
+    return duplicates
+
+def compact_store(args) -> int:
+    store = open_store(args)
+    path = store_path()
+    size_before = directory_size(path)
+    duplicates = find_exact_duplicates(store, args.page_size, args.within_source)
+    print(f"Found {len(duplicates)} exact-duplicate chunks among {store.count()}.", file=sys.stderr)
+    if args.dry_run:
+        return 0
+
+    # Imported here, as the Ingestion Agent loads the document parsers.
+    from agents.ingestion_agent import record_duplicates
+
+    # Delete from the store (and the BM25 index) first: should the run be interrupted
+    # before the manifest is updated, the kept copies still hold every text.
+    retrieval_agent.delete_chunks_from_chroma(list(duplicates))
+    recorded = record_duplicates(duplicates)
+    store.compact()
+    print(f"Deleted {len(duplicates)} chunks ({recorded} recorded in the ingestion manifest); "
+          f"store size {format_bytes(size_before)} -> {format_bytes(directory_size(path))}.", file=sys.stderr)
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=["chroma", "numpy", "numpy-int8", "numpy-binary"],
+                        help="Vector store backend (default: the Retrieval Agent's VECTOR_STORE_BACKEND).")
+    parser.add_argument("--path", help="Directory of the vector store (default: the Retrieval Agent's path for the backend).")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = commands.add_parser("list", help="Print one page of chunks.")
+    list_parser.add_argument("--offset", type=int, default=0, help="Number of chunks to skip.")
+    list_parser.add_argument("--limit", type=int, default=20, help="Number of chunks to print.")
+    list_parser.add_argument("--source", help="Only list the chunks of this document.")
+    list_parser.add_argument("--embeddings", action="store_true", help="Also print the first embedding values.")
+    list_parser.set_defaults(handler=list_chunks)
+
+    export_parser = commands.add_parser("export", help="Stream chunks to a JSON-lines or Parquet file.")
+    export_parser.add_argument("output", help="Output file; a .parquet extension selects Parquet.")
+    export_parser.add_argument("--format", choices=["jsonl", "parquet"], help="Output format (default: from the extension).")
+    export_parser.add_argument("--source", help="Only export the chunks of this document.")
+    export_parser.add_argument("--embeddings", action="store_true", help="Also export the embeddings.")
+    export_parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE, help="Chunks read per page.")
+    export_parser.set_defaults(handler=export_chunks)
+
+    stats_parser = commands.add_parser("stats", help="Report chunk counts, duplicate texts and disk usage.")
+    stats_parser.add_argument("--json", action="store_true", help="Print the statistics as JSON.")
+    stats_parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE, help="Chunks read per page.")
+    stats_parser.set_defaults(handler=show_stats)
+
+    compact_parser = commands.add_parser("compact", help="Delete exact-duplicate chunks and reclaim disk space.")
+    compact_parser.add_argument("--dry-run", action="store_true", help="Only count the duplicates.")
+    compact_parser.add_argument("--within-source", action="store_true",
+                                help="Only delete copies that repeat a chunk of the same document.")
+    compact_parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE, help="Chunks read per page.")
+    compact_parser.set_defaults(handler=compact_store)
+
+    args = parser.parse_args()
+    try:
+        sys.exit(args.handler(args))
+    except RuntimeError as e:
+        # e.g. a missing optional dependency
+        print(e, file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,9 @@
-from agents.coordinator_agent import coordinate_chat
+from agents.coordinator_agent import coordinate_chat, coordinate_indexing
 
 if __name__ == "__main__":
     user_question = "Describe the file"
     document_folder = "docs\Cars Datasets 2025.csv"
+    # Questions are answered from indexed documents only, so index them first.
+    coordinate_indexing(document_folder)
     answer = coordinate_chat(user_question, document_folder)
     print("\nFINAL ANSWER:\n", answer)
@@ -0,0 +1,102 @@
+# tests/conftest.py
+
+"""
+Shared fixtures of the test suite. Every test runs offline: the language model is
+the local stub model (utils/stub_llm.py), texts are embedded by a hashing stand-in
+for the sentence-transformer model, and all on-disk state is written to a
+temporary working directory.
+"""
+
+import os
+import re
+import sys
+import zlib
+import numpy as np
+import pytest
+
+# Make the repository's packages importable when pytest is run from any directory.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents import ingestion_agent, llm_response_agent, retrieval_agent
+from utils.answer_cache import answer_cache
+from utils.concurrency import LazyResource
+from utils.llm_backend import LLMBackend
+from utils.stub_llm import StubGenerativeModel
+
+# Seconds the stub model waits before each token; nonzero, so the timings are measurable.
+STUB_TOKEN_DELAY = 0.01
+# Size of the vectors of the hashing embedding engine.
+HASHING_DIMENSION = 64
+
+class HashingEmbeddingEngine:
+    """
+    Offline stand-in for `utils.embeddings.EmbeddingEngine`: a text's vector is the
+    normalized count of its words, each hashed to one of HASHING_DIMENSION axes, so
+    texts sharing words are similar.
+    """
+
+    model_name = "hashing"
+    backend = "test"
+    cache_key = "hashing:test"
+    dimension = HASHING_DIMENSION
+
+    def __init__(self):
+        self.encoded_texts = 0
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in re.findall(r"\w+", text.lower()):
+                vectors[row, zlib.crc32(word.encode("utf-8")) % self.dimension] += 1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        self.encoded_texts += len(texts)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def __call__(self, input: list[str]) -> np.ndarray:
+        return self.encode(list(input))
+
+@pytest.fixture(autouse=True)
+def working_directory(tmp_path, monkeypatch):
+    # The agents resolve their databases, manifest and trace file relative to the working directory.
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+def _reset_retrieval_state():
+    # The agents' resources are opened once per process; tests start from a clean slate.
+    for resource in (retrieval_agent._embedding_cache, retrieval_agent._vector_store, retrieval_agent._lexical_index):
+        resource.reset()
+    retrieval_agent.embed_query.cache_clear()
+    retrieval_agent._skipped_duplicates.cache_clear()
+    answer_cache.clear()
+
+@pytest.fixture
+def offline_retrieval(monkeypatch):
+    """
+    Runs ingestion and retrieval without the embedding model: texts are embedded by a
+    HashingEmbeddingEngine, chunks are stored in the NumPy vector store, and documents
+    are parsed in-process. The agents' databases are opened in the test's directory.
+
+    Returns:
+        HashingEmbeddingEngine: The engine used by the Retrieval Agent.
+    """
+    engine = HashingEmbeddingEngine()
+    monkeypatch.setattr(retrieval_agent, "embedding_engine", engine)
+    monkeypatch.setattr(retrieval_agent, "VECTOR_STORE_BACKEND", "numpy")
+    monkeypatch.setattr(ingestion_agent, "PARSE_WORKERS", 1)
+    _reset_retrieval_state()
+    yield engine
+    _reset_retrieval_state()
+
+@pytest.fixture
+def stub_llm(monkeypatch):
+    """
+    Replaces the LLM Response Agent's backend with the stub model, streaming its
+    fixed answer with STUB_TOKEN_DELAY seconds per token.
+
+    Returns:
+        StubGenerativeModel: A model configured like the ones the backend uses.
+    """
+    model = StubGenerativeModel(token_delay=STUB_TOKEN_DELAY)
+    monkeypatch.setattr(llm_response_agent, "_llm",
+                        LazyResource(lambda: LLMBackend(lambda: StubGenerativeModel(token_delay=STUB_TOKEN_DELAY))))
+    return model
@@ -0,0 +1,89 @@
+# tests/test_batch_qa.py
+
+"""
+Tests of batch question answering: the RETRIEVE_BATCH pipeline behind
+`coordinate_batch_async` and the batch_qa.py command line.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import pytest
+import batch_qa
+from agents import coordinator_agent
+
+QUESTIONS = [
+    "What torque for the flange bolts?",
+    "How is the pump primed?",
+    "When is the gasket replaced?",
+]
+
+def write_manual(document_path: str = "Documents"):
+    os.makedirs(document_path, exist_ok=True)
+    with open(os.path.join(document_path, "manual.txt"), "w", encoding="utf-8") as f:
+        f.write("The flange bolts are tightened to 40 Nm in a cross pattern. "
+                "Prime the pump with water before the first start. "
+                "Replace the gasket of the inspection cover every 500 hours.")
+
+def answer_all(questions: list[str], **kwargs) -> list[dict]:
+    # Collects every result of one batch; a hang fails the test instead of blocking it.
+    async def collect():
+        return [result async for result in coordinator_agent.coordinate_batch_async(questions, "Documents", **kwargs)]
+    return asyncio.run(asyncio.wait_for(collect(), timeout=60))
+
+def spy_requests(monkeypatch) -> list[dict]:
+    # Records the messages the coordinator sends through the bus asynchronously.
+    sent = []
+    request_async = coordinator_agent.bus.request_async
+    async def spy(message):
+        sent.append(message)
+        return await request_async(message)
+    monkeypatch.setattr(coordinator_agent.bus, "request_async", spy)
+    return sent
+
+def test_batch_qa_writes_one_line_per_question(offline_retrieval, stub_llm):
+    write_manual()
+    with open("questions.jsonl", "w", encoding="utf-8") as f:
+        f.writelines(json.dumps({"id": f"q{index}", "question": question}) + "\n" for index, question in enumerate(QUESTIONS))
+    args = argparse.Namespace(questions="questions.jsonl", output="answers.jsonl", documents="Documents",
+                              concurrency=2, batch_size=2)
+    assert asyncio.run(batch_qa.run(args)) == 0
+
+    with open("answers.jsonl", encoding="utf-8") as f:
+        results = [json.loads(line) for line in f]
+    assert sorted(result["id"] for result in results) == ["q0", "q1", "q2"]
+    for result in results:
+        assert result["question"] == QUESTIONS[result["index"]]
+        assert not result["error"] and result["answer"] and result["chunk_ids"]
+
+def test_batch_retrieves_in_slices_and_reuses_cached_answers(offline_retrieval, stub_llm, monkeypatch):
+    write_manual()
+    answer_all(QUESTIONS, retrieve_batch_size=2)
+
+    sent = spy_requests(monkeypatch)
+    results = answer_all(QUESTIONS, retrieve_batch_size=2)
+    batches = [message["payload"]["questions"] for message in sent if message["type"] == "RETRIEVE_BATCH"]
+    assert batches == [QUESTIONS[:2], QUESTIONS[2:]]
+    # The answers of the first run are served from the answer cache.
+    assert all(result["cached"] and not result["error"] for result in results)
+    assert not [message for message in sent if message["type"] == "GENERATE_RESPONSE"]
+
+def test_questions_without_context_do_not_reach_the_llm(offline_retrieval, stub_llm, monkeypatch):
+    write_manual()
+    sent = spy_requests(monkeypatch)
+    results = answer_all(QUESTIONS, sources=["Documents/missing.txt"])
+    assert sorted(result["index"] for result in results) == [0, 1, 2]
+    assert all(result["error"] and result["answer"] == coordinator_agent.NO_DOCUMENTS_MESSAGE for result in results)
+    assert not [message for message in sent if message["type"] == "GENERATE_RESPONSE"]
+
+def test_producer_failure_is_raised_to_the_consumer(offline_retrieval, stub_llm, monkeypatch):
+    write_manual()
+    request_async = coordinator_agent.bus.request_async
+    async def broken_batch(message):
+        if message["type"] == "RETRIEVE_BATCH":
+            return {"payload": {"results": None}}
+        return await request_async(message)
+    monkeypatch.setattr(coordinator_agent.bus, "request_async", broken_batch)
+    with pytest.raises(TypeError):
+        answer_all(QUESTIONS)
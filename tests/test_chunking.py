@@ -0,0 +1,94 @@
+# tests/test_chunking.py
+
+"""
+Tests of chunking: sentence splitting, sliding windows of sentences, chunk offsets
+across records, and re-chunking when the chunking settings change.
+"""
+
+import functools
+import os
+from agents import ingestion_agent
+from utils import file_loader
+from utils.manifest import load_manifest, source_key
+from utils.text import CHARS_PER_TOKEN, sentence_spans, sliding_window_spans
+
+def sentences(count: int) -> str:
+    return " ".join(f"Step {i:02d} of the procedure checks valve {i:02d}." for i in range(count))
+
+def ingest_batches() -> list[dict]:
+    # Runs one complete ingestion of the document folder, committing the manifest.
+    return list(ingestion_agent.iter_ingestion_batches("Documents"))
+
+def test_sentence_spans():
+    text = '  Check the seal.  Is it dry?! "Replace it." Then restart\nthe pump  '
+    assert [text[start:end] for start, end in sentence_spans(text)] == [
+        "Check the seal.", "Is it dry?!", '"Replace it."', "Then restart", "the pump",
+    ]
+    assert sentence_spans("   ") == []
+
+def test_windows_respect_the_target_and_overlap():
+    text = sentences(30)
+    spans = sentence_spans(text)
+    starts, ends = {start for start, _ in spans}, {end for _, end in spans}
+    windows = sliding_window_spans(text, target_tokens=30, overlap_tokens=12)
+    assert len(windows) > 1
+
+    for (start, end), (next_start, next_end) in zip(windows, windows[1:]):
+        # Consecutive windows overlap by at most the overlap size, and always move forward.
+        assert start < next_start < next_end and end - next_start <= 12 * CHARS_PER_TOKEN
+        assert next_start < end
+    for start, end in windows:
+        assert end - start <= 30 * CHARS_PER_TOKEN
+        assert start in starts and end in ends
+    # Together, the windows cover every sentence.
+    assert windows[0][0] == spans[0][0] and windows[-1][1] == spans[-1][1]
+
+def test_windows_without_overlap_do_not_repeat_sentences():
+    text = sentences(30)
+    windows = sliding_window_spans(text, target_tokens=30, overlap_tokens=0)
+    assert all(end < next_start for (_, end), (next_start, _) in zip(windows, windows[1:]))
+
+def test_sentences_longer_than_a_window_are_cut_at_word_boundaries():
+    long_sentence = " ".join(f"word{i}" for i in range(200)) + "."
+    text = "A short start. " + long_sentence + " A short end."
+    windows = sliding_window_spans(text, target_tokens=25, overlap_tokens=5)
+    assert all(end - start <= 25 * CHARS_PER_TOKEN for start, end in windows)
+    for start, end in windows:
+        assert start == 0 or text[start - 1] == " "
+        assert end == len(text) or text[end] == " "
+    # No word of the long sentence is lost.
+    covered = {word.rstrip(".") for start, end in windows for word in text[start:end].split()}
+    assert {f"word{i}" for i in range(200)} <= covered
+
+def test_chunk_offsets_span_the_concatenated_records():
+    records = [{"source": "manual.pdf", "page": page, "text": sentences(20) + "\n"} for page in (1, 2)]
+    text = "".join(record["text"] for record in records)
+    chunks = list(file_loader.chunk_records(records, target_tokens=40, overlap_tokens=10, min_chunk_length=50))
+    assert {record["page"] for _, _, record in chunks} == {1, 2}
+    for offset, chunk, record in chunks:
+        assert text[offset:offset + len(chunk)] == chunk
+        # A chunk never spans two records.
+        page_start = 0 if record["page"] == 1 else len(records[0]["text"])
+        assert page_start <= offset and offset + len(chunk) <= page_start + len(record["text"])
+    # Chunks shorter than the minimum length are dropped.
+    assert list(file_loader.chunk_records([{"source": "a.txt", "page": None, "text": "Too short."}])) == []
+
+def test_changed_chunking_signature_re_chunks_unchanged_files(monkeypatch):
+    os.makedirs("Documents")
+    with open("Documents/pump.txt", "w", encoding="utf-8") as f:
+        f.write(sentences(60))
+    old_ids = {chunk["id"] for batch in ingest_batches() for chunk in batch["chunks"]}
+
+    # Smaller chunks alone do not touch a file the manifest says was chunked with the current settings.
+    monkeypatch.setattr(ingestion_agent, "chunk_records",
+                        functools.partial(file_loader.chunk_records, target_tokens=50, overlap_tokens=10))
+    assert not [chunk for batch in ingest_batches() for chunk in batch["chunks"]]
+
+    monkeypatch.setattr(ingestion_agent, "CHUNKING_SIGNATURE", "sentences:50:10:test")
+    changes = ingest_batches()
+    new_ids = {chunk["id"] for batch in changes for chunk in batch["chunks"]}
+    deleted_ids = {chunk_id for batch in changes for chunk_id in batch["deleted_ids"]}
+    assert len(new_ids) > len(old_ids)
+    assert deleted_ids == old_ids - new_ids
+    entry = load_manifest()["files"][source_key("Documents/pump.txt")]
+    assert entry["chunking"] == "sentences:50:10:test" and set(entry["chunks"]) == new_ids
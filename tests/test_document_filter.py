@@ -0,0 +1,37 @@
+# tests/test_document_filter.py
+
+"""
+Tests of restricting a retrieval to chosen documents when some of their chunks
+were skipped as near duplicates of another document's chunks.
+"""
+
+import numpy as np
+from agents import retrieval_agent
+from utils.manifest import MANIFEST_VERSION, make_chunk_id, save_manifest, source_key
+from utils.vector_store import NumpyVectorStore
+
+def indexed_copies(monkeypatch) -> tuple:
+    # Two identical copies of a one-chunk document: only the first copy's chunk is
+    # stored, and the manifest records the second copy's chunk as its duplicate.
+    original, copy = source_key("Documents/v1/manual.txt"), source_key("Documents/v2/manual.txt")
+    original_id, copy_id = make_chunk_id(original, 0), make_chunk_id(copy, 0)
+    store = NumpyVectorStore("vector_store")
+    store.upsert([original_id], ["Torque the flange bolts to 40 Nm."], np.ones((1, 4), dtype=np.float32),
+                 [{"source": original, "start": 0, "end": 33}])
+    save_manifest({"version": MANIFEST_VERSION, "files": {
+        original: {"chunks": {original_id: "hash"}, "duplicates": {}},
+        copy: {"chunks": {}, "duplicates": {copy_id: original_id}},
+    }})
+    monkeypatch.setattr(retrieval_agent, "get_vector_store", lambda: store)
+    return store, original_id
+
+def test_filter_of_a_copy_matches_the_chunks_it_duplicates(monkeypatch):
+    store, original_id = indexed_copies(monkeypatch)
+    where = retrieval_agent.document_filter(["Documents/v2/manual.txt"])
+    assert store.find(where) == [original_id]
+    assert store.query(np.ones(4, dtype=np.float32), 3, where)[0] == [original_id]
+
+def test_filter_of_the_original_is_unchanged(monkeypatch):
+    indexed_copies(monkeypatch)
+    where = retrieval_agent.document_filter(["Documents/v1/manual.txt"], {"page": 1})
+    assert where == {"$and": [{"source": {"$in": [source_key("Documents/v1/manual.txt")]}}, {"page": 1}]}
@@ -0,0 +1,75 @@
+# tests/test_embedding_cache.py
+
+"""
+Tests of the persistent embedding cache: LRU eviction and the reuse of its slots,
+hit and miss counters, and persistence across reopening and CLEAR_ALL_DATA.
+"""
+
+import os
+import numpy as np
+from agents import coordinator_agent, retrieval_agent
+from utils.embedding_cache import EmbeddingCache, text_key
+
+# Dimension of the test vectors.
+DIMENSION = 8
+# Model name the test vectors are cached under.
+MODEL = "test-model"
+
+def vector(text: str) -> np.ndarray:
+    # A distinct vector per text, seeded by its characters.
+    return np.random.default_rng(sum(map(ord, text))).standard_normal(DIMENSION).astype(np.float32)
+
+def put(cache: EmbeddingCache, texts: list[str]):
+    cache.put_many(MODEL, texts, np.stack([vector(text) for text in texts]))
+
+def slots(cache: EmbeddingCache) -> dict:
+    # Text hash -> slot of every cached vector.
+    return dict(cache._db.execute("SELECT text_hash, slot FROM entries"))
+
+def test_least_recently_used_entries_are_evicted_into_their_slots(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache"), dimension=DIMENSION, max_entries=4)
+    put(cache, ["a", "b", "c", "d"])
+    cache.get_many(MODEL, ["a"])
+    old_slots = slots(cache)
+
+    put(cache, ["e", "f"])
+    results = dict(zip("abcdef", cache.get_many(MODEL, list("abcdef"))))
+    assert results["b"] is None and results["c"] is None
+    for text in "adef":
+        assert np.array_equal(results[text], vector(text))
+    # The new vectors took over the evicted slots; the file never grows past the capacity.
+    new_slots = slots(cache)
+    assert {new_slots[text_key("e")], new_slots[text_key("f")]} == {old_slots[text_key("b")], old_slots[text_key("c")]}
+    assert new_slots[text_key("a")] == old_slots[text_key("a")]
+    assert os.path.getsize(os.path.join(cache.path, "vectors.f32")) == 4 * DIMENSION * 4
+    assert cache.stats()["entries"] == 4
+
+def test_counters_and_reopening(tmp_path):
+    path = str(tmp_path / "cache")
+    cache = EmbeddingCache(path, dimension=DIMENSION, max_entries=10)
+    put(cache, ["pump", "fan"])
+    assert [result is None for result in cache.get_many(MODEL, ["pump", "valve", "fan"])] == [False, True, False]
+    # Vectors of another model are not shared.
+    assert cache.get_many("other-model", ["pump"]) == [None]
+    assert cache.stats() == {"hits": 2, "misses": 2, "entries": 2, "max_entries": 10}
+
+    # Whitespace does not change a text's key, and the vectors survive reopening.
+    reopened = EmbeddingCache(path, dimension=DIMENSION, max_entries=10)
+    assert np.array_equal(reopened.get_many(MODEL, ["  pump\n"])[0], vector("pump"))
+    assert reopened.stats()["entries"] == 2
+    # A cache written with another vector size is emptied.
+    assert EmbeddingCache(path, dimension=DIMENSION * 2).get_many(MODEL, ["pump"]) == [None]
+
+def test_cache_survives_clear_all_data(offline_retrieval):
+    chunks = [{"id": f"chunk-{i}", "text": f"Step {i} checks valve {i * 7}.", "metadata": {"source": "manual.txt", "start": i}}
+              for i in range(5)]
+    retrieval_agent.add_chunks_to_chroma(chunks)
+    encoded = offline_retrieval.encoded_texts
+    os.makedirs("Documents", exist_ok=True)
+    coordinator_agent.coordinate_chat("CLEAR_ALL_DATA", "Documents")
+    assert retrieval_agent.get_vector_store().count() == 0
+
+    # Re-adding the same texts reads their vectors from the cache instead of the model.
+    retrieval_agent.add_chunks_to_chroma(chunks)
+    assert offline_retrieval.encoded_texts == encoded
+    assert retrieval_agent.get_vector_store().count() == len(chunks)
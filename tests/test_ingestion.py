@@ -0,0 +1,135 @@
+# tests/test_ingestion.py
+
+"""
+Tests of incremental ingestion: which chunk changes the manifest lets through,
+and when the manifest is committed.
+"""
+
+import os
+import threading
+import uuid
+from agents import coordinator_agent, ingestion_agent, retrieval_agent
+from utils.manifest import MANIFEST_PATH, load_manifest, source_key
+from utils.mcp import create_mcp_message
+
+def write_document(path: str, topic: str, sentences: int = 60):
+    # A document long enough for several chunks, with sentences distinct enough not to be near duplicates.
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(" ".join(f"Step {i} of the {topic} procedure checks valve {i * 7} and gauge {i * 13}."
+                         for i in range(sentences)))
+
+def ingest(document_path: str) -> tuple[list[dict], list[str]]:
+    # Runs one complete ingestion (committing the manifest) and returns its chunks and deleted IDs.
+    chunks, deleted_ids = [], []
+    for batch in ingestion_agent.iter_ingestion_batches(document_path, batch_size=4):
+        chunks.extend(batch["chunks"])
+        deleted_ids.extend(batch["deleted_ids"])
+    return chunks, deleted_ids
+
+def test_unchanged_file_yields_no_chunks():
+    write_document("Documents/pump.txt", "pump")
+    chunks, _ = ingest("Documents")
+    assert len(chunks) > 1
+
+    assert ingest("Documents") == ([], [])
+    # Touching the file without changing its content does not re-chunk it either.
+    os.utime("Documents/pump.txt")
+    assert ingest("Documents") == ([], [])
+
+def test_modified_file_replaces_its_chunks():
+    write_document("Documents/pump.txt", "pump")
+    old_chunks, _ = ingest("Documents")
+    write_document("Documents/pump.txt", "compressor", sentences=30)
+    new_chunks, deleted_ids = ingest("Documents")
+
+    old_ids, new_ids = {chunk["id"] for chunk in old_chunks}, {chunk["id"] for chunk in new_chunks}
+    assert new_chunks and all("compressor" in chunk["text"] for chunk in new_chunks)
+    # Chunks at the old offsets are overwritten, the ones beyond the shorter text are deleted.
+    assert set(deleted_ids) == old_ids - new_ids and deleted_ids
+    assert set(load_manifest()["files"][source_key("Documents/pump.txt")]["chunks"]) == new_ids
+
+def test_deleted_file_sends_delete_chunks(offline_retrieval, monkeypatch):
+    write_document("Documents/pump.txt", "pump")
+    write_document("Documents/fan.txt", "fan")
+    coordinator_agent.coordinate_indexing("Documents")
+    pump_ids = retrieval_agent.get_vector_store().find({"source": source_key("Documents/pump.txt")})
+    assert pump_ids
+
+    sent = []
+    request = coordinator_agent.bus.request
+    monkeypatch.setattr(coordinator_agent.bus, "request", lambda message: sent.append(message) or request(message))
+    os.remove("Documents/pump.txt")
+    coordinator_agent.coordinate_indexing("Documents")
+
+    deletions = [message for message in sent if message["type"] == "DELETE_CHUNKS"]
+    assert [chunk_id for message in deletions for chunk_id in message["payload"]["ids"]] == pump_ids
+    assert not [message for message in sent if message["type"] == "ADD_CHUNKS"]
+    assert retrieval_agent.get_vector_store().find({"source": source_key("Documents/pump.txt")}) == []
+    assert source_key("Documents/pump.txt") not in load_manifest()["files"]
+
+def test_interrupted_stream_does_not_save_the_manifest():
+    write_document("Documents/pump.txt", "pump")
+    message = create_mcp_message("Test", "IngestionAgent", "INGEST", {"document_path": "Documents"}, str(uuid.uuid4()))
+
+    # Stopped after the first batch of chunks.
+    responses = ingestion_agent.stream_message(message)
+    next(response for response in responses if response["payload"].get("chunks"))
+    responses.close()
+    assert not os.path.exists(MANIFEST_PATH)
+
+    # Stopped right after INGESTION_COMPLETE, before asking for more.
+    responses = ingestion_agent.stream_message(message)
+    for response in responses:
+        if response["type"] == "INGESTION_COMPLETE":
+            break
+    responses.close()
+    assert not os.path.exists(MANIFEST_PATH)
+
+    # The next complete run still sees every chunk as new.
+    chunks, _ = ingest("Documents")
+    assert chunks and os.path.exists(MANIFEST_PATH)
+
+def test_forgetting_a_document_does_not_wait_for_a_running_ingestion():
+    write_document("Documents/pump.txt", "pump")
+    write_document("Documents/fan.txt", "fan")
+    ingest("Documents")
+    write_document("Documents/fan.txt", "blower")
+
+    # An ingestion run is paused between two batches, holding the ingestion lock.
+    batches = ingestion_agent.iter_ingestion_batches("Documents", batch_size=4)
+    next(batches)
+    forgotten = []
+    forget = threading.Thread(target=lambda: forgotten.append(ingestion_agent.forget_document("Documents/pump.txt")))
+    forget.start()
+    forget.join(timeout=10)
+    assert forgotten and forgotten[0]["chunk_ids"]
+
+    # The run's commit keeps its own changes, but not the forgotten document.
+    for _ in batches:
+        pass
+    files = load_manifest()["files"]
+    assert source_key("Documents/pump.txt") not in files
+    assert source_key("Documents/fan.txt") in files
+
+def test_delete_document_does_not_wait_for_the_ingestion_agent(offline_retrieval):
+    write_document("Documents/pump.txt", "pump")
+    write_document("Documents/fan.txt", "fan")
+    coordinator_agent.coordinate_indexing("Documents")
+    write_document("Documents/fan.txt", "blower")
+
+    # The IngestionAgent's only worker is busy with a stream that is not consumed.
+    message = create_mcp_message("Test", "IngestionAgent", "INGEST", {"document_path": "Documents"}, str(uuid.uuid4()))
+    responses = coordinator_agent.bus.stream(message, window=1)
+    try:
+        next(responses)
+        os.remove("Documents/pump.txt")
+        deleted = []
+        delete = threading.Thread(target=lambda: deleted.append(coordinator_agent.delete_document("Documents/pump.txt")))
+        delete.start()
+        delete.join(timeout=10)
+        assert deleted and deleted[0] > 0
+    finally:
+        responses.close()
+    assert retrieval_agent.get_vector_store().find({"source": source_key("Documents/pump.txt")}) == []
+    assert source_key("Documents/pump.txt") not in load_manifest()["files"]
@@ -0,0 +1,80 @@
+# tests/test_inspect_store.py
+
+"""
+Tests of the inspect_store.py command line against a small NumPy vector store:
+paging, export, and compaction of exact-duplicate chunks.
+"""
+
+import json
+import sys
+import pytest
+import inspect_store
+from agents import retrieval_agent
+from utils.manifest import MANIFEST_VERSION, load_manifest, save_manifest, source_key
+
+def add_chunks(count: int, texts: list[str] = None) -> list[dict]:
+    # Stores `count` chunks of manual.txt (or one per given text) and returns them.
+    texts = texts or [f"Step {i} of the pump procedure checks valve {i * 7}." for i in range(count)]
+    chunks = [{"id": f"chunk-{i}", "text": text, "metadata": {"source": source_key("manual.txt"), "start": i * 100}}
+              for i, text in enumerate(texts)]
+    retrieval_agent.add_chunks_to_chroma(chunks)
+    return chunks
+
+def run_cli(monkeypatch, *argv) -> int:
+    # Runs the command line on the Retrieval Agent's NumPy store. The agent's settings
+    # are restored after the test, as the command line changes them.
+    monkeypatch.setattr(retrieval_agent, "NUMPY_STORE_PATH", retrieval_agent.NUMPY_STORE_PATH)
+    monkeypatch.setattr(sys, "argv", ["inspect_store.py", "--backend", "numpy", "--path", retrieval_agent.NUMPY_STORE_PATH, *argv])
+    with pytest.raises(SystemExit) as exit_info:
+        inspect_store.main()
+    return exit_info.value.code
+
+def test_list_prints_one_page(offline_retrieval, monkeypatch, capsys):
+    chunks = add_chunks(12)
+    assert run_cli(monkeypatch, "list", "--offset", "5", "--limit", "4") == 0
+    output = capsys.readouterr()
+    listed = [line.split()[1] for line in output.out.splitlines() if line.startswith("[")]
+    assert listed == [chunk["id"] for chunk in chunks[5:9]]
+    assert f"Document: {chunks[5]['text']}" in output.out
+    assert "Showed 4 chunks from offset 5; the store holds 12." in output.err
+
+def test_export_to_parquet_and_json_lines(offline_retrieval, monkeypatch):
+    parquet = pytest.importorskip("pyarrow.parquet")
+    chunks = add_chunks(12)
+    assert run_cli(monkeypatch, "export", "chunks.parquet", "--embeddings", "--page-size", "5") == 0
+
+    exported = parquet.ParquetFile("chunks.parquet")
+    # One row group per page.
+    assert exported.metadata.num_row_groups == 3
+    table = exported.read().to_pylist()
+    assert [row["id"] for row in table] == [chunk["id"] for chunk in chunks]
+    assert [json.loads(row["metadata"]) for row in table] == [chunk["metadata"] for chunk in chunks]
+    embeddings = retrieval_agent.get_vector_store().get_embeddings(["chunk-3"])
+    assert table[3]["embedding"] == pytest.approx(embeddings["chunk-3"].tolist())
+
+    assert run_cli(monkeypatch, "export", "chunks.jsonl", "--source", "manual.txt") == 0
+    with open("chunks.jsonl", encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f]
+    assert [row["text"] for row in rows] == [chunk["text"] for chunk in chunks]
+    assert "embedding" not in rows[0]
+
+def test_compact_deletes_exact_duplicates(offline_retrieval, monkeypatch):
+    texts = ["Prime the pump with water.", "Check the seal.", "Prime  the pump\nwith water.", "Check the seal."]
+    add_chunks(len(texts), texts)
+    key = source_key("manual.txt")
+    save_manifest({"version": MANIFEST_VERSION, "files": {
+        key: {"chunks": {f"chunk-{i}": "hash" for i in range(len(texts))}, "duplicates": {}},
+    }})
+
+    assert run_cli(monkeypatch, "compact", "--dry-run") == 0
+    assert retrieval_agent.get_vector_store().count() == 4
+
+    assert run_cli(monkeypatch, "compact") == 0
+    store = retrieval_agent.get_vector_store()
+    assert store.count() == 2 and store._dead_rows == 0
+    assert sorted(store.get(["chunk-0", "chunk-1", "chunk-2", "chunk-3"])) == ["chunk-0", "chunk-1"]
+    # The BM25 index forgets the deleted copies, and the manifest records them as duplicates.
+    assert [chunk_id for chunk_id, _ in retrieval_agent.get_lexical_index().search("seal")] == ["chunk-1"]
+    entry = load_manifest()["files"][key]
+    assert sorted(entry["chunks"]) == ["chunk-0", "chunk-1"]
+    assert entry["duplicates"] == {"chunk-2": "chunk-0", "chunk-3": "chunk-1"}
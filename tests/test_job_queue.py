@@ -0,0 +1,89 @@
+# tests/test_job_queue.py
+
+"""
+Tests of the persistent background job queue: the state file, resuming unfinished
+jobs when the queue is opened, and cancellation.
+"""
+
+import json
+import threading
+import time
+from utils.job_queue import CANCELLED, COMPLETED, QUEUED, RUNNING, JobCancelled, JobQueue
+
+def gated_runner(gate: threading.Event) -> tuple:
+    # A runner that reports progress, then works until the gate opens or its job is cancelled.
+    started = []
+    def runner(params, report, cancelled):
+        started.append(params["name"])
+        report({"name": params["name"]})
+        while not gate.is_set():
+            if cancelled.wait(0.01):
+                raise JobCancelled()
+        return params["name"].upper()
+    return runner, started
+
+def open_gate() -> threading.Event:
+    gate = threading.Event()
+    gate.set()
+    return gate
+
+def test_finished_jobs_are_kept_in_the_state_file(tmp_path):
+    path = str(tmp_path / "jobs.json")
+    jobs = JobQueue(path, gated_runner(open_gate())[0])
+    job_id = jobs.submit(name="pump")
+    assert jobs.wait(job_id, timeout=10)["status"] == COMPLETED
+
+    with open(path, encoding="utf-8") as f:
+        assert [job["id"] for job in json.load(f)["jobs"]] == [job_id]
+    reopened = JobQueue(path, gated_runner(open_gate())[0])
+    job = reopened.get(job_id)
+    assert job["status"] == COMPLETED and job["result"] == "PUMP" and job["progress"] == {"name": "pump"}
+    assert not reopened.active()
+
+def test_unfinished_jobs_resume_when_the_queue_is_opened(tmp_path):
+    path = str(tmp_path / "jobs.json")
+    gate = threading.Event()
+    runner, started = gated_runner(gate)
+    jobs = JobQueue(path, runner)
+    running_id, queued_id = jobs.submit(name="pump"), jobs.submit(name="fan")
+    # An identical job that has not started yet is not queued twice.
+    assert jobs.submit(name="fan") == queued_id
+    while jobs.get(running_id)["status"] != RUNNING:
+        time.sleep(0.01)
+
+    # A second queue opened on the same file, as after a restart, runs both jobs again.
+    resumed_runner, resumed = gated_runner(open_gate())
+    reopened = JobQueue(path, resumed_runner)
+    for job_id in (running_id, queued_id):
+        job = reopened.wait(job_id, timeout=10)
+        assert job["status"] == COMPLETED and job["resumed"]
+    assert resumed == ["pump", "fan"]
+    gate.set()
+    jobs.cancel_all(wait=True, timeout=10)
+
+def test_cancel_stops_running_and_queued_jobs(tmp_path):
+    gate = threading.Event()
+    runner, started = gated_runner(gate)
+    jobs = JobQueue(str(tmp_path / "jobs.json"), runner)
+    running_id, queued_id = jobs.submit(name="pump"), jobs.submit(name="fan")
+
+    assert jobs.cancel(queued_id)
+    assert jobs.get(queued_id)["status"] == CANCELLED
+    assert jobs.cancel(running_id)
+    assert jobs.wait(running_id, timeout=10)["status"] == CANCELLED
+    # The queued job never started, and finished jobs cannot be cancelled again.
+    assert started == ["pump"]
+    assert not jobs.cancel(running_id) and not jobs.active()
+
+def test_cancel_all_waits_for_the_running_jobs(tmp_path):
+    gate = threading.Event()
+    runner, started = gated_runner(gate)
+    jobs = JobQueue(str(tmp_path / "jobs.json"), runner, workers=2)
+    job_ids = [jobs.submit(name=name) for name in ("pump", "fan", "valve")]
+    while len(started) < 2:
+        time.sleep(0.01)
+    assert jobs.get(job_ids[2])["status"] == QUEUED
+
+    jobs.cancel_all(wait=True, timeout=10)
+    assert [jobs.get(job_id)["status"] for job_id in job_ids] == [CANCELLED] * 3
+    assert not jobs.active() and sorted(started) == ["fan", "pump"]
@@ -0,0 +1,78 @@
+# tests/test_lexical_index.py
+
+"""
+Tests of the BM25 index: tokenization, persistence through snapshots and the
+operations log, filtered searches, and reciprocal rank fusion.
+"""
+
+import os
+from utils import lexical_index
+from utils.lexical_index import BM25Index, reciprocal_rank_fusion, tokenize
+
+CHUNKS = [
+    {"id": "pump-0", "text": "Replace seal kit PN-001-042 on the feed pump.", "metadata": {"source": "pump.txt", "page": 1}},
+    {"id": "pump-1", "text": "The feed pump runs at 1450 rpm.", "metadata": {"source": "pump.txt", "page": 2}},
+    {"id": "fan-0", "text": "The fan uses seal kit PN-002-007 since firmware v2.5.", "metadata": {"source": "fan.txt", "page": 1}},
+    {"id": "fan-1", "text": "Clean the fan blades every month.", "metadata": {"source": "fan.txt", "page": 1}},
+]
+
+def ids(results: list) -> list[str]:
+    return [chunk_id for chunk_id, _ in results]
+
+def test_compound_identifiers_are_indexed_whole_and_in_parts():
+    assert tokenize("Order PN-001-042 for the v2.5 unit_c/d") == [
+        "order", "pn-001-042", "pn", "001", "042", "v2.5", "v2", "5", "unit_c/d", "unit", "c", "d",
+    ]
+    index = BM25Index("index")
+    index.add(CHUNKS)
+    assert ids(index.search("PN-001-042"))[0] == "pump-0"
+    assert ids(index.search("042")) == ["pump-0"]
+    assert ids(index.search("firmware v2.5"))[0] == "fan-0"
+
+def test_reopened_index_replays_the_operations_log():
+    index = BM25Index("index")
+    index.add(CHUNKS)
+    index._compact()
+    # Operations after the snapshot only live in the log.
+    index.delete(["pump-1"])
+    index.add([{"id": "fan-1", "text": "Lubricate the fan bearing yearly.", "metadata": {"source": "fan.txt"}}])
+    assert os.path.exists(os.path.join("index", "snapshot.pkl")) and os.path.exists(os.path.join("index", "operations.log"))
+
+    reopened = BM25Index("index")
+    assert len(reopened) == 3
+    assert reopened.search("rpm") == [] and reopened.search("blades") == []
+    assert ids(reopened.search("bearing")) == ["fan-1"]
+    assert reopened.search("seal kit", 10) == index.search("seal kit", 10)
+
+def test_log_is_folded_into_a_snapshot_at_the_threshold(monkeypatch):
+    monkeypatch.setattr(lexical_index, "COMPACT_AFTER_OPERATIONS", 5)
+    index = BM25Index("index")
+    index.add(CHUNKS)
+    log_path = os.path.join("index", "operations.log")
+    assert os.path.exists(log_path) and not os.path.exists(os.path.join("index", "snapshot.pkl"))
+
+    # The fifth logged chunk operation triggers the compaction.
+    index.delete(["fan-1"])
+    assert not os.path.exists(log_path) and os.path.exists(os.path.join("index", "snapshot.pkl"))
+    reopened = BM25Index("index")
+    assert len(reopened) == 3 and reopened.search("blades") == []
+    assert ids(reopened.search("seal", where={"source": "fan.txt"})) == ["fan-0"]
+
+def test_search_filters_by_ids_and_metadata():
+    index = BM25Index("index")
+    index.add(CHUNKS)
+    assert sorted(ids(index.search("seal kit"))) == ["fan-0", "pump-0"]
+    assert ids(index.search("seal kit", allowed_ids={"fan-0", "fan-1"})) == ["fan-0"]
+    assert ids(index.search("seal kit", where={"source": "pump.txt"})) == ["pump-0"]
+    assert ids(index.search("pump fan", where={"$and": [{"source": "pump.txt"}, {"page": {"$gte": 2}}]})) == ["pump-1"]
+    assert index.search("seal kit", allowed_ids=set()) == []
+    assert index.search("seal kit", allowed_ids={"fan-0"}, where={"source": "pump.txt"}) == []
+
+def test_reciprocal_rank_fusion_favours_items_ranked_by_several_lists():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["d", "b", "e"]])
+    # "b" is second in both lists, which beats first in one list only; ties keep their first appearance.
+    assert fused == ["b", "a", "d", "c", "e"]
+    assert reciprocal_rank_fusion([["a", "b"], []]) == ["a", "b"]
+    # A smaller k weights the top ranks more heavily.
+    assert reciprocal_rank_fusion([["a", "x", "y"], ["b", "c", "a"]], k=1)[0] == "a"
+    assert reciprocal_rank_fusion([]) == []
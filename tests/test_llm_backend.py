@@ -0,0 +1,47 @@
+# tests/test_llm_backend.py
+
+"""
+Tests of call coalescing in the LLM backend when callers are cancelled.
+"""
+
+import asyncio
+import pytest
+from utils.llm_backend import LLMBackend
+from utils.stub_llm import DEFAULT_STUB_RESPONSE, StubGenerativeModel
+
+# Seconds the stub model waits before each token, so a call is still in flight when a caller is cancelled.
+STUB_TOKEN_DELAY = 0.01
+
+def stub_backend() -> LLMBackend:
+    return LLMBackend(lambda: StubGenerativeModel(token_delay=STUB_TOKEN_DELAY))
+
+def test_cancelled_leader_does_not_cancel_coalesced_callers():
+    backend = stub_backend()
+
+    async def scenario():
+        leader = asyncio.create_task(backend.generate_async("prompt"))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(backend.generate_async("prompt"))
+        await asyncio.sleep(STUB_TOKEN_DELAY)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        # The waiting caller takes the call over instead of inheriting the cancellation.
+        return await follower
+
+    assert asyncio.run(scenario()) == DEFAULT_STUB_RESPONSE
+
+def test_cancelled_follower_does_not_cancel_the_shared_call():
+    backend = stub_backend()
+
+    async def scenario():
+        leader = asyncio.create_task(backend.generate_async("prompt"))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(backend.generate_async("prompt"))
+        await asyncio.sleep(STUB_TOKEN_DELAY)
+        follower.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await follower
+        return await leader
+
+    assert asyncio.run(scenario()) == DEFAULT_STUB_RESPONSE
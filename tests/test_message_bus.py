@@ -0,0 +1,140 @@
+# tests/test_message_bus.py
+
+"""
+Tests of the message bus: the credit window of streamed requests, cancellation,
+backpressure of asynchronous requests, and shared memory payloads.
+
+This module doubles as the agent the tests register on the bus.
+"""
+
+import asyncio
+import threading
+import time
+from multiprocessing import shared_memory
+import pytest
+from utils.mcp import create_mcp_message
+from utils.message_bus import SHARED_MEMORY_MIN_BYTES, MessageBus, pack_message, unpack_message
+
+# Counters of the test agent, reset by the `bus` fixture.
+state = {}
+# Lets the test agent's `handle_message` return; cleared to keep requests in flight.
+release = threading.Event()
+_state_lock = threading.Lock()
+
+# --- Test Agent ---
+
+def handle_message(message: dict) -> dict:
+    with _state_lock:
+        state["running"] += 1
+        state["peak"] = max(state["peak"], state["running"])
+    release.wait(10)
+    with _state_lock:
+        state["running"] -= 1
+    return create_mcp_message("Echo", message["sender"], "ECHO", message["payload"], message["trace_id"])
+
+async def handle_message_async(message: dict) -> dict:
+    raise AssertionError("the request bypassed the agent's queue")
+
+def stream_message(message: dict):
+    try:
+        for number in range(message["payload"]["count"]):
+            state["produced"] += 1
+            yield create_mcp_message("Echo", message["sender"], "NUMBER", {"number": number}, message["trace_id"])
+    finally:
+        state["closed"] = True
+
+async def stream_message_async(message: dict):
+    raise AssertionError("the stream bypassed the credit window")
+    yield
+
+# --- Tests ---
+
+def echo(payload: dict, message_type: str = "ECHO") -> dict:
+    return create_mcp_message("Test", "Echo", message_type, payload, "trace")
+
+def wait_until(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.01)
+
+@pytest.fixture
+def bus():
+    state.update(running=0, peak=0, produced=0, closed=False)
+    release.set()
+    bus = MessageBus()
+    bus.register("Echo", __name__, workers=1, queue_size=1)
+    yield bus
+    release.set()
+    bus.shutdown()
+
+def test_stream_runs_at_most_a_window_ahead(bus):
+    responses = bus.stream(echo({"count": 10}), window=2)
+    assert next(responses)["payload"] == {"number": 0}
+    wait_until(lambda: state["produced"] == 2)
+    time.sleep(0.1)
+    assert state["produced"] == 2
+    # Asking for the next response grants credit for one more.
+    assert next(responses)["payload"] == {"number": 1}
+    wait_until(lambda: state["produced"] == 3)
+
+    # Stopping early closes the agent's stream and frees the worker for the next request.
+    responses.close()
+    wait_until(lambda: state["closed"])
+    assert state["produced"] == 3
+    assert bus.request(echo({"text": "next"}))["payload"] == {"text": "next"}
+
+def test_async_stream_uses_the_credit_window(bus):
+    async def consume():
+        numbers = []
+        async for response in bus.stream_async(echo({"count": 10}), window=1):
+            numbers.append(response["payload"]["number"])
+            await asyncio.sleep(0.1)
+            assert state["produced"] == len(numbers)
+            if len(numbers) == 3:
+                break
+        return numbers
+
+    assert asyncio.run(consume()) == [0, 1, 2]
+    wait_until(lambda: state["closed"])
+    assert state["produced"] == 3
+
+def test_async_requests_wait_in_the_bounded_queue(bus):
+    release.clear()
+
+    async def send_all():
+        tasks = [asyncio.create_task(bus.request_async(echo({"number": number}))) for number in range(4)]
+        await asyncio.sleep(0.2)
+        # One request is handled by the only worker, one waits in the queue of size 1,
+        # and the others wait to be queued.
+        assert state["running"] == 1
+        assert bus._endpoints["Echo"].inbound.full()
+        assert not any(task.done() for task in tasks)
+        release.set()
+        return await asyncio.gather(*tasks)
+
+    responses = asyncio.run(send_all())
+    assert [response["payload"]["number"] for response in responses] == [0, 1, 2, 3]
+    assert state["peak"] == 1
+
+def test_large_payloads_travel_through_shared_memory():
+    texts = ["x" * 1024] * (SHARED_MEMORY_MIN_BYTES // 1024)
+    chunks = [{"id": f"chunk-{i}", "text": text, "metadata": {"start": i}} for i, text in enumerate(texts)]
+    chunks[0] = {"id": "chunk-0", "text": "ünïcode " + texts[0]}
+    message = echo({"texts": texts, "chunks": chunks, "small": ["a", "b"], "count": 3})
+
+    packed = pack_message(message)
+    assert packed["payload"]["small"] == ["a", "b"] and packed["payload"]["count"] == 3
+    block_name = packed["payload"]["texts"]["strings"]["__shared_memory__"]
+    assert "chunks" in packed["payload"]["chunks"]
+    assert message["payload"]["texts"] is texts
+
+    assert unpack_message(packed) == message
+    # The receiver unlinks the blocks it has read.
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=block_name)
+
+def test_payloads_below_the_threshold_are_left_as_is():
+    texts = ["x" * 1024] * (SHARED_MEMORY_MIN_BYTES // 1024 - 1)
+    message = echo({"texts": texts})
+    assert pack_message(message) == message
@@ -0,0 +1,61 @@
+# tests/test_parsers.py
+
+"""
+Tests of the CSV parser: row groups with a repeated header, row ranges around
+blank rows, and decoding of files that are not entirely UTF-8.
+"""
+
+from utils.parsers import CSV_CELL_SEPARATOR, CSV_GROUP_TARGET_CHARS, csv_records
+
+HEADER = "part,description,torque"
+
+def write_csv(path: str, lines: list[str], encoding: str = "utf-8"):
+    with open(path, "w", encoding=encoding, newline="") as f:
+        f.write("\n".join(lines) + "\n")
+
+def data_rows(record: dict) -> list[str]:
+    # The row lines of a record, without its header line.
+    return record["text"].splitlines()[1:]
+
+def test_groups_repeat_the_header_and_cover_every_row(tmp_path):
+    path = str(tmp_path / "parts.csv")
+    write_csv(path, [HEADER] + [f"PN-{i:03d},Flange bolt of the feed pump housing,{20 + i} Nm" for i in range(60)])
+    records = list(csv_records(path))
+    assert len(records) > 1
+
+    header_line = CSV_CELL_SEPARATOR.join(HEADER.split(","))
+    next_row = 1
+    for record in records:
+        assert record["text"].splitlines()[0] == header_line
+        assert len(record["text"]) <= CSV_GROUP_TARGET_CHARS
+        metadata = record["metadata"]
+        assert metadata["columns"] == "part, description, torque"
+        # The row ranges are contiguous and match the rows in the record.
+        assert metadata["row_start"] == next_row
+        assert metadata["row_end"] - metadata["row_start"] + 1 == len(data_rows(record))
+        assert data_rows(record)[0].startswith(f"PN-{next_row - 1:03d}")
+        next_row = metadata["row_end"] + 1
+    assert next_row == 61
+
+def test_row_ranges_skip_blank_rows(tmp_path):
+    path = str(tmp_path / "parts.csv")
+    long_cell = "x" * (CSV_GROUP_TARGET_CHARS // 2)
+    write_csv(path, [HEADER, ",,", f"PN-002,{long_cell},5 Nm", "", f"PN-004,{long_cell},6 Nm", " , ,", ""])
+    records = list(csv_records(path))
+    # Row numbers count every row after the header, blank or not.
+    assert [(record["metadata"]["row_start"], record["metadata"]["row_end"]) for record in records] == [(2, 2), (4, 4)]
+
+def test_lines_that_are_not_utf8_fall_back_to_latin1(tmp_path):
+    path = str(tmp_path / "parts.csv")
+    with open(path, "wb") as f:
+        f.write("\ufeffpart,description\n".encode("utf-8"))
+        f.write("PN-001,Dichtung für Pumpe\n".encode("utf-8"))
+        f.write("PN-002,Joint d'étanchéité\n".encode("latin1"))
+    record, = csv_records(path)
+    assert record["metadata"]["columns"] == "part, description"
+    assert data_rows(record) == ["PN-001 | Dichtung für Pumpe", "PN-002 | Joint d'étanchéité"]
+
+def test_empty_file_yields_no_records(tmp_path):
+    path = str(tmp_path / "empty.csv")
+    open(path, "w").close()
+    assert list(csv_records(path)) == []
@@ -0,0 +1,68 @@
+# tests/test_retrieval.py
+
+"""
+Tests of the Retrieval Agent's query path.
+"""
+
+import os
+import pickle
+from collections import Counter
+import pytest
+from agents import retrieval_agent
+from utils.lexical_index import LEXICAL_INDEX_PATH
+from utils.manifest import source_key
+
+CHUNKS = [
+    {"id": f"chunk-{i}", "text": text, "metadata": {"source": "manual.txt", "start": i * 100}}
+    for i, text in enumerate([
+        "The flange bolts are tightened to 40 Nm in a cross pattern.",
+        "The flange bolts are tightened to 40 Nm in a cross pattern, twice.",
+        "Prime the pump with water before the first start.",
+        "Replace the gasket of the inspection cover every 500 hours.",
+    ])
+]
+
+# One test per backend: ChromaDB keeps its clients per process and does not cope
+# with a second store opened in another temporary directory.
+@pytest.mark.parametrize("backend", ["numpy", "chroma"])
+def test_query_embeds_only_the_question(offline_retrieval, monkeypatch, backend):
+    monkeypatch.setattr(retrieval_agent, "VECTOR_STORE_BACKEND", backend)
+    retrieval_agent.add_chunks_to_chroma(CHUNKS)
+    embeddings = retrieval_agent.get_vector_store().get_embeddings(["chunk-2", "missing"])
+    assert list(embeddings) == ["chunk-2"]
+    assert embeddings["chunk-2"] == pytest.approx(offline_retrieval.encode([CHUNKS[2]["text"]])[0], abs=1e-6)
+
+    cache = retrieval_agent.get_embedding_cache()
+    encoded, cache_stats = offline_retrieval.encoded_texts, cache.stats()
+    results = retrieval_agent.retrieve_chunks("What torque for the flange bolts?", n_results=3)
+    assert offline_retrieval.encoded_texts == encoded + 1
+    assert cache.stats() == cache_stats
+    # The near-identical bolt chunks are packed once, judged by their stored embeddings.
+    assert results["ids"][0] in ("chunk-0", "chunk-1")
+    assert not {"chunk-0", "chunk-1"} <= set(results["ids"])
+
+def test_filtered_query_does_not_list_the_matching_chunks(offline_retrieval, monkeypatch):
+    retrieval_agent.add_chunks_to_chroma(CHUNKS + [
+        {"id": "other-0", "text": "The flange bolts of the fan are tightened to 12 Nm.",
+         "metadata": {"source": source_key("fan.txt"), "start": 0}},
+    ])
+    store = retrieval_agent.get_vector_store()
+    monkeypatch.setattr(store, "find", lambda where: pytest.fail("a filtered query scanned the store"))
+
+    where = retrieval_agent.document_filter(["fan.txt"])
+    assert retrieval_agent.retrieve_chunks("flange bolts Nm", n_results=3, where=where)["ids"] == ["other-0"]
+    # The BM25 ranking is filtered too: the manual's chunks share every query term.
+    assert [chunk_id for chunk_id, _ in retrieval_agent.get_lexical_index().search("flange bolts", 10, where=where)] == ["other-0"]
+    assert retrieval_agent.retrieve_chunks("flange bolts", where=retrieval_agent.document_filter(["missing.txt"]))["ids"] == []
+
+def test_lexical_index_without_metadata_is_rebuilt_from_the_store(offline_retrieval):
+    retrieval_agent.add_chunks_to_chroma(CHUNKS)
+    # An operations log written before the index kept chunk metadata.
+    retrieval_agent._lexical_index.reset()
+    log_path = os.path.join(LEXICAL_INDEX_PATH, "operations.log")
+    with open(log_path, "wb") as f:
+        pickle.dump(("add", [("chunk-0", Counter(["flange"]))]), f)
+
+    index = retrieval_agent.get_lexical_index()
+    assert len(index) == len(CHUNKS)
+    assert [chunk_id for chunk_id, _ in index.search("gasket", where={"source": "manual.txt"})] == ["chunk-3"]
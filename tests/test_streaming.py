@@ -0,0 +1,67 @@
+# tests/test_streaming.py
+
+"""
+Tests of token streaming from the LLM Response Agent through the coordinator,
+and of the generation timings recorded per request.
+"""
+
+import asyncio
+import uuid
+import numpy as np
+import pytest
+from agents import coordinator_agent, llm_response_agent
+from utils.answer_cache import answer_cache
+from utils.mcp import create_mcp_message
+
+CONTEXT_CHUNKS = ["The torque for the M8 bolts is 25 Nm.", "Inspect the gasket every 500 hours."]
+
+def generate_message(trace_id: str) -> dict:
+    return create_mcp_message("Test", "LLMResponseAgent", "GENERATE_RESPONSE",
+                              {"question": "What is the torque?", "top_chunks": CONTEXT_CHUNKS}, trace_id)
+
+def test_stream_message_yields_chunks_then_final_response(stub_llm):
+    responses = list(llm_response_agent.stream_message(generate_message(str(uuid.uuid4()))))
+
+    types = [response["type"] for response in responses]
+    assert types[-1] == "FINAL_RESPONSE"
+    assert len(types) > 2 and set(types[:-1]) == {"RESPONSE_CHUNK"}
+    final = responses[-1]["payload"]
+    assert not final["error"]
+    # The streamed pieces add up to the full answer.
+    assert "".join(response["payload"]["text"] for response in responses[:-1]) == final["final_response"]
+    assert final["final_response"] == stub_llm.response_text
+
+def test_async_handler_serves_every_message_type(stub_llm):
+    response = asyncio.run(llm_response_agent.handle_message_async(generate_message(str(uuid.uuid4()))))
+    assert response["type"] == "FINAL_RESPONSE" and response["payload"]["final_response"] == stub_llm.response_text
+
+    warm_up = create_mcp_message("Test", "LLMResponseAgent", "WARM_UP", {}, str(uuid.uuid4()))
+    response = asyncio.run(llm_response_agent.handle_message_async(warm_up))
+    assert response["type"] == "WARM_UP_COMPLETE" and response["payload"] == {"status": "SUCCESS"}
+
+    unknown = create_mcp_message("Test", "LLMResponseAgent", "SUMMARIZE", {}, str(uuid.uuid4()))
+    with pytest.raises(ValueError):
+        asyncio.run(llm_response_agent.handle_message_async(unknown))
+
+def test_generation_metrics_time_to_first_token(stub_llm):
+    trace_id = str(uuid.uuid4())
+    for _ in llm_response_agent.stream_message(generate_message(trace_id)):
+        pass
+
+    metrics = llm_response_agent.get_generation_metrics(trace_id)
+    assert metrics is not None
+    assert 0 < metrics["time_to_first_token"] < metrics["generation_time"]
+
+def test_coordinate_chat_stream_yields_several_pieces(stub_llm, monkeypatch):
+    # Retrieval is replaced by a fixed context, so no embedding model or documents are needed.
+    def prepare_context(question, document_path, trace_id, sources=None):
+        return {"top_chunks": CONTEXT_CHUNKS, "chunk_ids": ["chunk-1", "chunk-2"],
+                "query_embedding": np.ones(384, dtype=np.float32)}
+    monkeypatch.setattr(coordinator_agent, "prepare_context", prepare_context)
+    # Never answer from the cache, so the answer is generated (and streamed) every time.
+    monkeypatch.setattr(answer_cache, "threshold", float("inf"))
+
+    pieces = list(coordinator_agent.coordinate_chat_stream("What is the torque?", "Documents"))
+
+    assert len(pieces) > 1
+    assert "".join(pieces) == stub_llm.response_text
@@ -0,0 +1,63 @@
+# tests/test_upload_store.py
+
+"""
+Tests of the content-addressed upload store: what re-uploading identical,
+duplicated or changed content writes, and when removing a name deletes its file.
+"""
+
+import os
+from utils.upload_store import DUPLICATE, REPLACED, STORED, UNCHANGED, UploadStore, content_hash
+
+def files_on_disk(directory: str) -> dict:
+    # Every file of the store directory -> its modification time.
+    return {os.path.join(root, name): os.stat(os.path.join(root, name)).st_mtime_ns
+            for root, _, names in os.walk(directory) for name in names}
+
+def test_identical_upload_writes_nothing(tmp_path):
+    store = UploadStore(str(tmp_path / "Documents"))
+    assert store.add("manual.txt", b"Torque the bolts to 40 Nm.") == STORED
+    before = files_on_disk(store.directory)
+
+    assert store.add("manual.txt", b"Torque the bolts to 40 Nm.") == UNCHANGED
+    assert files_on_disk(store.directory) == before
+
+def test_same_content_under_another_name_is_a_duplicate(tmp_path):
+    store = UploadStore(str(tmp_path / "Documents"))
+    store.add("manual.txt", b"Torque the bolts to 40 Nm.")
+    assert store.add("copy/manual-v2.txt", b"Torque the bolts to 40 Nm.") == DUPLICATE
+    documents = store.documents()
+    # Both names refer to the one stored file.
+    assert set(documents) == {"manual.txt", "manual-v2.txt"}
+    assert documents["manual.txt"] == documents["manual-v2.txt"]
+    assert len([path for path in files_on_disk(store.directory) if not path.endswith("upload_index.json")]) == 1
+
+def test_new_content_under_a_known_name_replaces_the_old_file(tmp_path):
+    store = UploadStore(str(tmp_path / "Documents"))
+    store.add("manual.txt", b"Torque the bolts to 40 Nm.")
+    old_path = store.documents()["manual.txt"]
+    store.mark_indexed(store.pending())
+
+    assert store.add("manual.txt", b"Torque the bolts to 45 Nm.") == REPLACED
+    new_path = store.documents()["manual.txt"]
+    assert new_path != old_path and not os.path.exists(old_path)
+    # The hash directory of the old version is removed with it.
+    assert not os.path.exists(os.path.dirname(old_path))
+    with open(new_path, "rb") as f:
+        assert f.read() == b"Torque the bolts to 45 Nm."
+    assert store.pending() == [content_hash(b"Torque the bolts to 45 Nm.")]
+
+def test_remove_keeps_content_another_name_refers_to(tmp_path):
+    store = UploadStore(str(tmp_path / "Documents"))
+    store.add("manual.txt", b"Torque the bolts to 40 Nm.")
+    store.add("manual-v2.txt", b"Torque the bolts to 40 Nm.")
+    path = store.documents()["manual.txt"]
+
+    assert store.remove("manual.txt") is None
+    assert os.path.exists(path) and store.documents() == {"manual-v2.txt": path}
+    assert store.remove("manual-v2.txt") == path
+    assert not os.path.exists(path) and not store.has_documents()
+    assert store.remove("unknown.txt") is None
+
+    # The index is persisted: a reopened store knows the same documents.
+    store.add("pump.txt", b"Prime the pump.")
+    assert UploadStore(store.directory).documents() == store.documents()
@@ -0,0 +1,125 @@
+# tests/test_vector_store.py
+
+"""
+Tests of the NumPy vector store: queries, tombstones, compaction, recovery from
+an interrupted write, metadata filters, and the recall of quantized searches.
+"""
+
+import os
+import numpy as np
+from utils import vector_store
+from utils.vector_store import NumpyVectorStore
+
+# Dimension of the test embeddings.
+DIMENSION = 16
+
+def chunk(number: int) -> tuple:
+    # ID, text, embedding and metadata of the test chunk with the given number. Random
+    # embeddings (seeded by the number) give every other chunk a distinct score.
+    embedding = np.random.default_rng(number).standard_normal(DIMENSION).astype(np.float32)
+    return f"chunk-{number}", f"Text of chunk {number}.", embedding, {"source": f"doc{number % 2}.txt", "start": number}
+
+def add_chunks(store: NumpyVectorStore, numbers):
+    ids, texts, embeddings, metadatas = zip(*(chunk(number) for number in numbers))
+    store.upsert(list(ids), list(texts), np.stack(embeddings), list(metadatas))
+
+def query(store: NumpyVectorStore, number: int, n_results: int = 3, where: dict = None) -> tuple:
+    return store.query(chunk(number)[2], n_results, where)
+
+def test_added_chunks_are_found_nearest_first(tmp_path):
+    # Three rows per segment, so the ten chunks span four segments.
+    store = NumpyVectorStore(str(tmp_path / "store"), segment_rows=3)
+    add_chunks(store, range(10))
+    ids, texts = query(store, 4)
+    assert ids[0] == "chunk-4" and texts[0] == "Text of chunk 4."
+    assert store.count() == 10
+    assert store.get(["chunk-7", "missing"]) == {"chunk-7": "Text of chunk 7."}
+
+def test_deleted_and_overwritten_chunks_are_never_returned(tmp_path):
+    path = str(tmp_path / "store")
+    store = NumpyVectorStore(path, segment_rows=3)
+    add_chunks(store, range(10))
+    store.delete(["chunk-4", "chunk-5"])
+    # Overwriting leaves a tombstone on the old row, and only the new text is returned.
+    store.upsert(["chunk-6"], ["New text of chunk 6."], [chunk(6)[2]], [chunk(6)[3]])
+    for reopened in (store, NumpyVectorStore(path, segment_rows=3)):
+        ids, texts = query(reopened, 4, n_results=10)
+        assert "chunk-4" not in ids and "chunk-5" not in ids
+        assert ids.count("chunk-6") == 1 and "New text of chunk 6." in texts
+        assert reopened.count() == 8
+        assert sorted(reopened.find({"source": "doc0.txt"})) == ["chunk-0", "chunk-2", "chunk-6", "chunk-8"]
+
+def test_compaction_keeps_query_results(tmp_path, monkeypatch):
+    monkeypatch.setattr(vector_store, "COMPACT_MIN_DEAD_ROWS", 4)
+    path = str(tmp_path / "store")
+    store = NumpyVectorStore(path, segment_rows=3)
+    add_chunks(store, range(12))
+    store.delete([f"chunk-{number}" for number in range(4)])
+    before = [query(store, number, n_results=5) for number in range(12)]
+    assert os.path.exists(os.path.join(path, "tombstones.log"))
+
+    # Deleting more rows than remain alive compacts the store automatically.
+    store.delete([f"chunk-{number}" for number in range(4, 7)])
+    add_chunks(store, range(4, 7))
+    assert not os.path.exists(os.path.join(path, "tombstones.log"))
+    assert store._dead_rows == 0
+    assert [query(store, number, n_results=5) for number in range(12)] == before
+    store.compact()
+    assert [query(NumpyVectorStore(path, segment_rows=3), number, n_results=5) for number in range(12)] == before
+
+def test_reopening_after_an_interrupted_write_keeps_complete_rows(tmp_path):
+    path = str(tmp_path / "store")
+    store = NumpyVectorStore(path)
+    add_chunks(store, range(5))
+    # A crash during an append: one row reached the JSON-lines file without its vector,
+    # and the next row was cut short, as was its vector.
+    with open(os.path.join(path, "segment_00000.jsonl"), "ab") as f:
+        f.write(b'{"id": "chunk-5", "text": "Text of chunk 5."}\n{"id": "chunk-6", "te')
+    with open(os.path.join(path, "segment_00000.f32"), "ab") as f:
+        f.write(b"\x00" * (4 * DIMENSION // 2))
+
+    reopened = NumpyVectorStore(path)
+    assert reopened.count() == 5
+    assert query(reopened, 3)[0][0] == "chunk-3"
+    # The partial rows are truncated away, so later appends line up again.
+    assert os.path.getsize(os.path.join(path, "segment_00000.f32")) == 5 * 4 * DIMENSION
+    add_chunks(reopened, [5, 6])
+    assert query(NumpyVectorStore(path), 6)[0][0] == "chunk-6"
+
+def test_where_filter_restricts_queries(tmp_path):
+    store = NumpyVectorStore(str(tmp_path / "store"), segment_rows=4)
+    add_chunks(store, range(10))
+    where = {"source": "doc1.txt"}
+    ids, _ = query(store, 4, n_results=10, where=where)
+    assert sorted(ids) == ["chunk-1", "chunk-3", "chunk-5", "chunk-7", "chunk-9"]
+    ids, _ = query(store, 4, n_results=10, where={"$and": [where, {"start": {"$gte": 5}}]})
+    assert sorted(ids) == ["chunk-5", "chunk-7", "chunk-9"]
+    assert query(store, 4, where={"source": "missing.txt"}) == ([], [])
+
+    # Rows added after a filtered query are matched by the same filter.
+    add_chunks(store, [11])
+    ids, _ = query(store, 11, n_results=10, where=where)
+    assert ids[0] == "chunk-11" and len(ids) == 6
+
+def test_quantized_search_recalls_the_exact_results(tmp_path):
+    # Clustered vectors, like embeddings of related texts, and queries near stored rows.
+    rng = np.random.default_rng(7)
+    centers = rng.standard_normal((40, 64))
+    vectors = (centers[rng.integers(0, 40, 2000)] + 0.6 * rng.standard_normal((2000, 64))).astype(np.float32)
+    queries = vectors[rng.integers(0, 2000, 50)] + 0.3 * rng.standard_normal((50, 64)).astype(np.float32)
+    ids = [f"chunk-{i}" for i in range(len(vectors))]
+    metadatas = [{"source": "doc.txt", "start": i} for i in range(len(vectors))]
+
+    def top_ids(store: NumpyVectorStore) -> list[set]:
+        return [set(store.query(query, 10)[0]) for query in queries]
+
+    exact = NumpyVectorStore(str(tmp_path / "exact"), segment_rows=512)
+    exact.upsert(ids, ids, vectors, metadatas)
+    expected = top_ids(exact)
+    for quantization in vector_store.QUANTIZATIONS:
+        path = str(tmp_path / quantization)
+        NumpyVectorStore(path, segment_rows=512, quantization=quantization).upsert(ids, ids, vectors, metadatas)
+        # Reopened, the store searches the codes it persisted.
+        found = top_ids(NumpyVectorStore(path, segment_rows=512, quantization=quantization))
+        recall = np.mean([len(found_ids & expected_ids) / 10 for found_ids, expected_ids in zip(found, expected)])
+        assert recall >= 0.95, f"{quantization} recall@10 is {recall:.3f}"
@@ -0,0 +1,134 @@
+# utils/answer_cache.py
+
+"""
+This module implements an in-process semantic answer cache.
+A stored answer is reused when a new question's embedding is within a cosine
+similarity threshold of a cached question AND retrieval returned exactly the same
+chunks, i.e. the LLM would be given the same context. Whenever ingestion upserts
+or deletes a chunk, every cached answer that was built on it is invalidated.
+The cache lives in the Coordinator's process, which both looks answers up and
+invalidates them as it forwards chunk changes to the Retrieval Agent.
+"""
+
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# --- Configuration and Constants ---
+
+# Minimum cosine similarity between two questions for a cached answer to be reused.
+ANSWER_CACHE_THRESHOLD = 0.95
+# Maximum number of answers kept in memory (least recently used ones are dropped).
+ANSWER_CACHE_MAX_ENTRIES = 512
+
+# --- Semantic Answer Cache ---
+
+class SemanticAnswerCache:
+    """
+    LRU cache of LLM answers keyed by question embedding and retrieved chunk IDs.
+    """
+
+    def __init__(self, threshold: float = ANSWER_CACHE_THRESHOLD, max_entries: int = ANSWER_CACHE_MAX_ENTRIES):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # entry id -> (normalized question embedding, chunk IDs, answer)
+        self._entries = OrderedDict()
+        # chunk IDs tuple -> entry ids, so a lookup only compares questions with the same context.
+        self._by_context = {}
+        # chunk ID -> entry ids, used for invalidation.
+        self._by_chunk = {}
+        self._next_id = 0
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, embedding, chunk_ids: list[str]):
+        """
+        Returns a cached answer for a semantically equivalent question, if any.
+
+        Args:
+            embedding: The new question's embedding.
+            chunk_ids (list[str]): The IDs of the chunks retrieved for the new question.
+
+        Returns:
+            str | None: The cached answer, or None on a miss.
+        """
+        query = self._normalize(embedding)
+        with self._lock:
+            candidates = self._by_context.get(tuple(chunk_ids), ())
+            best_id, best_score = None, self.threshold
+            for entry_id in candidates:
+                score = float(np.dot(self._entries[entry_id][0], query))
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+            if best_id is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(best_id)
+            return self._entries[best_id][2]
+
+    def store(self, embedding, chunk_ids: list[str], answer: str):
+        """
+        Caches an answer for a question and the chunks it was generated from.
+
+        Args:
+            embedding: The question's embedding.
+            chunk_ids (list[str]): The IDs of the chunks used as context.
+            answer (str): The generated answer.
+        """
+        context = tuple(chunk_ids)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (self._normalize(embedding), context, answer)
+            self._by_context.setdefault(context, set()).add(entry_id)
+            for chunk_id in context:
+                self._by_chunk.setdefault(chunk_id, set()).add(entry_id)
+            # Drop the least recently used answers once the cache is full.
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, entry_id: int):
+        _, context, _ = self._entries.pop(entry_id)
+        self._by_context[context].discard(entry_id)
+        if not self._by_context[context]:
+            del self._by_context[context]
+        for chunk_id in context:
+            entry_ids = self._by_chunk.get(chunk_id)
+            if entry_ids is not None:
+                entry_ids.discard(entry_id)
+                if not entry_ids:
+                    del self._by_chunk[chunk_id]
+
+    def invalidate(self, chunk_ids: list[str]):
+        """
+        Drops every cached answer that was built on any of the given chunks.
+
+        Args:
+            chunk_ids (list[str]): The IDs of chunks that were upserted or deleted.
+        """
+        with self._lock:
+            stale = set()
+            for chunk_id in chunk_ids:
+                stale.update(self._by_chunk.get(chunk_id, ()))
+            for entry_id in stale:
+                self._remove(entry_id)
+
+    def clear(self):
+        """
+        Drops every cached answer.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._by_context.clear()
+            self._by_chunk.clear()
+
+# The process-wide cache used by the Coordinator.
+answer_cache = SemanticAnswerCache()
@@ -0,0 +1,134 @@
+# utils/concurrency.py
+
+"""
+This module provides the bounded thread pools used by the asyncio-native agent
+interfaces. Blocking work (document parsing, embedding, ChromaDB calls) cannot
+run on the event loop, so each pipeline stage gets its own executor whose size
+caps how many such calls run at once. A burst of concurrent sessions therefore
+queues up per stage instead of oversubscribing the CPU or the database, while
+network-bound LLM calls stay on the event loop.
+
+It also provides `LazyResource`, the thread-safe lazy initializer the agents use
+for their expensive process-wide resources (models, database clients), so that
+importing an agent is cheap and the work happens on first use or during warm-up.
+"""
+
+import asyncio
+import functools
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+# --- Configuration and Constants ---
+
+# Maximum number of blocking calls running concurrently, per pipeline stage.
+STAGE_CONCURRENCY = {
+    "ingestion": 2,
+    "retrieval": 4,
+}
+# Concurrency used for stages that are not listed above.
+DEFAULT_STAGE_CONCURRENCY = 4
+
+# --- Executors ---
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+def get_stage_executor(stage: str) -> ThreadPoolExecutor:
+    """
+    Returns the process-wide executor of a pipeline stage, creating it on first use.
+
+    Args:
+        stage (str): The name of the stage, e.g. "ingestion" or "retrieval".
+
+    Returns:
+        ThreadPoolExecutor: The executor whose size bounds the stage's concurrency.
+    """
+    with _executors_lock:
+        if stage not in _executors:
+            _executors[stage] = ThreadPoolExecutor(
+                max_workers=STAGE_CONCURRENCY.get(stage, DEFAULT_STAGE_CONCURRENCY),
+                thread_name_prefix=f"{stage}-worker",
+            )
+        return _executors[stage]
+
+async def run_in_stage(stage: str, func, *args, **kwargs):
+    """
+    Runs a blocking function in a stage's executor without blocking the event loop.
+
+    Args:
+        stage (str): The name of the stage whose executor should run the call.
+        func: The blocking function to call.
+        *args, **kwargs: Arguments passed to the function.
+
+    Returns:
+        The function's return value.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_stage_executor(stage), functools.partial(func, *args, **kwargs))
+
+# --- Event Loop Locks ---
+
+_loop_locks = weakref.WeakKeyDictionary()
+
+def get_loop_lock(name: str) -> asyncio.Lock:
+    """
+    Returns a named asyncio lock belonging to the running event loop.
+
+    asyncio locks cannot be shared between event loops, so one lock is kept per
+    loop and name.
+
+    Args:
+        name (str): The name of the lock.
+
+    Returns:
+        asyncio.Lock: The lock for the running loop.
+    """
+    locks = _loop_locks.setdefault(asyncio.get_running_loop(), {})
+    if name not in locks:
+        locks[name] = asyncio.Lock()
+    return locks[name]
+
+# --- Lazy Resources ---
+
+class LazyResource:
+    """
+    A process-wide resource created by `factory` on first use.
+
+    Concurrent first calls wait for a single initialization instead of each
+    building their own copy; once created, `get` does not take the lock.
+    """
+
+    def __init__(self, factory):
+        """
+        Args:
+            factory: A function without arguments that creates the resource.
+        """
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._value = None
+        self._loaded = False
+
+    def get(self):
+        """
+        Returns the resource, creating it if necessary.
+
+        If the factory raises, the exception propagates and the next call tries again.
+        """
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self._value = self._factory()
+                    self._loaded = True
+        return self._value
+
+    @property
+    def loaded(self) -> bool:
+        """Whether the resource has been created."""
+        return self._loaded
+
+    def reset(self):
+        """Forgets the resource, so the next `get` creates a new one."""
+        with self._lock:
+            self._value = None
+            self._loaded = False
@@ -0,0 +1,89 @@
+# utils/context_packer.py
+
+"""
+This module assembles the context sent to the language model from the ranked
+candidate chunks of a retrieval. It runs between retrieval and generation and:
+- removes exact duplicates (same text up to case and whitespace) and near
+  duplicates (embeddings more similar than NEAR_DUPLICATE_SIMILARITY), which
+  otherwise fill several context slots with the same passage;
+- diversifies the remaining chunks with maximal marginal relevance (MMR), so
+  every selected chunk adds information the others do not already carry;
+- enforces a hard token budget, truncating the last chunk that does not fit at a
+  sentence boundary, so one giant paragraph cannot blow up the prompt.
+"""
+
+import numpy as np
+from utils.text import estimate_tokens, truncate_to_tokens
+
+# --- Configuration and Constants ---
+
+# Maximum number of (estimated) tokens of context per prompt.
+CONTEXT_TOKEN_BUDGET = 1500
+# Trade-off between relevance (1.0) and diversity (0.0) in MMR.
+MMR_LAMBDA = 0.7
+# Chunks whose embeddings are at least this similar (cosine) to a better-ranked chunk are dropped.
+NEAR_DUPLICATE_SIMILARITY = 0.95
+# A truncated chunk is only kept if at least this many tokens of it fit.
+MIN_TRUNCATED_TOKENS = 32
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+def pack_context(texts: list[str], embeddings: np.ndarray, max_chunks: int,
+                 token_budget: int = CONTEXT_TOKEN_BUDGET, mmr_lambda: float = MMR_LAMBDA,
+                 near_duplicate_similarity: float = NEAR_DUPLICATE_SIMILARITY) -> list[tuple[int, str]]:
+    """
+    Selects and trims the chunks that make up a prompt's context.
+
+    Relevance is taken from the candidates' order, i.e. the ranking the retrieval
+    already computed (including exact keyword matches), and the embeddings are
+    only used to measure redundancy between chunks.
+
+    Args:
+        texts (list[str]): The candidate chunk texts, most relevant first.
+        embeddings (np.ndarray): One embedding per candidate.
+        max_chunks (int): The maximum number of chunks to select.
+        token_budget (int): The maximum total of estimated tokens.
+        mmr_lambda (float): The MMR trade-off between relevance and diversity.
+        near_duplicate_similarity (float): The cosine similarity from which a chunk
+                                           counts as a near duplicate.
+
+    Returns:
+        list[tuple[int, str]]: The (candidate index, text) pairs of the selected
+                               chunks in selection order; a text may be truncated.
+    """
+    if not texts or max_chunks <= 0:
+        return []
+
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    similarity = vectors @ vectors.T
+
+    # Keep the best-ranked copy of every exact or near duplicate.
+    kept = []
+    seen = set()
+    for i, text in enumerate(texts):
+        key = _normalize(text)
+        if key in seen or any(similarity[i, j] >= near_duplicate_similarity for j in kept):
+            continue
+        seen.add(key)
+        kept.append(i)
+
+    # Linear relevance by rank: the best candidate scores 1, the worst close to 0.
+    relevance = {i: 1.0 - rank / len(texts) for rank, i in enumerate(kept)}
+    redundancy = {i: 0.0 for i in kept}
+    selected = []
+    remaining_tokens = token_budget
+
+    while kept and len(selected) < max_chunks and remaining_tokens >= MIN_TRUNCATED_TOKENS:
+        best = max(kept, key=lambda i: mmr_lambda * relevance[i] - (1 - mmr_lambda) * redundancy[i])
+        kept.remove(best)
+        text = truncate_to_tokens(texts[best], remaining_tokens)
+        if estimate_tokens(text) < min(MIN_TRUNCATED_TOKENS, estimate_tokens(texts[best])):
+            break
+        selected.append((best, text))
+        remaining_tokens -= estimate_tokens(text)
+        for i in kept:
+            redundancy[i] = max(redundancy[i], float(similarity[i, best]))
+
+    return selected
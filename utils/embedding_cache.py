@@ -0,0 +1,209 @@
+# utils/embedding_cache.py
+
+"""
+This module implements a persistent, size-bounded cache of text embeddings.
+Vectors are stored in a memory-mapped float32 array file, and a small SQLite
+database maps each (model, normalized text hash) key to its row ("slot") in that
+file together with a last-used counter for LRU eviction.
+
+The cache lives outside the vector database directory, so it survives a database
+reset: re-uploading documents that were embedded before costs a lookup instead of
+a model forward pass.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import numpy as np
+
+# --- Configuration and Constants ---
+
+# Define the directory where the embedding cache is persisted.
+EMBEDDING_CACHE_DIR = "embedding_cache"
+# Maximum number of vectors kept on disk before the least recently used ones are evicted.
+EMBEDDING_CACHE_MAX_ENTRIES = 200_000
+# The vectors file grows in steps of at least this many rows.
+_MIN_GROWTH_ROWS = 1024
+# SQLite limits the number of bound parameters per statement.
+_SQL_BATCH_SIZE = 500
+
+def text_key(text: str) -> str:
+    """
+    Hashes a chunk's text after normalizing its whitespace.
+
+    Args:
+        text (str): The chunk text.
+
+    Returns:
+        str: The hexadecimal SHA-256 digest of the normalized text.
+    """
+    return hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()
+
+# --- Embedding Cache ---
+
+class EmbeddingCache:
+    """
+    Persistent LRU cache of embeddings keyed by (model name, normalized text hash).
+    """
+
+    def __init__(self, path: str = EMBEDDING_CACHE_DIR, dimension: int = 384,
+                 max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES):
+        """
+        Opens (or creates) the cache stored in the given directory.
+
+        Args:
+            path (str): The directory holding the index and the vectors file.
+            dimension (int): The size of the cached vectors.
+            max_entries (int): The maximum number of vectors kept on disk.
+        """
+        self.path = path
+        self.dimension = dimension
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(path, exist_ok=True)
+        self._vectors_path = os.path.join(path, "vectors.f32")
+        self._db = sqlite3.connect(os.path.join(path, "index.sqlite3"), check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "model TEXT NOT NULL, text_hash TEXT NOT NULL, slot INTEGER NOT NULL UNIQUE, "
+            "last_used INTEGER NOT NULL, PRIMARY KEY (model, text_hash))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+        # A cache written with a different vector size cannot be reused.
+        stored_dimension = self._db.execute("SELECT value FROM meta WHERE key = 'dimension'").fetchone()
+        if stored_dimension is not None and stored_dimension[0] != dimension:
+            self._db.execute("DELETE FROM entries")
+            if os.path.exists(self._vectors_path):
+                os.remove(self._vectors_path)
+        self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('dimension', ?)", (dimension,))
+        self._db.commit()
+
+        self._count = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        self._clock = self._db.execute("SELECT COALESCE(MAX(last_used), 0) FROM entries").fetchone()[0]
+        self._vectors = None
+        self._capacity = 0
+        self._open_vectors()
+
+    def _open_vectors(self, capacity: int = 0):
+        # (Re)maps the vectors file, growing it to at least `capacity` rows.
+        row_bytes = self.dimension * 4
+        size = os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0
+        if capacity * row_bytes > size:
+            if self._vectors is not None:
+                self._vectors.flush()
+                self._vectors = None
+            with open(self._vectors_path, "ab") as f:
+                f.truncate(capacity * row_bytes)
+            size = capacity * row_bytes
+        self._capacity = size // row_bytes
+        if self._capacity:
+            self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(self._capacity, self.dimension))
+
+    def _select(self, model: str, hashes: list[str]) -> dict:
+        found = {}
+        for start in range(0, len(hashes), _SQL_BATCH_SIZE):
+            batch = hashes[start:start + _SQL_BATCH_SIZE]
+            rows = self._db.execute(
+                f"SELECT text_hash, slot FROM entries WHERE model = ? AND text_hash IN ({','.join('?' * len(batch))})",
+                [model, *batch],
+            )
+            found.update(rows)
+        return found
+
+    def get_many(self, model: str, texts: list[str]) -> list:
+        """
+        Looks up the cached embeddings of several texts.
+
+        Args:
+            model (str): The name of the model that produced the embeddings.
+            texts (list[str]): The texts to look up.
+
+        Returns:
+            list: For each text, its cached vector (np.ndarray) or None on a miss.
+        """
+        hashes = [text_key(text) for text in texts]
+        with self._lock:
+            slots = self._select(model, sorted(set(hashes)))
+            results = [np.array(self._vectors[slots[h]]) if h in slots else None for h in hashes]
+
+            # Mark the hits as most recently used.
+            self._clock += 1
+            self._db.executemany(
+                "UPDATE entries SET last_used = ? WHERE model = ? AND text_hash = ?",
+                [(self._clock, model, h) for h in slots],
+            )
+            self._db.commit()
+
+            hit_count = sum(result is not None for result in results)
+            self.hits += hit_count
+            self.misses += len(results) - hit_count
+        return results
+
+    def put_many(self, model: str, texts: list[str], vectors: np.ndarray):
+        """
+        Stores the embeddings of several texts, evicting the least recently used entries if full.
+
+        Args:
+            model (str): The name of the model that produced the embeddings.
+            texts (list[str]): The embedded texts.
+            vectors (np.ndarray): The embeddings, one row per text.
+        """
+        new_entries = {}
+        for text, vector in zip(texts, vectors):
+            new_entries[text_key(text)] = vector
+
+        with self._lock:
+            # Texts that are already cached only need their vector refreshed.
+            existing = self._select(model, list(new_entries))
+            for text_hash, slot in existing.items():
+                self._vectors[slot] = new_entries.pop(text_hash)
+
+            # Never try to store more than the cache can hold.
+            entries = list(new_entries.items())[-self.max_entries:]
+            if not entries:
+                if existing:
+                    self._vectors.flush()
+                return
+            free = max(0, min(len(entries), self.max_entries - self._count))
+            slots = list(range(self._count, self._count + free))
+
+            # Reuse the slots of the least recently used entries for the rest.
+            evict_count = len(entries) - free
+            if evict_count:
+                evicted = self._db.execute(
+                    "SELECT model, text_hash, slot FROM entries ORDER BY last_used LIMIT ?", (evict_count,)
+                ).fetchall()
+                self._db.executemany("DELETE FROM entries WHERE model = ? AND text_hash = ?",
+                                     [(row[0], row[1]) for row in evicted])
+                slots.extend(row[2] for row in evicted)
+
+            if self._count + free > self._capacity:
+                growth = max(self._count + free, self._capacity * 2, _MIN_GROWTH_ROWS)
+                self._open_vectors(min(growth, self.max_entries))
+
+            self._clock += 1
+            for slot, (_, vector) in zip(slots, entries):
+                self._vectors[slot] = vector
+            self._vectors.flush()
+            self._db.executemany(
+                "INSERT INTO entries (model, text_hash, slot, last_used) VALUES (?, ?, ?, ?)",
+                [(model, text_hash, slot, self._clock) for slot, (text_hash, _) in zip(slots, entries)],
+            )
+            self._db.commit()
+            self._count += free
+
+    def stats(self) -> dict:
+        """
+        Reports the cache's hit/miss counters and its current size.
+
+        Returns:
+            dict: 'hits', 'misses', 'entries' and 'max_entries'.
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": self._count, "max_entries": self.max_entries}
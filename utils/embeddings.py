@@ -0,0 +1,140 @@
+# utils/embeddings.py
+
+"""
+This module provides the embedding engine used to turn chunk texts and queries
+into vectors. It wraps the same sentence-transformer model the vector database
+was built with (all-MiniLM-L6-v2), but gives the application explicit control
+over how the work is done on CPU:
+- Texts are sorted by length and embedded in fixed-size batches, so each batch
+  pads to a similar length instead of the longest text in a random mix.
+- The model can run on PyTorch, on ONNX Runtime, or in an int8-quantized form
+  of either.
+- The number of CPU threads used for inference can be pinned.
+- The model is loaded on first use, not when the engine is created, so
+  importing the agents that own an engine stays fast.
+"""
+
+import threading
+import numpy as np
+
+# --- Configuration and Constants ---
+
+# Specify the sentence-transformer model to be used for creating embeddings (vectors).
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+# Number of texts passed to the model in a single forward pass.
+EMBEDDING_BATCH_SIZE = 64
+# Inference backend: "torch", "torch-int8", "onnx" or "onnx-int8".
+EMBEDDING_BACKEND = "torch"
+# Number of CPU threads used for inference (None keeps the library default).
+EMBEDDING_THREADS = None
+
+SUPPORTED_BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+# The int8-quantized ONNX export published alongside the model on the Hugging Face Hub.
+ONNX_INT8_FILE = "onnx/model_qint8_avx512_vnni.onnx"
+
+# --- Embedding Engine ---
+
+class EmbeddingEngine:
+    """
+    Batched, length-bucketed CPU embedding engine for a sentence-transformer model.
+
+    Instances are also callable with a list of texts, which makes them usable
+    anywhere a Chroma embedding function is expected.
+    """
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL, batch_size: int = EMBEDDING_BATCH_SIZE,
+                 backend: str = EMBEDDING_BACKEND, num_threads: int = EMBEDDING_THREADS):
+        """
+        Configures the engine. The model is loaded on the requested backend when it is first needed.
+
+        Args:
+            model_name (str): The sentence-transformer model name.
+            batch_size (int): The number of texts embedded per forward pass.
+            backend (str): One of SUPPORTED_BACKENDS.
+            num_threads (int, optional): The number of CPU threads used for inference.
+
+        Raises:
+            ValueError: If the backend is not supported.
+        """
+        if backend not in SUPPORTED_BACKENDS:
+            raise ValueError(f"Unsupported embedding backend: {backend}")
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.backend = backend
+        self.num_threads = num_threads
+        self._model = None
+        self._model_lock = threading.Lock()
+
+    def _load_model(self):
+        # Import lazily so that ONNX Runtime is only required when it is actually used.
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        if self.num_threads:
+            torch.set_num_threads(self.num_threads)
+
+        if self.backend.startswith("onnx"):
+            import onnxruntime
+            session_options = onnxruntime.SessionOptions()
+            if self.num_threads:
+                session_options.intra_op_num_threads = self.num_threads
+                session_options.inter_op_num_threads = 1
+            model_kwargs = {"provider": "CPUExecutionProvider", "session_options": session_options}
+            if self.backend == "onnx-int8":
+                model_kwargs["file_name"] = ONNX_INT8_FILE
+            return SentenceTransformer(self.model_name, device="cpu", backend="onnx", model_kwargs=model_kwargs)
+
+        model = SentenceTransformer(self.model_name, device="cpu")
+        if self.backend == "torch-int8":
+            # Dynamic quantization stores the linear layers' weights as int8.
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        return model
+
+    @property
+    def model(self):
+        """The sentence-transformer model, loaded by the first caller (other callers wait for it)."""
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    self._model = self._load_model()
+        return self._model
+
+    @property
+    def cache_key(self) -> str:
+        """Identifies the vectors this engine produces; quantized backends differ slightly."""
+        return f"{self.model_name}:{self.backend}"
+
+    @property
+    def dimension(self) -> int:
+        """The size of the vectors produced by the model."""
+        return self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        """
+        Embeds a list of texts.
+
+        The texts are sorted by length and split into batches of `batch_size`, so
+        that texts of similar length are padded together. The output keeps the
+        order of the input.
+
+        Args:
+            texts (list[str]): The texts to embed.
+
+        Returns:
+            np.ndarray: A float32 array of shape (len(texts), dimension).
+        """
+        embeddings = np.empty((len(texts), self.dimension), dtype=np.float32)
+        # Sort by character length, a cheap stand-in for the token count.
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        for start in range(0, len(order), self.batch_size):
+            indices = order[start:start + self.batch_size]
+            embeddings[indices] = self.model.encode(
+                [texts[i] for i in indices],
+                batch_size=len(indices),
+                convert_to_numpy=True,
+                show_progress_bar=False,
+            )
+        return embeddings
+
+    def __call__(self, input: list[str]) -> np.ndarray:
+        return self.encode(list(input))
@@ -1,57 +1,148 @@
 import os
-import pandas as pd
-import docx
-import fitz  
-from pptx import Presentation
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from utils.parsers import PARSERS, parse_records, parse_records_list, pdf_page_count
+from utils.text import sliding_window_spans
+from utils.tracing import span
 
-SUPPORTED_EXTENSIONS = [".txt", ".md", ".pdf", ".docx", ".pptx", ".csv"]
+SUPPORTED_EXTENSIONS = list(PARSERS)
 
-def load_documents(path):
-    docs = []
+# PDFs with more pages than this are split into page ranges parsed by different workers.
+PDF_PAGES_PER_TASK = 50
+# Formats that are always streamed in the calling process. A worker would have to hold and
+# pickle the whole parsed file, while streaming them keeps memory bounded for huge exports.
+STREAMED_EXTENSIONS = {".csv"}
 
+# Chunk size limit and overlap between consecutive chunks, in estimated tokens. The embedding
+# model reads at most 256 word pieces, so larger chunks would be truncated when embedded.
+CHUNK_TARGET_TOKENS = 200
+CHUNK_OVERLAP_TOKENS = 40
+# Chunks shorter than this many characters (page numbers, stray headings) are dropped.
+MIN_CHUNK_LENGTH = 50
+
+def iter_document_paths(path):
     if os.path.isdir(path):
-        for file in os.listdir(path):
-            full_path = os.path.join(path, file)
-            docs.extend(load_documents(full_path))  
+        # Sort the listing so documents are always visited in the same order.
+        for file in sorted(os.listdir(path)):
+            yield from iter_document_paths(os.path.join(path, file))
     elif os.path.isfile(path):
-        ext = os.path.splitext(path)[1].lower()
-
-        if ext in [".txt", ".md"]:
-            with open(path, "r", encoding="utf-8") as f:
-                docs.append(f.read())
-
-        elif ext == ".pdf":
-            text = ""
-            with fitz.open(path) as doc:
-                for page in doc:
-                    text += page.get_text()
-            docs.append(text)
-
-        elif ext == ".docx":
-            doc = docx.Document(path)
-            text = "\n".join([para.text for para in doc.paragraphs])
-            docs.append(text)
-
-        elif ext == ".pptx":
-            prs = Presentation(path)
-            text = ""
-            for slide in prs.slides:
-                for shape in slide.shapes:
-                    if hasattr(shape, "text"):
-                        text += shape.text + "\n"
-            docs.append(text)
-
-        elif ext == ".csv":
-            try:
-                df = pd.read_csv(path, encoding="utf-8")
-            except UnicodeDecodeError:
-                df = pd.read_csv(path, encoding="latin1")  # fallback for Windows encoding
-            text = df.to_string(index=False)
-            docs.append(text)
-
-    return docs
+        if os.path.splitext(path)[1].lower() in SUPPORTED_EXTENSIONS:
+            yield path
+
+def load_document(path):
+    return "".join(record["text"] for record in parse_records(path))
+
+def _plan_tasks(index, path, pdf_pages_per_task):
+    # Turns one file into (file index, path, start page, end page) tasks.
+    if os.path.splitext(path)[1].lower() in STREAMED_EXTENSIONS:
+        return [(index, path, None, None)]
+    if path.lower().endswith(".pdf"):
+        try:
+            page_count = pdf_page_count(path)
+        except Exception:
+            # Let the worker raise the parsing error for this file.
+            page_count = 0
+        if page_count > pdf_pages_per_task:
+            return [(index, path, start, start + pdf_pages_per_task)
+                    for start in range(0, page_count, pdf_pages_per_task)]
+    return [(index, path, 0, None)]
+
+def iter_file_records(paths, max_workers=1, pdf_pages_per_task=PDF_PAGES_PER_TASK):
+    # Yields (path, records) pairs in the same order as paths, where records is a lazy
+    # iterator over the file's page/section records. Iterating the records of a file that
+    # fails to parse raises that file's exception; the following files are unaffected.
+    paths = list(paths)
+
+    # A single non-PDF file cannot be split, so a process pool would only add overhead.
+    if max_workers <= 1 or (len(paths) == 1 and not paths[0].lower().endswith(".pdf")):
+        for path in paths:
+            yield path, parse_records(path)
+        return
+
+    tasks = (task for index, path in enumerate(paths) for task in _plan_tasks(index, path, pdf_pages_per_task))
+    pending = deque()
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        def fill():
+            # Keep a bounded number of tasks in flight so memory stays flat on large corpora.
+            while len(pending) < max_workers * 2:
+                task = next(tasks, None)
+                if task is None:
+                    return
+                index, path, start_page, end_page = task
+                if start_page is None:
+                    # Streamed in this process when its turn comes.
+                    pending.append((index, None, path))
+                else:
+                    pending.append((index, executor.submit(parse_records_list, path, start_page, end_page), path))
+
+        def records_of(index):
+            while True:
+                fill()
+                if not pending or pending[0][0] != index:
+                    return
+                _, future, path = pending.popleft()
+                if future is None:
+                    yield from parse_records(path)
+                else:
+                    yield from future.result()
+
+        for index, path in enumerate(paths):
+            yield path, records_of(index)
+            # Discard whatever the consumer did not read, e.g. after a parsing error.
+            fill()
+            while pending and pending[0][0] == index:
+                future = pending.popleft()[1]
+                if future is not None:
+                    future.cancel()
+                fill()
+
+def parse_files(paths, max_workers=1, pdf_pages_per_task=PDF_PAGES_PER_TASK):
+    # Parses the given files and returns (path, text, error) tuples in the same order as paths.
+    # A file that fails to parse gets text None and the exception, without affecting the others.
+    results = []
+    for path, records in iter_file_records(paths, max_workers, pdf_pages_per_task):
+        try:
+            results.append((path, "".join(record["text"] for record in records), None))
+        except Exception as e:
+            print(f"Failed to parse {path}. Reason: {e}")
+            results.append((path, None, e))
+    return results
+
+def load_documents(path, max_workers=1):
+    # Set max_workers above 1 to parse the documents in a process pool.
+    with span("load_documents") as loading:
+        results = parse_files(iter_document_paths(path), max_workers=max_workers)
+        loading["files"] = len(results)
+    return [text for _, text, error in results if error is None]
+
+def chunk_by_paragraph_with_offsets(text, min_chunk_length=50):
+    # Yields (offset, chunk) pairs, where offset is the chunk's position in the original text.
+    cursor = 0
+    for para in text.split("\n\n"):
+        stripped = para.strip()
+        if len(stripped) >= min_chunk_length:
+            yield cursor + para.index(stripped), stripped
+        cursor += len(para) + 2
+
+def chunk_by_tokens_with_offsets(text, target_tokens=CHUNK_TARGET_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS,
+                                 min_chunk_length=MIN_CHUNK_LENGTH):
+    # Yields (offset, chunk) pairs of overlapping, size-bounded windows of whole sentences,
+    # where offset is the chunk's position in the original text and chunk == text[offset:offset + len(chunk)].
+    for start, end in sliding_window_spans(text, target_tokens, overlap_tokens):
+        if end - start >= min_chunk_length:
+            yield start, text[start:end]
+
+def chunk_records(records, target_tokens=CHUNK_TARGET_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS,
+                  min_chunk_length=MIN_CHUNK_LENGTH):
+    # Lazily chunks a stream of records, yielding (offset, chunk, record) triples where
+    # offset is the chunk's position in the concatenated text of all records. Chunks never
+    # span two records, so every chunk belongs to exactly one page or slide.
+    base = 0
+    for record in records:
+        for offset, chunk in chunk_by_tokens_with_offsets(record["text"], target_tokens, overlap_tokens, min_chunk_length):
+            yield base + offset, chunk, record
+        base += len(record["text"])
 
 def basic_chunk_by_paragraph(text, min_chunk_length=50):
-    paragraphs = text.strip().split("\n\n")
-    chunks = [para.strip() for para in paragraphs if len(para.strip()) >= min_chunk_length]
-    return chunks
+    return [chunk for _, chunk in chunk_by_paragraph_with_offsets(text, min_chunk_length)]
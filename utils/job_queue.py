@@ -0,0 +1,284 @@
+# utils/job_queue.py
+
+"""
+This module implements a small persistent queue of background jobs, used to run
+document indexing off the request path.
+
+Jobs are executed one at a time (or by a few worker threads) in submission order.
+Every job has a state that is kept in memory, where the UI can poll it, and
+written to a JSON file, so that the job history and the progress of unfinished
+jobs survive a restart:
+- a job's runner reports progress (any JSON-serializable dictionary) while it works;
+- a job can be cancelled: a queued job never starts, and a running job's runner
+  is asked to stop through a `threading.Event` it checks between steps;
+- jobs that were queued or running when the process stopped are queued again
+  when the queue is opened, as every runner is expected to be resumable.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+
+# --- Configuration and Constants ---
+
+# Number of finished jobs kept in the state file and shown in the history.
+JOB_HISTORY_SIZE = 20
+# Minimum time between two writes of the state file for progress updates, in seconds.
+# Status changes (started, finished, cancelled) are always written immediately.
+JOB_STATE_SAVE_INTERVAL = 1.0
+
+# Job statuses.
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+class JobCancelled(Exception):
+    """Raised by a runner that stopped early because its job was cancelled."""
+
+# --- Job Queue ---
+
+class JobQueue:
+    """
+    Persistent FIFO of background jobs with progress reporting and cancellation.
+
+    A runner is called as `runner(params, report, cancelled)`, where `params` is
+    the dictionary the job was submitted with, `report(progress)` publishes the
+    job's current progress, and `cancelled` is an event the runner should check
+    regularly (raising `JobCancelled` when it is set). Its return value becomes
+    the job's 'result'.
+    """
+
+    def __init__(self, path: str, runner, workers: int = 1, history_size: int = JOB_HISTORY_SIZE):
+        """
+        Opens the queue whose state is stored in the given file. Unfinished jobs
+        found there are queued again; the worker threads start with the first job.
+
+        Args:
+            path (str): The JSON file holding the job states.
+            runner: The function that executes a job (see the class description).
+            workers (int): The number of jobs that may run at the same time.
+            history_size (int): The number of finished jobs to remember.
+        """
+        self.path = path
+        self.runner = runner
+        self.workers = workers
+        self.history_size = history_size
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._jobs = {}            # job ID -> state, in submission order
+        self._pending = deque()    # IDs of the queued jobs
+        self._cancel_events = {}   # job ID -> cancellation event of a queued or running job
+        self._threads = []
+        self._last_save = 0.0
+        self._load()
+
+    # --- Persistence ---
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                jobs = json.load(f)["jobs"]
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Failed to read job state {self.path}. Reason: {e}")
+            return
+        for job in jobs:
+            self._jobs[job["id"]] = job
+            # The process stopped before this job finished; run it (again) from the start.
+            if job["status"] in ACTIVE_STATUSES:
+                job.update(status=QUEUED, started=None, resumed=True)
+                self._pending.append(job["id"])
+                self._cancel_events[job["id"]] = threading.Event()
+        if self._pending:
+            self._start_workers()
+
+    def _save(self, force: bool = True):
+        # Called with the lock held. Progress updates are throttled, status changes are not.
+        now = time.monotonic()
+        if not force and now - self._last_save < JOB_STATE_SAVE_INTERVAL:
+            return
+        self._last_save = now
+        # Forget the oldest finished jobs beyond the history size.
+        finished = [job_id for job_id, job in self._jobs.items() if job["status"] not in ACTIVE_STATUSES]
+        for job_id in finished[:max(0, len(finished) - self.history_size)]:
+            del self._jobs[job_id]
+        # Write atomically, like the ingestion manifest, so a crash never leaves half a file.
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"jobs": list(self._jobs.values())}, f)
+        os.replace(tmp_path, self.path)
+
+    # --- Public Interface ---
+
+    def submit(self, **params) -> str:
+        """
+        Queues a job, unless an identical job is still waiting to start.
+
+        Args:
+            **params: The job's parameters, passed to the runner (JSON-serializable).
+
+        Returns:
+            str: The ID of the queued job (or of the identical job already queued).
+        """
+        with self._lock:
+            for job_id in self._pending:
+                if self._jobs[job_id]["params"] == params:
+                    return job_id
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                "id": job_id,
+                "params": params,
+                "status": QUEUED,
+                "submitted": time.time(),
+                "started": None,
+                "finished": None,
+                "progress": {},
+                "result": None,
+                "error": None,
+            }
+            self._pending.append(job_id)
+            self._cancel_events[job_id] = threading.Event()
+            self._save()
+            self._start_workers()
+            # Callers of `wait` share the condition, so wake everyone; an idle worker takes the job.
+            self._wakeup.notify_all()
+            return job_id
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancels a queued or running job. A running job stops at the runner's next check.
+
+        Args:
+            job_id (str): The ID of the job.
+
+        Returns:
+            bool: True if the job was still queued or running.
+        """
+        with self._lock:
+            event = self._cancel_events.get(job_id)
+            if event is None:
+                return False
+            event.set()
+            if job_id in self._pending:
+                self._pending.remove(job_id)
+                del self._cancel_events[job_id]
+                self._jobs[job_id].update(status=CANCELLED, finished=time.time())
+                self._save()
+                self._wakeup.notify_all()
+            return True
+
+    def cancel_all(self, wait: bool = True, timeout: float = None):
+        """
+        Cancels every queued and running job.
+
+        Args:
+            wait (bool): Whether to wait until the running jobs have stopped.
+            timeout (float, optional): The maximum time to wait, in seconds.
+        """
+        with self._lock:
+            job_ids = list(self._cancel_events)
+        for job_id in job_ids:
+            self.cancel(job_id)
+        if wait:
+            for job_id in job_ids:
+                self.wait(job_id, timeout)
+
+    def get(self, job_id: str) -> dict:
+        """
+        Returns a snapshot of a job's state.
+
+        Args:
+            job_id (str): The ID of the job.
+
+        Returns:
+            dict | None: The job's 'id', 'params', 'status', 'submitted', 'started' and
+                         'finished' times, latest 'progress', 'result' and 'error',
+                         or None if the job is unknown.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return json.loads(json.dumps(job)) if job is not None else None
+
+    def jobs(self) -> list[dict]:
+        """
+        Returns snapshots of every known job, most recently submitted first.
+        """
+        with self._lock:
+            return json.loads(json.dumps(list(reversed(self._jobs.values()))))
+
+    def active(self) -> bool:
+        """
+        Checks whether any job is queued or running.
+        """
+        with self._lock:
+            return bool(self._cancel_events)
+
+    def wait(self, job_id: str, timeout: float = None) -> dict:
+        """
+        Blocks until a job has finished.
+
+        Args:
+            job_id (str): The ID of the job.
+            timeout (float, optional): The maximum time to wait, in seconds.
+
+        Returns:
+            dict | None: A snapshot of the job's state (possibly still active after a timeout).
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while job_id in self._cancel_events:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._wakeup.wait(remaining)
+        return self.get(job_id)
+
+    # --- Workers ---
+
+    def _start_workers(self):
+        # Called with the lock held. The threads are created on first use, so opening
+        # a queue without work to do costs nothing.
+        self._threads = [thread for thread in self._threads if thread.is_alive()]
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._work, name=f"job-worker-{len(self._threads)}", daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def _work(self):
+        while True:
+            with self._lock:
+                while not self._pending:
+                    self._wakeup.wait()
+                job_id = self._pending.popleft()
+                job = self._jobs[job_id]
+                cancelled = self._cancel_events[job_id]
+                job.update(status=RUNNING, started=time.time())
+                params = dict(job["params"])
+                self._save()
+
+            def report(progress: dict, job=job):
+                with self._lock:
+                    job["progress"] = progress
+                    self._save(force=False)
+
+            try:
+                result, status, error = self.runner(params, report, cancelled), COMPLETED, None
+            except JobCancelled:
+                result, status, error = None, CANCELLED, None
+            except Exception as e:
+                print(f"Job {job_id} failed. Reason: {e}")
+                result, status, error = None, FAILED, str(e)
+
+            with self._lock:
+                job.update(status=status, finished=time.time(), result=result, error=error)
+                del self._cancel_events[job_id]
+                self._save()
+                # Wake up the callers of `wait` (and any idle worker).
+                self._wakeup.notify_all()
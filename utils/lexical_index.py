@@ -0,0 +1,352 @@
+# utils/lexical_index.py
+
+"""
+This module implements an in-process inverted index with BM25 scoring.
+It complements dense vector search, which tends to miss exact identifiers such as
+part numbers, codes and names: those are kept as whole tokens here and matched
+literally.
+
+The index is maintained incrementally. Every add or delete is appended to an
+operations log on disk, and the full index is only rewritten as a snapshot once
+the log has grown large, so keeping the index current costs time proportional
+to the batch being indexed, not to the size of the corpus.
+
+Every chunk's metadata is kept next to its terms, so a search can be restricted
+with the same `where` filters as the vector store; only the chunks matching the
+query's terms are checked against the filter.
+"""
+
+import math
+import os
+import pickle
+import re
+import threading
+from collections import Counter
+import numpy as np
+from utils.vector_store import matches_where
+
+# --- Configuration and Constants ---
+
+# Define the directory where the lexical index is persisted (next to the vector database).
+LEXICAL_INDEX_PATH = "lexical_index"
+# BM25 parameters: term frequency saturation (k1) and document length normalization (b).
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Number of logged chunk operations after which the log is folded into a new snapshot.
+COMPACT_AFTER_OPERATIONS = 50_000
+# Terms found in more than this fraction of chunks are ignored when the query also
+# contains rarer terms: they barely change the ranking but have the longest posting lists.
+COMMON_TERM_FRACTION = 0.5
+
+# Words, numbers and identifiers; internal '-', '_', '.' and '/' keep part numbers
+# such as "PN-001-042" or "v2.5" together as a single token.
+_TOKEN_PATTERN = re.compile(r"[0-9a-z]+(?:[-_./][0-9a-z]+)*")
+_SPLIT_PATTERN = re.compile(r"[-_./]")
+# Very common English words carry no signal but have the longest posting lists.
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have how i if in into is it its of on or "
+    "that the their there these this to was were what when where which who why will with".split()
+)
+
+def tokenize(text: str) -> list[str]:
+    """
+    Splits text into lowercase search terms.
+
+    Compound identifiers are emitted both whole and as their parts, so "PN-001-042"
+    matches a search for the full part number as well as for "001".
+
+    Args:
+        text (str): The text to tokenize.
+
+    Returns:
+        list[str]: The terms, in order, with stopwords removed.
+    """
+    terms = []
+    for token in _TOKEN_PATTERN.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        terms.append(token)
+        if _SPLIT_PATTERN.search(token):
+            terms.extend(part for part in _SPLIT_PATTERN.split(token) if part and part not in STOPWORDS)
+    return terms
+
+# --- BM25 Index ---
+
+class BM25Index:
+    """
+    Persistent inverted index over chunk texts, searchable with BM25.
+    """
+
+    def __init__(self, path: str = LEXICAL_INDEX_PATH):
+        """
+        Loads the index stored in the given directory (or starts an empty one).
+
+        Args:
+            path (str): The directory holding the snapshot and the operations log.
+        """
+        self.path = path
+        self._snapshot_path = os.path.join(path, "snapshot.pkl")
+        self._log_path = os.path.join(path, "operations.log")
+        self._lock = threading.Lock()
+        self._reset_state()
+        self._load()
+
+    def _reset_state(self):
+        # Chunks are stored in integer slots so posting lists can be scored as arrays.
+        self._slot_ids = []        # slot -> chunk ID (None for a free slot)
+        self._slots = {}           # chunk ID -> slot
+        self._slot_terms = []      # slot -> distinct terms of the chunk, needed for deletion
+        self._slot_metadata = []   # slot -> metadata of the chunk, for filtered searches
+        self._free_slots = []
+        self._lengths = np.zeros(0, dtype=np.float32)  # slot -> number of terms
+        self._total_length = 0
+        # term -> {slot: term frequency}
+        self._postings = {}
+        # term -> (slots array, frequencies array), rebuilt lazily after the term changes.
+        self._arrays = {}
+        self._logged_operations = 0
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    # --- Persistence ---
+
+    def _load(self):
+        if os.path.exists(self._snapshot_path):
+            with open(self._snapshot_path, "rb") as f:
+                state = pickle.load(f)
+            # An index written before chunk metadata was kept cannot filter; it is
+            # discarded, and the Retrieval Agent rebuilds it from the vector store.
+            if "slot_metadata" not in state:
+                self._discard()
+                return
+            self._slot_ids = state["slot_ids"]
+            self._slot_metadata = state["slot_metadata"]
+            self._slot_terms = state["slot_terms"]
+            self._postings = state["postings"]
+            self._lengths = state["lengths"]
+            self._slots = {chunk_id: slot for slot, chunk_id in enumerate(self._slot_ids) if chunk_id is not None}
+            self._free_slots = [slot for slot, chunk_id in enumerate(self._slot_ids) if chunk_id is None]
+            self._total_length = int(self._lengths.sum())
+
+        # Replay the operations logged since the snapshot was written. A record cut
+        # short by a crash is ignored, together with everything after it.
+        if os.path.exists(self._log_path):
+            with open(self._log_path, "rb") as f:
+                while True:
+                    try:
+                        operation, payload = pickle.load(f)
+                    except (EOFError, pickle.UnpicklingError, ValueError):
+                        break
+                    if operation == "add" and any(len(document) != 3 for document in payload):
+                        self._discard()
+                        return
+                    if operation == "add":
+                        self._add(payload)
+                    else:
+                        self._delete(payload)
+                    self._logged_operations += len(payload)
+
+    def _discard(self):
+        # Forgets the index, in memory and on disk.
+        self._reset_state()
+        for file_path in (self._snapshot_path, self._log_path):
+            if os.path.exists(file_path):
+                os.remove(file_path)
+
+    def _log(self, operation: str, payload: list):
+        os.makedirs(self.path, exist_ok=True)
+        with open(self._log_path, "ab") as f:
+            pickle.dump((operation, payload), f, protocol=pickle.HIGHEST_PROTOCOL)
+        self._logged_operations += len(payload)
+        if self._logged_operations >= COMPACT_AFTER_OPERATIONS:
+            self._compact()
+
+    def _compact(self):
+        # Write the full index atomically, then start a new, empty log.
+        os.makedirs(self.path, exist_ok=True)
+        state = {
+            "slot_ids": self._slot_ids,
+            "slot_terms": self._slot_terms,
+            "slot_metadata": self._slot_metadata,
+            "postings": self._postings,
+            "lengths": self._lengths,
+        }
+        temp_path = self._snapshot_path + ".tmp"
+        with open(temp_path, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, self._snapshot_path)
+        if os.path.exists(self._log_path):
+            os.remove(self._log_path)
+        self._logged_operations = 0
+
+    # --- Updates ---
+
+    def _add(self, documents: list):
+        for chunk_id, term_counts, metadata in documents:
+            # An upsert replaces the previous version of the chunk.
+            if chunk_id in self._slots:
+                self._delete([chunk_id])
+
+            if self._free_slots:
+                slot = self._free_slots.pop()
+                self._slot_ids[slot] = chunk_id
+                self._slot_terms[slot] = tuple(term_counts)
+                self._slot_metadata[slot] = metadata
+            else:
+                slot = len(self._slot_ids)
+                self._slot_ids.append(chunk_id)
+                self._slot_terms.append(tuple(term_counts))
+                self._slot_metadata.append(metadata)
+                if slot >= len(self._lengths):
+                    self._lengths = np.concatenate([self._lengths, np.zeros(max(1024, slot), dtype=np.float32)])
+            self._slots[chunk_id] = slot
+
+            length = sum(term_counts.values())
+            self._lengths[slot] = length
+            self._total_length += length
+            for term, count in term_counts.items():
+                self._postings.setdefault(term, {})[slot] = count
+                self._arrays.pop(term, None)
+
+    def _delete(self, chunk_ids: list[str]):
+        for chunk_id in chunk_ids:
+            slot = self._slots.pop(chunk_id, None)
+            if slot is None:
+                continue
+            for term in self._slot_terms[slot]:
+                postings = self._postings[term]
+                del postings[slot]
+                if not postings:
+                    del self._postings[term]
+                self._arrays.pop(term, None)
+            self._total_length -= int(self._lengths[slot])
+            self._lengths[slot] = 0
+            self._slot_ids[slot] = None
+            self._slot_terms[slot] = ()
+            self._slot_metadata[slot] = None
+            self._free_slots.append(slot)
+
+    def add(self, chunks: list[dict]):
+        """
+        Indexes (or re-indexes) a batch of chunks.
+
+        Args:
+            chunks (list[dict]): Chunk dictionaries with an 'id', a 'text' and optionally their 'metadata'.
+        """
+        documents = [(chunk["id"], Counter(tokenize(chunk["text"])), chunk.get("metadata") or {}) for chunk in chunks]
+        if not documents:
+            return
+        with self._lock:
+            self._add(documents)
+            self._log("add", documents)
+
+    def delete(self, chunk_ids: list[str]):
+        """
+        Removes a batch of chunks from the index; unknown IDs are ignored.
+
+        Args:
+            chunk_ids (list[str]): The IDs of the chunks to remove.
+        """
+        if not chunk_ids:
+            return
+        with self._lock:
+            self._delete(chunk_ids)
+            self._log("delete", list(chunk_ids))
+
+    def clear(self):
+        """
+        Removes every chunk from the index, in memory and on disk.
+        """
+        with self._lock:
+            self._discard()
+
+    # --- Search ---
+
+    def _term_arrays(self, term: str):
+        arrays = self._arrays.get(term)
+        if arrays is None:
+            postings = self._postings[term]
+            arrays = (
+                np.fromiter(postings.keys(), dtype=np.int64, count=len(postings)),
+                np.fromiter(postings.values(), dtype=np.float32, count=len(postings)),
+            )
+            self._arrays[term] = arrays
+        return arrays
+
+    def search(self, query: str, n_results: int = 10, allowed_ids: set = None,
+               where: dict = None) -> list[tuple[str, float]]:
+        """
+        Returns the chunks that best match the query's terms under BM25.
+
+        Filters restrict the results, not the corpus statistics, which still cover every chunk.
+
+        Args:
+            query (str): The search text.
+            n_results (int): The maximum number of results.
+            allowed_ids (set, optional): If given, only these chunks can be returned.
+            where (dict, optional): A metadata filter (see `utils.vector_store.matches_where`);
+                                    only chunks whose metadata matches it can be returned.
+
+        Returns:
+            list[tuple[str, float]]: (chunk ID, score) pairs, best first.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        with self._lock:
+            terms = [term for term in terms if term in self._postings]
+            if not terms or not self._slots:
+                return []
+
+            n_documents = len(self._slots)
+            rare_terms = [term for term in terms if len(self._postings[term]) <= COMMON_TERM_FRACTION * n_documents]
+            terms = rare_terms or terms
+            average_length = self._total_length / n_documents or 1.0
+            slot_arrays, score_arrays = [], []
+            # Score each term's posting list in one vectorized step.
+            for term in terms:
+                slots, frequencies = self._term_arrays(term)
+                document_frequency = len(slots)
+                idf = math.log(1.0 + (n_documents - document_frequency + 0.5) / (document_frequency + 0.5))
+                norms = BM25_K1 * (1.0 - BM25_B + BM25_B * self._lengths[slots] / average_length)
+                slot_arrays.append(slots)
+                score_arrays.append(idf * frequencies * (BM25_K1 + 1.0) / (frequencies + norms))
+
+            # Sum the per-term scores of every chunk that matched at least one term.
+            candidates, inverse = np.unique(np.concatenate(slot_arrays), return_inverse=True)
+            scores = np.bincount(inverse, weights=np.concatenate(score_arrays))
+            if allowed_ids is not None or where is not None:
+                keep = np.fromiter(((allowed_ids is None or self._slot_ids[slot] in allowed_ids)
+                                    and (where is None or matches_where(self._slot_metadata[slot], where))
+                                    for slot in candidates), dtype=bool, count=len(candidates))
+                candidates, scores = candidates[keep], scores[keep]
+                if not len(scores):
+                    return []
+
+            if len(scores) > n_results:
+                top = np.argpartition(-scores, n_results - 1)[:n_results]
+            else:
+                top = np.arange(len(scores))
+            top = top[np.argsort(-scores[top], kind="stable")]
+            return [(self._slot_ids[candidates[i]], float(scores[i])) for i in top]
+
+# --- Rank Fusion ---
+
+def reciprocal_rank_fusion(rankings: list[list[str]], k: int = 60) -> list[str]:
+    """
+    Merges several ranked lists of IDs into one with reciprocal rank fusion.
+
+    Each ID scores 1 / (k + rank) in every list it appears in, so items ranked
+    highly by any retriever, and especially by several, come first.
+
+    Args:
+        rankings (list[list[str]]): The ranked ID lists, best first.
+        k (int): Damping constant; larger values flatten the rank contributions.
+
+    Returns:
+        list[str]: All IDs, ordered by fused score.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
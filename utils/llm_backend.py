@@ -0,0 +1,561 @@
+# utils/llm_backend.py
+
+"""
+This module is the layer between the LLM Response Agent and the language model
+service. A backend wraps a generative model client (Gemini, or the local stub
+model for tests) and makes every call:
+- coalesced: concurrent requests for an identical prompt share one model call
+  (single flight), and concurrent streams of an identical prompt share one stream;
+- rate limited: a token bucket spaces requests out to stay within the quota;
+- retried: transient failures (quota, unavailable, timeouts) are retried with
+  exponential backoff and full jitter;
+- pooled: model clients are reused from a bounded pool, which also caps the
+  number of calls in flight.
+
+The backend works with text only: `generate` returns the answer, `stream`
+yields its pieces, and both have asynchronous counterparts.
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import asynccontextmanager, contextmanager
+from utils.stub_llm import StubGenerativeModel
+
+# --- Configuration and Constants ---
+
+# The Gemini model used by the "gemini" backend.
+GEMINI_MODEL_NAME = "gemini-2.5-flash"
+# Maximum number of model calls in flight (and clients kept in the pool).
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "8"))
+# Default request rate of the Gemini backend, in requests per minute. The stub is
+# unlimited unless LLM_REQUESTS_PER_MINUTE is set explicitly.
+DEFAULT_GEMINI_REQUESTS_PER_MINUTE = 600
+# Number of requests that may be sent at once after an idle period.
+LLM_RATE_LIMIT_BURST = 10
+# Number of retries after the first failed attempt of a call.
+LLM_MAX_RETRIES = 3
+# Backoff before retry n is uniformly random in [0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2**n)] seconds.
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 20.0
+# How often an asynchronous caller retries to take a client from a full pool, in seconds.
+_POOL_POLL_INTERVAL = 0.01
+
+# --- Rate Limiting ---
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` requests per second on average, with bursts
+    of up to `burst` requests. Callers wait in the order they arrived.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        # Takes a token, going into debt if none is left, and returns how long the
+        # caller must wait until its token has been refilled.
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return max(0.0, -self._tokens / self.rate)
+
+    def acquire(self):
+        """Blocks until a request may be sent."""
+        delay = self._reserve()
+        if delay:
+            time.sleep(delay)
+
+    async def acquire_async(self):
+        """Waits, without blocking the event loop, until a request may be sent."""
+        delay = self._reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+# --- Client Pool ---
+
+class ClientPool:
+    """
+    A bounded pool of reusable model clients. Clients are created on demand, at
+    most `size` of them, and returned to the pool after each call.
+    """
+
+    def __init__(self, factory, size: int):
+        self._factory = factory
+        self._slots = threading.Semaphore(size)
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _take(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        try:
+            return self._factory()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _give(self, client):
+        with self._lock:
+            self._idle.append(client)
+        self._slots.release()
+
+    @contextmanager
+    def client(self):
+        """Lends a client for the duration of the block, waiting while the pool is exhausted."""
+        self._slots.acquire()
+        client = self._take()
+        try:
+            yield client
+        finally:
+            self._give(client)
+
+    @asynccontextmanager
+    async def client_async(self):
+        """Asynchronous counterpart of `client`; waiting does not block the event loop."""
+        while not self._slots.acquire(blocking=False):
+            await asyncio.sleep(_POOL_POLL_INTERVAL)
+        client = self._take()
+        try:
+            yield client
+        finally:
+            self._give(client)
+
+# --- Retries ---
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Tells whether a failed call may succeed when repeated: quota and rate-limit
+    errors, unavailable or overloaded servers, timeouts and connection errors.
+    """
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    try:
+        from google.api_core import exceptions as google_exceptions
+    except ImportError:
+        return False
+    return isinstance(error, (
+        google_exceptions.TooManyRequests,
+        google_exceptions.ResourceExhausted,
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.DeadlineExceeded,
+        google_exceptions.InternalServerError,
+    ))
+
+def backoff_delay(attempt: int) -> float:
+    """
+    Returns the delay before retry number `attempt` (0-based): exponential backoff
+    with full jitter, so clients that failed together do not retry together.
+    """
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+
+# --- Shared Streams ---
+
+class CallAbandoned(Exception):
+    """
+    Raised to the callers sharing a coalesced model call or stream when the caller
+    that was making it was cancelled; their own requests were not.
+    """
+
+
+class _SharedStream:
+    """
+    One model stream read by several consumers. Every piece is kept, so a consumer
+    that joins late replays the pieces it missed. Whichever consumer runs out of
+    pieces first pulls the next one from the model; the others wait for it.
+
+    The backend registers consumers (`consumers`) and calls `on_finish` once the
+    stream has ended; `on_leave` is called by every consumer that stops reading and
+    returns True if it was the last one, so the unfinished model call is abandoned.
+    """
+
+    def __init__(self, source, on_finish, on_leave):
+        self._source = source
+        self._on_finish = on_finish
+        self._on_leave = on_leave
+        self.consumers = 0
+        self.done = False
+        self._pieces = []
+        self._error = None
+        self._producing = False
+        self._condition = threading.Condition()
+
+    def _next_piece(self, index: int):
+        # Returns the piece at `index`, or None if the caller must produce it.
+        # Raises StopIteration at the end of the stream.
+        with self._condition:
+            while index >= len(self._pieces) and not self.done and self._producing:
+                self._condition.wait()
+            if index < len(self._pieces):
+                return self._pieces[index]
+            if self.done:
+                if self._error is not None:
+                    raise self._error
+                raise StopIteration
+            self._producing = True
+            return None
+
+    def _publish(self, piece=None, end: bool = False, error: BaseException = None):
+        with self._condition:
+            self._producing = False
+            if end:
+                self.done, self._error = True, error
+            else:
+                self._pieces.append(piece)
+            self._condition.notify_all()
+        if end:
+            self._on_finish()
+
+    def read(self):
+        """Yields every piece of the stream, from the first one."""
+        index = 0
+        try:
+            while True:
+                try:
+                    piece = self._next_piece(index)
+                except StopIteration:
+                    return
+                if piece is None:
+                    # This consumer pulls the next piece on behalf of everyone.
+                    try:
+                        piece = next(self._source)
+                    except StopIteration:
+                        self._publish(end=True)
+                        return
+                    except BaseException as e:
+                        self._publish(end=True, error=e)
+                        raise
+                    self._publish(piece)
+                index += 1
+                yield piece
+        finally:
+            if self._on_leave(self):
+                # Nobody reads on, so release the model call (and its pooled client).
+                self._source.close()
+
+class _SharedStreamAsync(_SharedStream):
+    """Asynchronous counterpart of `_SharedStream`, for the consumers of one event loop."""
+
+    def __init__(self, source, on_finish, on_leave):
+        super().__init__(source, on_finish, on_leave)
+        self._condition = asyncio.Condition()
+
+    async def _next_piece(self, index: int):
+        async with self._condition:
+            await self._condition.wait_for(lambda: index < len(self._pieces) or self.done or not self._producing)
+            if index < len(self._pieces):
+                return self._pieces[index]
+            if self.done:
+                if self._error is not None:
+                    raise self._error
+                raise StopAsyncIteration
+            self._producing = True
+            return None
+
+    async def _publish(self, piece=None, end: bool = False, error: BaseException = None):
+        async with self._condition:
+            self._producing = False
+            if end:
+                self.done, self._error = True, error
+            else:
+                self._pieces.append(piece)
+            self._condition.notify_all()
+        if end:
+            self._on_finish()
+
+    async def read(self):
+        """Yields every piece of the stream, from the first one."""
+        index = 0
+        try:
+            while True:
+                try:
+                    piece = await self._next_piece(index)
+                except StopAsyncIteration:
+                    return
+                if piece is None:
+                    try:
+                        piece = await self._source.__anext__()
+                    except StopAsyncIteration:
+                        await self._publish(end=True)
+                        return
+                    except asyncio.CancelledError:
+                        # Only this consumer was cancelled, but the model stream died with it.
+                        await self._publish(end=True, error=CallAbandoned("The shared model stream was cancelled."))
+                        raise
+                    except BaseException as e:
+                        await self._publish(end=True, error=e)
+                        raise
+                    await self._publish(piece)
+                index += 1
+                yield piece
+        finally:
+            if self._on_leave(self):
+                await self._source.aclose()
+
+# --- Backend ---
+
+class LLMBackend:
+    """
+    A generative model behind single-flight coalescing, rate limiting, retries
+    and a client pool.
+
+    The clients created by `client_factory` must provide the `generate_content`
+    and `generate_content_async` methods of `google.generativeai.GenerativeModel`
+    (with and without `stream=True`).
+    """
+
+    def __init__(self, client_factory, pool_size: int = LLM_POOL_SIZE, requests_per_minute: float = None,
+                 burst: int = LLM_RATE_LIMIT_BURST, max_retries: int = LLM_MAX_RETRIES):
+        """
+        Args:
+            client_factory: Creates a new model client.
+            pool_size (int): Maximum number of calls in flight.
+            requests_per_minute (float, optional): Request rate limit; None for no limit.
+            burst (int): Number of requests that may be sent at once.
+            max_retries (int): Number of retries of a failed call.
+        """
+        self.pool = ClientPool(client_factory, pool_size)
+        self.rate_limiter = TokenBucket(requests_per_minute / 60, burst) if requests_per_minute else None
+        self.max_retries = max_retries
+        # Calls in flight, by prompt: futures of plain calls, shared streams of streaming calls.
+        self._calls = {}
+        self._streams = {}
+        self._async_streams = {}
+        self._lock = threading.Lock()
+
+    # --- Single Flight ---
+
+    def _join_call(self, prompt: str) -> tuple[Future, bool]:
+        # Returns the future of the call in flight for this prompt, and whether the caller must make it.
+        with self._lock:
+            future = self._calls.get(prompt)
+            if future is not None:
+                return future, False
+            future = self._calls[prompt] = Future()
+            return future, True
+
+    def _settle_call(self, prompt: str, future: Future, result=None, error: BaseException = None):
+        with self._lock:
+            del self._calls[prompt]
+        if isinstance(error, Exception):
+            future.set_exception(error)
+        elif error is not None:
+            # The caller making the call was cancelled (or interrupted): that is not the
+            # waiting callers' error, so they are told to make the call again themselves.
+            future.set_exception(CallAbandoned("The shared model call was cancelled."))
+        else:
+            future.set_result(result)
+
+    def generate(self, prompt: str) -> str:
+        """
+        Generates the complete answer to a prompt. Identical prompts requested
+        while a call is in flight wait for that call instead of making their own.
+
+        Args:
+            prompt (str): The full prompt.
+
+        Returns:
+            str: The generated text.
+        """
+        while True:
+            future, leader = self._join_call(prompt)
+            if leader:
+                break
+            try:
+                return future.result()
+            except CallAbandoned:
+                # The call was abandoned; the first caller to come back takes it over.
+                continue
+        try:
+            text = self._generate(prompt)
+        except BaseException as e:
+            self._settle_call(prompt, future, error=e)
+            raise
+        self._settle_call(prompt, future, text)
+        return text
+
+    async def generate_async(self, prompt: str) -> str:
+        """
+        Asynchronous counterpart of `generate`. Calls are coalesced with synchronous
+        callers and with callers on other event loops. Cancelling a caller only
+        cancels that caller: if it was making the shared call, a waiting caller
+        makes it instead.
+        """
+        while True:
+            future, leader = self._join_call(prompt)
+            if leader:
+                break
+            try:
+                # Shielded, so that cancelling this caller never cancels the shared call.
+                return await asyncio.shield(asyncio.wrap_future(future))
+            except CallAbandoned:
+                # The call was abandoned; the first caller to come back takes it over.
+                continue
+        try:
+            text = await self._generate_async(prompt)
+        except BaseException as e:
+            self._settle_call(prompt, future, error=e)
+            raise
+        self._settle_call(prompt, future, text)
+        return text
+
+    def stream(self, prompt: str):
+        """
+        Generates the answer to a prompt as a stream of text pieces. Concurrent
+        streams of an identical prompt share one model stream; a stream joined late
+        starts with the pieces generated so far.
+
+        Args:
+            prompt (str): The full prompt.
+
+        Yields:
+            str: Consecutive pieces of the answer.
+        """
+        shared = self._join_stream(self._streams, prompt, _SharedStream, lambda: self._stream(prompt))
+        yield from shared.read()
+
+    async def stream_async(self, prompt: str):
+        """
+        Asynchronous counterpart of `stream`. Streams are shared between the
+        consumers of one event loop.
+        """
+        key = (asyncio.get_running_loop(), prompt)
+        shared = self._join_stream(self._async_streams, key, _SharedStreamAsync, lambda: self._stream_async(prompt))
+        async for piece in shared.read():
+            yield piece
+
+    def _join_stream(self, streams: dict, key, stream_class, open_source):
+        # Returns the shared stream in flight for this key (creating it if needed), registered
+        # for one more consumer. Consumers are counted under the backend lock, so a stream is
+        # never abandoned while someone is joining it.
+        with self._lock:
+            shared = streams.get(key)
+            if shared is None:
+                def finished():
+                    with self._lock:
+                        if streams.get(key) is shared:
+                            del streams[key]
+
+                def left(stream) -> bool:
+                    with self._lock:
+                        stream.consumers -= 1
+                        if stream.consumers or stream.done:
+                            return False
+                        if streams.get(key) is stream:
+                            del streams[key]
+                        return True
+
+                shared = streams[key] = stream_class(open_source(), finished, left)
+            shared.consumers += 1
+            return shared
+
+    # --- Model Calls With Retries ---
+
+    def _generate(self, prompt: str) -> str:
+        for attempt in range(self.max_retries + 1):
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+            try:
+                with self.pool.client() as client:
+                    return client.generate_content(prompt).text
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+                delay = backoff_delay(attempt)
+                print(f"LLM request failed ({type(e).__name__}: {e}); retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    async def _generate_async(self, prompt: str) -> str:
+        for attempt in range(self.max_retries + 1):
+            if self.rate_limiter:
+                await self.rate_limiter.acquire_async()
+            try:
+                async with self.pool.client_async() as client:
+                    response = await client.generate_content_async(prompt)
+                    return response.text
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+                delay = backoff_delay(attempt)
+                print(f"LLM request failed ({type(e).__name__}: {e}); retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    def _stream(self, prompt: str):
+        # Once a piece has been delivered, a failure can no longer be retried
+        # without repeating text, so it is raised to the consumers.
+        for attempt in range(self.max_retries + 1):
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+            produced = False
+            try:
+                with self.pool.client() as client:
+                    for chunk in client.generate_content(prompt, stream=True):
+                        if chunk.text:
+                            produced = True
+                            yield chunk.text
+                return
+            except Exception as e:
+                if produced or attempt == self.max_retries or not is_retryable(e):
+                    raise
+                delay = backoff_delay(attempt)
+                print(f"LLM stream failed ({type(e).__name__}: {e}); retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    async def _stream_async(self, prompt: str):
+        for attempt in range(self.max_retries + 1):
+            if self.rate_limiter:
+                await self.rate_limiter.acquire_async()
+            produced = False
+            try:
+                async with self.pool.client_async() as client:
+                    response = await client.generate_content_async(prompt, stream=True)
+                    async for chunk in response:
+                        if chunk.text:
+                            produced = True
+                            yield chunk.text
+                return
+            except Exception as e:
+                if produced or attempt == self.max_retries or not is_retryable(e):
+                    raise
+                delay = backoff_delay(attempt)
+                print(f"LLM stream failed ({type(e).__name__}: {e}); retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+# --- Backend Factory ---
+
+def create_llm_backend(name: str) -> LLMBackend:
+    """
+    Creates the configured LLM backend.
+
+    Args:
+        name (str): "gemini" for Google's Gemini API (key from GEMINI_API_KEY), or
+                    "stub" for the local deterministic model, which streams a fixed
+                    answer with STUB_LLM_TOKEN_DELAY seconds per token.
+
+    Returns:
+        LLMBackend: The backend.
+
+    Raises:
+        ValueError: If the backend name is unknown.
+    """
+    requests_per_minute = os.getenv("LLM_REQUESTS_PER_MINUTE")
+    if name == "stub":
+        token_delay = float(os.getenv("STUB_LLM_TOKEN_DELAY", "0"))
+        return LLMBackend(lambda: StubGenerativeModel(token_delay=token_delay),
+                          requests_per_minute=float(requests_per_minute) if requests_per_minute else None)
+    if name == "gemini":
+        import google.generativeai as genai
+        genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+        return LLMBackend(lambda: genai.GenerativeModel(GEMINI_MODEL_NAME),
+                          requests_per_minute=float(requests_per_minute or DEFAULT_GEMINI_REQUESTS_PER_MINUTE))
+    raise ValueError(f"Unknown LLM backend: {name}")
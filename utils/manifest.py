@@ -0,0 +1,148 @@
+# utils/manifest.py
+
+"""
+This module keeps track of which documents have already been ingested.
+The manifest records, for every source file, its size, modification time and
+content hash together with the IDs (and text hashes) of the chunks that were
+produced from it. The Ingestion Agent uses it to skip unchanged files and to
+work out exactly which chunks must be upserted or deleted when a file changes.
+"""
+
+import hashlib
+import json
+import os
+
+# --- Configuration and Constants ---
+
+# Define the file path where the manifest is persisted between runs.
+MANIFEST_PATH = "ingestion_manifest.json"
+# Bump this whenever the manifest layout or the chunk ID scheme changes.
+MANIFEST_VERSION = 1
+# Read files in fixed-size blocks when hashing so large documents are never loaded at once.
+_HASH_BLOCK_SIZE = 1024 * 1024
+
+# --- Hashing Helpers ---
+
+def file_sha256(path: str) -> str:
+    """
+    Computes the SHA-256 hash of a file's content.
+
+    Args:
+        path (str): The path to the file to hash.
+
+    Returns:
+        str: The hexadecimal digest of the file content.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        # Stream the file block by block to keep memory usage flat.
+        for block in iter(lambda: f.read(_HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def text_sha1(text: str) -> str:
+    """
+    Computes a short fingerprint of a chunk's text, used to detect changed chunks.
+
+    Args:
+        text (str): The chunk text.
+
+    Returns:
+        str: The hexadecimal SHA-1 digest of the text.
+    """
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+def source_key(path: str) -> str:
+    """
+    Normalizes a file path into the key under which it is stored in the manifest.
+
+    Args:
+        path (str): A relative or absolute file path.
+
+    Returns:
+        str: The absolute, normalized path.
+    """
+    return os.path.normpath(os.path.abspath(path))
+
+def make_chunk_id(source: str, offset: int) -> str:
+    """
+    Builds a deterministic chunk ID from the source identity and the chunk's offset.
+
+    The same chunk of the same file always receives the same ID, so re-ingesting
+    an unchanged document upserts onto the existing rows instead of duplicating them.
+
+    Args:
+        source (str): The manifest key of the source file.
+        offset (int): The character offset of the chunk within the document text.
+
+    Returns:
+        str: A stable, hexadecimal chunk ID.
+    """
+    source_hash = hashlib.sha1(source.encode("utf-8")).hexdigest()
+    return hashlib.sha1(f"{source_hash}:{offset}".encode("utf-8")).hexdigest()
+
+# --- Persistence ---
+
+def _empty_manifest() -> dict:
+    return {"version": MANIFEST_VERSION, "files": {}}
+
+def load_manifest(path: str = MANIFEST_PATH) -> dict:
+    """
+    Loads the manifest from disk, returning an empty one if it is missing or outdated.
+
+    Args:
+        path (str): The location of the manifest file.
+
+    Returns:
+        dict: The manifest, with a "files" mapping keyed by source path.
+    """
+    if not os.path.exists(path):
+        return _empty_manifest()
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        # A corrupt manifest only costs a full re-ingestion, so start over.
+        print(f"Failed to read ingestion manifest {path}. Reason: {e}")
+        return _empty_manifest()
+    # A manifest written with a different chunk ID scheme cannot be trusted.
+    if manifest.get("version") != MANIFEST_VERSION:
+        return _empty_manifest()
+    return manifest
+
+def save_manifest(manifest: dict, path: str = MANIFEST_PATH):
+    """
+    Atomically writes the manifest to disk.
+
+    Args:
+        manifest (dict): The manifest to persist.
+        path (str): The location of the manifest file.
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    # Replace the old file in one step so a crash never leaves a half-written manifest.
+    os.replace(tmp_path, path)
+
+def clear_manifest(path: str = MANIFEST_PATH):
+    """
+    Deletes the manifest so that the next ingestion treats every file as new.
+
+    Args:
+        path (str): The location of the manifest file.
+    """
+    if os.path.exists(path):
+        os.remove(path)
+
+def is_under(key: str, root: str) -> bool:
+    """
+    Checks whether a manifest key lies at or below a given root path.
+
+    Args:
+        key (str): A manifest key (normalized absolute file path).
+        root (str): A normalized absolute file or directory path.
+
+    Returns:
+        bool: True if the key is the root itself or is contained in it.
+    """
+    return key == root or key.startswith(root.rstrip(os.sep) + os.sep)
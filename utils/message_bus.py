@@ -0,0 +1,522 @@
+# utils/message_bus.py
+
+"""
+This module implements the message bus that routes MCP messages between agents.
+Every agent is registered under the name used as `receiver` in its messages and
+gets a bounded inbound queue served by a pool of workers. A full queue blocks the
+sender, so a slow agent pushes back on its callers instead of letting requests
+pile up without limit.
+
+Workers run either as threads of the current process or as separate processes.
+Process workers keep CPU-heavy agents (parsing, embedding) from competing with
+the user interface for the GIL. Messages crossing a process boundary are pickled,
+except for large lists of strings or chunks, which are copied into a shared
+memory block once and only referenced by name in the pickled message.
+
+Streaming requests (an agent's `stream_message`) are flow-controlled: a worker
+runs at most STREAM_WINDOW responses ahead of the consumer, so a lazy producer
+such as ingestion stays lazy across the bus. A consumer that acts on a response
+before the stream may continue (e.g. before ingestion commits) streams with a
+window of 1.
+
+Spans recorded by process workers (see utils/tracing.py) are forwarded to this
+process alongside the replies, so traces and metrics cover every worker.
+"""
+
+import asyncio
+import importlib
+import itertools
+import multiprocessing
+import queue
+import threading
+from array import array
+from multiprocessing import shared_memory
+from utils import tracing
+
+# --- Configuration and Constants ---
+
+# Default capacity of an agent's inbound queue.
+DEFAULT_QUEUE_SIZE = 64
+# Maximum number of streamed responses a worker may produce ahead of the consumer.
+STREAM_WINDOW = 2
+# Lists of strings (or chunk dictionaries) larger than this many bytes are sent
+# between processes through shared memory instead of being pickled.
+SHARED_MEMORY_MIN_BYTES = 64 * 1024
+# Key sets of the chunk dictionaries whose IDs and texts are moved into shared memory.
+_CHUNK_KEYS = ({"id", "text"}, {"id", "text", "metadata"})
+# How often a waiting caller checks that the agent's workers are still alive, in seconds.
+_LIVENESS_CHECK_INTERVAL = 1.0
+# How often an asynchronous sender retries a full queue, in seconds.
+_QUEUE_POLL_INTERVAL = 0.01
+
+# --- Shared Memory Payloads ---
+
+def _pack_strings(strings: list[str]) -> dict:
+    encoded = [string.encode("utf-8") for string in strings]
+    lengths = array("Q", map(len, encoded))
+    block = shared_memory.SharedMemory(create=True, size=max(1, sum(lengths)))
+    offset = 0
+    for data in encoded:
+        block.buf[offset:offset + len(data)] = data
+        offset += len(data)
+    block.close()
+    return {"__shared_memory__": block.name, "lengths": lengths.tobytes()}
+
+def _unpack_strings(packed: dict) -> list[str]:
+    lengths = array("Q")
+    lengths.frombytes(packed["lengths"])
+    block = shared_memory.SharedMemory(name=packed["__shared_memory__"])
+    try:
+        data = bytes(block.buf[:sum(lengths)])
+    finally:
+        block.close()
+        # The receiver owns the block once it has been read.
+        block.unlink()
+    strings, offset = [], 0
+    for length in lengths:
+        strings.append(data[offset:offset + length].decode("utf-8"))
+        offset += length
+    return strings
+
+def _is_large(strings: list[str]) -> bool:
+    return sum(map(len, strings)) >= SHARED_MEMORY_MIN_BYTES
+
+def pack_message(message: dict) -> dict:
+    """
+    Moves large payload values of a message into shared memory before it is pickled.
+
+    Top-level payload values that are lists of strings, or lists of chunk
+    dictionaries with exactly an 'id', a 'text' and optionally a 'metadata', are
+    replaced by references to shared memory blocks (the small metadata
+    dictionaries are pickled along with the references). Everything else is left as is.
+
+    Args:
+        message (dict): A message dictionary following the Message Communication Protocol.
+
+    Returns:
+        dict: The message to send; the original is not modified.
+    """
+    payload = message.get("payload")
+    if not isinstance(payload, dict):
+        return message
+    packed = {}
+    for key, value in payload.items():
+        if isinstance(value, list) and value:
+            if all(isinstance(item, str) for item in value) and _is_large(value):
+                value = {"strings": _pack_strings(value)}
+            elif all(isinstance(item, dict) and item.keys() in _CHUNK_KEYS for item in value) \
+                    and _is_large([item["text"] for item in value]):
+                value = {"chunks": (_pack_strings([item["id"] for item in value]),
+                                    _pack_strings([item["text"] for item in value]),
+                                    [item.get("metadata") for item in value])}
+        packed[key] = value
+    return {**message, "payload": packed}
+
+def unpack_message(message: dict) -> dict:
+    """
+    Restores the payload values that `pack_message` moved into shared memory.
+
+    Args:
+        message (dict): A message produced by `pack_message`.
+
+    Returns:
+        dict: The original message.
+    """
+    payload = message.get("payload")
+    if not isinstance(payload, dict):
+        return message
+    unpacked = {}
+    for key, value in payload.items():
+        if isinstance(value, dict) and value.keys() == {"strings"} and "__shared_memory__" in value["strings"]:
+            value = _unpack_strings(value["strings"])
+        elif isinstance(value, dict) and value.keys() == {"chunks"} and isinstance(value["chunks"], tuple):
+            packed_ids, packed_texts, metadatas = value["chunks"]
+            ids, texts = _unpack_strings(packed_ids), _unpack_strings(packed_texts)
+            value = [{"id": chunk_id, "text": text} if metadata is None else {"id": chunk_id, "text": text, "metadata": metadata}
+                     for chunk_id, text, metadata in zip(ids, texts, metadatas)]
+        unpacked[key] = value
+    return {**message, "payload": unpacked}
+
+# --- Workers ---
+
+def _serve(module_name: str, inbound, outbound, credits, worker_id: int, use_shared_memory: bool):
+    # Worker loop, run in a thread or in a child process. The agent module is imported
+    # here, so a process worker loads the agent's models and databases in its own memory.
+    pack = pack_message if use_shared_memory else (lambda message: message)
+    unpack = unpack_message if use_shared_memory else (lambda message: message)
+    if use_shared_memory:
+        # Spans finished in this process are sent ahead of each reply.
+        tracing.forward_spans()
+
+    def send(reply: tuple):
+        spans = tracing.collect_forwarded_spans() if use_shared_memory else None
+        if spans:
+            outbound.put((None, worker_id, "spans", spans))
+        outbound.put(reply)
+
+    module = importlib.import_module(module_name)
+
+    while True:
+        envelope = inbound.get()
+        if envelope is None:
+            break
+        # The window is 0 for plain requests.
+        request_id, window, message = envelope
+        try:
+            message = unpack(message)
+            if not window:
+                send((request_id, worker_id, "done", pack(module.handle_message(message))))
+                continue
+
+            # Send streamed responses while the consumer has credit for them. The stream is
+            # only resumed once there is credit, so everything it does after a response
+            # (e.g. committing state) happens when at most window - 1 responses are
+            # still unconsumed, and never after the consumer has cancelled.
+            outstanding = 0
+            cancelled = False
+            responses = module.stream_message(message)
+            try:
+                while True:
+                    while outstanding >= window and not cancelled:
+                        outstanding, cancelled = _wait_for_credit(credits, request_id, outstanding)
+                    if cancelled:
+                        break
+                    response = next(responses, None)
+                    if response is None:
+                        break
+                    send((request_id, worker_id, "item", pack(response)))
+                    outstanding += 1
+            finally:
+                responses.close()
+            if cancelled:
+                continue
+            send((request_id, worker_id, "done", None))
+            # Wait until every response has been consumed before taking the next request.
+            while outstanding and not cancelled:
+                outstanding, cancelled = _wait_for_credit(credits, request_id, outstanding)
+        except Exception as e:
+            send((request_id, worker_id, "error", f"{type(e).__name__}: {e}"))
+
+def _wait_for_credit(credits, request_id: int, outstanding: int) -> tuple[int, bool]:
+    # Blocks until the consumer acknowledges a response of this request (or cancels it).
+    # Credits left over from earlier requests are discarded.
+    credit_request_id, kind = credits.get()
+    if credit_request_id != request_id:
+        return outstanding, False
+    if kind == "cancel":
+        return outstanding, True
+    return outstanding - 1, False
+
+class _Endpoint:
+    """The inbound queue and worker pool of one registered agent."""
+
+    def __init__(self, name: str, module_name: str, workers: int, queue_size: int, processes: bool):
+        self.name = name
+        self.module_name = module_name
+        self.worker_count = workers
+        self.processes = processes
+        self.queue_size = queue_size
+        self.started = False
+        self.workers = []
+
+    def start(self, deliver):
+        if self.processes:
+            # "spawn" gives each worker a clean interpreter, which is safe even when the
+            # parent (e.g. the Streamlit server) runs many threads.
+            context = multiprocessing.get_context("spawn")
+            self.inbound = context.Queue(self.queue_size)
+            self.outbound = context.Queue()
+            self.credits = [context.Queue() for _ in range(self.worker_count)]
+            # Workers are not daemonic, so agents may start their own worker processes.
+            self.workers = [
+                context.Process(target=_serve, name=f"{self.name}-{i}",
+                                args=(self.module_name, self.inbound, self.outbound, self.credits[i], i, True))
+                for i in range(self.worker_count)
+            ]
+        else:
+            self.inbound = queue.Queue(self.queue_size)
+            self.outbound = queue.Queue()
+            self.credits = [queue.Queue() for _ in range(self.worker_count)]
+            self.workers = [
+                threading.Thread(target=_serve, name=f"{self.name}-{i}", daemon=True,
+                                 args=(self.module_name, self.inbound, self.outbound, self.credits[i], i, False))
+                for i in range(self.worker_count)
+            ]
+        for worker in self.workers:
+            worker.start()
+
+        # A single dispatcher thread hands every reply to the caller waiting for it.
+        def dispatch():
+            while True:
+                reply = self.outbound.get()
+                if reply is None:
+                    break
+                deliver(reply)
+        self.dispatcher = threading.Thread(target=dispatch, name=f"{self.name}-dispatcher", daemon=True)
+        self.dispatcher.start()
+        self.started = True
+
+    def alive(self) -> bool:
+        return any(worker.is_alive() for worker in self.workers)
+
+    def stop(self):
+        if not self.started:
+            return
+        for _ in self.workers:
+            self.inbound.put(None)
+        for worker in self.workers:
+            worker.join(timeout=10)
+            if self.processes and worker.is_alive():
+                worker.terminate()
+        self.outbound.put(None)
+        self.started = False
+
+# --- Message Bus ---
+
+class MessageBus:
+    """
+    Routes MCP messages to registered agents by their 'receiver' field.
+    """
+
+    def __init__(self):
+        self._endpoints = {}
+        self._lock = threading.Lock()
+        self._request_ids = itertools.count()
+        # request ID -> function receiving the (kind, message) replies of that request
+        self._pending = {}
+
+    def register(self, name: str, module_name: str, workers: int = 1,
+                 queue_size: int = DEFAULT_QUEUE_SIZE, processes: bool = False):
+        """
+        Registers an agent module under a receiver name.
+
+        The module must provide `handle_message`, and `stream_message` if it is
+        used for streaming requests. Workers are started on the first request.
+
+        Args:
+            name (str): The receiver name, e.g. "RetrievalAgent".
+            module_name (str): The importable module implementing the agent.
+            workers (int): The number of workers serving the agent's queue.
+            queue_size (int): The capacity of the agent's inbound queue.
+            processes (bool): If True, each worker is a separate process.
+        """
+        with self._lock:
+            self._endpoints[name] = _Endpoint(name, module_name, workers, queue_size, processes)
+
+    def _endpoint(self, message: dict) -> _Endpoint:
+        with self._lock:
+            endpoint = self._endpoints.get(message["receiver"])
+            if endpoint is None:
+                raise ValueError(f"Unknown receiver: {message['receiver']}")
+            if not endpoint.started:
+                endpoint.start(self._deliver)
+            return endpoint
+
+    def _deliver(self, reply):
+        request_id, worker_id, kind, message = reply
+        if kind == "spans":
+            for span in message:
+                tracing.record_span(span)
+            return
+        with self._lock:
+            sink = self._pending.get(request_id)
+        # Replies of abandoned requests are dropped.
+        if sink is not None:
+            try:
+                sink((worker_id, kind, message))
+            except RuntimeError:
+                # The caller's event loop has been closed.
+                pass
+
+    def _submit(self, endpoint: _Endpoint, message: dict, window: int, sink) -> tuple:
+        request_id = next(self._request_ids)
+        with self._lock:
+            self._pending[request_id] = sink
+        envelope = (request_id, window, pack_message(message) if endpoint.processes else message)
+        return request_id, envelope
+
+    def _finish(self, request_id: int):
+        with self._lock:
+            self._pending.pop(request_id, None)
+
+    def _open_reply(self, endpoint: _Endpoint, reply: tuple) -> tuple:
+        worker_id, kind, message = reply
+        if kind == "error":
+            raise RuntimeError(f"{endpoint.name} failed: {message}")
+        if endpoint.processes and message is not None:
+            message = unpack_message(message)
+        return worker_id, kind, message
+
+    def _receive(self, endpoint: _Endpoint, replies: queue.Queue) -> tuple:
+        while True:
+            try:
+                return self._open_reply(endpoint, replies.get(timeout=_LIVENESS_CHECK_INTERVAL))
+            except queue.Empty:
+                if not endpoint.alive():
+                    raise RuntimeError(f"{endpoint.name} workers are not running")
+
+    async def _receive_async(self, endpoint: _Endpoint, replies: asyncio.Queue) -> tuple:
+        while True:
+            try:
+                return self._open_reply(endpoint, await asyncio.wait_for(replies.get(), _LIVENESS_CHECK_INTERVAL))
+            except asyncio.TimeoutError:
+                if not endpoint.alive():
+                    raise RuntimeError(f"{endpoint.name} workers are not running")
+
+    @staticmethod
+    async def _put_async(endpoint: _Endpoint, envelope: tuple):
+        # Wait for space in a full queue without blocking the event loop or a thread.
+        while True:
+            try:
+                endpoint.inbound.put_nowait(envelope)
+                return
+            except queue.Full:
+                await asyncio.sleep(_QUEUE_POLL_INTERVAL)
+
+    @staticmethod
+    def _cancel_stream(endpoint: _Endpoint, request_id: int, worker_id):
+        # A consumer that stops early releases the worker. Before the first response
+        # it is unknown which worker took the request, so all of them are told.
+        for credits in ([endpoint.credits[worker_id]] if worker_id is not None else endpoint.credits):
+            credits.put((request_id, "cancel"))
+
+    def request(self, message: dict) -> dict:
+        """
+        Sends a message to its receiver and waits for the response.
+
+        Blocks while the receiver's queue is full.
+
+        Args:
+            message (dict): A message dictionary following the Message Communication Protocol.
+
+        Returns:
+            dict: The receiver's response message.
+
+        Raises:
+            ValueError: If no agent is registered under the message's receiver.
+            RuntimeError: If the agent failed to handle the message.
+        """
+        endpoint = self._endpoint(message)
+        replies = queue.Queue()
+        request_id, envelope = self._submit(endpoint, message, 0, replies.put)
+        try:
+            endpoint.inbound.put(envelope)
+            return self._receive(endpoint, replies)[2]
+        finally:
+            self._finish(request_id)
+
+    def stream(self, message: dict, window: int = STREAM_WINDOW):
+        """
+        Sends a message to its receiver's `stream_message` and yields the responses.
+
+        Args:
+            message (dict): A message dictionary following the Message Communication Protocol.
+            window (int): The number of responses the worker may produce ahead of the
+                consumer. With 1, the stream only continues past a response once the
+                consumer asks for the next one.
+
+        Yields:
+            dict: The receiver's response messages, in order.
+
+        Raises:
+            ValueError: If no agent is registered under the message's receiver.
+            RuntimeError: If the agent failed to handle the message.
+        """
+        endpoint = self._endpoint(message)
+        replies = queue.Queue()
+        request_id, envelope = self._submit(endpoint, message, window, replies.put)
+        worker_id = None
+        finished = False
+        try:
+            endpoint.inbound.put(envelope)
+            while True:
+                try:
+                    worker_id, kind, response = self._receive(endpoint, replies)
+                except RuntimeError:
+                    finished = True
+                    raise
+                if kind == "done":
+                    finished = True
+                    return
+                yield response
+                # Grant the worker credit for one more response.
+                endpoint.credits[worker_id].put((request_id, "ack"))
+        finally:
+            if not finished:
+                self._cancel_stream(endpoint, request_id, worker_id)
+            self._finish(request_id)
+
+    def _async_sink(self) -> tuple:
+        # Replies arrive on the dispatcher thread and are handed to the running event loop.
+        loop = asyncio.get_running_loop()
+        replies = asyncio.Queue()
+        return replies, lambda reply: loop.call_soon_threadsafe(replies.put_nowait, reply)
+
+    async def request_async(self, message: dict) -> dict:
+        """
+        Asynchronous counterpart of `request`.
+
+        The message goes through the receiver's bounded queue like a blocking
+        request, so it waits for a free worker, but the waiting is done on the
+        event loop instead of in a thread.
+
+        Args:
+            message (dict): A message dictionary following the Message Communication Protocol.
+
+        Returns:
+            dict: The receiver's response message.
+        """
+        endpoint = self._endpoint(message)
+        replies, sink = self._async_sink()
+        request_id, envelope = self._submit(endpoint, message, 0, sink)
+        try:
+            await self._put_async(endpoint, envelope)
+            return (await self._receive_async(endpoint, replies))[2]
+        finally:
+            self._finish(request_id)
+
+    async def stream_async(self, message: dict, window: int = STREAM_WINDOW):
+        """
+        Asynchronous counterpart of `stream`.
+
+        The worker is flow-controlled by the same credit window as in `stream`.
+
+        Args:
+            message (dict): A message dictionary following the Message Communication Protocol.
+            window (int): The number of responses the worker may produce ahead of the
+                consumer.
+
+        Yields:
+            dict: The receiver's response messages, in order.
+        """
+        endpoint = self._endpoint(message)
+        replies, sink = self._async_sink()
+        request_id, envelope = self._submit(endpoint, message, window, sink)
+        worker_id = None
+        finished = False
+        try:
+            await self._put_async(endpoint, envelope)
+            while True:
+                try:
+                    worker_id, kind, response = await self._receive_async(endpoint, replies)
+                except RuntimeError:
+                    finished = True
+                    raise
+                if kind == "done":
+                    finished = True
+                    return
+                yield response
+                endpoint.credits[worker_id].put((request_id, "ack"))
+        finally:
+            if not finished:
+                self._cancel_stream(endpoint, request_id, worker_id)
+            self._finish(request_id)
+
+    def shutdown(self):
+        """
+        Stops every agent's workers.
+        """
+        with self._lock:
+            endpoints = list(self._endpoints.values())
+        for endpoint in endpoints:
+            endpoint.stop()
@@ -0,0 +1,212 @@
+# utils/near_duplicates.py
+
+"""
+This module detects near-duplicate chunks at ingestion time, so that revised
+versions of a document, slide decks that reuse boilerplate, or whole copied
+directory trees are embedded and stored once instead of once per copy.
+
+Every chunk is fingerprinted with MinHash over its word shingles: the fraction
+of equal positions in two fingerprints estimates the Jaccard similarity of the
+two chunks' shingle sets. The fingerprints of the stored chunks are kept in a
+locality-sensitive hashing (LSH) index that splits each fingerprint into bands,
+so only chunks sharing at least one whole band are compared, instead of every
+stored chunk. The index is persisted next to the ingestion manifest.
+"""
+
+import os
+import re
+import zlib
+import numpy as np
+
+# --- Configuration and Constants ---
+
+# Define the file where the fingerprints of the stored chunks are persisted.
+NEAR_DUPLICATE_INDEX_PATH = "near_duplicate_index.npz"
+# Number of MinHash values per fingerprint; the similarity estimate has a standard
+# error of about 0.05 at 64 values.
+MINHASH_PERMUTATIONS = 64
+# Number of LSH bands a fingerprint is split into (it must divide MINHASH_PERMUTATIONS).
+# With 16 bands of 4 values, two chunks with a Jaccard similarity of 0.8 are compared
+# with a probability above 99.9%, while unrelated chunks almost never are.
+LSH_BANDS = 16
+# Number of consecutive words per shingle.
+SHINGLE_WORDS = 3
+
+_WORD = re.compile(r"\w+")
+# The MinHash permutations are random linear functions modulo a Mersenne prime. The seed
+# is fixed, so fingerprints stay comparable across runs and processes.
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_random = np.random.RandomState(42)
+_PERMUTATION_A = _random.randint(1, 1 << 31, size=MINHASH_PERMUTATIONS).astype(np.uint64)
+_PERMUTATION_B = _random.randint(0, 1 << 31, size=MINHASH_PERMUTATIONS).astype(np.uint64)
+
+def minhash(text: str) -> np.ndarray:
+    """
+    Computes the MinHash fingerprint of a text's word shingles, ignoring case,
+    punctuation and whitespace.
+
+    Args:
+        text (str): The chunk text.
+
+    Returns:
+        np.ndarray | None: MINHASH_PERMUTATIONS uint32 values, or None if the text has no words.
+    """
+    words = _WORD.findall(text.lower())
+    if not words:
+        return None
+    # A text shorter than one shingle is a single shingle.
+    shingles = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(max(1, len(words) - SHINGLE_WORDS + 1))}
+    hashes = np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in shingles),
+                         dtype=np.uint64, count=len(shingles))
+    # (a * x + b) stays below 2^63 for 32-bit hashes and 31-bit coefficients, so nothing overflows.
+    permuted = (hashes[:, None] * _PERMUTATION_A + _PERMUTATION_B) % _MERSENNE_PRIME
+    return (permuted.min(axis=0) & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+
+# --- LSH Index ---
+
+class NearDuplicateIndex:
+    """
+    LSH index of the MinHash fingerprints of stored chunks, keyed by chunk ID.
+    """
+
+    def __init__(self, bands: int = LSH_BANDS):
+        """
+        Creates an empty index.
+
+        Args:
+            bands (int): The number of bands each fingerprint is split into.
+        """
+        self.bands = bands
+        self._rows = MINHASH_PERMUTATIONS // bands
+        self._signatures = {}                            # chunk ID -> fingerprint
+        self._buckets = [{} for _ in range(bands)]       # per band: band bytes -> set of chunk IDs
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def __contains__(self, chunk_id: str) -> bool:
+        return chunk_id in self._signatures
+
+    def _band_keys(self, signature: np.ndarray) -> list[bytes]:
+        return [signature[i * self._rows:(i + 1) * self._rows].tobytes() for i in range(self.bands)]
+
+    def add(self, chunk_id: str, signature: np.ndarray):
+        """
+        Adds (or replaces) the fingerprint of a stored chunk.
+
+        Args:
+            chunk_id (str): The chunk's ID.
+            signature (np.ndarray | None): Its fingerprint from `minhash`; None is ignored.
+        """
+        if signature is None:
+            return
+        self.remove(chunk_id)
+        self._signatures[chunk_id] = signature
+        for bucket, key in zip(self._buckets, self._band_keys(signature)):
+            bucket.setdefault(key, set()).add(chunk_id)
+
+    def remove(self, chunk_id: str) -> np.ndarray:
+        """
+        Removes a chunk's fingerprint, e.g. because the chunk was deleted.
+
+        Args:
+            chunk_id (str): The chunk's ID.
+
+        Returns:
+            np.ndarray | None: The removed fingerprint, or None if the chunk was unknown.
+        """
+        signature = self._signatures.pop(chunk_id, None)
+        if signature is not None:
+            for bucket, key in zip(self._buckets, self._band_keys(signature)):
+                ids = bucket[key]
+                ids.discard(chunk_id)
+                if not ids:
+                    del bucket[key]
+        return signature
+
+    def find(self, signature: np.ndarray, threshold: float, exclude: str = None) -> str:
+        """
+        Finds the stored chunk most similar to a fingerprint, if it is similar enough.
+
+        Args:
+            signature (np.ndarray | None): The fingerprint from `minhash`.
+            threshold (float): The minimum estimated Jaccard similarity of a near duplicate.
+            exclude (str, optional): A chunk ID that never matches, e.g. the chunk's own.
+
+        Returns:
+            str | None: The ID of the best match, or None if no stored chunk reaches the threshold.
+        """
+        if signature is None:
+            return None
+        candidates = set()
+        for bucket, key in zip(self._buckets, self._band_keys(signature)):
+            candidates.update(bucket.get(key, ()))
+        candidates.discard(exclude)
+
+        if not candidates:
+            return None
+        # Compare against all candidates at once: the estimate is the fraction of equal values.
+        candidates = list(candidates)
+        similarities = (np.stack([self._signatures[chunk_id] for chunk_id in candidates]) == signature).mean(axis=1)
+        best = int(np.argmax(similarities))
+        return candidates[best] if similarities[best] >= threshold else None
+
+    # --- Persistence ---
+
+    @classmethod
+    def load(cls, path: str = NEAR_DUPLICATE_INDEX_PATH, known_ids: set = None) -> "NearDuplicateIndex":
+        """
+        Loads an index from disk, returning an empty one if it is missing or unreadable.
+
+        Args:
+            path (str): The location of the index file.
+            known_ids (set, optional): The IDs of the chunks actually stored; fingerprints
+                                       of any other chunk (e.g. left behind by an
+                                       interrupted run) are dropped.
+
+        Returns:
+            NearDuplicateIndex: The index.
+        """
+        index = cls()
+        if not os.path.exists(path):
+            return index
+        try:
+            with np.load(path) as data:
+                ids, signatures = data["ids"], data["signatures"]
+        except (OSError, ValueError, KeyError) as e:
+            # A lost index only costs some duplicates being stored again.
+            print(f"Failed to read near-duplicate index {path}. Reason: {e}")
+            return index
+        # Fingerprints computed with other settings are not comparable.
+        if signatures.ndim != 2 or signatures.shape[1] != MINHASH_PERMUTATIONS:
+            return index
+        for chunk_id, signature in zip(ids.tolist(), signatures):
+            if known_ids is None or chunk_id in known_ids:
+                index.add(chunk_id, signature)
+        return index
+
+    def save(self, path: str = NEAR_DUPLICATE_INDEX_PATH):
+        """
+        Atomically writes the index to disk.
+
+        Args:
+            path (str): The location of the index file.
+        """
+        ids = list(self._signatures)
+        signatures = (np.stack([self._signatures[chunk_id] for chunk_id in ids]) if ids
+                      else np.zeros((0, MINHASH_PERMUTATIONS), dtype=np.uint32))
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, ids=np.array(ids, dtype=str), signatures=signatures)
+        # Replace the old file in one step, like the manifest, so a crash never leaves half an index.
+        os.replace(tmp_path, path)
+
+def clear_near_duplicate_index(path: str = NEAR_DUPLICATE_INDEX_PATH):
+    """
+    Deletes the persisted index, e.g. together with the ingestion manifest.
+
+    Args:
+        path (str): The location of the index file.
+    """
+    if os.path.exists(path):
+        os.remove(path)
@@ -1,17 +1,126 @@
+import csv
+import os
 import fitz  # PyMuPDF
 from docx import Document
+from pptx import Presentation
 
-def parse_pdf(file_path):
-    doc = fitz.open(file_path)
-    text = ""
-    for page in doc:
-        text += page.get_text()
-    return text.strip()
+# Every parser is a generator that takes a file path and yields records of the form
+# {"source": path, "page": page or slide number (or None), "text": str}, optionally with a
+# "metadata" dict of extra chunk metadata. Joining the texts of all records gives the
+# document's plain text, so nothing ever needs to hold the full text of a long document.
+# The parsers live at module level so that a process pool can pickle them by reference.
 
-def parse_txt(file_path):
+# Plain-text and DOCX records are cut at the first paragraph break after this many characters.
+RECORD_TARGET_CHARS = 64 * 1024
+# CSV rows are grouped into records of at most this many characters (header included), so that
+# each group fits into a single chunk (see CHUNK_TARGET_TOKENS in utils/file_loader.py).
+CSV_GROUP_TARGET_CHARS = 800
+# Separator between the cells of a CSV row in the record text.
+CSV_CELL_SEPARATOR = " | "
+
+def pdf_page_count(file_path):
+    with fitz.open(file_path) as doc:
+        return doc.page_count
+
+def pdf_records(file_path, start_page=0, end_page=None):
+    # Yields one record per page in [start_page, end_page) so large PDFs can be split across workers.
+    with fitz.open(file_path) as doc:
+        end_page = doc.page_count if end_page is None else min(end_page, doc.page_count)
+        for i in range(start_page, end_page):
+            yield {"source": file_path, "page": i + 1, "text": doc[i].get_text()}
+
+def txt_records(file_path):
+    lines = []
+    size = 0
     with open(file_path, "r", encoding="utf-8") as f:
-        return f.read().strip()
+        for line in f:
+            lines.append(line)
+            size += len(line)
+            # Only cut on a blank line so paragraphs never straddle two records.
+            if size >= RECORD_TARGET_CHARS and not line.strip():
+                yield {"source": file_path, "page": None, "text": "".join(lines)}
+                lines, size = [], 0
+    if lines:
+        yield {"source": file_path, "page": None, "text": "".join(lines)}
 
-def parse_docx(file_path):
+def docx_records(file_path):
     doc = Document(file_path)
-    return "\n".join([para.text for para in doc.paragraphs if para.text.strip()])
+    section = []
+    size = 0
+    for para in doc.paragraphs:
+        # Start a new record at every heading, or when the current one grows too large.
+        is_heading = para.style is not None and para.style.name.startswith("Heading")
+        if section and (is_heading or size >= RECORD_TARGET_CHARS):
+            yield {"source": file_path, "page": None, "text": "\n".join(section) + "\n"}
+            section, size = [], 0
+        section.append(para.text)
+        size += len(para.text) + 1
+    if section:
+        yield {"source": file_path, "page": None, "text": "\n".join(section)}
+
+def pptx_records(file_path):
+    prs = Presentation(file_path)
+    for number, slide in enumerate(prs.slides, start=1):
+        text = "".join(shape.text + "\n" for shape in slide.shapes if hasattr(shape, "text"))
+        yield {"source": file_path, "page": number, "text": text}
+
+def _decoded_lines(f):
+    # Decodes a binary file line by line. A line that is not valid UTF-8 falls back to
+    # latin1 (Windows exports), so a bad byte deep in the file never forces a second pass.
+    for line in f:
+        try:
+            yield line.decode("utf-8")
+        except UnicodeDecodeError:
+            yield line.decode("latin1")
+
+def csv_records(file_path):
+    # Streams the table and yields groups of rows, each repeating the header line, with
+    # the column names and the (1-based, header excluded) row range as metadata.
+    with open(file_path, "rb") as f:
+        rows = csv.reader(_decoded_lines(f))
+        header = next(rows, None)
+        if header is None:
+            return
+        header[0] = header[0].lstrip("\ufeff")  # byte order mark of UTF-8 exports
+        header_line = CSV_CELL_SEPARATOR.join(header) + "\n"
+        columns = ", ".join(header)
+
+        # The row range of a group covers its first and last non-blank rows; blank rows are
+        # skipped but still counted, so the numbers match the rows of the file.
+        group, size, first_row, last_row = [], len(header_line), None, None
+        for row_number, row in enumerate(rows, start=1):
+            if not any(cell.strip() for cell in row):
+                continue
+            # Whitespace inside a cell (including line breaks in quoted cells) collapses to one space.
+            line = CSV_CELL_SEPARATOR.join(" ".join(cell.split()) for cell in row) + "\n"
+            if group and size + len(line) > CSV_GROUP_TARGET_CHARS:
+                yield {"source": file_path, "page": None, "text": header_line + "".join(group),
+                       "metadata": {"columns": columns, "row_start": first_row, "row_end": last_row}}
+                group, size = [], len(header_line)
+            if not group:
+                first_row = row_number
+            group.append(line)
+            size += len(line)
+            last_row = row_number
+        if group:
+            yield {"source": file_path, "page": None, "text": header_line + "".join(group),
+                   "metadata": {"columns": columns, "row_start": first_row, "row_end": last_row}}
+
+PARSERS = {
+    ".txt": txt_records,
+    ".md": txt_records,
+    ".pdf": pdf_records,
+    ".docx": docx_records,
+    ".pptx": pptx_records,
+    ".csv": csv_records,
+}
+
+def parse_records(file_path, start_page=0, end_page=None):
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext == ".pdf":
+        return pdf_records(file_path, start_page, end_page)
+    return PARSERS[ext](file_path)
+
+def parse_records_list(file_path, start_page=0, end_page=None):
+    # Materialized variant used by pool workers, whose results must be pickled back.
+    return list(parse_records(file_path, start_page, end_page))
@@ -0,0 +1,90 @@
+# utils/stub_llm.py
+
+"""
+This module provides a local, deterministic stand-in for the Gemini generative model.
+It mimics the parts of the `google.generativeai.GenerativeModel` interface used by
+the LLM Response Agent (`generate_content`, with and without `stream=True`), so the
+whole pipeline, including streaming, can run offline. Tokens are emitted with a
+configurable delay to simulate network and decoding latency.
+"""
+
+import asyncio
+import time
+
+# --- Configuration and Constants ---
+
+# The answer returned when no fixed response is configured.
+DEFAULT_STUB_RESPONSE = "This is a stub answer generated locally for testing purposes."
+
+# --- Stub Model ---
+
+class StubResponse:
+    """A minimal response object exposing the generated text as `.text`."""
+
+    def __init__(self, text: str):
+        self.text = text
+
+class StubGenerativeModel:
+    """
+    Offline generative model that streams a fixed answer word by word.
+    """
+
+    def __init__(self, response_text: str = DEFAULT_STUB_RESPONSE, token_delay: float = 0.0):
+        """
+        Args:
+            response_text (str): The answer returned for every prompt.
+            token_delay (float): Seconds to wait before emitting each token.
+        """
+        self.response_text = response_text
+        self.token_delay = token_delay
+
+    def _tokens(self) -> list[str]:
+        # Keep the separating whitespace so the streamed tokens join back to the full answer.
+        words = self.response_text.split(" ")
+        return [word + " " for word in words[:-1]] + words[-1:]
+
+    def _stream(self):
+        for token in self._tokens():
+            if self.token_delay:
+                time.sleep(self.token_delay)
+            yield StubResponse(token)
+
+    def generate_content(self, prompt: str, stream: bool = False):
+        """
+        Generates the configured answer.
+
+        Args:
+            prompt (str): The prompt (ignored).
+            stream (bool): If True, return an iterator of partial responses.
+
+        Returns:
+            StubResponse, or an iterator of StubResponse chunks when streaming.
+        """
+        if stream:
+            return self._stream()
+        if self.token_delay:
+            time.sleep(self.token_delay * len(self._tokens()))
+        return StubResponse(self.response_text)
+
+    async def _stream_async(self):
+        for token in self._tokens():
+            if self.token_delay:
+                await asyncio.sleep(self.token_delay)
+            yield StubResponse(token)
+
+    async def generate_content_async(self, prompt: str, stream: bool = False):
+        """
+        Asynchronous counterpart of `generate_content`; delays do not block the event loop.
+
+        Args:
+            prompt (str): The prompt (ignored).
+            stream (bool): If True, return an async iterator of partial responses.
+
+        Returns:
+            StubResponse, or an async iterator of StubResponse chunks when streaming.
+        """
+        if stream:
+            return self._stream_async()
+        if self.token_delay:
+            await asyncio.sleep(self.token_delay * len(self._tokens()))
+        return StubResponse(self.response_text)
@@ -0,0 +1,135 @@
+# utils/text.py
+
+"""
+This module provides small text helpers shared by chunking and context assembly:
+a fast regex-based sentence splitter, a token estimate, sentence-aware
+truncation to a token budget, and a sliding window of sentences for chunking.
+
+Token counts are estimated from the character count instead of running a
+tokenizer. For English prose both the embedding model's WordPiece vocabulary and
+Gemini's tokenizer average close to CHARS_PER_TOKEN characters per token, which
+is accurate enough for budgeting.
+"""
+
+import re
+
+# --- Configuration and Constants ---
+
+# Average number of characters per token used by `estimate_tokens`.
+CHARS_PER_TOKEN = 4
+
+# A sentence ends with ".", "!" or "?" (possibly repeated and followed by closing quotes
+# or brackets) before whitespace, or at a line break.
+_SENTENCE_BREAK = re.compile(r"""([.!?]+["')\]]*)\s+|\s*\n\s*""")
+
+# --- Helpers ---
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimates the number of tokens of a text.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        int: The estimated token count.
+    """
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+def sentence_spans(text: str) -> list[tuple[int, int]]:
+    """
+    Splits a text into sentences.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        list[tuple[int, int]]: The (start, end) character offsets of every sentence,
+                               without surrounding whitespace.
+    """
+    spans = []
+    start = len(text) - len(text.lstrip())
+    for match in _SENTENCE_BREAK.finditer(text, start):
+        end = match.end(1) if match.group(1) else match.start()
+        if end > start:
+            spans.append((start, end))
+        start = max(start, match.end())
+    end = len(text.rstrip())
+    if end > start:
+        spans.append((start, end))
+    return spans
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Shortens a text to at most `max_tokens` estimated tokens, cutting after the
+    last whole sentence that fits. If not even the first sentence fits, the text
+    is cut at the last word boundary instead.
+
+    Args:
+        text (str): The text.
+        max_tokens (int): The token budget.
+
+    Returns:
+        str: The text itself if it fits, otherwise its longest fitting prefix.
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    cut = 0
+    for start, end in sentence_spans(text):
+        if end > max_chars:
+            break
+        cut = end
+    if cut == 0:
+        # One very long sentence: keep as many whole words as fit.
+        cut = text.rfind(" ", 0, max_chars + 1)
+        cut = cut if cut > 0 else max_chars
+    return text[:cut].strip()
+
+def sliding_window_spans(text: str, target_tokens: int, overlap_tokens: int) -> list[tuple[int, int]]:
+    """
+    Splits a text into windows of whole sentences of at most `target_tokens`
+    estimated tokens, where each window repeats up to `overlap_tokens` of the end
+    of the previous one. Sentences longer than a window are cut at word boundaries.
+
+    Args:
+        text (str): The text.
+        target_tokens (int): The maximum size of a window.
+        overlap_tokens (int): The maximum overlap between consecutive windows.
+
+    Returns:
+        list[tuple[int, int]]: The (start, end) character offsets of every window.
+    """
+    max_chars = target_tokens * CHARS_PER_TOKEN
+    overlap_chars = overlap_tokens * CHARS_PER_TOKEN
+
+    # The units a window is built from: sentences, with over-long ones split into pieces.
+    units = []
+    for start, end in sentence_spans(text):
+        while end - start > max_chars:
+            cut = text.rfind(" ", start, start + max_chars + 1)
+            cut = cut if cut > start else start + max_chars
+            units.append((start, cut))
+            start = cut
+            while start < end and text[start].isspace():
+                start += 1
+        if end > start:
+            units.append((start, end))
+
+    windows = []
+    first = 0
+    while first < len(units):
+        # Grow the window sentence by sentence while it stays within the target size.
+        last = first + 1
+        while last < len(units) and units[last][1] - units[first][0] <= max_chars:
+            last += 1
+        windows.append((units[first][0], units[last - 1][1]))
+        if last == len(units):
+            break
+        # The next window starts with the trailing sentences that fit into the overlap,
+        # but always at least one sentence later than this one.
+        next_first = last
+        while next_first - 1 > first and units[last - 1][1] - units[next_first - 1][0] <= overlap_chars:
+            next_first -= 1
+        first = next_first
+    return windows
@@ -0,0 +1,453 @@
+# utils/tracing.py
+
+"""
+This module records span-style traces and latency metrics for the RAG pipeline.
+A span measures one unit of work (an agent handling a message, parsing a file,
+an embedding batch, a database call, an LLM call) and carries the MCP `trace_id`
+of the request it belongs to, so every step of a request can be lined up.
+
+Finished spans are:
+- kept in memory per trace, for the timing panel of the user interface;
+- optionally appended to a JSON-lines file (TRACE_PATH), one span per line, by a
+  background thread that rotates the file once it reaches TRACE_MAX_BYTES;
+- aggregated into Prometheus histograms and counters, which can be served in the
+  Prometheus text format over HTTP (`start_metrics_server`).
+
+Agents running in worker processes do not write any of these themselves; their
+spans are forwarded to the coordinator's process by the message bus.
+"""
+
+import asyncio
+import atexit
+import contextvars
+import functools
+import inspect
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- Configuration and Constants ---
+
+# Set TRACING_ENABLED=0 to turn span recording off entirely.
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "1") != "0"
+# The JSON-lines file that finished spans are appended to, e.g. "traces.jsonl". Empty
+# (the default) disables the file export; the in-memory traces and metrics are kept.
+TRACE_PATH = os.getenv("TRACE_PATH", "")
+# Size in bytes at which the trace file is rotated: it is renamed to "<TRACE_PATH>.1",
+# replacing the previous one, and a new file is started.
+TRACE_MAX_BYTES = int(os.getenv("TRACE_MAX_BYTES", str(50 * 1024 * 1024)))
+# Number of recent traces kept in memory.
+TRACE_MAX_TRACES = 1000
+# Upper bounds of the latency histogram buckets, in seconds.
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Upper bounds of the payload size histogram buckets, in bytes.
+SIZE_BUCKETS = (1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000)
+
+# The trace and the innermost open span of the code that is currently running.
+_current_trace_id = contextvars.ContextVar("trace_id", default=None)
+_current_span_id = contextvars.ContextVar("span_id", default=None)
+
+# --- Metrics ---
+
+class _Histogram:
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+
+class _Metrics:
+    """Histograms and counters of finished spans, labelled by span name."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.durations = {}
+        self.payload_sizes = {}
+        self.spans = {}
+        self.chunks = {}
+
+    def observe(self, span: dict):
+        name = span["name"]
+        with self._lock:
+            self.durations.setdefault(name, _Histogram(DURATION_BUCKETS)).observe(span["duration"])
+            key = (name, span["status"])
+            self.spans[key] = self.spans.get(key, 0) + 1
+            attributes = span["attributes"]
+            if "payload_bytes" in attributes:
+                self.payload_sizes.setdefault(name, _Histogram(SIZE_BUCKETS)).observe(attributes["payload_bytes"])
+            if "chunks" in attributes:
+                self.chunks[name] = self.chunks.get(name, 0) + attributes["chunks"]
+
+    def render(self) -> str:
+        lines = []
+
+        def histogram(metric: str, help_text: str, histograms: dict):
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} histogram")
+            for name, hist in sorted(histograms.items()):
+                cumulative = 0
+                for bound, count in zip(hist.buckets + ("+Inf",), hist.counts):
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{{span="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'{metric}_sum{{span="{name}"}} {hist.sum}')
+                lines.append(f'{metric}_count{{span="{name}"}} {cumulative}')
+
+        with self._lock:
+            histogram("rag_span_duration_seconds", "Duration of pipeline spans.", self.durations)
+            histogram("rag_span_payload_bytes", "Size of message payloads handled by a span.", self.payload_sizes)
+            lines.append("# HELP rag_spans_total Finished spans by status.")
+            lines.append("# TYPE rag_spans_total counter")
+            for (name, status), count in sorted(self.spans.items()):
+                lines.append(f'rag_spans_total{{span="{name}",status="{status}"}} {count}')
+            lines.append("# HELP rag_span_chunks_total Chunks processed by spans.")
+            lines.append("# TYPE rag_span_chunks_total counter")
+            for name, count in sorted(self.chunks.items()):
+                lines.append(f'rag_span_chunks_total{{span="{name}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+metrics = _Metrics()
+
+# --- Trace File ---
+
+class _TraceWriter:
+    """
+    Appends finished spans to the trace file from a background thread, so requests
+    never wait for the disk, and rotates the file by size, so it never grows unbounded.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def write(self, span: dict):
+        # The thread is only started once a span is exported.
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="trace-writer", daemon=True)
+                    self._thread.start()
+        self._queue.put(span)
+
+    def _run(self):
+        while True:
+            spans = [self._queue.get()]
+            # Write everything that queued up in the meantime in one go.
+            while True:
+                try:
+                    spans.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in spans
+            try:
+                self._append([span for span in spans if span is not None])
+            except OSError as e:
+                print(f"Failed to write traces to {self.path}. Reason: {e}")
+            if stop:
+                return
+
+    def _append(self, spans: list[dict]):
+        if not spans:
+            return
+        f = open(self.path, "ab")
+        try:
+            size = f.tell()
+            for span in spans:
+                line = (json.dumps(span, default=str) + "\n").encode("utf-8")
+                # Rotate before a line that would take the file past its limit.
+                if size and size + len(line) > self.max_bytes:
+                    f.close()
+                    os.replace(self.path, f"{self.path}.1")
+                    f = open(self.path, "ab")
+                    size = 0
+                f.write(line)
+                size += len(line)
+        finally:
+            f.close()
+
+    def close(self, timeout: float = 2.0):
+        """
+        Writes the spans still queued and stops the thread (at interpreter exit).
+        """
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout)
+
+_trace_writer = _TraceWriter(TRACE_PATH, TRACE_MAX_BYTES)
+atexit.register(_trace_writer.close)
+
+# --- Span Recording ---
+
+_traces = OrderedDict()
+_traces_lock = threading.Lock()
+# When set (in agent worker processes), finished spans are buffered for forwarding instead.
+_forward_buffer = None
+
+def forward_spans():
+    """
+    Switches this process to forwarding mode: finished spans are buffered until
+    `collect_forwarded_spans` is called, instead of being exported here.
+    """
+    global _forward_buffer
+    _forward_buffer = []
+
+def collect_forwarded_spans() -> list[dict]:
+    """
+    Returns (and clears) the spans buffered in forwarding mode.
+
+    Returns:
+        list[dict]: The finished spans, oldest first.
+    """
+    global _forward_buffer
+    if not _forward_buffer:
+        return []
+    spans, _forward_buffer = _forward_buffer, []
+    return spans
+
+def record_span(span: dict):
+    """
+    Exports a finished span: keeps it with its trace, writes it to the trace file
+    and adds it to the metrics. Also used for spans forwarded from other processes.
+
+    Args:
+        span (dict): The finished span.
+    """
+    if _forward_buffer is not None:
+        _forward_buffer.append(span)
+        return
+
+    metrics.observe(span)
+    if span["trace_id"] is not None:
+        with _traces_lock:
+            _traces.setdefault(span["trace_id"], []).append(span)
+            _traces.move_to_end(span["trace_id"])
+            while len(_traces) > TRACE_MAX_TRACES:
+                _traces.popitem(last=False)
+    if TRACE_PATH:
+        _trace_writer.write(span)
+
+def get_trace(trace_id: str) -> list[dict]:
+    """
+    Returns the recorded spans of a trace.
+
+    Args:
+        trace_id (str): The trace ID of the request.
+
+    Returns:
+        list[dict]: The spans, in the order they finished.
+    """
+    with _traces_lock:
+        return list(_traces.get(trace_id, ()))
+
+def _status(exc_type) -> str:
+    # A stream closed early by its consumer (or a cancelled task) is not a failure.
+    if exc_type is None:
+        return "ok"
+    if issubclass(exc_type, (GeneratorExit, asyncio.CancelledError)):
+        return "cancelled"
+    return "error"
+
+class span:
+    """
+    Context manager measuring one unit of work.
+
+    Attributes such as counts and sizes can be passed as keyword arguments or set
+    while the span is open through item assignment:
+
+        with span("embed", texts=len(texts)) as s:
+            ...
+            s["cache_hits"] = hits
+    """
+
+    def __init__(self, name: str, trace_id: str = None, **attributes):
+        self.name = name
+        self.trace_id = trace_id
+        self.attributes = attributes
+        # When set before the span closes, recorded instead of the elapsed wall time.
+        self.duration = None
+
+    def __setitem__(self, key, value):
+        self.attributes[key] = value
+
+    def __enter__(self):
+        if not TRACING_ENABLED:
+            return self
+        # An explicit trace ID (from an incoming message) becomes the current trace.
+        self._trace_token = _current_trace_id.set(self.trace_id) if self.trace_id else None
+        self.trace_id = _current_trace_id.get()
+        self.parent_id = _current_span_id.get()
+        self.span_id = uuid.uuid4().hex[:16]
+        self._span_token = _current_span_id.set(self.span_id)
+        self.start_time = time.time()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not TRACING_ENABLED:
+            return False
+        duration = self.duration if self.duration is not None else time.perf_counter() - self._start
+        # A span opened in one context (e.g. a generator) may be closed from another.
+        for var, token in ((_current_span_id, self._span_token), (_current_trace_id, self._trace_token)):
+            if token is not None:
+                try:
+                    var.reset(token)
+                except ValueError:
+                    pass
+        record_span({
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start_time,
+            "duration": duration,
+            "status": _status(exc_type),
+            "error": f"{exc_type.__name__}: {exc}" if _status(exc_type) == "error" else None,
+            "process": os.getpid(),
+            "attributes": self.attributes,
+        })
+        return False
+
+def traced_iter(name: str, iterable, count_as: str = "items", **attributes):
+    """
+    Iterates over a lazy iterable within a span that only measures the time spent
+    producing its items, not the time the consumer spends between them.
+
+    Args:
+        name (str): The span name.
+        iterable: The iterable to trace, e.g. a generator parsing and chunking a file.
+        count_as (str): The attribute recording the number of items produced.
+        **attributes: Further span attributes.
+
+    Yields:
+        The items of the iterable.
+    """
+    iterator = iter(iterable)
+    busy = 0.0
+    count = 0
+    with span(name, **attributes) as traced:
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                finally:
+                    busy += time.perf_counter() - start
+                count += 1
+                yield item
+        except StopIteration:
+            pass
+        finally:
+            traced.duration = busy
+            traced[count_as] = count
+
+# --- Message Handler Instrumentation ---
+
+def payload_size(value) -> int:
+    """
+    Estimates the size of a message payload in bytes, without serializing it.
+
+    Args:
+        value: The payload (nested dicts, lists, strings and numbers).
+
+    Returns:
+        int: The approximate size.
+    """
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(len(str(key)) + payload_size(item) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(payload_size(item) for item in value)
+    return 8
+
+def traced_handler(agent_name: str):
+    """
+    Decorates an agent's message handler so that every message it handles is a span.
+
+    The span is named "<agent>.<message type>", belongs to the message's trace and
+    records the size of the incoming payload. Plain functions, coroutines, and
+    (async) generators are supported; a streaming handler's span lasts until its
+    stream is exhausted or closed.
+
+    Args:
+        agent_name (str): The agent's name, e.g. "RetrievalAgent".
+    """
+    def decorator(handler):
+        def open_span(mcp_message: dict) -> span:
+            return span(f"{agent_name}.{mcp_message['type']}", trace_id=mcp_message.get("trace_id"),
+                        payload_bytes=payload_size(mcp_message.get("payload")))
+
+        if inspect.isasyncgenfunction(handler):
+            @functools.wraps(handler)
+            async def wrapper(mcp_message):
+                with open_span(mcp_message):
+                    async for response in handler(mcp_message):
+                        yield response
+        elif inspect.isgeneratorfunction(handler):
+            @functools.wraps(handler)
+            def wrapper(mcp_message):
+                with open_span(mcp_message):
+                    yield from handler(mcp_message)
+        elif inspect.iscoroutinefunction(handler):
+            @functools.wraps(handler)
+            async def wrapper(mcp_message):
+                with open_span(mcp_message):
+                    return await handler(mcp_message)
+        else:
+            @functools.wraps(handler)
+            def wrapper(mcp_message):
+                with open_span(mcp_message):
+                    return handler(mcp_message)
+        return wrapper
+    return decorator
+
+# --- Prometheus Endpoint ---
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Keep scrapes out of the application's output.
+        pass
+
+_metrics_server = None
+
+def start_metrics_server(port: int, host: str = "0.0.0.0"):
+    """
+    Serves the metrics in the Prometheus text format at http://<host>:<port>/metrics.
+
+    Only the first call starts a server; later calls do nothing.
+
+    Args:
+        port (int): The port to listen on.
+        host (str): The interface to bind to.
+    """
+    global _metrics_server
+    if _metrics_server is not None:
+        return
+    _metrics_server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=_metrics_server.serve_forever, name="metrics-server", daemon=True).start()
@@ -0,0 +1,250 @@
+# utils/upload_store.py
+
+"""
+This module implements the content-addressed store for uploaded documents.
+
+Every upload is identified by the SHA-256 hash of its content and written once,
+to `<directory>/<first 16 hex digits of the hash>/<file name>`, so:
+- uploading the same content again (under any name) writes nothing;
+- two different files with the same name no longer overwrite each other on disk;
+  re-uploading a name with new content replaces the old version explicitly.
+
+A small JSON index in the store directory maps file names to content hashes and
+remembers, per content hash, where it is stored and whether it has been indexed,
+so the app can trigger ingestion only for content that is actually new. As the
+index lives inside the directory, emptying the directory also resets the store.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from utils.manifest import file_sha256
+
+# --- Configuration and Constants ---
+
+# File name of the index inside the store directory (not a supported document type,
+# so ingestion never picks it up).
+UPLOAD_INDEX_FILE = "upload_index.json"
+# Number of hex digits of the content hash used as the directory name of a stored file.
+HASH_PREFIX_LENGTH = 16
+
+# Results of `UploadStore.add`.
+UNCHANGED = "unchanged"  # the name already refers to this content
+DUPLICATE = "duplicate"  # the content is already stored under another name
+STORED = "stored"        # new content was written
+REPLACED = "replaced"    # new content was written, replacing other content under the same name
+
+def content_hash(data) -> str:
+    """
+    Computes the SHA-256 hash of an upload's content.
+
+    Args:
+        data: The content, as bytes or any buffer (e.g. a memoryview).
+
+    Returns:
+        str: The hexadecimal digest.
+    """
+    return hashlib.sha256(data).hexdigest()
+
+# --- Upload Store ---
+
+class UploadStore:
+    """
+    Content-addressed store of uploaded documents with a name -> hash -> indexed-state index.
+
+    All methods are thread-safe, so one store can be shared by every session of the app.
+    """
+
+    def __init__(self, directory: str):
+        """
+        Opens the store in the given directory, creating the directory if needed.
+
+        Args:
+            directory (str): The document directory that ingestion reads from.
+        """
+        self.directory = directory
+        self._index_path = os.path.join(directory, UPLOAD_INDEX_FILE)
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        # name -> content hash
+        self._names = {}
+        # content hash -> {"path": path relative to the directory, "size": bytes, "indexed": bool}
+        self._blobs = {}
+
+        if os.path.exists(self._index_path):
+            try:
+                with open(self._index_path, "r", encoding="utf-8") as f:
+                    index = json.load(f)
+                self._names, self._blobs = index["names"], index["blobs"]
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Failed to read upload index {self._index_path}. Reason: {e}")
+                self._names, self._blobs = {}, {}
+        else:
+            # A directory filled before the store existed: adopt its files where they are.
+            self._adopt_existing_files()
+
+        # Forget content whose file has disappeared.
+        missing = [h for h, blob in self._blobs.items() if not os.path.exists(self._path(blob))]
+        for h in missing:
+            del self._blobs[h]
+        self._names = {name: h for name, h in self._names.items() if h in self._blobs}
+        if missing:
+            self._save()
+
+    def _adopt_existing_files(self):
+        for root, _, files in os.walk(self.directory):
+            for name in sorted(files):
+                # Skip leftovers of interrupted writes.
+                if name.endswith((".part", ".tmp")):
+                    continue
+                path = os.path.join(root, name)
+                h = file_sha256(path)
+                if h not in self._blobs:
+                    self._blobs[h] = {"path": os.path.relpath(path, self.directory),
+                                      "size": os.path.getsize(path), "indexed": False}
+                self._names[name] = h
+        if self._blobs:
+            self._save()
+
+    def _path(self, blob: dict) -> str:
+        return os.path.join(self.directory, blob["path"])
+
+    def _save(self):
+        # Write atomically, like the ingestion manifest, so a crash never leaves half an index.
+        tmp_path = f"{self._index_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"names": self._names, "blobs": self._blobs}, f)
+        os.replace(tmp_path, self._index_path)
+
+    def _remove_if_unreferenced(self, h: str):
+        if h in self._blobs and h not in self._names.values():
+            path = self._path(self._blobs.pop(h))
+            if os.path.exists(path):
+                os.remove(path)
+            # Remove the hash directory too, once it is empty.
+            folder = os.path.dirname(path)
+            if os.path.abspath(folder) != os.path.abspath(self.directory) and not os.listdir(folder):
+                os.rmdir(folder)
+
+    def contains(self, h: str) -> bool:
+        """
+        Checks whether content with the given hash is stored.
+
+        Args:
+            h (str): A content hash from `content_hash`.
+        """
+        with self._lock:
+            return h in self._blobs
+
+    def add(self, name: str, data, h: str = None) -> str:
+        """
+        Stores an upload unless its content is already stored.
+
+        Args:
+            name (str): The uploaded file's name (any directory part is ignored).
+            data: The file content, as bytes or a buffer.
+            h (str, optional): The content hash, if the caller has already computed it.
+
+        Returns:
+            str: UNCHANGED, DUPLICATE, STORED or REPLACED.
+        """
+        name = os.path.basename(name)
+        h = h or content_hash(data)
+        with self._lock:
+            previous = self._names.get(name)
+            if previous == h:
+                return UNCHANGED
+
+            if h in self._blobs:
+                status = DUPLICATE
+            else:
+                relative_path = os.path.join(h[:HASH_PREFIX_LENGTH], name)
+                path = os.path.join(self.directory, relative_path)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                # Write under a temporary name first, so ingestion never reads a partial file.
+                tmp_path = f"{path}.part"
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+                self._blobs[h] = {"path": relative_path, "size": os.path.getsize(path), "indexed": False}
+                status = REPLACED if previous is not None else STORED
+
+            self._names[name] = h
+            # The old version of a re-uploaded name is dropped, unless another name still refers to it.
+            if previous is not None:
+                self._remove_if_unreferenced(previous)
+            self._save()
+            return status
+
+    def remove(self, name: str) -> str:
+        """
+        Removes a stored document by name.
+
+        Args:
+            name (str): The file name the document was uploaded under.
+
+        Returns:
+            str | None: The path the removed file was stored at, so its chunks can be
+                        deleted from the index, or None if nothing was removed from disk
+                        (the name is unknown, or another name still refers to the content).
+        """
+        name = os.path.basename(name)
+        with self._lock:
+            h = self._names.pop(name, None)
+            if h is None:
+                return None
+            path = self._path(self._blobs[h])
+            self._remove_if_unreferenced(h)
+            self._save()
+            return None if h in self._blobs else path
+
+    def pending(self) -> list[str]:
+        """
+        Returns the hashes of stored content that has not been indexed yet.
+        """
+        with self._lock:
+            return [h for h, blob in self._blobs.items() if not blob["indexed"]]
+
+    def mark_indexed(self, hashes: list[str]):
+        """
+        Records that the given content has been handed to ingestion and indexing.
+
+        Args:
+            hashes (list[str]): Content hashes, e.g. from `pending`.
+        """
+        with self._lock:
+            changed = False
+            for h in hashes:
+                if h in self._blobs and not self._blobs[h]["indexed"]:
+                    self._blobs[h]["indexed"] = True
+                    changed = True
+            if changed:
+                self._save()
+
+    def documents(self) -> dict:
+        """
+        Returns every stored document by name.
+
+        Returns:
+            dict: File name -> path of the stored file.
+        """
+        with self._lock:
+            return {name: self._path(self._blobs[h]) for name, h in self._names.items()}
+
+    def has_documents(self) -> bool:
+        """
+        Checks whether any document is stored, without touching the disk.
+        """
+        with self._lock:
+            return bool(self._blobs)
+
+    def reload(self):
+        """
+        Re-reads the store from disk, e.g. after the directory has been emptied.
+        """
+        with self._lock:
+            self._load()
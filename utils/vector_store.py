@@ -0,0 +1,985 @@
+# utils/vector_store.py
+
+"""
+This module defines the storage interface used by the Retrieval Agent and its backends.
+Every backend stores chunk IDs, texts, embeddings and metadata and answers nearest-neighbour
+queries; the agent does not depend on which one is in use.
+
+- ChromaVectorStore keeps the chunks in a ChromaDB persistent collection.
+- NumpyVectorStore keeps them in append-only segments on disk: one memory-mapped
+  float32 matrix plus one JSON-lines file of IDs, texts and metadata per segment. Queries
+  are exact, vectorized brute-force scans; deletes and overwrites only mark the
+  old rows with tombstones, and dead rows are dropped by occasional compaction.
+  It starts instantly and keeps little besides the chunk IDs and metadata in
+  memory, which suits small and medium corpora.
+- With quantization ("numpy-int8" or "numpy-binary"), the NumPy store also keeps a
+  compact copy of every vector in memory, int8 (4x smaller) or one bit per
+  dimension (32x smaller). A query first scans only these codes, with int8 dot
+  products or Hamming distances, then rescores a shortlist against the
+  full-precision vectors, of which only the shortlisted rows are ever read.
+  This suits corpora whose float32 vectors no longer fit in memory.
+
+Queries and lookups can be restricted by chunk metadata with a ChromaDB-style
+`where` filter, e.g. `{"source": {"$in": [...]}}`; `matches_where` evaluates the
+same filters for the NumPy backend.
+"""
+
+import json
+import os
+import shutil
+import threading
+from itertools import groupby
+import numpy as np
+
+# --- Configuration and Constants ---
+
+# Name of the ChromaDB collection holding the document chunks.
+CHROMA_COLLECTION_NAME = "document_qa_collection"
+# Maximum number of rows in one segment of the NumPy store.
+SEGMENT_ROWS = 65_536
+# The NumPy store is compacted once dead rows outnumber live ones (and there are at least this many).
+COMPACT_MIN_DEAD_ROWS = 4096
+# Number of metadata filters per segment whose row masks are kept for repeated queries.
+FILTER_MASK_CACHE_SIZE = 32
+# Quantized copies of the vectors the NumPy store can search first.
+QUANTIZATIONS = ("int8", "binary")
+# A quantized search rescores this many candidates per requested result, and at least
+# QUANTIZED_MIN_SHORTLIST, against the full-precision vectors. Binary codes need the
+# larger shortlist; with it both modes find the exact top results on clustered data.
+QUANTIZED_SHORTLIST_FACTOR = 20
+QUANTIZED_MIN_SHORTLIST = 100
+# Number of int8 rows converted to float32 at a time while scoring; small blocks stay in
+# the CPU cache, which makes the int8 scan faster than the float32 one.
+QUANTIZED_BLOCK_ROWS = 256
+# Number of rows whose missing codes are computed at a time when a segment is opened.
+_CODE_REBUILD_ROWS = 16384
+
+# --- Metadata Filters ---
+
+# Comparison operators of a `where` filter, as supported by ChromaDB.
+_OPERATORS = {
+    "$eq": lambda value, operand: value == operand,
+    "$ne": lambda value, operand: value != operand,
+    "$gt": lambda value, operand: value is not None and value > operand,
+    "$gte": lambda value, operand: value is not None and value >= operand,
+    "$lt": lambda value, operand: value is not None and value < operand,
+    "$lte": lambda value, operand: value is not None and value <= operand,
+    "$in": lambda value, operand: value in operand,
+    "$nin": lambda value, operand: value not in operand,
+}
+
+def matches_where(metadata: dict, where: dict) -> bool:
+    """
+    Evaluates a ChromaDB-style metadata filter against one chunk's metadata.
+
+    A filter maps field names to a value (equality) or to {operator: operand},
+    with the operators of `_OPERATORS`; "$and" and "$or" combine lists of filters.
+    Several fields in one dictionary must all match.
+
+    Args:
+        metadata (dict): The chunk's metadata (may be None or empty).
+        where (dict): The filter.
+
+    Returns:
+        bool: True if the metadata satisfies the filter.
+
+    Raises:
+        ValueError: If the filter uses an unknown operator.
+    """
+    metadata = metadata or {}
+    for field, condition in where.items():
+        if field == "$and":
+            matched = all(matches_where(metadata, clause) for clause in condition)
+        elif field == "$or":
+            matched = any(matches_where(metadata, clause) for clause in condition)
+        elif isinstance(condition, dict):
+            value = metadata.get(field)
+            matched = True
+            for operator, operand in condition.items():
+                if operator not in _OPERATORS:
+                    raise ValueError(f"Unsupported filter operator: {operator}")
+                try:
+                    matched = matched and _OPERATORS[operator](value, operand)
+                except TypeError:
+                    # Values of different types (e.g. a number compared with a string) never match.
+                    matched = False
+        else:
+            matched = metadata.get(field) == condition
+        if not matched:
+            return False
+    return True
+
+# --- Quantization ---
+
+def quantize_int8(vectors: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Quantizes vectors to int8 with one scale per vector (symmetric, by the largest component).
+
+    Args:
+        vectors (np.ndarray): A float matrix with one vector per row.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The int8 codes and the float32 scales, so that
+                                       `codes * scales[:, None]` approximates the vectors.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127 if len(vectors) else np.zeros(0, dtype=np.float32)
+    codes = np.rint(vectors / np.where(scales == 0, 1, scales)[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+def quantize_binary(vectors: np.ndarray) -> np.ndarray:
+    """
+    Quantizes vectors to one bit per dimension: whether the component is positive.
+
+    Args:
+        vectors (np.ndarray): A float matrix with one vector per row.
+
+    Returns:
+        np.ndarray: The packed bits, a uint8 matrix with ceil(dimension / 8) bytes per row.
+    """
+    return np.packbits(np.asarray(vectors) > 0, axis=1)
+
+# Bits set per byte, for NumPy versions without np.bitwise_count.
+_POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+def _popcount(codes: np.ndarray) -> np.ndarray:
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(codes)
+    return _POPCOUNT_TABLE[codes]
+
+def _top_rows(scores: np.ndarray, k: int) -> np.ndarray:
+    # Partial selection of each query's (column's) top k rows, without sorting all of them.
+    rows = scores.shape[0]
+    if k < rows:
+        return np.argpartition(-scores, k - 1, axis=0)[:k]
+    return np.broadcast_to(np.arange(rows)[:, None], scores.shape)
+
+# --- Interface ---
+
+class VectorStore:
+    """
+    Interface of a persistent store of chunk texts and embeddings.
+    """
+
+    def upsert(self, ids: list[str], documents: list[str], embeddings, metadatas: list[dict] = None):
+        """
+        Adds chunks, replacing any stored chunk with the same ID.
+
+        Args:
+            ids (list[str]): The chunk IDs.
+            documents (list[str]): The chunk texts.
+            embeddings: One embedding per chunk.
+            metadatas (list[dict], optional): One metadata dictionary per chunk, with
+                                              string, integer, float or boolean values.
+        """
+        raise NotImplementedError
+
+    def delete(self, ids: list[str]):
+        """
+        Removes chunks; unknown IDs are ignored.
+
+        Args:
+            ids (list[str]): The IDs of the chunks to remove.
+        """
+        raise NotImplementedError
+
+    def query(self, embedding, n_results: int, where: dict = None) -> tuple[list[str], list[str]]:
+        """
+        Finds the chunks nearest to an embedding.
+
+        Args:
+            embedding: The query embedding.
+            n_results (int): The maximum number of chunks to return.
+            where (dict, optional): A metadata filter; only matching chunks are returned.
+
+        Returns:
+            tuple[list[str], list[str]]: The IDs and texts of the nearest chunks, best first.
+        """
+        raise NotImplementedError
+
+    def query_batch(self, embeddings, n_results: int, where: dict = None) -> list[tuple[list[str], list[str]]]:
+        """
+        Finds the nearest chunks for several query embeddings at once.
+
+        Backends that can answer many queries in one call override this; the
+        default runs the queries one by one.
+
+        Args:
+            embeddings: One query embedding per row.
+            n_results (int): The maximum number of chunks per query.
+            where (dict, optional): A metadata filter applied to every query.
+
+        Returns:
+            list[tuple[list[str], list[str]]]: The IDs and texts of the nearest chunks for each query.
+        """
+        return [self.query(embedding, n_results, where) for embedding in embeddings]
+
+    def find(self, where: dict) -> list[str]:
+        """
+        Looks up the IDs of every chunk whose metadata matches a filter.
+
+        Args:
+            where (dict): The metadata filter, e.g. {"source": path}.
+
+        Returns:
+            list[str]: The IDs of the matching chunks.
+        """
+        raise NotImplementedError
+
+    def get(self, ids: list[str]) -> dict:
+        """
+        Looks up chunk texts by ID.
+
+        Args:
+            ids (list[str]): The chunk IDs.
+
+        Returns:
+            dict: Chunk ID -> text, for the IDs that exist.
+        """
+        raise NotImplementedError
+
+    def get_embeddings(self, ids: list[str]) -> dict:
+        """
+        Looks up stored chunk embeddings by ID.
+
+        Args:
+            ids (list[str]): The chunk IDs.
+
+        Returns:
+            dict: Chunk ID -> embedding (a float32 array), for the IDs that exist.
+        """
+        raise NotImplementedError
+
+    def get_metadata(self, ids: list[str]) -> dict:
+        """
+        Looks up chunk metadata by ID.
+
+        Args:
+            ids (list[str]): The chunk IDs.
+
+        Returns:
+            dict: Chunk ID -> metadata dictionary, for the IDs that exist.
+        """
+        raise NotImplementedError
+
+    def count(self) -> int:
+        """
+        Returns the number of stored chunks.
+        """
+        raise NotImplementedError
+
+    def iter_documents(self, batch_size: int = 256):
+        """
+        Iterates over all stored chunks in pages.
+
+        Args:
+            batch_size (int): The number of chunks per page.
+
+        Yields:
+            list[tuple[str, str]]: (chunk ID, text) pairs.
+        """
+        raise NotImplementedError
+
+    def iter_chunks(self, batch_size: int = 256, offset: int = 0, limit: int = None,
+                    where: dict = None, include_embeddings: bool = False):
+        """
+        Iterates over stored chunks with their metadata in pages, e.g. to inspect or export
+        the store. Only one page is held in memory at a time, whatever the size of the store.
+
+        Args:
+            batch_size (int): The number of chunks per page.
+            offset (int): The number of (matching) chunks to skip first.
+            limit (int, optional): The maximum number of chunks to yield; None for all of them.
+            where (dict, optional): A metadata filter; only matching chunks are yielded.
+            include_embeddings (bool): Whether to read each chunk's embedding too.
+
+        Yields:
+            list[dict]: Chunks with an 'id', a 'text', their 'metadata' and, if requested,
+                        their 'embedding' as a float32 array.
+        """
+        raise NotImplementedError
+
+    def compact(self):
+        """
+        Reclaims the disk space still held by deleted or overwritten chunks.
+        """
+        raise NotImplementedError
+
+    def reset(self):
+        """
+        Removes every chunk, in memory and on disk.
+        """
+        raise NotImplementedError
+
+# --- ChromaDB Backend ---
+
+class ChromaVectorStore(VectorStore):
+    """
+    Vector store backed by a ChromaDB persistent collection.
+    """
+
+    def __init__(self, path: str, collection_name: str = CHROMA_COLLECTION_NAME):
+        """
+        Opens (or creates) the collection stored in the given directory.
+
+        Args:
+            path (str): The ChromaDB persistence directory.
+            collection_name (str): The name of the collection.
+        """
+        # Imported here, as importing ChromaDB takes a noticeable part of a second.
+        import chromadb
+        from chromadb.config import Settings
+
+        self.path = path
+        self.client = chromadb.PersistentClient(
+            path=path,
+            # Pass a settings object to enable the .reset() method.
+            # This is a security feature to prevent accidental data loss.
+            settings=Settings(allow_reset=True)
+        )
+        # Embeddings are always computed by the caller, so the collection never
+        # needs an embedding function of its own.
+        self.collection = self.client.get_or_create_collection(name=collection_name, embedding_function=None)
+
+    def upsert(self, ids, documents, embeddings, metadatas=None):
+        self.collection.upsert(ids=ids, documents=documents, embeddings=embeddings, metadatas=metadatas)
+
+    def delete(self, ids):
+        self.collection.delete(ids=ids)
+
+    def query(self, embedding, n_results, where=None):
+        results = self.collection.query(query_embeddings=[embedding], n_results=n_results, where=where,
+                                        include=["documents"])
+        # The results are returned in a nested list (one list per query); take the only one.
+        return results["ids"][0], results["documents"][0]
+
+    def query_batch(self, embeddings, n_results, where=None):
+        if len(embeddings) == 0:
+            return []
+        # A single multi-query call returns one result list per query embedding.
+        results = self.collection.query(query_embeddings=list(embeddings), n_results=n_results, where=where,
+                                        include=["documents"])
+        return list(zip(results["ids"], results["documents"]))
+
+    def find(self, where):
+        # The filter is evaluated by ChromaDB's metadata index; no documents are loaded.
+        return self.collection.get(where=where, include=[])["ids"]
+
+    def get(self, ids):
+        found = self.collection.get(ids=ids, include=["documents"])
+        return dict(zip(found["ids"], found["documents"]))
+
+    def get_embeddings(self, ids):
+        found = self.collection.get(ids=ids, include=["embeddings"])
+        return {chunk_id: np.asarray(embedding, dtype=np.float32)
+                for chunk_id, embedding in zip(found["ids"], found["embeddings"])}
+
+    def get_metadata(self, ids):
+        found = self.collection.get(ids=ids, include=["metadatas"])
+        return {chunk_id: metadata or {} for chunk_id, metadata in zip(found["ids"], found["metadatas"])}
+
+    def count(self):
+        return self.collection.count()
+
+    def iter_documents(self, batch_size=256):
+        for offset in range(0, self.collection.count(), batch_size):
+            page = self.collection.get(limit=batch_size, offset=offset, include=["documents"])
+            yield list(zip(page["ids"], page["documents"]))
+
+    def iter_chunks(self, batch_size=256, offset=0, limit=None, where=None, include_embeddings=False):
+        include = ["documents", "metadatas"] + (["embeddings"] if include_embeddings else [])
+        remaining = limit
+        while remaining is None or remaining > 0:
+            size = batch_size if remaining is None else min(batch_size, remaining)
+            page = self.collection.get(where=where, limit=size, offset=offset, include=include)
+            if not page["ids"]:
+                return
+            chunks = [{"id": chunk_id, "text": text, "metadata": metadata or {}}
+                      for chunk_id, text, metadata in zip(page["ids"], page["documents"], page["metadatas"])]
+            if include_embeddings:
+                for chunk, embedding in zip(chunks, page["embeddings"]):
+                    chunk["embedding"] = np.asarray(embedding, dtype=np.float32)
+            yield chunks
+            offset += len(chunks)
+            if remaining is not None:
+                remaining -= len(chunks)
+            # A short page is the last one.
+            if len(chunks) < size:
+                return
+
+    def compact(self):
+        # Deleted chunks leave free pages in ChromaDB's SQLite file until it is vacuumed.
+        # (Their entries in the HNSW segment files are only marked as deleted and reused by later inserts.)
+        import sqlite3
+        connection = sqlite3.connect(os.path.join(self.path, "chroma.sqlite3"))
+        try:
+            connection.execute("VACUUM")
+        finally:
+            connection.close()
+
+    def reset(self):
+        self.client.reset()
+
+# --- NumPy Memory-Mapped Backend ---
+
+class _Segment:
+    """
+    One append-only segment: a float32 vectors file and a JSON-lines file of IDs, texts and
+    metadata, plus, with quantization, the codes of the vectors (loaded into memory).
+    """
+
+    def __init__(self, path: str, number: int, dimension: int, quantization: str = None):
+        self.number = number
+        self.dimension = dimension
+        self.quantization = quantization
+        self.vectors_path = os.path.join(path, f"segment_{number:05d}.f32")
+        self.rows_path = os.path.join(path, f"segment_{number:05d}.jsonl")
+        # int8 codes and their per-row scales, or packed sign bits.
+        self.int8_path = os.path.join(path, f"segment_{number:05d}.i8")
+        self.scales_path = os.path.join(path, f"segment_{number:05d}.i8s")
+        self.binary_path = os.path.join(path, f"segment_{number:05d}.b1")
+        self.codes = None
+        self.scales = None
+        if quantization is not None:
+            _, dtype, width = self._code_files()[0]
+            self.codes = np.zeros((0, width), dtype=dtype)
+            self.scales = np.zeros(0, dtype=np.float32)
+        self.ids = []
+        self.metadatas = []  # metadata of each row (None if it has none), for filtered queries
+        self.offsets = []  # byte offset of each row's line in the JSON-lines file
+        self.dead = np.zeros(0, dtype=bool)
+        self.dead_count = 0
+        self._matrix = None
+        # Serialized filter -> boolean mask of the rows matching it.
+        self._filter_masks = {}
+
+    def load(self):
+        end = 0
+        if os.path.exists(self.rows_path):
+            with open(self.rows_path, "rb") as f:
+                for line in f:
+                    # A line without its newline was cut short by a crash.
+                    if not line.endswith(b"\n"):
+                        break
+                    row = json.loads(line)
+                    self.ids.append(row["id"])
+                    self.metadatas.append(row.get("metadata"))
+                    self.offsets.append(end)
+                    end += len(line)
+        vectors_size = os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0
+
+        # After a crash during an append, keep only the rows present in both files.
+        rows = min(len(self.ids), vectors_size // (4 * self.dimension))
+        if rows < len(self.ids):
+            end = self.offsets[rows]
+            del self.ids[rows:], self.metadatas[rows:], self.offsets[rows:]
+        if os.path.exists(self.rows_path) and os.path.getsize(self.rows_path) != end:
+            os.truncate(self.rows_path, end)
+        if vectors_size != rows * 4 * self.dimension:
+            os.truncate(self.vectors_path, rows * 4 * self.dimension)
+        self.dead = np.zeros(rows, dtype=bool)
+        if self.quantization is not None:
+            self._load_codes()
+
+    @property
+    def files(self) -> list[str]:
+        # Every file of the segment, including codes of a quantization no longer in use.
+        return [self.vectors_path, self.rows_path, self.int8_path, self.scales_path, self.binary_path]
+
+    def _code_files(self) -> list[tuple[str, type, int]]:
+        # (path, dtype, values per row) of the files holding this segment's codes.
+        if self.quantization == "int8":
+            return [(self.int8_path, np.int8, self.dimension), (self.scales_path, np.float32, 1)]
+        return [(self.binary_path, np.uint8, -(-self.dimension // 8))]
+
+    def _load_codes(self):
+        # Codes are derived data: rows they are missing for (the store was used without
+        # quantization, or a crash cut an append short) are computed from the vectors.
+        loaded = []
+        for file_path, dtype, width in self._code_files():
+            values = np.fromfile(file_path, dtype=dtype) if os.path.exists(file_path) else np.zeros(0, dtype=dtype)
+            loaded.append(values[:len(values) // width * width].reshape(-1, width))
+        valid = min(self.rows, *(len(values) for values in loaded))
+        for (file_path, dtype, width), values in zip(self._code_files(), loaded):
+            if os.path.exists(file_path) and os.path.getsize(file_path) != valid * width * np.dtype(dtype).itemsize:
+                os.truncate(file_path, valid * width * np.dtype(dtype).itemsize)
+        self.codes = loaded[0][:valid]
+        self.scales = loaded[1][:valid, 0] if self.quantization == "int8" else None
+        if valid < self.rows:
+            matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(self.rows, self.dimension))
+            for start in range(valid, self.rows, _CODE_REBUILD_ROWS):
+                self._append_codes(np.asarray(matrix[start:start + _CODE_REBUILD_ROWS]))
+            del matrix
+
+    def _append_codes(self, vectors: np.ndarray):
+        if self.quantization == "int8":
+            codes, scales = quantize_int8(vectors)
+            parts = [codes, scales]
+        else:
+            codes = quantize_binary(vectors)
+            parts = [codes]
+        for (file_path, _, _), values in zip(self._code_files(), parts):
+            with open(file_path, "ab") as f:
+                f.write(np.ascontiguousarray(values).tobytes())
+        self.codes = np.concatenate([self.codes, codes])
+        if self.quantization == "int8":
+            self.scales = np.concatenate([self.scales, scales])
+
+    @property
+    def rows(self) -> int:
+        return len(self.ids)
+
+    def append(self, ids: list[str], documents: list[str], vectors: np.ndarray, metadatas: list[dict]):
+        with open(self.rows_path, "ab") as f:
+            offset = f.tell()
+            for chunk_id, text, metadata in zip(ids, documents, metadatas):
+                row = {"id": chunk_id, "text": text}
+                if metadata:
+                    row["metadata"] = metadata
+                line = (json.dumps(row, ensure_ascii=False) + "\n").encode("utf-8")
+                f.write(line)
+                self.offsets.append(offset)
+                offset += len(line)
+        with open(self.vectors_path, "ab") as f:
+            f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+        # The codes are written last: on load, missing codes are recomputed from the vectors.
+        if self.quantization is not None:
+            self._append_codes(np.asarray(vectors, dtype=np.float32))
+        self.ids.extend(ids)
+        self.metadatas.extend(metadatas)
+        self.dead = np.concatenate([self.dead, np.zeros(len(ids), dtype=bool)])
+        # The memory map is re-created on the next query to cover the new rows.
+        self._matrix = None
+        self._filter_masks = {}
+
+    def matching(self, where: dict) -> np.ndarray:
+        # Boolean mask of the rows (dead or alive) whose metadata matches the filter.
+        key = json.dumps(where, sort_keys=True)
+        mask = self._filter_masks.get(key)
+        if mask is None:
+            mask = np.fromiter((matches_where(metadata, where) for metadata in self.metadatas),
+                               dtype=bool, count=self.rows)
+            if len(self._filter_masks) >= FILTER_MASK_CACHE_SIZE:
+                self._filter_masks.clear()
+            self._filter_masks[key] = mask
+        return mask
+
+    def approximate_scores(self, queries: np.ndarray) -> np.ndarray:
+        # Scores of every row against every query from the codes alone (higher is better):
+        # int8 dot products rescaled to cosine similarities, or negated Hamming distances.
+        if self.quantization == "int8":
+            scores = np.empty((self.rows, len(queries)), dtype=np.float32)
+            for start in range(0, self.rows, QUANTIZED_BLOCK_ROWS):
+                block = self.codes[start:start + QUANTIZED_BLOCK_ROWS].astype(np.float32)
+                scores[start:start + QUANTIZED_BLOCK_ROWS] = block @ queries.T
+            return scores * self.scales[:, None]
+        distances = np.empty((self.rows, len(queries)), dtype=np.float32)
+        for q, query_code in enumerate(quantize_binary(queries)):
+            distances[:, q] = _popcount(self.codes ^ query_code).sum(axis=1)
+        return -distances
+
+    def matrix(self) -> np.ndarray:
+        if self._matrix is None and self.rows:
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(self.rows, self.dimension))
+        return self._matrix
+
+    def read_vectors(self, rows: list[int]) -> np.ndarray:
+        # Reads single rows with plain file reads: faulting them in through the memory map
+        # would also map the pages around each row, so a few hundred scattered rows would
+        # make much of the vectors file resident.
+        row_bytes = 4 * self.dimension
+        vectors = np.empty((len(rows), self.dimension), dtype=np.float32)
+        with open(self.vectors_path, "rb") as f:
+            for i, row in enumerate(rows):
+                f.seek(row * row_bytes)
+                vectors[i] = np.frombuffer(f.read(row_bytes), dtype=np.float32)
+        return vectors
+
+    def read_rows(self, rows: list[int]) -> list[dict]:
+        # The stored records ('id', 'text' and, if any, 'metadata') of the given rows.
+        records = []
+        with open(self.rows_path, "rb") as f:
+            for row in rows:
+                f.seek(self.offsets[row])
+                records.append(json.loads(f.readline()))
+        return records
+
+    def read_texts(self, rows: list[int]) -> list[str]:
+        return [record["text"] for record in self.read_rows(rows)]
+
+class NumpyVectorStore(VectorStore):
+    """
+    Vector store backed by append-only, memory-mapped float32 segments with tombstones.
+
+    Vectors are L2-normalized on insert, so the inner product used for ranking is the
+    cosine similarity. With quantization, queries run in two stages: candidates from
+    the in-memory codes, then exact rescoring of a shortlist.
+    """
+
+    def __init__(self, path: str, segment_rows: int = SEGMENT_ROWS, quantization: str = None):
+        """
+        Opens (or creates) the store in the given directory.
+
+        Args:
+            path (str): The directory holding the segments.
+            segment_rows (int): The maximum number of rows per segment.
+            quantization (str, optional): "int8" or "binary" to search quantized codes
+                                          first; codes missing on disk are computed on open.
+
+        Raises:
+            ValueError: If the quantization is unknown.
+        """
+        if quantization is not None and quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization: {quantization}")
+        self.path = path
+        self.segment_rows = segment_rows
+        self.quantization = quantization
+        self._lock = threading.Lock()
+        self._meta_path = os.path.join(path, "meta.json")
+        self._tombstones_path = os.path.join(path, "tombstones.log")
+        os.makedirs(path, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        self.dimension = None
+        self._segments = []
+        # chunk ID -> (segment index, row) of its live row
+        self._locations = {}
+        self._dead_rows = 0
+
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path, encoding="utf-8") as f:
+                self.dimension = json.load(f)["dimension"]
+        if self.dimension is None:
+            return
+
+        numbers = sorted(int(name[8:13]) for name in os.listdir(self.path)
+                         if name.startswith("segment_") and name.endswith(".jsonl"))
+        for number in numbers:
+            segment = _Segment(self.path, number, self.dimension, self.quantization)
+            segment.load()
+            self._segments.append(segment)
+
+        by_number = {segment.number: index for index, segment in enumerate(self._segments)}
+        if os.path.exists(self._tombstones_path):
+            with open(self._tombstones_path, encoding="utf-8") as f:
+                for line in f:
+                    parts = line.split()
+                    # Tombstones of segments removed by a compaction are ignored.
+                    if len(parts) == 2 and int(parts[0]) in by_number:
+                        segment = self._segments[by_number[int(parts[0])]]
+                        row = int(parts[1])
+                        if row < segment.rows and not segment.dead[row]:
+                            segment.dead[row] = True
+                            segment.dead_count += 1
+
+        # Later rows win over earlier ones with the same ID.
+        for index, segment in enumerate(self._segments):
+            for row, chunk_id in enumerate(segment.ids):
+                if segment.dead[row]:
+                    continue
+                previous = self._locations.get(chunk_id)
+                if previous is not None:
+                    self._kill(*previous)
+                self._locations[chunk_id] = (index, row)
+        self._dead_rows = sum(segment.dead_count for segment in self._segments)
+
+    def _kill(self, index: int, row: int) -> str:
+        # Marks a row as dead and returns its tombstone record.
+        segment = self._segments[index]
+        segment.dead[row] = True
+        segment.dead_count += 1
+        self._dead_rows += 1
+        return f"{segment.number} {row}\n"
+
+    def _write_tombstones(self, tombstones: list[str]):
+        if tombstones:
+            with open(self._tombstones_path, "a", encoding="utf-8") as f:
+                f.writelines(tombstones)
+
+    def _new_segment(self) -> _Segment:
+        number = self._segments[-1].number + 1 if self._segments else 0
+        segment = _Segment(self.path, number, self.dimension, self.quantization)
+        self._segments.append(segment)
+        return segment
+
+    def _append(self, ids: list[str], documents: list[str], vectors: np.ndarray, metadatas: list[dict]):
+        start = 0
+        while start < len(ids):
+            segment = self._segments[-1] if self._segments else None
+            if segment is None or segment.rows >= self.segment_rows:
+                segment = self._new_segment()
+            end = min(len(ids), start + self.segment_rows - segment.rows)
+            first_row = segment.rows
+            segment.append(ids[start:end], documents[start:end], vectors[start:end], metadatas[start:end])
+            index = len(self._segments) - 1
+            for row, chunk_id in enumerate(ids[start:end], start=first_row):
+                self._locations[chunk_id] = (index, row)
+            start = end
+
+    def upsert(self, ids, documents, embeddings, metadatas=None):
+        vectors = np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+
+        # Within one batch, the last occurrence of an ID wins.
+        last = {chunk_id: i for i, chunk_id in enumerate(ids)}
+        keep = sorted(last.values())
+        ids = [ids[i] for i in keep]
+        documents = [documents[i] for i in keep]
+        metadatas = [metadatas[i] for i in keep] if metadatas is not None else [None] * len(keep)
+        vectors = vectors[keep]
+
+        with self._lock:
+            if self.dimension is None:
+                self.dimension = vectors.shape[1]
+                with open(self._meta_path, "w", encoding="utf-8") as f:
+                    json.dump({"dimension": self.dimension}, f)
+            elif vectors.shape[1] != self.dimension:
+                raise ValueError(f"Expected embeddings of size {self.dimension}, got {vectors.shape[1]}")
+
+            # Overwritten chunks leave a tombstone on their previous row.
+            tombstones = []
+            for chunk_id in ids:
+                location = self._locations.get(chunk_id)
+                if location is not None:
+                    tombstones.append(self._kill(*location))
+            # Rows are appended before their tombstones are written, so a crash in
+            # between leaves duplicates (resolved on load) rather than lost chunks.
+            self._append(ids, documents, vectors, metadatas)
+            self._write_tombstones(tombstones)
+            self._maybe_compact()
+
+    def delete(self, ids):
+        with self._lock:
+            tombstones = []
+            for chunk_id in ids:
+                location = self._locations.pop(chunk_id, None)
+                if location is not None:
+                    tombstones.append(self._kill(*location))
+            self._write_tombstones(tombstones)
+            self._maybe_compact()
+
+    def _maybe_compact(self):
+        if self._dead_rows >= COMPACT_MIN_DEAD_ROWS and self._dead_rows > len(self._locations):
+            self._compact()
+
+    def _compact(self):
+        # Copy the live rows into new segments, then drop the old segments and their tombstones.
+        # Until the old files are gone, a reload still sees a consistent store: the new
+        # rows come later and win, and the old tombstones still apply to the old rows.
+        old_segments = self._segments
+        live = sorted(self._locations.values())
+        self._segments = list(old_segments)
+        self._locations = {}
+        self._new_segment()
+        first_new = len(self._segments) - 1
+
+        for start in range(0, len(live), self.segment_rows):
+            page = live[start:start + self.segment_rows]
+            ids, documents, metadatas, vectors = [], [], [], []
+            for index in sorted({index for index, _ in page}):
+                rows = [row for i, row in page if i == index]
+                segment = old_segments[index]
+                records = segment.read_rows(rows)
+                ids.extend(segment.ids[row] for row in rows)
+                documents.extend(record["text"] for record in records)
+                metadatas.extend(segment.metadatas[row] for row in rows)
+                vectors.append(np.asarray(segment.matrix()[rows]))
+            self._append(ids, documents, np.concatenate(vectors), metadatas)
+
+        for segment in old_segments:
+            segment._matrix = None
+            for file_path in segment.files:
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+        if os.path.exists(self._tombstones_path):
+            os.remove(self._tombstones_path)
+
+        self._segments = self._segments[first_new:]
+        self._locations = {chunk_id: (index - first_new, row) for chunk_id, (index, row) in self._locations.items()}
+        self._dead_rows = 0
+
+    def query(self, embedding, n_results, where=None):
+        return self.query_batch(np.asarray(embedding, dtype=np.float32).reshape(1, -1), n_results, where)[0]
+
+    def query_batch(self, embeddings, n_results, where=None):
+        queries = np.asarray(embeddings, dtype=np.float32)
+        if queries.size == 0:
+            return []
+        queries = queries.reshape(len(queries), -1)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms == 0, 1, norms)
+
+        with self._lock:
+            if self.quantization is None:
+                best_by_query = self._nearest(queries, n_results, where)
+            else:
+                best_by_query = self._nearest_quantized(queries, n_results, where)
+            return [([self._segments[index].ids[row] for index, row in best], self._read(best))
+                    for best in best_by_query]
+
+    def _candidates(self, queries: np.ndarray, k: int, where: dict, quantized: bool) -> list[list[tuple]]:
+        # Per query, the (score, segment index, row) triples of each segment's top k rows.
+        candidates = [[] for _ in range(len(queries))]
+        for index, segment in enumerate(self._segments):
+            if not segment.rows:
+                continue
+            if quantized:
+                scores = segment.approximate_scores(queries)
+            else:
+                # One matrix product scores every row of the segment against every query.
+                scores = segment.matrix() @ queries.T
+            # Dead rows and rows outside the filter can never be returned.
+            excluded = segment.dead if where is None else segment.dead | ~segment.matching(where)
+            if excluded.any():
+                scores[excluded] = -np.inf
+            top = _top_rows(scores, min(k, segment.rows))
+            for q in range(len(queries)):
+                rows = top[:, q]
+                candidates[q].extend(
+                    (float(scores[row, q]), index, int(row)) for row in rows if scores[row, q] > -np.inf
+                )
+        for query_candidates in candidates:
+            query_candidates.sort(key=lambda candidate: -candidate[0])
+            del query_candidates[k:]
+        return candidates
+
+    def _nearest(self, queries: np.ndarray, n_results: int, where: dict) -> list[list[tuple[int, int]]]:
+        # Exact search: the (segment index, row) of each query's nearest rows, best first.
+        return [[(index, row) for _, index, row in query_candidates]
+                for query_candidates in self._candidates(queries, n_results, where, quantized=False)]
+
+    def _nearest_quantized(self, queries: np.ndarray, n_results: int, where: dict) -> list[list[tuple[int, int]]]:
+        # Two-stage search: a shortlist from the codes, reranked by the full-precision vectors.
+        shortlist_size = max(n_results * QUANTIZED_SHORTLIST_FACTOR, QUANTIZED_MIN_SHORTLIST)
+        results = []
+        for query, query_candidates in zip(queries, self._candidates(queries, shortlist_size, where, quantized=True)):
+            shortlist = [(index, row) for _, index, row in query_candidates]
+            scores = np.empty(len(shortlist), dtype=np.float32)
+            # Only the shortlisted rows of the full-precision vectors are read, segment by segment.
+            by_segment = {}
+            for position, (index, row) in enumerate(shortlist):
+                by_segment.setdefault(index, []).append((row, position))
+            for index, entries in by_segment.items():
+                entries.sort()
+                rows = [row for row, _ in entries]
+                positions = [position for _, position in entries]
+                scores[positions] = self._segments[index].read_vectors(rows) @ query
+            order = np.argsort(-scores, kind="stable")[:n_results]
+            results.append([shortlist[i] for i in order])
+        return results
+
+    def _read(self, locations) -> list[str]:
+        # Read the texts segment by segment, then restore the requested order.
+        texts = {}
+        by_segment = {}
+        for index, row in locations:
+            by_segment.setdefault(index, []).append(row)
+        for index, rows in by_segment.items():
+            texts.update(zip(((index, row) for row in rows), self._segments[index].read_texts(rows)))
+        return [texts[location] for location in locations]
+
+    def get(self, ids):
+        with self._lock:
+            found = [(chunk_id, self._locations[chunk_id]) for chunk_id in ids if chunk_id in self._locations]
+            return dict(zip((chunk_id for chunk_id, _ in found), self._read([location for _, location in found])))
+
+    def get_embeddings(self, ids):
+        # The stored vectors are L2-normalized; each segment's rows are read in one go.
+        with self._lock:
+            by_segment = {}
+            for chunk_id in ids:
+                if chunk_id in self._locations:
+                    index, row = self._locations[chunk_id]
+                    by_segment.setdefault(index, []).append((row, chunk_id))
+            embeddings = {}
+            for index, entries in by_segment.items():
+                entries.sort()
+                vectors = self._segments[index].read_vectors([row for row, _ in entries])
+                embeddings.update(zip((chunk_id for _, chunk_id in entries), vectors))
+            return embeddings
+
+    def get_metadata(self, ids):
+        # Metadata is held in memory, so no segment file is read.
+        with self._lock:
+            found = [(chunk_id, self._locations[chunk_id]) for chunk_id in ids if chunk_id in self._locations]
+            return {chunk_id: dict(self._segments[index].metadatas[row] or {}) for chunk_id, (index, row) in found}
+
+    def find(self, where):
+        with self._lock:
+            return [chunk_id for chunk_id, (index, row) in self._locations.items()
+                    if matches_where(self._segments[index].metadatas[row], where)]
+
+    def count(self):
+        return len(self._locations)
+
+    def iter_documents(self, batch_size=256):
+        with self._lock:
+            locations = sorted(self._locations.values())
+        for start in range(0, len(locations), batch_size):
+            page = locations[start:start + batch_size]
+            with self._lock:
+                texts = self._read(page)
+                ids = [self._segments[index].ids[row] for index, row in page]
+            yield list(zip(ids, texts))
+
+    def iter_chunks(self, batch_size=256, offset=0, limit=None, where=None, include_embeddings=False):
+        with self._lock:
+            locations = sorted(location for location in self._locations.values()
+                               if where is None or matches_where(self._segments[location[0]].metadatas[location[1]], where))
+        end = len(locations) if limit is None else min(len(locations), offset + limit)
+        for start in range(offset, end, batch_size):
+            page = locations[start:min(start + batch_size, end)]
+            chunks = []
+            with self._lock:
+                # The page is sorted, so each segment's rows are read in one go and in file order.
+                for index, group in groupby(page, key=lambda location: location[0]):
+                    segment = self._segments[index]
+                    rows = [row for _, row in group]
+                    vectors = segment.read_vectors(rows) if include_embeddings else None
+                    for i, (row, record) in enumerate(zip(rows, segment.read_rows(rows))):
+                        chunk = {"id": record["id"], "text": record["text"], "metadata": dict(segment.metadatas[row] or {})}
+                        if include_embeddings:
+                            chunk["embedding"] = vectors[i]
+                        chunks.append(chunk)
+            yield chunks
+
+    def compact(self):
+        # Rewrites the segments without their dead rows, however few there are.
+        with self._lock:
+            if self._dead_rows:
+                self._compact()
+
+    def reset(self):
+        with self._lock:
+            for segment in self._segments:
+                segment._matrix = None
+            shutil.rmtree(self.path, ignore_errors=True)
+            os.makedirs(self.path, exist_ok=True)
+            self._load()
+
+# --- Factory ---
+
+def create_vector_store(backend: str, path: str) -> VectorStore:
+    """
+    Creates the vector store of the given backend.
+
+    Args:
+        backend (str): "chroma", "numpy", or "numpy-int8" / "numpy-binary" for the NumPy
+                       store with a quantized first search stage.
+        path (str): The directory where the store is persisted.
+
+    Returns:
+        VectorStore: The opened store.
+
+    Raises:
+        ValueError: If the backend is unknown.
+    """
+    if backend == "chroma":
+        return ChromaVectorStore(path)
+    if backend == "numpy":
+        return NumpyVectorStore(path)
+    if backend.startswith("numpy-") and backend[len("numpy-"):] in QUANTIZATIONS:
+        return NumpyVectorStore(path, quantization=backend[len("numpy-"):])
+    raise ValueError(f"Unknown vector store backend: {backend}")